@@ -14,15 +14,24 @@ class Config:
     DATA_DIR = os.path.join(BASE_DIR, 'app', 'data')
     DOCUMENTS_DIR = os.path.join(DATA_DIR, 'documents')
     VECTORSTORE_DIR = os.path.join(DATA_DIR, 'vectorstore')
+    DOCUMENT_MANIFEST_PATH = os.getenv('DOCUMENT_MANIFEST_PATH', os.path.join(DATA_DIR, 'documents_manifest.json'))
     
     # RAG Configuration
     CHUNK_SIZE = int(os.getenv('CHUNK_SIZE', 500))
     CHUNK_OVERLAP = int(os.getenv('CHUNK_OVERLAP', 50))
     SIMILARITY_TOP_K = int(os.getenv('SIMILARITY_TOP_K', 5))
+    DOCUMENT_PARSE_WORKERS = int(os.getenv('DOCUMENT_PARSE_WORKERS', min(2, os.cpu_count() or 1)))  # 1 = en serie; cada worker ~25 MB
+    INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', 100))  # chunks por lote de embedding/upsert
     
     # Gemini Configuration
     GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-2.5-flash')
     EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'models/text-embedding-004')
+    EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', 100))  # máximo aceptado por batchEmbedContents
+    EMBEDDING_MAX_CONCURRENCY = int(os.getenv('EMBEDDING_MAX_CONCURRENCY', 4))
+    EMBEDDING_MAX_RETRIES = int(os.getenv('EMBEDDING_MAX_RETRIES', 5))
+    EMBEDDING_BACKOFF_SECONDS = float(os.getenv('EMBEDDING_BACKOFF_SECONDS', 1.0))
+    EMBEDDING_CACHE_ENABLED = os.getenv('EMBEDDING_CACHE_ENABLED', 'True').lower() in ('1','true','yes')
+    EMBEDDING_CACHE_PATH = os.getenv('EMBEDDING_CACHE_PATH', os.path.join(DATA_DIR, 'embedding_cache.sqlite3'))
     
     # Application Configuration
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
@@ -53,9 +62,32 @@ class Config:
             'admin': {'limit': 10, 'window': 3600}
         }
 
+    # Almacén compartido del rate limiter (memory: por proceso; sqlite/redis: entre workers)
+    RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'memory')  # opciones: memory, sqlite, redis
+    RATE_LIMIT_SQLITE_PATH = os.getenv('RATE_LIMIT_SQLITE_PATH', os.path.join(DATA_DIR, 'rate_limits.sqlite3'))
+    # Espera máxima por el lock de escritura de SQLite; al vencer la request pasa (fail-open)
+    RATE_LIMIT_SQLITE_TIMEOUT_MS = int(os.getenv('RATE_LIMIT_SQLITE_TIMEOUT_MS', 250))
+    REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+    # Algoritmo: sliding_window (un timestamp por request) o gcra (un float por límite)
+    RATE_LIMIT_ALGORITHM = os.getenv('RATE_LIMIT_ALGORITHM', 'sliding_window')
+    # Tope de clientes en el almacén en memoria; al superarlo se desplaza el menos reciente
+    RATE_LIMIT_MAX_TRACKED_CLIENTS = int(os.getenv('RATE_LIMIT_MAX_TRACKED_CLIENTS', 100000))
+
     # Cache backend and TTL
     CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'memory')  # opciones: memory, redis, none
     CACHE_TTL = int(os.getenv('CACHE_TTL', 3600))  # segundos por defecto
+    CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 1000))
+    CACHE_MAX_BYTES = int(os.getenv('CACHE_MAX_BYTES', 32 * 1024 * 1024))  # 32MB
+    CACHE_EVICTION_POLICY = os.getenv('CACHE_EVICTION_POLICY', 'lru')  # opciones: lru, lfu, tinylfu
+
+    # Cache semántico (respuestas para consultas parafraseadas)
+    SEMANTIC_CACHE_ENABLED = os.getenv('SEMANTIC_CACHE_ENABLED', 'True').lower() in ('1','true','yes')
+    SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', 0.92))  # similitud coseno mínima
+    SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv('SEMANTIC_CACHE_MAX_ENTRIES', 500))  # por idioma
+
+    # Tier semántico del clasificador FAQ (paráfrasis de preguntas frecuentes)
+    FAQ_SEMANTIC_ENABLED = os.getenv('FAQ_SEMANTIC_ENABLED', 'True').lower() in ('1','true','yes')
+    FAQ_SEMANTIC_THRESHOLD = float(os.getenv('FAQ_SEMANTIC_THRESHOLD', 0.85))  # similitud coseno mínima
 
     # Monitoring endpoints / integration settings
     MONITORING_ENABLED = os.getenv('MONITORING_ENABLED', 'False').lower() in ('1','true','yes')
@@ -66,6 +98,41 @@ class Config:
         'logs': os.getenv('MONITORING_LOGS_PATH', '/api/monitoring/logs')
     }
 
+    # Muestreador de métricas en segundo plano (rutas de monitoring)
+    METRICS_SAMPLE_INTERVAL = float(os.getenv('METRICS_SAMPLE_INTERVAL', 5))  # segundos
+    METRICS_HISTORY_SIZE = int(os.getenv('METRICS_HISTORY_SIZE', 720))  # muestras en el ring buffer (1h a 5s)
+
+    # Trazas por request (spans del flujo híbrido en un ring buffer en memoria)
+    TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'True').lower() in ('1','true','yes')
+    TRACE_BUFFER_SIZE = int(os.getenv('TRACE_BUFFER_SIZE', 200))  # últimas trazas completas
+    TRACE_SLOWEST_SIZE = int(os.getenv('TRACE_SLOWEST_SIZE', 20))  # top de trazas más lentas
+    TRACE_EXPORT_PATH = os.getenv('TRACE_EXPORT_PATH', '')  # JSON Lines OTLP; vacío = sin exportar
+    TRACE_EXPORT_INTERVAL = float(os.getenv('TRACE_EXPORT_INTERVAL', 5))  # segundos
+    TRACE_SERVICE_NAME = os.getenv('TRACE_SERVICE_NAME', 'portfolio-backend')
+    # Prefijos de path que no abren traza (los propios endpoints de monitoring)
+    TRACE_EXCLUDED_PATHS = [p.strip() for p in os.getenv('TRACE_EXCLUDED_PATHS', '/api/monitoring,/metrics').split(',') if p.strip()]
+
+    # Profiler estadístico (/api/monitoring/profile, solo admin)
+    PROFILER_INTERVAL_MS = float(os.getenv('PROFILER_INTERVAL_MS', 10))  # 100 muestras por segundo
+    PROFILER_MAX_SECONDS = float(os.getenv('PROFILER_MAX_SECONDS', 60))
+    PROFILER_MAX_DEPTH = int(os.getenv('PROFILER_MAX_DEPTH', 128))  # frames por pila
+
+    # Logging estructurado: cola acotada drenada en segundo plano
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+    LOG_BODY_PREVIEW_BYTES = int(os.getenv('LOG_BODY_PREVIEW_BYTES', 1000))
+    # Fracción de requests logueadas por prefijo de path (JSON vía env LOG_SAMPLE_RATES)
+    try:
+        import json as _json
+        LOG_SAMPLE_RATES = _json.loads(os.getenv('LOG_SAMPLE_RATES', '') or '{}') or {
+            '/api/health': 0.01,
+            '/api/monitoring/metrics': 0.1
+        }
+    except Exception:
+        LOG_SAMPLE_RATES = {
+            '/api/health': 0.01,
+            '/api/monitoring/metrics': 0.1
+        }
+
     # Docker / Environment overrides
     DOCKER_IMAGE = os.getenv('DOCKER_IMAGE', 'portfolio-backend:latest')
     DOCKER_CPU_LIMIT = os.getenv('DOCKER_CPU_LIMIT', None)
@@ -94,6 +161,17 @@ class Config:
             return False
         return key in cls.ADMIN_API_KEYS
 
+    # API keys de clientes (comma separated en env RATE_LIMIT_API_KEYS) con tier 'api_key' en el rate limiting
+    _rate_limit_keys_env = os.getenv('RATE_LIMIT_API_KEYS', '')
+    RATE_LIMIT_API_KEYS = [k.strip() for k in _rate_limit_keys_env.split(',') if k.strip()]
+
+    @classmethod
+    def is_valid_rate_limit_key(cls, key: str) -> bool:
+        """Valida si la API key da acceso al tier 'api_key' (las claves admin también cuentan)."""
+        if not key:
+            return False
+        return key in cls.RATE_LIMIT_API_KEYS or key in cls.ADMIN_API_KEYS
+
     # ---------------- JWT / AUTH ----------------
     # Intentar leer JWT secret desde Docker secret file si existe, luego env var
     _jwt_secret = None
@@ -140,6 +218,18 @@ class Config:
             warnings.append(f"Unknown CACHE_BACKEND '{cls.CACHE_BACKEND}', falling back to 'memory'.")
             cls.CACHE_BACKEND = 'memory'
 
+        if cls.RATE_LIMIT_BACKEND not in ('memory', 'sqlite', 'redis'):
+            warnings.append(f"Unknown RATE_LIMIT_BACKEND '{cls.RATE_LIMIT_BACKEND}', falling back to 'memory'.")
+            cls.RATE_LIMIT_BACKEND = 'memory'
+
+        if cls.RATE_LIMIT_ALGORITHM not in ('sliding_window', 'gcra'):
+            warnings.append(f"Unknown RATE_LIMIT_ALGORITHM '{cls.RATE_LIMIT_ALGORITHM}', falling back to 'sliding_window'.")
+            cls.RATE_LIMIT_ALGORITHM = 'sliding_window'
+
+        if cls.RATE_LIMIT_SQLITE_TIMEOUT_MS <= 0:
+            warnings.append('RATE_LIMIT_SQLITE_TIMEOUT_MS must be positive; using 250')
+            cls.RATE_LIMIT_SQLITE_TIMEOUT_MS = 250
+
         # Rate limit defaults estructura
         if not isinstance(cls.RATE_LIMIT_DEFAULTS, dict):
             warnings.append('RATE_LIMIT_DEFAULTS has wrong format; using defaults')
@@ -155,6 +245,15 @@ class Config:
         if cls.MONITORING_ENABLED and not cls.MONITORING_BACKEND:
             warnings.append('MONITORING_ENABLED is true but MONITORING_BACKEND is not configured')
 
+        if cls.TRACE_BUFFER_SIZE <= 0 or cls.TRACE_SLOWEST_SIZE <= 0:
+            warnings.append('TRACE_BUFFER_SIZE and TRACE_SLOWEST_SIZE must be positive; using defaults')
+            cls.TRACE_BUFFER_SIZE = cls.TRACE_BUFFER_SIZE if cls.TRACE_BUFFER_SIZE > 0 else 200
+            cls.TRACE_SLOWEST_SIZE = cls.TRACE_SLOWEST_SIZE if cls.TRACE_SLOWEST_SIZE > 0 else 20
+
+        if cls.PROFILER_INTERVAL_MS <= 0:
+            warnings.append('PROFILER_INTERVAL_MS must be positive; using 10ms')
+            cls.PROFILER_INTERVAL_MS = 10.0
+
         # Admin keys advertencia
         if cls.ADMIN_API_KEY_REQUIRED and not cls.ADMIN_API_KEYS:
             warnings.append('ADMIN_API_KEY_REQUIRED is True but ADMIN_API_KEYS is empty; admin endpoints will be inaccessible')
@@ -181,12 +280,36 @@ class Config:
             'EMBEDDING_MODEL': cls.EMBEDDING_MODEL,
             'CACHE_BACKEND': cls.CACHE_BACKEND,
             'CACHE_TTL': cls.CACHE_TTL,
+            'CACHE_MAX_ENTRIES': cls.CACHE_MAX_ENTRIES,
+            'CACHE_MAX_BYTES': cls.CACHE_MAX_BYTES,
+            'CACHE_EVICTION_POLICY': cls.CACHE_EVICTION_POLICY,
+            'SEMANTIC_CACHE': {
+                'enabled': cls.SEMANTIC_CACHE_ENABLED,
+                'threshold': cls.SEMANTIC_CACHE_THRESHOLD,
+                'max_entries': cls.SEMANTIC_CACHE_MAX_ENTRIES
+            },
+            'FAQ_SEMANTIC': {
+                'enabled': cls.FAQ_SEMANTIC_ENABLED,
+                'threshold': cls.FAQ_SEMANTIC_THRESHOLD
+            },
             'RATE_LIMIT_DEFAULTS': cls.RATE_LIMIT_DEFAULTS,
+            'RATE_LIMIT_BACKEND': cls.RATE_LIMIT_BACKEND,
+            'RATE_LIMIT_ALGORITHM': cls.RATE_LIMIT_ALGORITHM,
             'MONITORING': {
                 'enabled': cls.MONITORING_ENABLED,
                 'backend': cls.MONITORING_BACKEND,
                 'endpoints': cls.MONITORING_ENDPOINTS
             },
+            'TRACING': {
+                'enabled': cls.TRACING_ENABLED,
+                'buffer_size': cls.TRACE_BUFFER_SIZE,
+                'slowest_size': cls.TRACE_SLOWEST_SIZE,
+                'export_path': cls.TRACE_EXPORT_PATH or None
+            },
+            'PROFILER': {
+                'interval_ms': cls.PROFILER_INTERVAL_MS,
+                'max_seconds': cls.PROFILER_MAX_SECONDS
+            },
             'DOCKER': {
                 'image': cls.DOCKER_IMAGE,
                 'cpu_limit': cls.DOCKER_CPU_LIMIT,
@@ -194,5 +317,6 @@ class Config:
             },
             'DEBUG': cls.DEBUG,
             'ADMIN_KEYS_CONFIGURED': bool(cls.ADMIN_API_KEYS),
+            'RATE_LIMIT_API_KEYS_CONFIGURED': bool(cls.RATE_LIMIT_API_KEYS),
             'ADMIN_API_KEY_REQUIRED': cls.ADMIN_API_KEY_REQUIRED
         }
\ No newline at end of file
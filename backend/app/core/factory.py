@@ -8,6 +8,7 @@ from ..providers import (
     InMemoryCacheProvider,
     FileSystemDocumentProcessor
 )
+from ..providers.embedding_cache import CachedEmbeddingProvider
 
 # Importar ChromaDB provider
 try:
@@ -42,7 +43,7 @@ class ProviderFactory:
         """Crea proveedor de embeddings"""
         try:
             if provider_type.lower() == "gemini":
-                return GeminiEmbeddingProvider()
+                return ProviderFactory._with_embedding_cache(GeminiEmbeddingProvider())
             else:
                 logger.error(f"Proveedor embedding no soportado: {provider_type}")
                 return None
@@ -50,6 +51,17 @@ class ProviderFactory:
             logger.error(f"Error creando embedding provider: {e}")
             return None
     
+    @staticmethod
+    def _with_embedding_cache(provider: IEmbeddingProvider) -> IEmbeddingProvider:
+        """Envuelve el proveedor con el cache persistente de embeddings si está habilitado"""
+        if not Config.EMBEDDING_CACHE_ENABLED:
+            return provider
+        try:
+            return CachedEmbeddingProvider(provider)
+        except Exception as e:
+            logger.warning(f"Cache de embeddings no disponible, usando proveedor directo: {e}")
+            return provider
+    
     @staticmethod
     def create_vector_store(store_type: str = "chromadb") -> Optional[IVectorStore]:  # ✅ Cambiar default a chromadb
         """Crea almacén vectorial"""
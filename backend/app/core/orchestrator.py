@@ -1,22 +1,45 @@
 import logging
 import hashlib
 import json
-from typing import Dict, Any, List, Optional
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple, AsyncIterator
 from ..interfaces import ILLMProvider, IEmbeddingProvider, IVectorStore, IDocumentProcessor, ICacheProvider
 from .factory import ProviderFactory
 from ..config.settings import Config
+from ..providers.semantic_cache import SemanticResponseCache
 
 # Importar componentes del diagrama híbrido
-from ..utils.rate_limiter import check_rate_limit, get_client_identifier
+from ..utils.rate_limiter import check_rate_limit, get_client_identifier, run_rate_limit_check
 from ..utils.sanitizer import process_user_input
-from ..utils.faq_checker import classify_user_message
+from ..utils.faq_checker import classify_user_message, faq_classifier, SemanticFAQIndex
 from ..utils.section_templates import validate_message_section
 from ..services.emergency_mode import emergency_mode, handle_emergency, check_emergency_activation
-from ..services.safety_checker import check_input_safety, check_output_safety
+from ..services.safety_checker import check_input_safety, check_output_safety, check_stream_safety
 from ..services.i18n_service import translate_response, detect_user_language
 
+# Instrumentación Prometheus (import seguro)
+try:
+    from ..monitoring.prometheus_exporter import inc_cache_hit, inc_request, inc_error, observe_response_time, observe_flow
+except Exception:
+    inc_cache_hit = None
+    inc_request = None
+    inc_error = None
+    observe_response_time = None
+    observe_flow = None
+
+from ..monitoring.metrics_sampler import get_metrics_sampler
+from ..monitoring.tracing import start_span, trace_span
+
+# Pasos del flujo que cuentan como acierto de cache para el sampler
+CACHE_HIT_PATHS = ('cache_hit', 'semantic_cache_hit')
+
 logger = logging.getLogger(__name__)
 
+# Caracteres ya emitidos que se re-evalúan junto a cada fragmento nuevo del stream,
+# para detectar patrones partidos entre dos fragmentos
+STREAM_SAFETY_OVERLAP = 128
+
 class HybridRAGOrchestrator:
     """
     Orquestador RAG Híbrido según diagrama de flujo completo
@@ -37,12 +60,29 @@ class HybridRAGOrchestrator:
         self.document_processor: IDocumentProcessor = self.providers['document_processor']
         self.cache_provider: ICacheProvider = self.providers['cache']
         
+        # Cache semántico: reutiliza respuestas de consultas parafraseadas
+        self.semantic_cache: Optional[SemanticResponseCache] = (
+            SemanticResponseCache() if Config.SEMANTIC_CACHE_ENABLED else None
+        )
+        
+        # Tier semántico de FAQs: se indexa tras cargar los proveedores
+        self.semantic_faq: Optional[SemanticFAQIndex] = (
+            SemanticFAQIndex(faq_classifier) if Config.FAQ_SEMANTIC_ENABLED else None
+        )
+        
+        # cache_key -> archivos usados como contexto, para invalidación selectiva
+        self._response_sources: OrderedDict = OrderedDict()
+        
+        # Hay un manifest de referencia para sincronizaciones incrementales
+        self._manifest_ready = False
+        
         # Estado de inicialización
         self.is_initialized = False
         self.initialization_error = None
         
         # Inicializar documentos
         self._initialize_documents()
+        self._build_semantic_faq_index()
         
         logger.info("HybridRAGOrchestrator inicializado con flujo completo")
     
@@ -59,311 +99,764 @@ class HybridRAGOrchestrator:
         Returns:
             Dict con respuesta procesada según flujo híbrido
         """
-        flow_metadata = {
-            'steps_completed': [],
-            'processing_time': {},
-            'flow_path': []
-        }
+        flow_metadata = self._new_flow_metadata()
+        start_time = time.time()
+        flow_span = start_span('hybrid_request', flow='sync')
         
         try:
-            import time
-            start_time = time.time()
             
-            # PASO 1: RATE LIMITING
-            step_start = time.time()
-            rate_result = check_rate_limit(client_identifier, "chat")
-            flow_metadata['steps_completed'].append('rate_limiting')
-            flow_metadata['processing_time']['rate_limiting'] = time.time() - step_start
+            # PASOS 1-8: etapas previas a la generación (CPU, sin I/O externo)
+            early_response, state = self._run_pre_generation_stages(
+                message, client_identifier, user_context, target_language, flow_metadata
+            )
+            if early_response is not None:
+                return early_response
             
-            if not rate_result.get('allowed', False):
-                flow_metadata['flow_path'].append('rate_limit_exceeded')
-                return self._create_response(
-                    success=False,
-                    response=self._get_localized_message('rate_limit_exceeded', target_language),
-                    error="Rate limit exceeded",
-                    metadata=flow_metadata,
-                    retry_after=rate_result.get('retry_after', 60)
-                )
+            # PASO 9a: EMBEDDING DE LA CONSULTA + FAQ SEMÁNTICA + CACHE SEMÁNTICO
+            query_embedding = self._embed_query(state['processed_message'], flow_metadata)
+            semantic_response = self._run_embedding_stages(query_embedding, state, flow_metadata)
+            if semantic_response is not None:
+                return semantic_response
             
-            # PASO 2: VALIDACIÓN DE ENTRADA
+            # PASO 9b: BÚSQUEDA RAG + GENERACIÓN LLM (reutiliza el embedding)
             step_start = time.time()
-            input_validation = process_user_input(message, user_context)
-            flow_metadata['steps_completed'].append('input_validation')
-            flow_metadata['processing_time']['input_validation'] = time.time() - step_start
+            rag_response = self._generate_rag_response(state['processed_message'], user_context, query_embedding=query_embedding)
+            flow_metadata['processing_time']['rag_generation'] = time.time() - step_start
             
-            if not input_validation.get('is_valid', False):
-                flow_metadata['flow_path'].append('input_validation_failed')
-                return self._create_response(
-                    success=False,
-                    response=self._get_localized_message('input_too_long', target_language),
-                    error="Input validation failed",
-                    metadata=flow_metadata,
-                    validation_issues=input_validation.get('warnings', [])
-                )
+            # PASOS 10-13: safety de salida, estructura, i18n y cache
+            return self._run_post_generation_stages(rag_response, state, target_language, flow_metadata, start_time)
+            
+        except Exception as e:
+            return self._critical_error_response(e, target_language, flow_metadata)
+        finally:
+            self._record_flow(flow_metadata, start_time, flow_span)
+    
+    async def aprocess_hybrid_request(self, message: str, client_identifier: str, user_context: Optional[str] = None, target_language: str = "es") -> Dict[str, Any]:
+        """
+        Versión asíncrona de process_hybrid_request
+        
+        Las etapas CPU (sanitizer, safety, FAQ, i18n) se ejecutan inline; las etapas
+        de I/O (embedding, vector store, LLM) se esperan con await para no bloquear
+        el event loop de uvicorn.
+        
+        Args:
+            message: Mensaje del usuario
+            client_identifier: Identificador del cliente (IP, user ID)
+            user_context: Contexto adicional opcional
+            target_language: Idioma objetivo para respuesta
+        
+        Returns:
+            Dict con respuesta procesada según flujo híbrido
+        """
+        flow_metadata = self._new_flow_metadata()
+        start_time = time.time()
+        flow_span = start_span('hybrid_request', flow='async')
+        
+        try:
             
-            # Usar mensaje procesado
-            processed_message = input_validation['processed_message']
-            flow_metadata['input_transformations'] = input_validation.get('transformations', [])
+            rate_result = await self._acheck_rate_limit(client_identifier, "chat", flow_metadata)
+            early_response, state = self._run_pre_generation_stages(
+                message, client_identifier, user_context, target_language, flow_metadata,
+                rate_result=rate_result
+            )
+            if early_response is not None:
+                return early_response
+            
+            query_embedding = await self._aembed_query(state['processed_message'], flow_metadata)
+            semantic_response = self._run_embedding_stages(query_embedding, state, flow_metadata)
+            if semantic_response is not None:
+                return semantic_response
             
-            # PASO 3: VERIFICACIÓN DE SEGURIDAD DE ENTRADA
             step_start = time.time()
-            input_safety = check_input_safety(processed_message)
-            flow_metadata['steps_completed'].append('input_safety')
-            flow_metadata['processing_time']['input_safety'] = time.time() - step_start
+            rag_response = await self._agenerate_rag_response(state['processed_message'], user_context, query_embedding=query_embedding)
+            flow_metadata['processing_time']['rag_generation'] = time.time() - step_start
             
-            if not input_safety.get('is_safe', True):
-                flow_metadata['flow_path'].append('input_unsafe')
-                return self._create_response(
-                    success=False,
-                    response=self._get_localized_message('inappropriate_content', target_language),
-                    error="Unsafe input detected",
-                    metadata=flow_metadata,
-                    safety_issues=input_safety.get('issues', [])
-                )
+            return self._run_post_generation_stages(rag_response, state, target_language, flow_metadata, start_time)
             
-            # PASO 4: CACHE LOOKUP
+        except Exception as e:
+            return self._critical_error_response(e, target_language, flow_metadata)
+        finally:
+            self._record_flow(flow_metadata, start_time, flow_span)
+    
+    async def astream_hybrid_request(self, message: str, client_identifier: str, user_context: Optional[str] = None, target_language: str = "es") -> AsyncIterator[Dict[str, Any]]:
+        """
+        Versión en streaming del flujo híbrido
+        
+        Emite eventos {'event': ..., 'data': ...}:
+            - 'token': fragmento de texto generado por el LLM
+            - 'done': respuesta final estructurada (igual que aprocess_hybrid_request)
+            - 'error': flujo interrumpido (safety, error del LLM); data es la respuesta template
+        
+        Las respuestas tempranas (cache, FAQ, rate limit...) se emiten como un único
+        evento final. La respuesta generada se cachea solo cuando el stream termina.
+        """
+        flow_metadata = self._new_flow_metadata()
+        start_time = time.time()
+        flow_span = start_span('hybrid_request', flow='stream')
+        
+        try:
+            
+            rate_result = await self._acheck_rate_limit(client_identifier, "chat_stream", flow_metadata)
+            early_response, state = self._run_pre_generation_stages(
+                message, client_identifier, user_context, target_language, flow_metadata,
+                request_type="chat_stream", rate_result=rate_result
+            )
+            if early_response is not None:
+                yield {
+                    'event': 'done' if early_response.get('success', False) else 'error',
+                    'data': early_response
+                }
+                return
+            
+            processed_message = state['processed_message']
+            query_embedding = await self._aembed_query(processed_message, flow_metadata)
+            semantic_response = self._run_embedding_stages(query_embedding, state, flow_metadata)
+            if semantic_response is not None:
+                yield {'event': 'done', 'data': semantic_response}
+                return
+            
+            flow_metadata['flow_path'].append('streaming')
             step_start = time.time()
+            
+            try:
+                relevant_context = await self._asearch_relevant_context(processed_message, query_embedding=query_embedding)
+                with trace_span('build_prompt', chunks=len(relevant_context)) as span:
+                    enhanced_prompt = self._build_enhanced_prompt(processed_message, relevant_context, user_context)
+                    span.set_attribute('prompt_length', len(enhanced_prompt))
+                
+                chunks = []
+                emitted_tail = ""
+                # El span queda abierto entre yields: se cierra al terminar o cortar el stream
+                llm_span = start_span('llm_stream', prompt_length=len(enhanced_prompt))
+                try:
+                    async for chunk in self.llm_provider.astream_response(enhanced_prompt):
+                        if not chunk:
+                            continue
+                        
+                        # Safety incremental sobre el buffer deslizante antes de emitir
+                        stream_safety = check_stream_safety(emitted_tail + chunk)
+                        if not stream_safety.get('is_safe', True):
+                            flow_metadata['flow_path'].append('output_unsafe_stream')
+                            template_response = self._get_template_response("unsafe_output", target_language)
+                            template_response['metadata'] = flow_metadata
+                            template_response['safety_issues'] = stream_safety.get('issues', [])
+                            yield {'event': 'error', 'data': template_response}
+                            return
+                        
+                        chunks.append(chunk)
+                        emitted_tail = (emitted_tail + chunk)[-STREAM_SAFETY_OVERLAP:]
+                        yield {'event': 'token', 'data': chunk}
+                except Exception as e:
+                    llm_span.record_error(e)
+                    raise
+                finally:
+                    llm_span.set_attributes(chunks=len(chunks), response_length=sum(len(chunk) for chunk in chunks))
+                    llm_span.end()
+                
+                rag_response = {
+                    'success': True,
+                    'response': "".join(chunks),
+                    'sources_used': len(relevant_context),
+                    'source_paths': self._context_sources(relevant_context),
+                    'context_found': bool(relevant_context),
+                    'model_info': self.llm_provider.get_model_info()
+                }
+            except Exception as e:
+                logger.error(f"Error en generación RAG (stream): {e}")
+                rag_response = {
+                    'success': False,
+                    'error': str(e)
+                }
+            
+            flow_metadata['processing_time']['rag_generation'] = time.time() - step_start
+            
+            final_response = self._run_post_generation_stages(rag_response, state, target_language, flow_metadata, start_time)
+            yield {
+                'event': 'done' if final_response.get('success', False) else 'error',
+                'data': final_response
+            }
+            
+        except Exception as e:
+            yield {'event': 'error', 'data': self._critical_error_response(e, target_language, flow_metadata)}
+        finally:
+            self._record_flow(flow_metadata, start_time, flow_span)
+    
+    def _new_flow_metadata(self) -> Dict[str, Any]:
+        """Crea el contenedor de metadata del flujo"""
+        return {
+            'steps_completed': [],
+            'processing_time': {},
+            'flow_path': []
+        }
+    
+    def _record_flow(self, flow_metadata: Dict[str, Any], start_time: float, flow_span=None) -> None:
+        """
+        Envía tiempos por etapa y camino del flujo a los histogramas Prometheus,
+        el tiempo total al sampler de métricas en proceso y cierra el span del flujo
+        """
+        total_seconds = time.time() - start_time
+        try:
+            flow_path = flow_metadata['flow_path']
+            cache_hit = any(path in CACHE_HIT_PATHS for path in flow_path)
+            if flow_span is not None:
+                flow_span.set_attributes(flow_path=list(flow_path), cache_hit=cache_hit)
+                flow_span.end()
+            get_metrics_sampler().record_request(total_seconds, cache_hit=cache_hit)
+            if observe_flow:
+                observe_flow(flow_metadata['processing_time'], flow_path, total_seconds)
+        except Exception as e:
+            logger.debug(f"No se pudieron registrar métricas del flujo: {e}")
+    
+    def _critical_error_response(self, error: Exception, target_language: str, flow_metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """Respuesta ante un error no controlado del flujo"""
+        logger.error(f"Error en flujo híbrido: {error}")
+        flow_metadata['flow_path'].append('critical_error')
+        return self._create_response(
+            success=False,
+            response=self._get_localized_message('system_error', target_language),
+            error=str(error),
+            metadata=flow_metadata
+        )
+    
+    def _check_rate_limit(self, client_identifier: str, request_type: str,
+                          flow_metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """PASO 1: consulta el rate limiter (bloqueante si el almacén es SQLite o Redis)"""
+        step_start = time.time()
+        with trace_span('rate_limiting', request_type=request_type) as span:
+            rate_result = check_rate_limit(client_identifier, request_type)
+            span.set_attribute('allowed', bool(rate_result.get('allowed', False)))
+        flow_metadata['processing_time']['rate_limiting'] = time.time() - step_start
+        return rate_result
+    
+    async def _acheck_rate_limit(self, client_identifier: str, request_type: str,
+                                 flow_metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """Versión asíncrona de _check_rate_limit: el almacén se consulta fuera del event loop"""
+        step_start = time.time()
+        with trace_span('rate_limiting', request_type=request_type) as span:
+            rate_result = await run_rate_limit_check(check_rate_limit, client_identifier, request_type)
+            span.set_attribute('allowed', bool(rate_result.get('allowed', False)))
+        flow_metadata['processing_time']['rate_limiting'] = time.time() - step_start
+        return rate_result
+    
+    def _run_pre_generation_stages(self, message: str, client_identifier: str, user_context: Optional[str],
+                                   target_language: str, flow_metadata: Dict[str, Any],
+                                   request_type: str = "chat",
+                                   rate_result: Optional[Dict[str, Any]] = None) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Ejecuta los pasos 1-8 del flujo (rate limiting hasta FAQ)
+        
+        request_type define la categoría y el costo del rate limiting (un stream
+        consume más presupuesto de chat que una respuesta completa). Los flujos
+        async pasan rate_result ya resuelto con _acheck_rate_limit.
+        
+        Returns:
+            Tupla (respuesta_temprana, estado). Si respuesta_temprana no es None el
+            flujo termina ahí; si no, estado contiene lo necesario para la generación.
+        """
+        # PASO 1: RATE LIMITING
+        if rate_result is None:
+            rate_result = self._check_rate_limit(client_identifier, request_type, flow_metadata)
+        flow_metadata['steps_completed'].append('rate_limiting')
+        
+        if not rate_result.get('allowed', False):
+            flow_metadata['flow_path'].append('rate_limit_exceeded')
+            return self._create_response(
+                success=False,
+                response=self._get_localized_message('rate_limit_exceeded', target_language),
+                error="Rate limit exceeded",
+                metadata=flow_metadata,
+                retry_after=rate_result.get('retry_after', 60)
+            ), {}
+        
+        # PASO 2: VALIDACIÓN DE ENTRADA
+        step_start = time.time()
+        with trace_span('input_validation', message_length=len(message or '')):
+            input_validation = process_user_input(message, user_context)
+        flow_metadata['steps_completed'].append('input_validation')
+        flow_metadata['processing_time']['input_validation'] = time.time() - step_start
+        
+        if not input_validation.get('is_valid', False):
+            flow_metadata['flow_path'].append('input_validation_failed')
+            return self._create_response(
+                success=False,
+                response=self._get_localized_message('input_too_long', target_language),
+                error="Input validation failed",
+                metadata=flow_metadata,
+                validation_issues=input_validation.get('warnings', [])
+            ), {}
+        
+        # Usar mensaje procesado
+        processed_message = input_validation['processed_message']
+        flow_metadata['input_transformations'] = input_validation.get('transformations', [])
+        
+        # PASO 3: VERIFICACIÓN DE SEGURIDAD DE ENTRADA
+        step_start = time.time()
+        with trace_span('input_safety') as span:
+            input_safety = check_input_safety(processed_message)
+            span.set_attribute('is_safe', bool(input_safety.get('is_safe', True)))
+        flow_metadata['steps_completed'].append('input_safety')
+        flow_metadata['processing_time']['input_safety'] = time.time() - step_start
+        
+        if not input_safety.get('is_safe', True):
+            flow_metadata['flow_path'].append('input_unsafe')
+            return self._create_response(
+                success=False,
+                response=self._get_localized_message('inappropriate_content', target_language),
+                error="Unsafe input detected",
+                metadata=flow_metadata,
+                safety_issues=input_safety.get('issues', [])
+            ), {}
+        
+        # PASO 4: CACHE LOOKUP
+        step_start = time.time()
+        with trace_span('cache_lookup') as span:
             cache_key = self._generate_cache_key(processed_message, user_context, target_language)
             cached_response = None
 
             if self.cache_provider:
                 cached_response = self.cache_provider.get(cache_key)
+            span.set_attribute('cache_hit', bool(cached_response))
 
-            flow_metadata['steps_completed'].append('cache_lookup')
-            flow_metadata['processing_time']['cache_lookup'] = time.time() - step_start
+        flow_metadata['steps_completed'].append('cache_lookup')
+        flow_metadata['processing_time']['cache_lookup'] = time.time() - step_start
 
-            # Intentar instrumentación Prometheus (import seguro)
+        if cached_response:
+            flow_metadata['flow_path'].append('cache_hit')
+            cached_response['from_cache'] = True
+            cached_response['metadata'].update(flow_metadata)
+            # Instrumentar cache hit
             try:
-                from ..monitoring.prometheus_exporter import inc_cache_hit, inc_request, inc_error, observe_response_time
+                if inc_cache_hit:
+                    inc_cache_hit(endpoint='cache_lookup')
             except Exception:
-                inc_cache_hit = None
-                inc_request = None
-                inc_error = None
-                observe_response_time = None
-
-            if cached_response:
-                flow_metadata['flow_path'].append('cache_hit')
-                cached_response['from_cache'] = True
-                cached_response['metadata'].update(flow_metadata)
-                # Instrumentar cache hit
-                try:
-                    if inc_cache_hit:
-                        inc_cache_hit(endpoint='cache_lookup')
-                except Exception:
-                    pass
-                return cached_response
+                pass
+            return cached_response, {}
 
-            flow_metadata['flow_path'].append('cache_miss')
-            
-            # PASO 5: HEALTH CHECK DE SERVICIOS
+        flow_metadata['flow_path'].append('cache_miss')
+        
+        # PASO 5: HEALTH CHECK DE SERVICIOS
+        step_start = time.time()
+        services_health = self._check_services_health()
+        flow_metadata['steps_completed'].append('health_check')
+        flow_metadata['processing_time']['health_check'] = time.time() - step_start
+        flow_metadata['services_status'] = services_health
+        
+        # PASO 6: VERIFICAR SI ACTIVAR MODO DE EMERGENCIA
+        emergency_activated = check_emergency_activation(
+            services_health['llm_available'],
+            services_health['vector_store_available'],
+            services_health['embedding_available']
+        )
+        
+        if not emergency_activated and emergency_mode.is_active:
+            flow_metadata['flow_path'].append('emergency_mode')
             step_start = time.time()
-            services_health = self._check_services_health()
-            flow_metadata['steps_completed'].append('health_check')
-            flow_metadata['processing_time']['health_check'] = time.time() - step_start
-            flow_metadata['services_status'] = services_health
-            
-            # PASO 6: VERIFICAR SI ACTIVAR MODO DE EMERGENCIA
-            emergency_activated = check_emergency_activation(
-                services_health['llm_available'],
-                services_health['vector_store_available'],
-                services_health['embedding_available']
-            )
+            emergency_response = handle_emergency(processed_message)
+            flow_metadata['processing_time']['emergency_mode'] = time.time() - step_start
             
-            if not emergency_activated and emergency_mode.is_active:
-                flow_metadata['flow_path'].append('emergency_mode')
-                step_start = time.time()
-                emergency_response = handle_emergency(processed_message)
-                flow_metadata['processing_time']['emergency_mode'] = time.time() - step_start
-                
-                # Traducir respuesta de emergencia
-                translated_response = translate_response(emergency_response, target_language)
-                translated_response['metadata'] = flow_metadata
-                return translated_response
-            
-            # PASO 7: VALIDACIÓN DE SECCIÓN
-            step_start = time.time()
+            # Traducir respuesta de emergencia
+            translated_response = translate_response(emergency_response, target_language)
+            translated_response['metadata'] = flow_metadata
+            return translated_response, {}
+        
+        # PASO 7: VALIDACIÓN DE SECCIÓN
+        step_start = time.time()
+        with trace_span('section_validation'):
             section_validation = validate_message_section(processed_message)
-            flow_metadata['steps_completed'].append('section_validation')
-            flow_metadata['processing_time']['section_validation'] = time.time() - step_start
-            flow_metadata['detected_section'] = section_validation.get('detected_section', 'general')
-            
-            if not section_validation.get('is_valid', True):
-                enforcement_action = section_validation.get('enforcement_action', 'proceed')
-                
-                if enforcement_action == 'guide':
-                    flow_metadata['flow_path'].append('section_guidance')
-                    return self._create_response(
-                        success=True,
-                        response=section_validation.get('guidance', ''),
-                        guidance=True,
-                        metadata=flow_metadata,
-                        question_templates=section_validation.get('question_templates', [])
-                    )
-                elif enforcement_action == 'clarify':
-                    flow_metadata['flow_path'].append('section_clarification')
-                    return self._create_response(
-                        success=True,
-                        response=section_validation.get('guidance', ''),
-                        clarification_needed=True,
-                        metadata=flow_metadata,
-                        conflicting_sections=section_validation.get('conflicting_sections', [])
-                    )
-            
-            # PASO 8: CLASIFICACIÓN FAQ
-            step_start = time.time()
-            faq_classification = classify_user_message(processed_message)
-            flow_metadata['steps_completed'].append('faq_classification')
-            flow_metadata['processing_time']['faq_classification'] = time.time() - step_start
+        flow_metadata['steps_completed'].append('section_validation')
+        flow_metadata['processing_time']['section_validation'] = time.time() - step_start
+        flow_metadata['detected_section'] = section_validation.get('detected_section', 'general')
+        
+        if not section_validation.get('is_valid', True):
+            enforcement_action = section_validation.get('enforcement_action', 'proceed')
             
-            if faq_classification.get('is_faq', False) and faq_classification.get('confidence', 0) > 0.7:
-                flow_metadata['flow_path'].append('faq_response')
-                faq_response = self._create_response(
+            if enforcement_action == 'guide':
+                flow_metadata['flow_path'].append('section_guidance')
+                return self._create_response(
                     success=True,
-                    response=faq_classification['response'],
-                    source='faq',
-                    confidence=faq_classification['confidence'],
-                    category=faq_classification.get('category', 'general'),
-                    metadata=flow_metadata
-                )
-                
-                # Cache y traducir respuesta FAQ
-                translated_response = translate_response(faq_response, target_language)
-                self._cache_response(cache_key, translated_response)
-                return translated_response
-            
-            # PASO 9: BÚSQUEDA RAG + GENERACIÓN LLM
-            flow_metadata['flow_path'].append('rag_generation')
-            
-            # Verificar disponibilidad de Gemini Free Tier
-            if not services_health['llm_available']:
-                flow_metadata['flow_path'].append('llm_unavailable_template')
-                template_response = self._get_template_response("llm_unavailable", target_language)
-                template_response['metadata'] = flow_metadata
-                return template_response
-            
-            # Generar respuesta usando RAG
-            step_start = time.time()
-            rag_response = self._generate_rag_response(processed_message, user_context)
-            flow_metadata['processing_time']['rag_generation'] = time.time() - step_start
+                    response=section_validation.get('guidance', ''),
+                    guidance=True,
+                    metadata=flow_metadata,
+                    question_templates=section_validation.get('question_templates', [])
+                ), {}
+            elif enforcement_action == 'clarify':
+                flow_metadata['flow_path'].append('section_clarification')
+                return self._create_response(
+                    success=True,
+                    response=section_validation.get('guidance', ''),
+                    clarification_needed=True,
+                    metadata=flow_metadata,
+                    conflicting_sections=section_validation.get('conflicting_sections', [])
+                ), {}
+        
+        # PASO 8: CLASIFICACIÓN FAQ
+        step_start = time.time()
+        with trace_span('faq_classification') as span:
+            faq_classification = classify_user_message(processed_message)
+            span.set_attributes(is_faq=bool(faq_classification.get('is_faq', False)),
+                                confidence=float(faq_classification.get('confidence', 0) or 0))
+        flow_metadata['steps_completed'].append('faq_classification')
+        flow_metadata['processing_time']['faq_classification'] = time.time() - step_start
+        
+        if faq_classification.get('is_faq', False) and faq_classification.get('confidence', 0) > 0.7:
+            return self._faq_response(faq_classification, cache_key, target_language, flow_metadata), {}
+        
+        # PASO 9 (preparación): la generación RAG la ejecuta el llamador
+        flow_metadata['flow_path'].append('rag_generation')
+        
+        # Verificar disponibilidad de Gemini Free Tier
+        if not services_health['llm_available']:
+            flow_metadata['flow_path'].append('llm_unavailable_template')
+            template_response = self._get_template_response("llm_unavailable", target_language)
+            template_response['metadata'] = flow_metadata
+            return template_response, {}
+        
+        return None, {
+            'processed_message': processed_message,
+            'cache_key': cache_key,
+            'section_validation': section_validation,
+            'user_context': user_context,
+            'target_language': target_language
+        }
+    
+    def _faq_response(self, faq_classification: Dict[str, Any], cache_key: str, target_language: str,
+                      flow_metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """Respuesta FAQ (bypass RAG), traducida y cacheada"""
+        flow_metadata['flow_path'].append('faq_response')
+        faq_response = self._create_response(
+            success=True,
+            response=faq_classification['response'],
+            source='faq',
+            confidence=faq_classification['confidence'],
+            category=faq_classification.get('category', 'general'),
+            metadata=flow_metadata
+        )
+        
+        # Cache y traducir respuesta FAQ
+        translated_response = translate_response(faq_response, target_language)
+        self._cache_response(cache_key, translated_response)
+        return translated_response
+    
+    def _build_semantic_faq_index(self):
+        """Precalcula las embeddings de las FAQs para el tier semántico"""
+        if self.semantic_faq is None or not self.embedding_provider:
+            return
+        self.semantic_faq.build(self.embedding_provider)
+    
+    def _needs_query_embedding(self) -> bool:
+        """El embedding de la consulta solo se calcula si alguien lo va a usar"""
+        return bool(self.embedding_provider) and (
+            self.semantic_cache is not None
+            or self.is_initialized
+            or (self.semantic_faq is not None and self.semantic_faq.size > 0)
+        )
+    
+    def _embed_query(self, message: str, flow_metadata: Dict[str, Any]) -> List[float]:
+        """Calcula una única vez el embedding de la consulta"""
+        if not self._needs_query_embedding():
+            return []
+        step_start = time.time()
+        with trace_span('query_embedding') as span:
+            try:
+                query_embedding = self.embedding_provider.generate_embedding(message) or []
+            except Exception as e:
+                logger.error(f"Error generando embedding de la consulta: {e}")
+                span.record_error(e)
+                query_embedding = []
+            span.set_attribute('dimensions', len(query_embedding))
+        flow_metadata['processing_time']['query_embedding'] = time.time() - step_start
+        return query_embedding
+    
+    async def _aembed_query(self, message: str, flow_metadata: Dict[str, Any]) -> List[float]:
+        """Versión asíncrona de _embed_query"""
+        if not self._needs_query_embedding():
+            return []
+        step_start = time.time()
+        with trace_span('query_embedding') as span:
+            try:
+                query_embedding = await self.embedding_provider.agenerate_embedding(message) or []
+            except Exception as e:
+                logger.error(f"Error generando embedding de la consulta (async): {e}")
+                span.record_error(e)
+                query_embedding = []
+            span.set_attribute('dimensions', len(query_embedding))
+        flow_metadata['processing_time']['query_embedding'] = time.time() - step_start
+        return query_embedding
+    
+    def _run_embedding_stages(self, query_embedding: List[float], state: Dict[str, Any],
+                              flow_metadata: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Etapas que reutilizan el embedding de la consulta antes de ir al LLM"""
+        faq_response = self._run_semantic_faq_stage(query_embedding, state, flow_metadata)
+        if faq_response is not None:
+            return faq_response
+        return self._run_semantic_cache_stage(query_embedding, state, flow_metadata)
+    
+    def _run_semantic_faq_stage(self, query_embedding: List[float], state: Dict[str, Any],
+                                flow_metadata: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Tier semántico de FAQs: paráfrasis que el clasificador léxico no reconoció"""
+        if self.semantic_faq is None or not query_embedding:
+            return None
+        # FAQs agregadas después de construir el índice (add_faq): se re-embeben en
+        # segundo plano y mientras tanto se consulta la matriz anterior
+        if self.embedding_provider:
+            self.semantic_faq.refresh_in_background(self.embedding_provider)
+        if self.semantic_faq.size == 0:
+            return None
+        
+        step_start = time.time()
+        with trace_span('semantic_faq_lookup') as span:
+            match = self.semantic_faq.match(query_embedding)
+            span.set_attribute('hit', match is not None)
+        flow_metadata['steps_completed'].append('semantic_faq_lookup')
+        flow_metadata['processing_time']['semantic_faq_lookup'] = time.time() - step_start
+        
+        if match is None:
+            return None
+        
+        flow_metadata['flow_path'].append('semantic_faq_hit')
+        return self._faq_response(match, state['cache_key'], state['target_language'], flow_metadata)
+    
+    def _run_semantic_cache_stage(self, query_embedding: List[float], state: Dict[str, Any],
+                                  flow_metadata: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Consulta el cache semántico tras un miss del cache exacto
+        
+        Solo aplica a consultas sin contexto de usuario, ya que esas respuestas
+        no son intercambiables entre usuarios. Guarda el embedding en el estado
+        para poblar el cache después de la generación.
+        """
+        state['query_embedding'] = query_embedding
+        if self.semantic_cache is None or state.get('user_context') or not query_embedding:
+            return None
+        
+        step_start = time.time()
+        with trace_span('semantic_cache_lookup') as span:
+            hit = self.semantic_cache.lookup(query_embedding, state['target_language'])
+            span.set_attribute('cache_hit', hit is not None)
+        flow_metadata['steps_completed'].append('semantic_cache_lookup')
+        flow_metadata['processing_time']['semantic_cache_lookup'] = time.time() - step_start
+        
+        if hit is None:
+            flow_metadata['flow_path'].append('semantic_cache_miss')
+            return None
+        
+        flow_metadata['flow_path'].append('semantic_cache_hit')
+        cached_response = hit['response']
+        cached_response['from_cache'] = True
+        cached_response['semantic_similarity'] = hit['similarity']
+        cached_response.setdefault('metadata', {}).update(flow_metadata)
+        # Promover al cache exacto para que la misma consulta no vuelva a embeberse
+        self._cache_response(state['cache_key'], cached_response)
+        self._track_response_sources(state['cache_key'], hit.get('sources', frozenset()))
+        try:
+            if inc_cache_hit:
+                inc_cache_hit(endpoint='semantic_cache_lookup')
+        except Exception:
+            pass
+        return cached_response
+    
+    def _run_post_generation_stages(self, rag_response: Dict[str, Any], state: Dict[str, Any], target_language: str,
+                                    flow_metadata: Dict[str, Any], start_time: float) -> Dict[str, Any]:
+        """Ejecuta los pasos 10-13 del flujo sobre la respuesta generada"""
+        # Instrumentar latencia de generación RAG
+        try:
+            if observe_response_time and flow_metadata.get('processing_time', {}).get('rag_generation'):
+                observe_response_time(endpoint='rag_generation', seconds=flow_metadata['processing_time']['rag_generation'])
+        except Exception:
+            pass
 
-            # Instrumentar latencia de generación RAG
+        if not rag_response.get('success', False):
+            flow_metadata['flow_path'].append('rag_error_template')
+            # Instrumentar error
             try:
-                if observe_response_time and flow_metadata.get('processing_time', {}).get('rag_generation'):
-                    observe_response_time(endpoint='rag_generation', seconds=flow_metadata['processing_time']['rag_generation'])
+                if inc_error:
+                    inc_error(endpoint='rag_generation', err_type='generation_error')
             except Exception:
                 pass
-
-            if not rag_response.get('success', False):
-                flow_metadata['flow_path'].append('rag_error_template')
-                # Instrumentar error
-                try:
-                    if inc_error:
-                        inc_error(endpoint='rag_generation', err_type='generation_error')
-                except Exception:
-                    pass
-                template_response = self._get_template_response("generation_error", target_language)
-                template_response['metadata'] = flow_metadata
-                return template_response
-            
-            # PASO 10: SAFETY CHECK DE RESPUESTA
-            step_start = time.time()
-            safety_context = {
-                'user_message': processed_message,
-                'detected_section': section_validation.get('detected_section')
-            }
+            template_response = self._get_template_response("generation_error", target_language)
+            template_response['metadata'] = flow_metadata
+            return template_response
+        
+        # PASO 10: SAFETY CHECK DE RESPUESTA
+        step_start = time.time()
+        safety_context = {
+            'user_message': state['processed_message'],
+            'detected_section': state['section_validation'].get('detected_section')
+        }
+        with trace_span('output_safety', response_length=len(rag_response['response'] or '')) as span:
             output_safety = check_output_safety(rag_response['response'], safety_context)
-            flow_metadata['steps_completed'].append('output_safety')
-            flow_metadata['processing_time']['output_safety'] = time.time() - step_start
-            
-            if not output_safety.get('is_safe', True):
-                flow_metadata['flow_path'].append('output_unsafe_template')
-                template_response = self._get_template_response("unsafe_output", target_language)
-                template_response['metadata'] = flow_metadata
-                template_response['safety_issues'] = output_safety.get('issues', [])
-                return template_response
-            
-            # Usar respuesta segura
-            final_response_text = output_safety.get('safe_response', rag_response['response'])
-            
-            # PASO 11: ESTRUCTURAR RESPUESTA
-            structured_response = self._create_response(
-                success=True,
-                response=final_response_text,
-                source='rag',
-                sources_used=rag_response.get('sources_used', 0),
-                context_found=rag_response.get('context_found', False),
-                model_info=rag_response.get('model_info', {}),
-                metadata=flow_metadata,
-                safety_passed=True
-            )
-            
-            # PASO 12: INTERNACIONALIZACIÓN
-            step_start = time.time()
+            span.set_attribute('is_safe', bool(output_safety.get('is_safe', True)))
+        flow_metadata['steps_completed'].append('output_safety')
+        flow_metadata['processing_time']['output_safety'] = time.time() - step_start
+        
+        if not output_safety.get('is_safe', True):
+            flow_metadata['flow_path'].append('output_unsafe_template')
+            template_response = self._get_template_response("unsafe_output", target_language)
+            template_response['metadata'] = flow_metadata
+            template_response['safety_issues'] = output_safety.get('issues', [])
+            return template_response
+        
+        # Usar respuesta segura
+        final_response_text = output_safety.get('safe_response', rag_response['response'])
+        
+        # PASO 11: ESTRUCTURAR RESPUESTA
+        structured_response = self._create_response(
+            success=True,
+            response=final_response_text,
+            source='rag',
+            sources_used=rag_response.get('sources_used', 0),
+            context_found=rag_response.get('context_found', False),
+            model_info=rag_response.get('model_info', {}),
+            metadata=flow_metadata,
+            safety_passed=True
+        )
+        
+        # PASO 12: INTERNACIONALIZACIÓN
+        step_start = time.time()
+        with trace_span('i18n', target_language=target_language):
             translated_response = translate_response(structured_response, target_language)
-            flow_metadata['processing_time']['i18n'] = time.time() - step_start
-            flow_metadata['steps_completed'].append('i18n')
-            
-            # PASO 13: CACHE Y RETORNO
-            translated_response['metadata'] = flow_metadata
-            translated_response['total_processing_time'] = time.time() - start_time
-            self._cache_response(cache_key, translated_response)
-            # Instrumentar cache set (no inc_cache_hit, pero podría incrementarse en cache provider)
-            try:
-                if inc_request:
-                    inc_request(endpoint='chat', method='POST')
-            except Exception:
-                pass
+        flow_metadata['processing_time']['i18n'] = time.time() - step_start
+        flow_metadata['steps_completed'].append('i18n')
+        
+        # PASO 13: CACHE Y RETORNO
+        translated_response['metadata'] = flow_metadata
+        translated_response['total_processing_time'] = time.time() - start_time
+        sources = frozenset(rag_response.get('source_paths', []))
+        self._cache_response(state['cache_key'], translated_response)
+        self._track_response_sources(state['cache_key'], sources)
+        if self.semantic_cache is not None and not state.get('user_context') and state.get('query_embedding'):
+            self.semantic_cache.store(state['query_embedding'], target_language,
+                                      self._cacheable_copy(translated_response), sources=sources)
+        # Instrumentar cache set (no inc_cache_hit, pero podría incrementarse en cache provider)
+        try:
+            if inc_request:
+                inc_request(endpoint='chat', method='POST')
+        except Exception:
+            pass
 
-            return translated_response
-            
-        except Exception as e:
-            logger.error(f"Error en flujo híbrido: {e}")
-            flow_metadata['flow_path'].append('critical_error')
-            return self._create_response(
-                success=False,
-                response=self._get_localized_message('system_error', target_language),
-                error=str(e),
-                metadata=flow_metadata
-            )
+        return translated_response
     
     def _initialize_documents(self):
-        """Inicializa documentos en el sistema (heredado del orquestador original)"""
+        """
+        Inicializa documentos en el sistema
+        
+        Ingesta en streaming: archivos -> chunks -> lotes de embeddings -> lotes
+        al vector store. Solo hay en memoria un lote (más los archivos en vuelo
+        del procesador), así que el pico no depende del tamaño del corpus.
+        """
         try:
             if not self.document_processor or not self.embedding_provider or not self.vector_store:
                 self.initialization_error = "Proveedores críticos no disponibles"
                 return
             
-            documents = self.document_processor.load_documents()
-            if not documents:
-                logger.warning("No se encontraron documentos para cargar")
-                self.is_initialized = True
+            if self._sync_persisted_documents():
                 return
             
-            embeddings = []
-            for doc in documents:
-                embedding = self.embedding_provider.generate_embedding(doc['content'])
-                if embedding:
-                    embeddings.append(embedding)
-                else:
-                    logger.warning(f"No se pudo generar embedding para: {doc.get('metadata', {}).get('filename', 'unknown')}")
+            total_chunks = 0
+            indexed_chunks = 0
+            for file_group in self._iter_file_groups(self._iter_source_documents()):
+                documents = [doc for _, file_documents in file_group for doc in file_documents]
+                total_chunks += len(documents)
+                valid_documents, valid_embeddings = self._embed_documents(documents)
+                
+                if valid_documents:
+                    if not self.vector_store.add_documents(valid_documents, valid_embeddings):
+                        self.initialization_error = "Error agregando documentos al vector store"
+                        return
+                    indexed_chunks += len(valid_documents)
             
-            valid_documents = [doc for doc, emb in zip(documents, embeddings) if emb]
-            valid_embeddings = [emb for emb in embeddings if emb]
+            if not total_chunks:
+                logger.warning("No se encontraron documentos para cargar")
+                self.is_initialized = True
+                return
             
-            if valid_documents:
-                success = self.vector_store.add_documents(valid_documents, valid_embeddings)
-                if success:
-                    logger.info(f"Inicializados {len(valid_documents)} documentos en RAG")
-                    self.is_initialized = True
-                else:
-                    self.initialization_error = "Error agregando documentos al vector store"
-            else:
+            if not indexed_chunks:
                 self.initialization_error = "No se pudieron procesar embeddings"
+                return
+            
+            logger.info(f"Inicializados {indexed_chunks} documentos en RAG")
+            self.is_initialized = True
+            # Línea base para las sincronizaciones incrementales posteriores
+            if hasattr(self.document_processor, 'snapshot_manifest'):
+                self._manifest_ready = self.document_processor.save_manifest(
+                    self.document_processor.snapshot_manifest()) is True
                 
         except Exception as e:
             logger.error(f"Error inicializando documentos: {e}")
             self.initialization_error = str(e)
     
+    def _sync_persisted_documents(self) -> bool:
+        """
+        Arranque sobre un vector store persistente ya poblado
+        
+        Si hay un manifest guardado, se aplican solo las diferencias con él
+        (archivos nuevos, modificados o eliminados mientras el servicio estaba
+        caído) en vez de re-ingestar todo encima de los chunks previos, que
+        dejaría en el store el texto de archivos borrados o acortados.
+        
+        Returns:
+            True si el store quedó sincronizado; False para hacer la carga completa
+        """
+        if not hasattr(self.document_processor, 'scan_changes'):
+            return False
+        manifest = self.document_processor.load_manifest()
+        if not isinstance(manifest, dict) or not manifest:
+            return False
+        stored = self.vector_store.get_stats().get('total_documents')
+        if not isinstance(stored, int) or stored <= 0:
+            return False
+        
+        try:
+            result = self.sync_documents()
+        except NotImplementedError:
+            return False
+        except Exception as e:
+            logger.warning(f"Sincronización al arrancar fallida ({e}); se realiza la carga completa")
+            return False
+        
+        logger.info(f"Vector store persistente sincronizado al arrancar: {result['changed_files']} actualizados, "
+                    f"{result['removed_files']} eliminados, {result['unchanged_files']} sin cambios")
+        self.is_initialized = True
+        self._manifest_ready = True
+        return True
+    
+    def _iter_source_documents(self, paths: Optional[List[str]] = None):
+        """Chunks por archivo: en streaming si el procesador lo soporta"""
+        if hasattr(self.document_processor, 'iter_documents'):
+            return self.document_processor.iter_documents(paths)
+        return [(None, self.document_processor.load_documents())]
+    
+    def _iter_file_groups(self, file_documents):
+        """Agrupa archivos consecutivos hasta reunir Config.INGEST_BATCH_SIZE chunks"""
+        batch_size = max(1, Config.INGEST_BATCH_SIZE)
+        group = []
+        group_chunks = 0
+        for path, documents in file_documents:
+            group.append((path, documents))
+            group_chunks += len(documents)
+            if group_chunks >= batch_size:
+                yield group
+                group = []
+                group_chunks = 0
+        if group:
+            yield group
+    
+    def _embed_documents(self, documents: List[Dict]) -> Tuple[List[Dict], List[List[float]]]:
+        """Embebe un lote y descarta los chunks sin embedding"""
+        if not documents:
+            return [], []
+        embeddings = self.embedding_provider.generate_embeddings_batch([doc['content'] for doc in documents])
+        
+        valid_documents = []
+        valid_embeddings = []
+        for doc, embedding in zip(documents, embeddings):
+            if embedding:
+                valid_documents.append(doc)
+                valid_embeddings.append(embedding)
+            else:
+                logger.warning(f"No se pudo generar embedding para: {doc.get('metadata', {}).get('filename', 'unknown')}")
+        return valid_documents, valid_embeddings
+    
     def _check_services_health(self) -> Dict[str, bool]:
         """Verifica salud de todos los servicios"""
         return {
@@ -374,17 +867,24 @@ class HybridRAGOrchestrator:
             'documents_initialized': self.is_initialized
         }
     
-    def _generate_rag_response(self, message: str, user_context: Optional[str] = None) -> Dict[str, Any]:
+    def _generate_rag_response(self, message: str, user_context: Optional[str] = None,
+                               query_embedding: Optional[List[float]] = None) -> Dict[str, Any]:
         """Genera respuesta usando RAG (heredado y mejorado)"""
         try:
-            relevant_context = self._search_relevant_context(message)
-            enhanced_prompt = self._build_enhanced_prompt(message, relevant_context, user_context)
-            llm_response = self.llm_provider.generate_response(enhanced_prompt)
+            relevant_context = self._search_relevant_context(message, query_embedding=query_embedding)
+            with trace_span('build_prompt', chunks=len(relevant_context)) as span:
+                enhanced_prompt = self._build_enhanced_prompt(message, relevant_context, user_context)
+                span.set_attribute('prompt_length', len(enhanced_prompt))
+            with trace_span('llm_generation', prompt_length=len(enhanced_prompt)) as span:
+                llm_response = self.llm_provider.generate_response(enhanced_prompt)
+                span.set_attributes(success=bool(llm_response.get('success', False)),
+                                    response_length=len(llm_response.get('response') or ''))
             
             return {
                 'success': llm_response.get('success', False),
                 'response': llm_response.get('response', ''),
                 'sources_used': len(relevant_context),
+                'source_paths': self._context_sources(relevant_context),
                 'context_found': bool(relevant_context),
                 'model_info': self.llm_provider.get_model_info()
             }
@@ -395,23 +895,82 @@ class HybridRAGOrchestrator:
                 'error': str(e)
             }
     
-    def _search_relevant_context(self, message: str) -> List[Dict]:
-        """Busca contexto relevante (heredado)"""
+    def _search_relevant_context(self, message: str, query_embedding: Optional[List[float]] = None) -> List[Dict]:
+        """Busca contexto relevante (heredado); reutiliza query_embedding si ya se calculó"""
         try:
             if not self.embedding_provider or not self.vector_store or not self.is_initialized:
                 return []
             
-            query_embedding = self.embedding_provider.generate_embedding(message)
+            if query_embedding is None:
+                query_embedding = self.embedding_provider.generate_embedding(message)
             if not query_embedding:
                 return []
             
-            similar_docs = self.vector_store.search_similar(query_embedding, Config.SIMILARITY_TOP_K)
+            with trace_span('vector_search', top_k=Config.SIMILARITY_TOP_K) as span:
+                similar_docs = self.vector_store.search_similar(query_embedding, Config.SIMILARITY_TOP_K)
+                span.set_attribute('chunks', len(similar_docs))
             return similar_docs
             
         except Exception as e:
             logger.error(f"Error buscando contexto: {e}")
             return []
     
+    async def _agenerate_rag_response(self, message: str, user_context: Optional[str] = None,
+                                      query_embedding: Optional[List[float]] = None) -> Dict[str, Any]:
+        """Versión asíncrona de _generate_rag_response"""
+        try:
+            relevant_context = await self._asearch_relevant_context(message, query_embedding=query_embedding)
+            with trace_span('build_prompt', chunks=len(relevant_context)) as span:
+                enhanced_prompt = self._build_enhanced_prompt(message, relevant_context, user_context)
+                span.set_attribute('prompt_length', len(enhanced_prompt))
+            with trace_span('llm_generation', prompt_length=len(enhanced_prompt)) as span:
+                llm_response = await self.llm_provider.agenerate_response(enhanced_prompt)
+                span.set_attributes(success=bool(llm_response.get('success', False)),
+                                    response_length=len(llm_response.get('response') or ''))
+            
+            return {
+                'success': llm_response.get('success', False),
+                'response': llm_response.get('response', ''),
+                'sources_used': len(relevant_context),
+                'source_paths': self._context_sources(relevant_context),
+                'context_found': bool(relevant_context),
+                'model_info': self.llm_provider.get_model_info()
+            }
+        except Exception as e:
+            logger.error(f"Error en generación RAG (async): {e}")
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
+    async def _asearch_relevant_context(self, message: str, query_embedding: Optional[List[float]] = None) -> List[Dict]:
+        """Versión asíncrona de _search_relevant_context"""
+        try:
+            if not self.embedding_provider or not self.vector_store or not self.is_initialized:
+                return []
+            
+            if query_embedding is None:
+                query_embedding = await self.embedding_provider.agenerate_embedding(message)
+            if not query_embedding:
+                return []
+            
+            with trace_span('vector_search', top_k=Config.SIMILARITY_TOP_K) as span:
+                similar_docs = await self.vector_store.asearch_similar(query_embedding, Config.SIMILARITY_TOP_K)
+                span.set_attribute('chunks', len(similar_docs))
+            return similar_docs
+            
+        except Exception as e:
+            logger.error(f"Error buscando contexto (async): {e}")
+            return []
+    
+    def _context_sources(self, relevant_context: List[Dict]) -> List[str]:
+        """Archivos de los que proviene el contexto recuperado"""
+        return sorted({
+            doc.get('metadata', {}).get('full_path')
+            for doc in relevant_context
+            if doc.get('metadata', {}).get('full_path')
+        })
+    
     def _build_enhanced_prompt(self, message: str, relevant_context: List[Dict], user_context: Optional[str] = None) -> str:
         """Construye prompt enriquecido (heredado)"""
         system_context = """Eres un asistente AI especializado en ayudar con consultas sobre mi perfil profesional y portfolio.
@@ -469,7 +1028,7 @@ RESPUESTA:"""
         base_response = {
             'success': success,
             'response': response,
-            'timestamp': __import__('time').time(),
+            'timestamp': time.time(),
             'from_cache': False
         }
         base_response.update(kwargs)
@@ -517,13 +1076,7 @@ RESPUESTA:"""
         """Guarda respuesta en cache"""
         try:
             if self.cache_provider:
-                # Remover metadata temporal antes de cachear
-                cached_response = response.copy()
-                if 'metadata' in cached_response:
-                    cached_response['metadata'] = {
-                        k: v for k, v in cached_response['metadata'].items() 
-                        if k in ['steps_completed', 'flow_path', 'detected_section']
-                    }
+                cached_response = self._cacheable_copy(response)
                 self.cache_provider.set(cache_key, cached_response, ttl=3600)
                 # Instrumentar cache set (si está disponible)
                 try:
@@ -535,6 +1088,46 @@ RESPUESTA:"""
         except Exception as e:
             logger.error(f"Error cacheando respuesta: {e}")
     
+    def _track_response_sources(self, cache_key: str, sources: frozenset):
+        """
+        Registra qué archivos respaldan una respuesta cacheada
+        
+        La tabla está acotada a Config.CACHE_MAX_ENTRIES; al desplazar una clave
+        se borra también del cache, para que ninguna respuesta cacheada quede
+        fuera del alcance de la invalidación selectiva.
+        """
+        if not self.cache_provider:
+            return
+        self._response_sources[cache_key] = sources
+        self._response_sources.move_to_end(cache_key)
+        while len(self._response_sources) > max(1, Config.CACHE_MAX_ENTRIES):
+            displaced_key, _ = self._response_sources.popitem(last=False)
+            self.cache_provider.delete(displaced_key)
+    
+    def _invalidate_responses_for_sources(self, sources: set, include_sourceless: bool) -> int:
+        """Borra del cache exacto y semántico las respuestas afectadas por los archivos"""
+        invalidated = 0
+        for cache_key, response_sources in list(self._response_sources.items()):
+            if (response_sources & sources) or (include_sourceless and not response_sources):
+                if self.cache_provider:
+                    self.cache_provider.delete(cache_key)
+                del self._response_sources[cache_key]
+                invalidated += 1
+        
+        if self.semantic_cache is not None:
+            invalidated += self.semantic_cache.invalidate_sources(sources, include_sourceless)
+        return invalidated
+    
+    def _cacheable_copy(self, response: Dict[str, Any]) -> Dict[str, Any]:
+        """Copia de la respuesta sin la metadata temporal del flujo"""
+        cached_response = response.copy()
+        if 'metadata' in cached_response:
+            cached_response['metadata'] = {
+                k: v for k, v in cached_response['metadata'].items() 
+                if k in ['steps_completed', 'flow_path', 'detected_section']
+            }
+        return cached_response
+    
     def get_system_status(self) -> Dict[str, Any]:
         """Estado completo del sistema híbrido"""
         try:
@@ -580,6 +1173,18 @@ RESPUESTA:"""
             if self.vector_store:
                 base_status['vector_store_stats'] = self.vector_store.get_stats()
             
+            if self.cache_provider and hasattr(self.cache_provider, 'get_stats'):
+                base_status['cache_stats'] = self.cache_provider.get_stats()
+            
+            if self.semantic_cache is not None:
+                base_status['semantic_cache_stats'] = self.semantic_cache.get_stats()
+            
+            if self.semantic_faq is not None:
+                base_status['semantic_faq_stats'] = self.semantic_faq.get_stats()
+            
+            if self.embedding_provider and hasattr(self.embedding_provider, 'get_stats'):
+                base_status['embedding_cache_stats'] = self.embedding_provider.get_stats()
+            
             if self.document_processor:
                 base_status['documents_info'] = self.document_processor.get_documents_info()
             
@@ -589,9 +1194,88 @@ RESPUESTA:"""
             logger.error(f"Error obteniendo estado del sistema: {e}")
             return {"error": str(e)}
 
-    def reload_documents(self) -> Dict[str, Any]:
-        """Recarga documentos con limpieza de componentes"""
+    def sync_documents(self) -> Dict[str, Any]:
+        """
+        Sincroniza incrementalmente el vector store con los archivos
+        
+        Solo re-procesa y re-embebe los archivos nuevos o modificados, borra los
+        chunks de archivos eliminados e invalida únicamente las respuestas
+        cacheadas que dependían de ellos. El resto del store sigue sirviendo
+        contexto durante toda la operación.
+        """
+        start_time = time.time()
+        changes = self.document_processor.scan_changes()
+        changed, removed = changes['changed'], changes['removed']
+        
+        for path in removed:
+            if not self.vector_store.replace_source_documents(path, [], []):
+                raise RuntimeError(f"No se pudo eliminar {path} del vector store")
+        
+        skipped = set()
+        for file_group in self._iter_file_groups(self._iter_source_documents(changed)):
+            documents = [doc for _, file_documents in file_group for doc in file_documents]
+            embeddings = self.embedding_provider.generate_embeddings_batch(
+                [doc['content'] for doc in documents]) if documents else []
+            
+            offset = 0
+            for path, file_documents in file_group:
+                count = len(file_documents)
+                file_embeddings = embeddings[offset:offset + count]
+                offset += count
+                # Sin todos sus embeddings el archivo conserva la versión indexada
+                if len(file_embeddings) < count or not all(file_embeddings):
+                    logger.warning(f"Embeddings incompletos para {path}; se reintentará en la próxima sincronización")
+                    skipped.add(path)
+                    continue
+                if not self.vector_store.replace_source_documents(path, file_documents, file_embeddings):
+                    raise RuntimeError(f"No se pudo actualizar {path} en el vector store")
+        
+        updated = [path for path in changed if path not in skipped]
+        invalidated = 0
+        if updated or removed:
+            invalidated = self._invalidate_responses_for_sources(set(updated) | set(removed), include_sourceless=bool(updated))
+        
+        # El manifest solo avanza con los cambios aplicados: un archivo salteado
+        # mantiene su entrada anterior (o ninguna) y vuelve a detectarse como cambiado
+        manifest = changes['manifest']
+        if skipped:
+            previous = self.document_processor.load_manifest()
+            for path in skipped:
+                if path in previous:
+                    manifest[path] = previous[path]
+                else:
+                    manifest.pop(path, None)
+        self.document_processor.save_manifest(manifest)
+        
+        logger.info(f"Sincronización incremental: {len(updated)} archivos actualizados, "
+                    f"{len(removed)} eliminados, {len(skipped)} salteados, {invalidated} respuestas invalidadas")
+        return {
+            "success": not skipped,
+            "mode": "incremental",
+            "changed_files": len(updated),
+            "skipped_files": len(skipped),
+            "removed_files": len(removed),
+            "unchanged_files": changes['unchanged'],
+            "invalidated_responses": invalidated,
+            "duration_seconds": time.time() - start_time
+        }
+    
+    def reload_documents(self, full: bool = False) -> Dict[str, Any]:
+        """
+        Recarga documentos
+        
+        Por defecto aplica una sincronización incremental; la recarga completa
+        (vaciar vector store y caches y re-ingestar todo) se usa con full=True,
+        si el sistema no llegó a inicializarse o si el vector store no soporta
+        actualizaciones por archivo.
+        """
         try:
+            if not full and self.is_initialized and self._manifest_ready:
+                try:
+                    return self.sync_documents()
+                except NotImplementedError as e:
+                    logger.info(f"{e}; se realiza recarga completa")
+            
             logger.info("Recargando documentos en sistema híbrido...")
             
             # Limpiar vector store
@@ -601,6 +1285,11 @@ RESPUESTA:"""
             # Limpiar cache
             if self.cache_provider:
                 self.cache_provider.clear()
+            self._response_sources.clear()
+            
+            # Las respuestas semánticas dependen de los documentos indexados
+            if self.semantic_cache is not None:
+                self.semantic_cache.clear()
             
             # Reinicializar
             self.is_initialized = False
@@ -3,7 +3,8 @@ from .providers import (
     IEmbeddingProvider, 
     IVectorStore,
     IDocumentProcessor,
-    ICacheProvider
+    ICacheProvider,
+    IRateLimitStore
 )
 
 __all__ = [
@@ -11,5 +12,6 @@ __all__ = [
     'IEmbeddingProvider',
     'IVectorStore', 
     'IDocumentProcessor',
-    'ICacheProvider'
+    'ICacheProvider',
+    'IRateLimitStore'
 ]
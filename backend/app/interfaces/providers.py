@@ -1,5 +1,6 @@
+import asyncio
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
 
 class ILLMProvider(ABC):
     """Interfaz para proveedores de LLM (Language Learning Models)"""
@@ -9,6 +10,23 @@ class ILLMProvider(ABC):
         """Genera una respuesta usando el LLM"""
         pass
     
+    async def agenerate_response(self, prompt: str, **kwargs) -> Dict[str, Any]:
+        """Versión asíncrona de generate_response (por defecto delega en un hilo)"""
+        return await asyncio.to_thread(self.generate_response, prompt, **kwargs)
+    
+    async def astream_response(self, prompt: str, **kwargs) -> AsyncIterator[str]:
+        """
+        Genera la respuesta de forma incremental, fragmento a fragmento
+        
+        La implementación por defecto emite la respuesta completa como un único
+        fragmento; los proveedores con streaming nativo deben sobrescribirla.
+        Lanza excepción si la generación falla.
+        """
+        result = await self.agenerate_response(prompt, **kwargs)
+        if not result.get('success', False):
+            raise RuntimeError(result.get('error', 'LLM generation failed'))
+        yield result.get('response', '')
+    
     @abstractmethod
     def is_available(self) -> bool:
         """Verifica si el proveedor está disponible"""
@@ -33,6 +51,14 @@ class IEmbeddingProvider(ABC):
         """Genera embeddings de múltiples textos"""
         pass
     
+    async def agenerate_embedding(self, text: str) -> List[float]:
+        """Versión asíncrona de generate_embedding (por defecto delega en un hilo)"""
+        return await asyncio.to_thread(self.generate_embedding, text)
+    
+    async def agenerate_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
+        """Versión asíncrona de generate_embeddings_batch (por defecto delega en un hilo)"""
+        return await asyncio.to_thread(self.generate_embeddings_batch, texts)
+    
     @abstractmethod
     def is_available(self) -> bool:
         """Verifica si el proveedor está disponible"""
@@ -52,6 +78,18 @@ class IVectorStore(ABC):
         """Busca documentos similares"""
         pass
     
+    async def asearch_similar(self, query_embedding: List[float], k: int) -> List[Dict]:
+        """Versión asíncrona de search_similar (por defecto delega en un hilo)"""
+        return await asyncio.to_thread(self.search_similar, query_embedding, k)
+    
+    def replace_source_documents(self, source: str, documents: List[Dict], embeddings: List[List[float]]) -> bool:
+        """
+        Sustituye todos los chunks de un archivo fuente (metadata 'full_path')
+        Con documents vacío equivale a borrar la fuente. Los stores que no lo
+        soporten obligan a una recarga completa.
+        """
+        raise NotImplementedError(f"{self.__class__.__name__} no soporta actualización incremental")
+    
     @abstractmethod
     def get_stats(self) -> Dict[str, Any]:
         """Obtiene estadísticas del store"""
@@ -104,3 +142,56 @@ class ICacheProvider(ABC):
     def clear(self) -> bool:
         """Limpia todo el cache"""
         pass
+
+
+class IRateLimitStore(ABC):
+    """
+    Interfaz para almacenes de rate limiting
+    
+    Las operaciones deben ser atómicas respecto de otros procesos que compartan
+    el almacén, para que varios workers apliquen un único límite.
+    """
+    
+    # Las operaciones hacen I/O (disco, red): el flujo async las corre en un hilo
+    blocking = True
+    
+    @abstractmethod
+    def acquire(self, key: str, now: float, limits: List[Tuple[int, float]], cost: int = 1) -> Dict[str, Any]:
+        """
+        Registra la request si ninguna ventana deslizante (límite, segundos) se excede
+        
+        Returns:
+            Dict con 'violated' (índice del primer límite excedido o None),
+            'counts' (uso por ventana, incluida la request si se registró) y
+            'oldest' (timestamp más antiguo dentro de cada ventana o None)
+        """
+        pass
+    
+    @abstractmethod
+    def peek(self, key: str, now: float, limits: List[Tuple[int, float]]) -> Dict[str, Any]:
+        """Uso actual por ventana sin registrar nada ('counts', 'oldest')"""
+        pass
+    
+    def acquire_gcra(self, key: str, now: float, limits: List[Tuple[int, float]], cost: int = 1) -> Dict[str, Any]:
+        """
+        Variante GCRA de acquire: guarda solo el TAT (theoretical arrival time) por límite
+        
+        Returns:
+            Dict con 'violated' (índice del primer límite excedido o None) y
+            'tats' (TAT por límite tras registrar la request, o los vigentes si se rechazó)
+        """
+        raise NotImplementedError(f"{self.__class__.__name__} no soporta GCRA")
+    
+    def peek_gcra(self, key: str, now: float, limits: List[Tuple[int, float]]) -> Dict[str, Any]:
+        """TAT vigentes por límite sin registrar nada ('tats', None si no hay estado)"""
+        raise NotImplementedError(f"{self.__class__.__name__} no soporta GCRA")
+    
+    @abstractmethod
+    def reset(self, key: str) -> bool:
+        """Elimina el historial de un identificador"""
+        pass
+    
+    @abstractmethod
+    def get_stats(self) -> Dict[str, Any]:
+        """Estadísticas del almacén"""
+        pass
@@ -2,7 +2,9 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 # Importar rutas
-from app.routes import chat
+from app.routes.chat import router as chat_router
+from app.routes.monitoring import router as monitoring_router
+from app.middleware.tracing_middleware import TracingMiddleware
 import os
 import logging
 
@@ -31,8 +33,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Span raíz por request (ver /api/monitoring/traces)
+app.add_middleware(TracingMiddleware)
 
-app.include_router(chat.router, prefix="/api")
+
+app.include_router(chat_router, prefix="/api")
+# Dashboard, métricas, trazas y profiler (el router ya trae el prefijo /api/monitoring)
+app.include_router(monitoring_router)
 
 # Health check
 @app.get("/api/health")
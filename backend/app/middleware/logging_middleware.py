@@ -1,100 +1,278 @@
 """
 Middleware de logging estructurado y mascaramiento de PII
 Soporta FastAPI mediante middleware ASGI
+
+El event loop solo arma un registro liviano y lo encola: el mascaramiento de
+PII, la decodificación de headers y el json.dumps ocurren en el hilo del
+QueueListener, que escribe las líneas JSON.
 """
+import atexit
 import logging
+import logging.handlers
 import json
+import queue
+import random
 import re
-from typing import Callable
-from fastapi import Request
+import threading
+from typing import Any, Dict, List, Optional, Tuple
 
-logger = logging.getLogger("structured_logger")
+from ..config.settings import Config
 
-# Patrones PII comunes
-_EMAIL_RE = re.compile(r"([a-zA-Z0-9_.+-]+)@([a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+)")
-_SSN_RE = re.compile(r"\b(\d{3}[- ]?\d{2}[- ]?\d{4})\b")
-_CC_RE = re.compile(r"\b(\d{4}[- ]?\d{4}[- ]?\d{4}[- ]?\d{4})\b")
-_PHONE_RE = re.compile(r"\b(\+?\d{1,3}[\s-]?)?(\(?\d{2,4}\)?[\s-]?)?\d{6,10}\b")
+logger = logging.getLogger("structured_logger")
 
+# Escáner de PII (emails, SSN, tarjetas y teléfonos) en una sola pasada sobre
+# el texto. Los matches no se solapan: gana el que empieza antes y, a igual
+# inicio, el orden de las alternativas (email, ssn, tarjeta, teléfono).
+# Los dígitos dentro del dominio de un email quedan en claro: forman parte
+# del match del email.
+# Cada alternativa solo arranca al inicio de una corrida (lookbehind negativo):
+# el usuario del email al inicio de una corrida de caracteres válidos y los
+# números tras un carácter que no es de palabra, así una palabra o un número
+# largo se recorre una vez y no una por posición.
+_EMAIL_CHARS = r"[a-zA-Z0-9_.+-]"
+_PII_RE = re.compile(
+    rf"(?P<email>(?<!{_EMAIL_CHARS})(?P<email_user>{_EMAIL_CHARS}+)@(?P<email_domain>[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+))"
+    r"|(?<!\w)(?=[+(\d])(?:"
+    r"(?P<ssn>\d{3}[- ]?\d{2}[- ]?\d{4}\b)"
+    r"|(?P<cc>\d{4}[- ]?\d{4}[- ]?\d{4}[- ]?\d{4}\b)"
+    r"|(?P<phone>(?:\+?\d{1,3}[\s-]?)?(?:\(?\d{2,4}\)?[\s-]?)?\d{6,10}\b))"
+)
+# Todo PII contiene un dígito o una '@': sin ninguno no hace falta escanear
+_PII_HINT_RE = re.compile(r"[\d@]")
 
-def _mask_email(match: re.Match) -> str:
-    user = match.group(1)
-    domain = match.group(2)
-    masked_user = user[0] + "***" + user[-1] if len(user) > 2 else "***"
-    return f"{masked_user}@{domain}"
+# Headers que nunca se escriben en claro
+_REDACTED_HEADERS = ('authorization', 'x-api-key')
 
 
-def _mask_generic(match: re.Match) -> str:
-    s = match.group(0)
+def _mask_span(s: str) -> str:
+    """Conserva los dos primeros y dos últimos caracteres"""
     if len(s) <= 4:
         return "[PII]"
     return s[:2] + "*" * (len(s) - 4) + s[-2:]
 
 
 def mask_pii(text: str) -> str:
-    if not text:
+    """Enmascara emails, SSN, tarjetas y teléfonos en una sola pasada"""
+    if not text or not _PII_HINT_RE.search(text):
         return text
     try:
-        text = _EMAIL_RE.sub(_mask_email, text)
-        text = _SSN_RE.sub(lambda m: _mask_generic(m), text)
-        text = _CC_RE.sub(lambda m: _mask_generic(m), text)
-        text = _PHONE_RE.sub(lambda m: _mask_generic(m), text)
-        return text
+        parts = []
+        position = 0
+        for match in _PII_RE.finditer(text):
+            start, end = match.span()
+            parts.append(text[position:start])
+            if match.lastgroup == 'email':
+                user = match.group('email_user')
+                masked_user = user[0] + "***" + user[-1] if len(user) > 2 else "***"
+                parts.append(f"{masked_user}@{match.group('email_domain')}")
+            else:
+                parts.append(_mask_span(match.group(0)))
+            position = end
+        if not parts:
+            return text
+        parts.append(text[position:])
+        return "".join(parts)
     except Exception:
         return text
 
 
+class _JsonLogMessage:
+    """
+    Mensaje diferido: se serializa recién cuando el listener llama a str()
+
+    headers son los pares en bytes del scope ASGI y payload los primeros bytes
+    del body, ambos sin procesar.
+    """
+
+    __slots__ = ('entry', 'headers', 'payload')
+
+    def __init__(self, entry: Dict[str, Any], headers: Optional[List[Tuple[bytes, bytes]]] = None,
+                 payload: Optional[bytes] = None):
+        self.entry = entry
+        self.headers = headers
+        self.payload = payload
+
+    def __str__(self) -> str:
+        entry = dict(self.entry)
+        if self.headers is not None:
+            headers = {k.decode('latin1'): v.decode('latin1') for k, v in self.headers}
+            # Mask headers that may contain PII or auth
+            for name in _REDACTED_HEADERS:
+                if name in headers:
+                    headers[name] = 'REDACTED'
+            entry['headers'] = headers
+        if self.payload is not None:
+            payload_preview = self.payload.decode('utf-8', errors='ignore')
+            entry['payload_preview'] = mask_pii(payload_preview) if payload_preview else None
+        return json.dumps(entry)
+
+
+class _DropCountingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler que no formatea en el hilo que loguea y descarta (contando)
+    cuando la cola está llena, en lugar de bloquear el event loop
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # El formateo (y el json.dumps del mensaje diferido) queda para el listener
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogPipeline:
+    """Cola acotada + QueueListener en segundo plano para el logger estructurado"""
+
+    def __init__(self, queue_size: Optional[int] = None, handlers: Optional[List[logging.Handler]] = None):
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size or Config.LOG_QUEUE_SIZE)
+        self.handler = _DropCountingQueueHandler(self.queue)
+
+        if not handlers:
+            writer = logging.StreamHandler()
+            writer.setFormatter(logging.Formatter('%(message)s'))
+            handlers = [writer]
+        self.listener = logging.handlers.QueueListener(self.queue, *handlers, respect_handler_level=True)
+        self._started = False
+
+    def start(self) -> None:
+        if not self._started:
+            self.listener.start()
+            self._started = True
+
+    def stop(self) -> None:
+        """Drena la cola y detiene el hilo del listener"""
+        if self._started:
+            self.listener.stop()
+            self._started = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'queued': self.queue.qsize(),
+            'capacity': self.queue.maxsize,
+            'dropped': self.handler.dropped,
+            'running': self._started
+        }
+
+
+_pipeline: Optional[LogPipeline] = None
+_pipeline_lock = threading.Lock()
+
+
+def get_log_pipeline() -> LogPipeline:
+    """Pipeline compartido: conecta el logger estructurado a la cola una sola vez"""
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = LogPipeline()
+            logger.addHandler(_pipeline.handler)
+            logger.propagate = False
+            _pipeline.start()
+            atexit.register(_pipeline.stop)
+        return _pipeline
+
+
 class StructuredLoggingMiddleware:
-    """Middleware ligero para FastAPI que genera logs JSON y mascara PII"""
-    def __init__(self, app, log_level: int = logging.INFO):
+    """
+    Middleware ASGI para FastAPI que genera logs JSON y mascara PII
+
+    El preview del body se copia de los mensajes de `receive` a medida que la
+    app los consume (hasta body_preview_bytes), sin leer ni bufferizar el
+    payload completo. sample_rates define, por prefijo de path, la fracción
+    de requests que se loguean (1.0 = todas).
+    """
+    def __init__(self, app, log_level: int = logging.INFO,
+                 sample_rates: Optional[Dict[str, float]] = None,
+                 body_preview_bytes: Optional[int] = None,
+                 pipeline: Optional[LogPipeline] = None):
         self.app = app
         self.log_level = log_level
         self.logger = logging.getLogger("structured_logger")
         self.logger.setLevel(log_level)
+        self.pipeline = pipeline or get_log_pipeline()
+        self.body_preview_bytes = body_preview_bytes if body_preview_bytes is not None else Config.LOG_BODY_PREVIEW_BYTES
+
+        rates = sample_rates if sample_rates is not None else Config.LOG_SAMPLE_RATES
+        # Prefijo más largo primero
+        self.sample_rates = sorted(rates.items(), key=lambda item: len(item[0]), reverse=True)
+        self.sampled_out = 0
 
-    async def __call__(self, request: Request, call_next: Callable):
-        # Log entrada estructurada
+    def _sample_rate(self, path: str) -> float:
+        for prefix, rate in self.sample_rates:
+            if path.startswith(prefix):
+                return rate
+        return 1.0
+
+    def _emit(self, message: _JsonLogMessage) -> None:
         try:
-            payload_preview = None
-            try:
-                payload = await request.body()
-                payload_preview = payload.decode('utf-8', errors='ignore')[:1000]
-            except Exception:
-                payload_preview = None
-
-            headers = {k.decode('latin1'): v.decode('latin1') for k, v in request.scope.get('headers', [])}
-            # Mask headers that may contain PII or auth
-            if 'authorization' in headers:
-                headers['authorization'] = 'REDACTED'
-            if 'x-api-key' in headers:
-                headers['x-api-key'] = 'REDACTED'
-
-            log_entry = {
-                'event': 'request_received',
-                'method': request.method,
-                'path': request.url.path,
-                'client': request.client.host if request.client else None,
-                'headers': headers,
-                'payload_preview': mask_pii(payload_preview) if payload_preview else None
-            }
-            self.logger.info(json.dumps(log_entry))
+            self.logger.log(self.log_level, message)
         except Exception:
             pass
 
-        # Llamar al siguiente handler
-        response = await call_next(request)
+    async def __call__(self, scope, receive, send):
+        if scope.get('type') != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        path = scope.get('path', '')
+        rate = self._sample_rate(path)
+        if rate < 1.0 and random.random() >= rate:
+            self.sampled_out += 1
+            await self.app(scope, receive, send)
+            return
+
+        client = scope.get('client')
+        request_entry = {
+            'event': 'request_received',
+            'method': scope.get('method'),
+            'path': path,
+            'client': client[0] if client else None
+        }
+        preview = bytearray()
+        state = {'request_logged': False, 'status_code': None}
+
+        def log_request(payload: Optional[bytes]) -> None:
+            if not state['request_logged']:
+                state['request_logged'] = True
+                self._emit(_JsonLogMessage(request_entry, scope.get('headers', []), payload))
+
+        async def receive_with_preview():
+            message = await receive()
+            if message['type'] == 'http.request' and not state['request_logged']:
+                body = message.get('body', b'')
+                remaining = self.body_preview_bytes - len(preview)
+                if body and remaining > 0:
+                    preview.extend(body[:remaining])
+                if not message.get('more_body', False) or len(preview) >= self.body_preview_bytes:
+                    log_request(bytes(preview))
+            return message
+
+        async def send_with_status(message):
+            if message['type'] == 'http.response.start':
+                state['status_code'] = message.get('status')
+                # La app respondió sin consumir el body completo
+                log_request(bytes(preview) if preview else None)
+            await send(message)
 
-        # Log respuesta
         try:
-            response_log = {
+            await self.app(scope, receive_with_preview, send_with_status)
+        finally:
+            log_request(bytes(preview) if preview else None)
+            self._emit(_JsonLogMessage({
                 'event': 'response_sent',
-                'method': request.method,
-                'path': request.url.path,
-                'status_code': getattr(response, 'status_code', None)
-            }
-            self.logger.info(json.dumps(response_log))
-        except Exception:
-            pass
+                'method': scope.get('method'),
+                'path': path,
+                'status_code': state['status_code']
+            }))
 
-        return response
-        return response
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self.pipeline.get_stats()
+        stats['sampled_out'] = self.sampled_out
+        return stats
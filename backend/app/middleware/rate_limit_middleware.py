@@ -4,18 +4,69 @@ Implementa rate limiting según el diagrama de flujo híbrido
 """
 
 import logging
+from bisect import bisect_right
 from functools import wraps
-from typing import Callable, Optional, Dict, Any
+from typing import Callable, Optional, Dict, Any, List, Tuple
 from fastapi import Request, HTTPException, status
 from fastapi.responses import JSONResponse
 import time
 
-from ..utils.rate_limiter import check_rate_limit, get_client_identifier
+from ..utils.rate_limiter import (check_rate_limit, get_api_key, get_client_identifier, rate_limiter,
+                                  run_rate_limit_check, RATE_LIMIT_CONFIGS)
 from ..services.i18n_service import get_localized_message
 from ..config.settings import Config
 
 logger = logging.getLogger(__name__)
 
+# Mapeo base de rutas a categorías
+ENDPOINT_CATEGORIES = {
+    "/api/chat": "chat",
+    "/api/suggest": "suggest",
+    "/api/search": "search",
+    "/api/documents": "documents",
+    "/api/admin": "admin"
+}
+
+
+class _RouteTable:
+    """
+    Tabla de prefijos ordenada, compilada una vez por configuración
+    
+    Resuelve el prefijo más largo de un path con bisect: el candidato es el
+    mayor prefijo <= path en orden lexicográfico y, si no es prefijo del path,
+    se sube por la cadena de prefijos que lo contienen (precalculada). Las
+    rutas excluidas viven en la misma tabla con valor None.
+    """
+    
+    def __init__(self, routes: Dict[str, Optional[Dict[str, Any]]], default: Dict[str, Any], source: Any):
+        self.prefixes: List[str] = sorted(routes)
+        self.values: List[Optional[Dict[str, Any]]] = [routes[prefix] for prefix in self.prefixes]
+        self.default = default
+        # Configuración de la que se compiló la tabla (para detectar recargas)
+        self.source = source
+        
+        # parents[i]: índice del prefijo más largo de la tabla que contiene a prefixes[i]
+        self.parents: List[int] = []
+        stack: List[int] = []
+        for index, prefix in enumerate(self.prefixes):
+            while stack and not prefix.startswith(self.prefixes[stack[-1]]):
+                stack.pop()
+            self.parents.append(stack[-1] if stack else -1)
+            stack.append(index)
+    
+    def resolve(self, path: str) -> Tuple[bool, Dict[str, Any]]:
+        """Devuelve (excluido, configuración) para el prefijo más largo del path"""
+        index = bisect_right(self.prefixes, path) - 1
+        while index >= 0 and not path.startswith(self.prefixes[index]):
+            index = self.parents[index]
+        if index < 0:
+            return False, self.default
+        value = self.values[index]
+        if value is None:
+            return True, self.default
+        return False, value
+
+
 class RateLimitMiddleware:
     """
     Middleware para aplicar rate limiting a requests HTTP
@@ -38,30 +89,42 @@ class RateLimitMiddleware:
             "/redoc",
             "/openapi.json",
             "/health",
-            "/monitoring/status"
+            "/monitoring/status",
+            # El stream lo limita el orquestador (categoría chat_stream, mismo
+            # get_client_identifier); cobrarlo también acá lo descontaría dos veces
+            "/api/chat/stream"
         ]
+        self._routes = self._compile_routes()
         
     async def __call__(self, request: Request, call_next):
         """
         Procesa el request aplicando rate limiting
         """
-        # Excluir ciertas rutas del rate limiting
-        if any(request.url.path.startswith(path) for path in self.excluded_paths):
+        # Exclusión y configuración del endpoint en una sola búsqueda
+        excluded, endpoint_config = self._resolve(request.url.path)
+        if excluded:
             return await call_next(request)
         
         # Obtener identificador del cliente
         client_id = self._get_client_identifier(request)
         
-        # Obtener configuración específica del endpoint
-        endpoint_config = self._get_endpoint_config(request.url.path)
-        
-        # Verificar rate limit
-        rate_result = check_rate_limit(
-            client_id, 
-            endpoint_config['category'],
-            limit=endpoint_config.get('limit', self.default_limit),
-            window=endpoint_config.get('window', self.default_window)
-        )
+        # Verificar rate limit: el tier del cliente manda; si la categoría no
+        # tiene tier se usan los límites de la ruta (con SQLite o Redis el
+        # chequeo corre en un hilo, fuera del event loop)
+        client_type = get_client_type(request)
+        if rate_limiter.has_tier(client_type, endpoint_config['category']):
+            rate_result = await run_rate_limit_check(
+                check_rate_limit, client_id, endpoint_config['category'], client_type=client_type
+            )
+        else:
+            rate_result = await run_rate_limit_check(
+                check_rate_limit,
+                client_id,
+                endpoint_config['category'],
+                limit=endpoint_config.get('limit', self.default_limit),
+                window=endpoint_config.get('window', self.default_window),
+                client_type=client_type
+            )
         
         if not rate_result.get('allowed', False):
             # Detectar idioma del request
@@ -100,78 +163,64 @@ class RateLimitMiddleware:
     def _get_client_identifier(self, request: Request) -> str:
         """
         Obtiene identificador único del cliente
-        Prioridad: API Key > User ID > Session ID > IP Address
+        Prioridad: API Key válida > User ID > IP Address (vía get_client_identifier)
+
+        La cookie de sesión no se usa: la elige el cliente y bastaría con
+        rotarla para estrenar cuota.
         """
-        # Verificar API Key
-        api_key = request.headers.get('X-API-Key')
-        if api_key:
-            return f"api_key:{api_key}"
-        
-        # Verificar User ID (si existe autenticación)
-        if hasattr(request.state, 'user_id'):
+        if get_api_key(request) is None and hasattr(request.state, 'user_id'):
             return f"user:{request.state.user_id}"
-        
-        # Verificar Session ID
-        session_id = request.cookies.get('session_id')
-        if session_id:
-            return f"session:{session_id}"
-        
-        # Usar IP como fallback
-        client_ip = request.client.host if request.client else "unknown"
-        
-        # Verificar si viene de proxy
-        forwarded_for = request.headers.get("X-Forwarded-For")
-        if forwarded_for:
-            client_ip = forwarded_for.split(",")[0].strip()
-        
-        real_ip = request.headers.get("X-Real-IP")
-        if real_ip:
-            client_ip = real_ip
-        
-        return f"ip:{client_ip}"
+        return get_client_identifier(request)
     
-    def _get_endpoint_config(self, path: str) -> Dict[str, Any]:
+    def _compile_routes(self) -> _RouteTable:
         """
-        Obtiene configuración de rate limiting específica del endpoint
-        Ahora utiliza `Config.RATE_LIMIT_DEFAULTS` como fuente de verdad y permite
-        sobrescribir límites por categoría.
+        Compila rutas, exclusiones y límites a partir de `Config.RATE_LIMIT_DEFAULTS`
+        (fuente de verdad, con sobrescritura de límites por categoría)
         """
-        # Mapeo base de rutas a categorías
-        endpoint_configs = {
-            "/api/chat": {"category": "chat"},
-            "/api/chat/stream": {"category": "chat_stream"},
-            "/api/suggest": {"category": "suggest"},
-            "/api/search": {"category": "search"},
-            "/api/documents": {"category": "documents"},
-            "/api/admin": {"category": "admin"}
+        source = getattr(Config, 'RATE_LIMIT_DEFAULTS', None)
+        defaults = source or {}
+        
+        def category_config(category: str) -> Dict[str, Any]:
+            cat_defaults = defaults.get(category) or defaults.get('general') or {}
+            return {
+                "category": category,
+                "limit": int(cat_defaults.get('limit', self.default_limit)),
+                "window": int(cat_defaults.get('window', self.default_window))
+            }
+        
+        routes: Dict[str, Optional[Dict[str, Any]]] = {
+            path: category_config(category) for path, category in ENDPOINT_CATEGORIES.items()
         }
-
-        # Obtener defaults desde la configuración centralizada
-        defaults = getattr(Config, 'RATE_LIMIT_DEFAULTS', {}) or {}
-
-        # Enriquecer cada configuración con límites y ventanas
-        for cfg in endpoint_configs.values():
-            cat = cfg.get('category', 'general')
-            cat_defaults = defaults.get(cat) or defaults.get('general') or {}
-            cfg['limit'] = int(cat_defaults.get('limit', self.default_limit))
-            cfg['window'] = int(cat_defaults.get('window', self.default_window))
-
-        # Buscar configuración exacta
-        if path in endpoint_configs:
-            return endpoint_configs[path]
-
-        # Buscar por prefijo
-        for config_path, config in endpoint_configs.items():
-            if path.startswith(config_path):
-                return config
-
+        # Las exclusiones tienen prioridad sobre una ruta con el mismo prefijo
+        for path in self.excluded_paths:
+            routes[path] = None
+        
         # Configuración default basada en RATE_LIMIT_DEFAULTS.general
         general_default = defaults.get('general', {})
-        return {
+        default = {
             "category": "general",
             "limit": int(general_default.get('limit', self.default_limit)),
             "window": int(general_default.get('window', self.default_window))
         }
+        return _RouteTable(routes, default, source)
+    
+    def reload(self) -> None:
+        """Recompila la tabla de rutas (p. ej. tras modificar la configuración en sitio)"""
+        self._routes = self._compile_routes()
+        logger.info(f"Tabla de rate limiting recompilada: {len(self._routes.prefixes)} prefijos")
+    
+    def _resolve(self, path: str) -> Tuple[bool, Dict[str, Any]]:
+        # Recarga en caliente si la configuración fue reemplazada
+        if getattr(Config, 'RATE_LIMIT_DEFAULTS', None) is not self._routes.source:
+            self.reload()
+        return self._routes.resolve(path)
+    
+    def _get_endpoint_config(self, path: str) -> Dict[str, Any]:
+        """
+        Obtiene configuración de rate limiting específica del endpoint
+        (prefijo más largo en la tabla precompilada)
+        """
+        return self._resolve(path)[1]
 
 def rate_limit_middleware(app, **kwargs):
     """
@@ -211,7 +260,8 @@ def require_rate_limit(
                 client_id = get_client_identifier(request)
             
             # Verificar rate limit
-            rate_result = check_rate_limit(
+            rate_result = await run_rate_limit_check(
+                check_rate_limit,
                 client_id, 
                 category,
                 limit=limit,
@@ -258,36 +308,12 @@ def require_rate_limit(
         return wrapper
     return decorator
 
-# Configuración de rate limiting por tipo de cliente
-RATE_LIMIT_CONFIGS = {
-    'anonymous': {
-        'chat': {'limit': 30, 'window': 3600},      # 30 chats/hora
-        'suggest': {'limit': 50, 'window': 3600},   # 50 sugerencias/hora
-        'search': {'limit': 100, 'window': 3600}    # 100 búsquedas/hora
-    },
-    'authenticated': {
-        'chat': {'limit': 100, 'window': 3600},     # 100 chats/hora
-        'suggest': {'limit': 200, 'window': 3600},  # 200 sugerencias/hora
-        'search': {'limit': 500, 'window': 3600}    # 500 búsquedas/hora
-    },
-    'premium': {
-        'chat': {'limit': 500, 'window': 3600},     # 500 chats/hora
-        'suggest': {'limit': 1000, 'window': 3600}, # 1000 sugerencias/hora
-        'search': {'limit': 2000, 'window': 3600}   # 2000 búsquedas/hora
-    },
-    'api_key': {
-        'chat': {'limit': 1000, 'window': 3600},    # 1000 chats/hora
-        'suggest': {'limit': 5000, 'window': 3600}, # 5000 sugerencias/hora
-        'search': {'limit': 10000, 'window': 3600}  # 10000 búsquedas/hora
-    }
-}
-
 def get_client_type(request: Request) -> str:
     """
     Determina el tipo de cliente basado en la autenticación
     """
-    # Verificar API Key
-    if request.headers.get('X-API-Key'):
+    # Verificar API Key (solo claves configuradas; una desconocida no sube de tier)
+    if get_api_key(request):
         return 'api_key'
     
     # Verificar usuario autenticado
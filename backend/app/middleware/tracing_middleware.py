@@ -0,0 +1,50 @@
+"""
+Middleware ASGI de trazas: abre el span raíz de cada request HTTP
+
+Los spans que abran el orquestador y los proveedores durante la request
+quedan como hijos de este. El trace_id se devuelve en el header x-trace-id
+para ubicar la traza en /api/monitoring/traces.
+"""
+from typing import List, Optional
+
+from ..config.settings import Config
+from ..monitoring.tracing import Tracer, get_tracer, SPAN_KIND_SERVER
+
+TRACE_ID_HEADER = b'x-trace-id'
+
+
+class TracingMiddleware:
+    """Middleware ASGI que crea un span 'http.request' por request"""
+
+    def __init__(self, app, tracer: Optional[Tracer] = None, excluded_paths: Optional[List[str]] = None):
+        self.app = app
+        self.tracer = tracer or get_tracer()
+        self.excluded_paths = tuple(excluded_paths if excluded_paths is not None else Config.TRACE_EXCLUDED_PATHS)
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get('path', '')
+        if (scope.get('type') != 'http' or not self.tracer.enabled
+                or (self.excluded_paths and path.startswith(self.excluded_paths))):
+            await self.app(scope, receive, send)
+            return
+
+        span = self.tracer.start_span('http.request', SPAN_KIND_SERVER, **{
+            'http.method': scope.get('method'),
+            'http.target': path
+        })
+
+        async def send_with_trace_id(message):
+            if message['type'] == 'http.response.start':
+                span.set_attribute('http.status_code', message.get('status'))
+                headers = list(message.get('headers', []))
+                headers.append((TRACE_ID_HEADER, span.trace_id.encode('latin1')))
+                message = {**message, 'headers': headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace_id)
+        except BaseException as e:
+            span.record_error(e)
+            raise
+        finally:
+            span.end()
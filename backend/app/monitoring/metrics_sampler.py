@@ -0,0 +1,242 @@
+"""
+Agregador de métricas en proceso para las rutas de monitoring
+
+Un hilo en segundo plano toma cada METRICS_SAMPLE_INTERVAL segundos una foto
+del proceso (CPU, RSS, threads, descriptores) y la guarda en un ring buffer.
+Los tiempos de respuesta se registran sin locks (un deque.append atómico) y el
+mismo hilo los vuelca a un sketch de cuantiles. Los endpoints solo leen la
+última foto precalculada.
+"""
+
+import os
+import math
+import time
+import logging
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from ..config.settings import Config
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    psutil = None
+    PSUTIL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 3) if seconds is not None else None
+
+
+class QuantileSketch:
+    """
+    Sketch de cuantiles con error relativo acotado (estilo DDSketch)
+
+    Cada valor cae en el bucket ceil(log_gamma(v)), con gamma = (1+a)/(1-a):
+    el cuantil estimado está a menos de `relative_accuracy` del real, con
+    memoria logarítmica en el rango de valores. No es thread-safe: lo escribe
+    un único hilo.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, min_value: float = 1e-6):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.min_value = min_value
+        self.buckets: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.total = 0.0
+        self.max = None
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        if self.max is None or value > self.max:
+            self.max = value
+        if value <= self.min_value:
+            self.zero_count += 1
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def quantiles(self, qs: Tuple[float, ...]) -> List[Optional[float]]:
+        """Cuantiles estimados (punto medio del bucket que contiene cada rango)"""
+        if not self.count:
+            return [None] * len(qs)
+        keys = sorted(self.buckets)
+        results: List[Optional[float]] = []
+        for q in qs:
+            rank = q * (self.count - 1)
+            cumulative = self.zero_count
+            value = 0.0 if rank < cumulative else None
+            for index in keys:
+                if value is not None:
+                    break
+                cumulative += self.buckets[index]
+                if cumulative > rank:
+                    # Bucket (gamma^(i-1), gamma^i]
+                    value = 2 * self.gamma ** index / (self.gamma + 1)
+            results.append(value)
+        return results
+
+
+class MetricsSampler:
+    """
+    Muestreador de métricas del proceso con ring buffer y sketch de latencias
+
+    record_request() es el único método del camino caliente: encola la
+    observación en un deque acotado (append atómico, sin locks). El hilo de
+    muestreo la consume, actualiza el sketch y publica una foto inmutable
+    que snapshot() devuelve en O(1).
+    """
+
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self, interval: Optional[float] = None, history_size: Optional[int] = None,
+                 pending_limit: int = 100000):
+        self.interval = interval or Config.METRICS_SAMPLE_INTERVAL
+        self.history: Deque[Dict[str, Any]] = deque(maxlen=history_size or Config.METRICS_HISTORY_SIZE)
+        self.response_times = QuantileSketch()
+
+        # (segundos, cache_hit) pendientes de volcar al sketch
+        self._pending: Deque[Tuple[float, bool]] = deque(maxlen=pending_limit)
+        self._requests = 0
+        self._cache_hits = 0
+        self._last_sample_at: Optional[float] = None
+        self._latest: Dict[str, Any] = self._build_snapshot(time.time(), None, 0, 0.0)
+
+        self._process = psutil.Process(os.getpid()) if PSUTIL_AVAILABLE else None
+        if self._process is not None:
+            # Primera llamada sin intervalo: fija la referencia para las siguientes
+            self._process.cpu_percent(interval=None)
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def record_request(self, seconds: float, cache_hit: bool = False) -> None:
+        """Registra una request atendida (llamado desde el camino de la request)"""
+        self._pending.append((seconds, cache_hit))
+
+    def start(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="metrics-sampler", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample_once()
+            except Exception as e:
+                logger.warning(f"Error muestreando métricas: {e}")
+
+    def _drain(self) -> int:
+        drained = 0
+        pending = self._pending
+        while pending:
+            try:
+                seconds, cache_hit = pending.popleft()
+            except IndexError:
+                break
+            self.response_times.add(seconds)
+            self._cache_hits += cache_hit
+            drained += 1
+        self._requests += drained
+        return drained
+
+    def _system_metrics(self) -> Dict[str, Any]:
+        if self._process is None:
+            return {'cpu_percent': None, 'memory_mb': None, 'memory_percent': None,
+                    'threads': None, 'open_files': None}
+        process = self._process
+        with process.oneshot():
+            return {
+                # Sin intervalo: CPU desde la muestra anterior, no bloquea
+                'cpu_percent': process.cpu_percent(interval=None),
+                'memory_mb': process.memory_info().rss / 1024 / 1024,
+                'memory_percent': process.memory_percent(),
+                'threads': process.num_threads(),
+                'open_files': process.num_fds() if hasattr(process, 'num_fds') else None
+            }
+
+    def sample_once(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """Toma una muestra y publica la nueva foto (lo invoca el hilo de fondo)"""
+        now = now if now is not None else time.time()
+        drained = self._drain()
+        elapsed = now - self._last_sample_at if self._last_sample_at is not None else None
+        self._last_sample_at = now
+
+        snapshot = self._build_snapshot(now, elapsed, drained, self._requests)
+        snapshot['system'] = self._system_metrics()
+        self.history.append({
+            'timestamp': now,
+            'requests': drained,
+            **snapshot['system']
+        })
+        snapshot['throughput']['requests_per_minute'] = self._requests_last_minute(now)
+
+        # Reemplazo atómico de la referencia: los lectores nunca ven una foto a medias
+        self._latest = snapshot
+        return snapshot
+
+    def _requests_last_minute(self, now: float) -> int:
+        return sum(sample['requests'] for sample in self.history if now - sample['timestamp'] < 60)
+
+    def _build_snapshot(self, now: float, elapsed: Optional[float], drained: int, total: float) -> Dict[str, Any]:
+        sketch = self.response_times
+        p50, p95, p99 = sketch.quantiles(self.QUANTILES)
+        return {
+            'timestamp': now,
+            'system': None,
+            'response_times': {
+                'average_ms': _ms(sketch.total / sketch.count) if sketch.count else None,
+                'median_ms': _ms(p50),
+                'p95_ms': _ms(p95),
+                'p99_ms': _ms(p99),
+                'max_ms': _ms(sketch.max),
+                'count': sketch.count
+            },
+            'throughput': {
+                'requests_per_second': round(drained / elapsed, 3) if elapsed else None,
+                'requests_per_minute': None,
+                'total_requests': int(total)
+            },
+            'cache': {
+                'hit_rate': round(self._cache_hits / self._requests, 4) if self._requests else None,
+                'miss_rate': round(1 - self._cache_hits / self._requests, 4) if self._requests else None
+            }
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Última foto precalculada (O(1))"""
+        return self._latest
+
+    def get_history(self) -> List[Dict[str, Any]]:
+        return list(self.history)
+
+
+_sampler: Optional[MetricsSampler] = None
+_sampler_lock = threading.Lock()
+
+
+def get_metrics_sampler() -> MetricsSampler:
+    """Sampler compartido del proceso; arranca el hilo en el primer uso"""
+    global _sampler
+    if _sampler is None:
+        with _sampler_lock:
+            if _sampler is None:
+                sampler = MetricsSampler()
+                sampler.start()
+                _sampler = sampler
+    return _sampler
@@ -0,0 +1,193 @@
+"""
+Profiler estadístico en proceso para el servicio en producción
+
+Un hilo muestrea cada PROFILER_INTERVAL_MS las pilas de todos los hilos con
+sys._current_frames() y cuenta pilas iguales. No instrumenta código ni usa
+sys.setprofile, así que el costo lo paga solo el hilo muestreador (una
+caminata de frames por hilo y muestra). El resultado se exporta como
+collapsed stacks (flamegraph.pl, speedscope) o en el formato JSON de
+speedscope.
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config.settings import Config
+
+logger = logging.getLogger(__name__)
+
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+
+# Raíz del paquete app: las rutas de frames propios se muestran relativas
+_APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ProfilerBusyError(RuntimeError):
+    """Ya hay un perfilado en curso"""
+
+
+class ProfileResult:
+    """
+    Muestras agregadas de un perfilado
+
+    stacks cuenta (nombre_del_hilo, frames) con los frames de la raíz a la
+    hoja; cada frame es un índice en `frames` (nombre, archivo, línea).
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.frames: List[Tuple[str, str, int]] = []
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at = time.time()
+        self.duration = 0.0
+
+    def to_collapsed(self) -> str:
+        """Una línea 'hilo;raíz;...;hoja cantidad' por pila distinta"""
+        lines = []
+        for (thread_name, stack), count in self.stacks.most_common():
+            names = [thread_name] + [f"{self.frames[i][0]} ({self.frames[i][1]}:{self.frames[i][2]})" for i in stack]
+            lines.append(f"{';'.join(names)} {count}")
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def to_speedscope(self, name: str = "portfolio-backend") -> Dict[str, Any]:
+        """Archivo speedscope con un perfil 'sampled' por hilo"""
+        weight = self.interval * 1000
+        by_thread: Dict[str, Dict[str, list]] = {}
+        for (thread_name, stack), count in self.stacks.items():
+            profile = by_thread.setdefault(thread_name, {'samples': [], 'weights': []})
+            profile['samples'].append(list(stack))
+            profile['weights'].append(count * weight)
+
+        return {
+            '$schema': SPEEDSCOPE_SCHEMA,
+            'name': name,
+            'exporter': __name__,
+            'activeProfileIndex': 0,
+            'shared': {
+                'frames': [{'name': func, 'file': path, 'line': line} for func, path, line in self.frames]
+            },
+            'profiles': [
+                {
+                    'type': 'sampled',
+                    'name': thread_name,
+                    'unit': 'milliseconds',
+                    'startValue': 0,
+                    'endValue': sum(profile['weights']),
+                    'samples': profile['samples'],
+                    'weights': profile['weights']
+                }
+                for thread_name, profile in sorted(by_thread.items())
+            ]
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'samples': self.samples,
+            'distinct_stacks': len(self.stacks),
+            'frames': len(self.frames),
+            'interval_ms': self.interval * 1000,
+            'duration_seconds': round(self.duration, 3)
+        }
+
+
+class SamplingProfiler:
+    """
+    Muestreador de pilas de todos los hilos (un perfilado a la vez)
+
+    Las etiquetas de frame se cachean por code object y las pilas se guardan
+    como tuplas de índices, así cada muestra solo camina frames y actualiza
+    un Counter.
+    """
+
+    def __init__(self, interval_ms: Optional[float] = None, max_depth: Optional[int] = None):
+        self.interval = (interval_ms or Config.PROFILER_INTERVAL_MS) / 1000
+        self.max_depth = max_depth or Config.PROFILER_MAX_DEPTH
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def profile(self, seconds: float) -> ProfileResult:
+        """Muestrea durante `seconds` (bloquea al llamador: usar desde un hilo)"""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError("Ya hay un perfilado en curso")
+        try:
+            return self._sample(min(seconds, Config.PROFILER_MAX_SECONDS))
+        finally:
+            self._lock.release()
+
+    def _sample(self, seconds: float) -> ProfileResult:
+        result = ProfileResult(self.interval)
+        frame_index: Dict[Any, int] = {}
+        thread_names: Dict[int, str] = {}
+        own_ident = threading.get_ident()
+        max_depth = self.max_depth
+
+        def frame_id(code) -> int:
+            index = frame_index.get(code)
+            if index is None:
+                path = code.co_filename
+                if path.startswith(_APP_ROOT):
+                    path = 'app' + path[len(_APP_ROOT):]
+                index = len(result.frames)
+                result.frames.append((code.co_name, path, code.co_firstlineno))
+                frame_index[code] = index
+            return index
+
+        start = time.perf_counter()
+        deadline = start + seconds
+        next_sample = start
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            current = sys._current_frames()
+            for ident, frame in current.items():
+                if ident == own_ident:
+                    continue
+                name = thread_names.get(ident)
+                if name is None:
+                    thread_names.update((t.ident, t.name) for t in threading.enumerate())
+                    name = thread_names.setdefault(ident, f"thread-{ident}")
+                stack = []
+                depth = 0
+                while frame is not None and depth < max_depth:
+                    stack.append(frame_id(frame.f_code))
+                    frame = frame.f_back
+                    depth += 1
+                stack.reverse()
+                result.stacks[(name, tuple(stack))] += 1
+            # No retener frames (y sus locals) entre muestras
+            current = frame = None
+            result.samples += 1
+
+            # Intervalo fijo sin deriva; si el muestreo se atrasa se saltea en vez de ráfagas
+            next_sample += self.interval
+            after = time.perf_counter()
+            if next_sample < after:
+                next_sample = after + self.interval
+            time.sleep(max(0.0, min(next_sample, deadline) - after))
+
+        result.duration = time.perf_counter() - start
+        return result
+
+
+_profiler: Optional[SamplingProfiler] = None
+_profiler_lock = threading.Lock()
+
+
+def get_profiler() -> SamplingProfiler:
+    """Profiler compartido del proceso (garantiza un único perfilado a la vez)"""
+    global _profiler
+    if _profiler is None:
+        with _profiler_lock:
+            if _profiler is None:
+                _profiler = SamplingProfiler()
+    return _profiler
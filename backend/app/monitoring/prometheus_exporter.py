@@ -5,7 +5,7 @@ Prometheus exporter helper para exponer métricas reales desde la app
 """
 from prometheus_client import Counter, Histogram, Gauge, generate_latest, CONTENT_TYPE_LATEST
 from prometheus_client import CollectorRegistry
-from typing import Optional
+from typing import Dict, Iterable, List, Optional
 
 registry = CollectorRegistry()
 
@@ -13,6 +13,15 @@ REQUEST_COUNTER = Counter('portfolio_requests_total', 'Total requests', ['endpoi
 RESPONSE_TIME = Histogram('portfolio_response_duration_seconds', 'Response time seconds', ['endpoint'], registry=registry)
 CACHE_HITS = Counter('portfolio_cache_hits_total', 'Cache hits', ['endpoint'], registry=registry)
 ERROR_COUNTER = Counter('portfolio_errors_total', 'Total errors', ['endpoint', 'type'], registry=registry)
+# Latencias por etapa del flujo híbrido (flow_metadata['processing_time']) y del total;
+# buckets desde 0.5 ms (rate limiting, FAQ) hasta 30 s (generación RAG)
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+STAGE_LATENCY = Histogram('portfolio_flow_stage_duration_seconds', 'Hybrid flow stage duration seconds', ['stage'],
+                          buckets=STAGE_BUCKETS, registry=registry)
+FLOW_PATH_COUNTER = Counter('portfolio_flow_path_total', 'Hybrid flow path steps taken', ['path'], registry=registry)
+RATE_LIMIT_TRACKED_CLIENTS = Gauge('portfolio_rate_limit_tracked_clients', 'Clients tracked by the in-memory rate limiter', registry=registry)
+RATE_LIMIT_MEMORY_BYTES = Gauge('portfolio_rate_limit_memory_bytes', 'Estimated memory used by the in-memory rate limiter', registry=registry)
+RATE_LIMIT_FAIL_OPEN = Counter('portfolio_rate_limit_fail_open_total', 'Requests allowed because the rate limit store failed', ['backend'], registry=registry)
 
 
 def get_metrics():
@@ -33,3 +42,80 @@ def inc_cache_hit(endpoint: str):
 
 def inc_error(endpoint: str, err_type: str = 'internal'):
     ERROR_COUNTER.labels(endpoint=endpoint, type=err_type).inc()
+
+
+def set_rate_limit_gauges(tracked_clients: int, memory_bytes: int):
+    RATE_LIMIT_TRACKED_CLIENTS.set(tracked_clients)
+    RATE_LIMIT_MEMORY_BYTES.set(memory_bytes)
+
+
+def inc_rate_limit_fail_open(backend: str):
+    RATE_LIMIT_FAIL_OPEN.labels(backend=backend).inc()
+
+
+def observe_flow(processing_time: Dict[str, float], flow_path: Iterable[str], total_seconds: Optional[float] = None):
+    """Registra las latencias por etapa y el camino recorrido por una request"""
+    for stage, seconds in processing_time.items():
+        STAGE_LATENCY.labels(stage=stage).observe(seconds)
+    if total_seconds is not None:
+        STAGE_LATENCY.labels(stage='total').observe(total_seconds)
+    for path in flow_path:
+        FLOW_PATH_COUNTER.labels(path=path).inc()
+
+
+def histogram_quantile(quantile: float, buckets: List[tuple], count: float) -> Optional[float]:
+    """
+    Cuantil estimado a partir de buckets acumulados [(le, count)], con
+    interpolación lineal dentro del bucket (como histogram_quantile de PromQL)
+    """
+    if count <= 0:
+        return None
+    rank = quantile * count
+    lower_bound, lower_count = 0.0, 0.0
+    for upper_bound, cumulative in buckets:
+        if cumulative >= rank:
+            if upper_bound == float('inf'):
+                # Por encima del último bucket finito no hay más resolución
+                return lower_bound
+            if cumulative == lower_count:
+                return upper_bound
+            return lower_bound + (upper_bound - lower_bound) * (rank - lower_count) / (cumulative - lower_count)
+        lower_bound, lower_count = upper_bound, cumulative
+    return lower_bound
+
+
+def stage_latency_summary(quantiles: Iterable[float] = (0.5, 0.95, 0.99)) -> Dict[str, Dict[str, float]]:
+    """Count, promedio y cuantiles (segundos) por etapa desde el histograma en vivo"""
+    stages: Dict[str, Dict[str, object]] = {}
+    for family in STAGE_LATENCY.collect():
+        for sample in family.samples:
+            stage = stages.setdefault(sample.labels['stage'], {'buckets': [], 'count': 0.0, 'sum': 0.0})
+            if sample.name.endswith('_bucket'):
+                stage['buckets'].append((float(sample.labels['le']), sample.value))
+            elif sample.name.endswith('_count'):
+                stage['count'] = sample.value
+            elif sample.name.endswith('_sum'):
+                stage['sum'] = sample.value
+
+    summary = {}
+    for name, stage in stages.items():
+        count = stage['count']
+        if not count:
+            continue
+        buckets = sorted(stage['buckets'])
+        summary[name] = {
+            'count': int(count),
+            'avg': stage['sum'] / count,
+            **{f"p{int(q * 100)}": histogram_quantile(q, buckets, count) for q in quantiles}
+        }
+    return summary
+
+
+def flow_path_counts() -> Dict[str, int]:
+    """Veces que se recorrió cada paso de flow_path"""
+    counts = {}
+    for family in FLOW_PATH_COUNTER.collect():
+        for sample in family.samples:
+            if sample.name.endswith('_total'):
+                counts[sample.labels['path']] = int(sample.value)
+    return counts
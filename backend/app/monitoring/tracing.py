@@ -0,0 +1,386 @@
+"""
+Trazas por request para el flujo híbrido
+
+Cada request abre un span raíz (TracingMiddleware o, fuera de HTTP, el propio
+orquestador) y las etapas del flujo y los proveedores abren spans hijos. El
+span activo viaja en un ContextVar, así que se propaga solo a través de await
+y de asyncio.to_thread. Al cerrarse el span raíz la traza completa entra en un
+ring buffer en memoria y en el top de las más lentas; si hay exportadores, se
+encola para ellos. Las trazas exportadas siguen el formato OTLP/JSON.
+"""
+
+import atexit
+import json
+import heapq
+import random
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+from ..config.settings import Config
+
+logger = logging.getLogger(__name__)
+
+_current_span: ContextVar[Optional['Span']] = ContextVar('current_span', default=None)
+
+# Valores OTLP de SpanKind y StatusCode
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+
+class Span:
+    """Operación con nombre, duración y atributos dentro de una traza"""
+
+    __slots__ = ('tracer', 'trace_id', 'span_id', 'parent_id', 'name', 'kind', 'attributes',
+                 'start_ns', 'end_ns', 'status', 'spans', '_token')
+
+    def __init__(self, tracer: 'Tracer', name: str, parent: Optional['Span'], kind: int,
+                 attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.span_id = f"{random.getrandbits(64):016x}"
+        if parent is None:
+            self.trace_id = f"{random.getrandbits(128):032x}"
+            self.parent_id = None
+            # Spans de la traza, en orden de apertura (lista compartida con los hijos)
+            self.spans: List['Span'] = []
+        else:
+            self.trace_id = parent.trace_id
+            self.parent_id = parent.span_id
+            self.spans = parent.spans
+        self.spans.append(self)
+        self.status = STATUS_OK
+        self.end_ns: Optional[int] = None
+        self._token = None
+        self.start_ns = time.time_ns()
+
+    @property
+    def is_root(self) -> bool:
+        return self.parent_id is None
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        if self.end_ns is None:
+            return None
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def record_error(self, error: BaseException) -> None:
+        self.status = STATUS_ERROR
+        self.attributes['error.type'] = type(error).__name__
+        self.attributes['error.message'] = str(error)[:200]
+
+    def end(self) -> None:
+        """Cierra el span y restaura como activo a su padre"""
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if self._token is not None:
+            try:
+                _current_span.reset(self._token)
+            except ValueError:
+                # Cerrado desde otro contexto (p.ej. un generador async finalizado por el GC)
+                pass
+            self._token = None
+        if self.is_root:
+            self.tracer._finish(self)
+
+    def to_dict(self, root_start_ns: Optional[int] = None) -> Dict[str, Any]:
+        offset = (self.start_ns - root_start_ns) / 1e6 if root_start_ns is not None else 0.0
+        duration = self.duration_ms
+        return {
+            'name': self.name,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'start_offset_ms': round(offset, 3),
+            'duration_ms': round(duration, 3) if duration is not None else None,
+            'status': 'error' if self.status == STATUS_ERROR else 'ok',
+            'attributes': dict(self.attributes)
+        }
+
+
+class _NoopSpan:
+    """Span que no registra nada (tracing deshabilitado)"""
+
+    trace_id = None
+    span_id = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_attributes(self, **attributes) -> None:
+        pass
+
+    def record_error(self, error: BaseException) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        # OTLP/JSON serializa los int64 como string
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    if isinstance(value, (list, tuple)):
+        return {'arrayValue': {'values': [_otlp_value(item) for item in value]}}
+    return {'stringValue': str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{'key': key, 'value': _otlp_value(value)} for key, value in attributes.items()]
+
+
+def to_otlp_json(spans: List[Span], service_name: str) -> Dict[str, Any]:
+    """Traza en el formato ExportTraceServiceRequest de OTLP/JSON"""
+    return {
+        'resourceSpans': [{
+            'resource': {'attributes': _otlp_attributes({'service.name': service_name})},
+            'scopeSpans': [{
+                'scope': {'name': __name__},
+                'spans': [
+                    {
+                        'traceId': span.trace_id,
+                        'spanId': span.span_id,
+                        'parentSpanId': span.parent_id or '',
+                        'name': span.name,
+                        'kind': span.kind,
+                        'startTimeUnixNano': str(span.start_ns),
+                        'endTimeUnixNano': str(span.end_ns if span.end_ns is not None else span.start_ns),
+                        'attributes': _otlp_attributes(span.attributes),
+                        'status': {'code': span.status}
+                    }
+                    for span in spans
+                ]
+            }]
+        }]
+    }
+
+
+class OTLPFileExporter:
+    """
+    Exportador a archivo JSON Lines: una línea OTLP/JSON por traza
+
+    export() solo encola la traza; la serialización y la escritura ocurren en
+    flush(), que invoca un hilo en segundo plano cada `interval` segundos
+    (o directamente quien lo necesite, p.ej. los tests).
+    """
+
+    def __init__(self, path: str, service_name: Optional[str] = None,
+                 interval: Optional[float] = None, max_pending: int = 10000):
+        self.path = path
+        self.service_name = service_name or Config.TRACE_SERVICE_NAME
+        self.interval = interval or Config.TRACE_EXPORT_INTERVAL
+        self._pending: Deque[List[Span]] = deque(maxlen=max_pending)
+        self._write_lock = threading.Lock()
+        self.exported = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def export(self, spans: List[Span]) -> None:
+        self._pending.append(spans)
+
+    def flush(self) -> int:
+        """Escribe las trazas pendientes; devuelve cuántas se escribieron"""
+        lines = []
+        while self._pending:
+            try:
+                spans = self._pending.popleft()
+            except IndexError:
+                break
+            lines.append(json.dumps(to_otlp_json(spans, self.service_name), separators=(',', ':')))
+        if not lines:
+            return 0
+        with self._write_lock:
+            with open(self.path, 'a', encoding='utf-8') as handle:
+                handle.write("\n".join(lines) + "\n")
+            self.exported += len(lines)
+        return len(lines)
+
+    def start(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"Error exportando trazas: {e}")
+
+
+class Tracer:
+    """
+    Crea spans y guarda las trazas terminadas
+
+    recent() lee el ring buffer de las últimas `buffer_size` trazas; slowest()
+    el top de las `slowest_size` más lentas desde el arranque (min-heap: una
+    traza más rápida que la última del top no toma el lock de escritura).
+    """
+
+    def __init__(self, enabled: Optional[bool] = None, buffer_size: Optional[int] = None,
+                 slowest_size: Optional[int] = None, exporters: Optional[List[OTLPFileExporter]] = None):
+        self.enabled = Config.TRACING_ENABLED if enabled is None else enabled
+        self.traces: Deque[Span] = deque(maxlen=buffer_size or Config.TRACE_BUFFER_SIZE)
+        self.slowest_size = slowest_size or Config.TRACE_SLOWEST_SIZE
+        self._slowest: List[Tuple[int, str, Span]] = []
+        self._slowest_lock = threading.Lock()
+        self.exporters = list(exporters or [])
+        self.finished = 0
+
+    def start_span(self, name: str, kind: int = SPAN_KIND_INTERNAL, **attributes) -> Span:
+        """
+        Abre un span hijo del activo (o raíz de una traza nueva) y lo activa
+        Hay que cerrarlo con end(); para bloques usar span()
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+        span = Span(self, name, _current_span.get(), kind, attributes)
+        span._token = _current_span.set(span)
+        return span
+
+    @contextmanager
+    def span(self, name: str, kind: int = SPAN_KIND_INTERNAL, **attributes) -> Iterator[Span]:
+        span = self.start_span(name, kind, **attributes)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_error(e)
+            raise
+        finally:
+            span.end()
+
+    def _finish(self, root: Span) -> None:
+        self.finished += 1
+        self.traces.append(root)
+        duration = root.end_ns - root.start_ns
+        slowest = self._slowest
+        if len(slowest) < self.slowest_size or duration > slowest[0][0]:
+            with self._slowest_lock:
+                entry = (duration, root.trace_id, root)
+                if len(slowest) < self.slowest_size:
+                    heapq.heappush(slowest, entry)
+                elif duration > slowest[0][0]:
+                    heapq.heapreplace(slowest, entry)
+        for exporter in self.exporters:
+            try:
+                exporter.export(root.spans)
+            except Exception as e:
+                logger.debug(f"No se pudo encolar la traza para exportar: {e}")
+
+    @staticmethod
+    def summarize(root: Span) -> Dict[str, Any]:
+        return {
+            'trace_id': root.trace_id,
+            'name': root.name,
+            'start': root.start_ns / 1e9,
+            'duration_ms': round(root.duration_ms, 3),
+            'span_count': len(root.spans),
+            'status': 'error' if any(span.status == STATUS_ERROR for span in root.spans) else 'ok',
+            'attributes': dict(root.attributes)
+        }
+
+    @staticmethod
+    def describe(root: Span) -> Dict[str, Any]:
+        trace = Tracer.summarize(root)
+        trace['spans'] = [span.to_dict(root.start_ns) for span in list(root.spans)]
+        return trace
+
+    def recent(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Resumen de las últimas trazas, de la más nueva a la más vieja"""
+        traces = list(self.traces)[-limit:] if limit > 0 else []
+        return [self.summarize(root) for root in reversed(traces)]
+
+    def slowest(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Trazas más lentas con todos sus spans, de la más lenta a la más rápida"""
+        with self._slowest_lock:
+            entries = heapq.nlargest(limit, self._slowest)
+        return [self.describe(root) for _, _, root in entries]
+
+    def get_trace(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        for root in reversed(list(self.traces)):
+            if root.trace_id == trace_id:
+                return self.describe(root)
+        with self._slowest_lock:
+            for _, slow_id, root in self._slowest:
+                if slow_id == trace_id:
+                    return self.describe(root)
+        return None
+
+    def clear(self) -> None:
+        self.traces.clear()
+        with self._slowest_lock:
+            self._slowest = []
+        self.finished = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'finished_traces': self.finished,
+            'buffered_traces': len(self.traces),
+            'buffer_size': self.traces.maxlen,
+            'exported': sum(exporter.exported for exporter in self.exporters)
+        }
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """Tracer compartido del proceso; con TRACE_EXPORT_PATH arranca el exportador"""
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                exporters = []
+                if Config.TRACE_EXPORT_PATH:
+                    exporter = OTLPFileExporter(Config.TRACE_EXPORT_PATH)
+                    exporter.start()
+                    atexit.register(exporter.stop)
+                    exporters.append(exporter)
+                _tracer = Tracer(exporters=exporters)
+    return _tracer
+
+
+def start_span(name: str, kind: int = SPAN_KIND_INTERNAL, **attributes) -> Span:
+    """Abre y activa un span en el tracer compartido (cerrar con end())"""
+    return get_tracer().start_span(name, kind, **attributes)
+
+
+def trace_span(name: str, kind: int = SPAN_KIND_INTERNAL, **attributes):
+    """Context manager de un span en el tracer compartido"""
+    return get_tracer().span(name, kind, **attributes)
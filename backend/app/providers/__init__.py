@@ -1,6 +1,9 @@
 from .gemini_provider import GeminiLLMProvider, GeminiEmbeddingProvider
 from .memory_providers import InMemoryVectorStore, InMemoryCacheProvider
 from .document_processor import FileSystemDocumentProcessor
+from .semantic_cache import SemanticResponseCache
+from .embedding_cache import PersistentEmbeddingCache, CachedEmbeddingProvider
+from .rate_limit_store import InMemoryRateLimitStore, SQLiteRateLimitStore, RedisRateLimitStore
 
 # Importar ChromaDB si está disponible
 try:
@@ -11,7 +14,13 @@ try:
         'InMemoryVectorStore',
         'ChromaDBVectorStore',  # ✅ Exportar ChromaDB
         'InMemoryCacheProvider',
-        'FileSystemDocumentProcessor'
+        'FileSystemDocumentProcessor',
+        'SemanticResponseCache',
+        'PersistentEmbeddingCache',
+        'CachedEmbeddingProvider',
+        'InMemoryRateLimitStore',
+        'SQLiteRateLimitStore',
+        'RedisRateLimitStore'
     ]
 except ImportError:
     __all__ = [
@@ -19,5 +28,11 @@ except ImportError:
         'GeminiEmbeddingProvider',
         'InMemoryVectorStore',
         'InMemoryCacheProvider',
-        'FileSystemDocumentProcessor'
+        'FileSystemDocumentProcessor',
+        'SemanticResponseCache',
+        'PersistentEmbeddingCache',
+        'CachedEmbeddingProvider',
+        'InMemoryRateLimitStore',
+        'SQLiteRateLimitStore',
+        'RedisRateLimitStore'
     ]
@@ -0,0 +1,228 @@
+"""
+Políticas de desalojo para InMemoryCacheProvider
+Cada política decide qué clave desalojar cuando el cache está lleno y,
+opcionalmente, si una clave nueva merece entrar (admisión)
+"""
+
+import logging
+from abc import ABC, abstractmethod
+from collections import OrderedDict, defaultdict
+from typing import Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class EvictionPolicy(ABC):
+    """Interfaz para políticas de desalojo del cache"""
+
+    @abstractmethod
+    def record_insert(self, key: str):
+        """Registra una clave recién insertada"""
+        pass
+
+    @abstractmethod
+    def record_access(self, key: str):
+        """Registra un acceso (hit) a una clave existente"""
+        pass
+
+    @abstractmethod
+    def record_remove(self, key: str):
+        """Registra que una clave salió del cache"""
+        pass
+
+    @abstractmethod
+    def victims(self) -> Iterator[str]:
+        """Claves en orden de desalojo (sin modificar el estado)"""
+        pass
+
+    def select_victim(self) -> Optional[str]:
+        """Clave a desalojar"""
+        return next(self.victims(), None)
+
+    def record_miss(self, key: str):
+        """Registra un miss (solo relevante para políticas con historial)"""
+        pass
+
+    def admit(self, candidate: str, victim: str) -> bool:
+        """Decide si la clave candidata puede desplazar a la víctima"""
+        return True
+
+    def clear(self):
+        """Reinicia el estado de la política"""
+        pass
+
+
+class LRUEvictionPolicy(EvictionPolicy):
+    """Desaloja la clave usada hace más tiempo"""
+
+    def __init__(self):
+        self._order: OrderedDict = OrderedDict()
+
+    def record_insert(self, key: str):
+        self._order[key] = None
+        self._order.move_to_end(key)
+
+    def record_access(self, key: str):
+        if key in self._order:
+            self._order.move_to_end(key)
+
+    def record_remove(self, key: str):
+        self._order.pop(key, None)
+
+    def victims(self) -> Iterator[str]:
+        return iter(self._order)
+
+    def clear(self):
+        self._order.clear()
+
+
+class LFUEvictionPolicy(EvictionPolicy):
+    """Desaloja la clave menos usada (empates por antigüedad), en O(1)"""
+
+    def __init__(self):
+        self._freq: Dict[str, int] = {}
+        self._buckets: Dict[int, OrderedDict] = defaultdict(OrderedDict)
+        self._min_freq = 0
+
+    def record_insert(self, key: str):
+        if key in self._freq:
+            self.record_access(key)
+            return
+        self._freq[key] = 1
+        self._buckets[1][key] = None
+        self._min_freq = 1
+
+    def record_access(self, key: str):
+        freq = self._freq.get(key)
+        if freq is None:
+            return
+        bucket = self._buckets[freq]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[freq]
+            if self._min_freq == freq:
+                self._min_freq = freq + 1
+        self._freq[key] = freq + 1
+        self._buckets[freq + 1][key] = None
+
+    def record_remove(self, key: str):
+        freq = self._freq.pop(key, None)
+        if freq is None:
+            return
+        bucket = self._buckets[freq]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[freq]
+            if self._min_freq == freq:
+                self._min_freq = min(self._buckets) if self._buckets else 0
+
+    def select_victim(self) -> Optional[str]:
+        bucket = self._buckets.get(self._min_freq)
+        if not bucket:
+            return None
+        return next(iter(bucket))
+
+    def victims(self) -> Iterator[str]:
+        for freq in sorted(self._buckets):
+            yield from self._buckets[freq]
+
+    def clear(self):
+        self._freq.clear()
+        self._buckets.clear()
+        self._min_freq = 0
+
+
+_MASK64 = (1 << 64) - 1
+
+
+class FrequencySketch:
+    """
+    Count-Min Sketch con envejecimiento para estimar frecuencias de claves
+    Memoria constante independientemente del número de claves vistas
+    """
+
+    def __init__(self, width: int = 4096, depth: int = 4, sample_size: Optional[int] = None):
+        self.width = width
+        self.depth = depth
+        self.rows = [[0] * width for _ in range(depth)]
+        self._seeds = [((i + 1) * 0x9E3779B97F4A7C15) & _MASK64 for i in range(depth)]
+        self.sample_size = sample_size or width * 10
+        self.additions = 0
+
+    def _indexes(self, key: str):
+        # Un hash independiente por fila: el hash de la clave con la semilla de
+        # la fila pasa por el finalizador de MurmurHash3 (fmix64). Derivar las
+        # filas con XOR o con hash((fila, clave)) conserva la estructura del
+        # hash base y dos claves que chocan en una fila chocan en casi todas
+        key_hash = hash(key)
+        for i, seed in enumerate(self._seeds):
+            h = (key_hash ^ seed) & _MASK64
+            h = ((h ^ (h >> 33)) * 0xFF51AFD7ED558CCD) & _MASK64
+            h = ((h ^ (h >> 33)) * 0xC4CEB9FE1A85EC53) & _MASK64
+            yield i, (h ^ (h >> 33)) % self.width
+
+    def increment(self, key: str):
+        for row, index in self._indexes(key):
+            self.rows[row][index] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self._age()
+
+    def estimate(self, key: str) -> int:
+        return min(self.rows[row][index] for row, index in self._indexes(key))
+
+    def _age(self):
+        """Divide todos los contadores a la mitad para olvidar historial antiguo"""
+        for row in self.rows:
+            for i in range(self.width):
+                row[i] >>= 1
+        self.additions //= 2
+
+    def clear(self):
+        self.rows = [[0] * self.width for _ in range(self.depth)]
+        self.additions = 0
+
+
+class TinyLFUEvictionPolicy(LRUEvictionPolicy):
+    """
+    Desalojo LRU con admisión TinyLFU: una clave nueva solo entra si su
+    frecuencia estimada supera a la de la víctima
+    """
+
+    def __init__(self, sketch_width: int = 4096):
+        super().__init__()
+        self.sketch = FrequencySketch(width=sketch_width)
+
+    def record_insert(self, key: str):
+        self.sketch.increment(key)
+        super().record_insert(key)
+
+    def record_access(self, key: str):
+        self.sketch.increment(key)
+        super().record_access(key)
+
+    def record_miss(self, key: str):
+        self.sketch.increment(key)
+
+    def admit(self, candidate: str, victim: str) -> bool:
+        return self.sketch.estimate(candidate) > self.sketch.estimate(victim)
+
+    def clear(self):
+        super().clear()
+        self.sketch.clear()
+
+
+EVICTION_POLICIES = {
+    'lru': LRUEvictionPolicy,
+    'lfu': LFUEvictionPolicy,
+    'tinylfu': TinyLFUEvictionPolicy
+}
+
+
+def create_eviction_policy(name: str) -> EvictionPolicy:
+    """Crea una política de desalojo por nombre (lru por defecto)"""
+    policy_class = EVICTION_POLICIES.get((name or 'lru').lower())
+    if policy_class is None:
+        logger.warning(f"Política de desalojo desconocida '{name}', usando lru")
+        policy_class = LRUEvictionPolicy
+    return policy_class()
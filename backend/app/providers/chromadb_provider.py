@@ -1,9 +1,11 @@
 import chromadb
 import os
+import hashlib
 import logging
 from typing import List, Dict, Any, Optional
 from ..interfaces import IVectorStore
 from ..config.settings import Config
+from ..monitoring.tracing import trace_span
 
 logger = logging.getLogger(__name__)
 
@@ -42,6 +44,41 @@ class ChromaDBVectorStore(IVectorStore):
             self.chroma_client = None
             self.collection = None
     
+    @staticmethod
+    def _source_chunk_id(source: str, chunk_index: int) -> str:
+        """ID de un chunk: ruta completa del archivo fuente + posición del chunk"""
+        return f"src_{hashlib.sha1(source.encode('utf-8')).hexdigest()[:16]}_{chunk_index}"
+
+    def _document_id(self, doc: Dict, position: int) -> str:
+        """
+        ID estable de un documento (igual para add_documents y replace_source_documents)
+
+        Sin full_path en la metadata se usa el hash del contenido: el nombre de
+        archivo o la posición en el lote se repiten entre directorios y lotes.
+        """
+        metadata = doc.get('metadata', {})
+        source = metadata.get('full_path')
+        if source:
+            return self._source_chunk_id(source, metadata.get('chunk_index', position))
+        return f"doc_{hashlib.sha1(doc['content'].encode('utf-8')).hexdigest()[:16]}"
+
+    def _delete_legacy_ids(self, sources: List[str]) -> int:
+        """
+        Borra chunks de las fuentes dadas guardados con IDs anteriores a src_*
+
+        Versiones previas usaban doc_{posición}_{archivo}; sin borrarlos cada
+        chunk quedaría duplicado junto a su versión con ID estable.
+        """
+        if not sources:
+            return 0
+        where = {'full_path': sources[0]} if len(sources) == 1 else {'full_path': {'$in': sources}}
+        existing = self.collection.get(where=where, include=[])
+        legacy_ids = [doc_id for doc_id in existing.get('ids', []) if not doc_id.startswith('src_')]
+        if legacy_ids:
+            self.collection.delete(ids=legacy_ids)
+            logger.info(f"Eliminados {len(legacy_ids)} chunks con IDs antiguos de ChromaDB")
+        return len(legacy_ids)
+
     def add_documents(self, documents: List[Dict], embeddings: List[List[float]]) -> bool:
         """Agrega documentos con embeddings a ChromaDB"""
         try:
@@ -53,35 +90,28 @@ class ChromaDBVectorStore(IVectorStore):
                 logger.error("Cantidad de documentos y embeddings no coincide")
                 return False
 
-            # Preparar datos para ChromaDB
-            texts = []
-            ids = []
-            metadatas = []
-            chroma_embeddings = []
-
+            # Preparar datos para ChromaDB (por ID: un chunk repetido queda una sola vez)
+            entries = {}
             for i, (doc, embedding) in enumerate(zip(documents, embeddings)):
                 if not embedding:  # Skip documentos sin embedding
                     continue
 
-                # Generar ID único
-                doc_id = f"doc_{i}_{doc.get('metadata', {}).get('filename', 'unknown')}"
-
-                texts.append(doc['content'])
-                ids.append(doc_id)
-                metadatas.append(doc.get('metadata', {}))
-                chroma_embeddings.append(embedding)
+                metadata = doc.get('metadata', {})
+                entries[self._document_id(doc, i)] = (doc['content'], metadata, embedding)
 
-            if not chroma_embeddings:
+            if not entries:
                 logger.warning("No hay embeddings válidos para agregar")
                 return False
 
-            # Agregar a ChromaDB
-            self.collection.add(
-                documents=texts,
-                embeddings=chroma_embeddings,
-                ids=ids,
-                metadatas=metadatas
+            # Upsert: re-ingestar un archivo sobrescribe sus chunks en vez de fallar o duplicarlos
+            self.collection.upsert(
+                documents=[text for text, _, _ in entries.values()],
+                embeddings=[embedding for _, _, embedding in entries.values()],
+                ids=list(entries),
+                metadatas=[metadata for _, metadata, _ in entries.values()]
             )
+            self._delete_legacy_ids(sorted({metadata['full_path'] for _, metadata, _ in entries.values()
+                                             if metadata.get('full_path')}))
 
             # Instrumentación: intentar incrementar contador de requests/ops
             try:
@@ -91,7 +121,7 @@ class ChromaDBVectorStore(IVectorStore):
             except Exception:
                 pass
 
-            logger.info(f"Agregados {len(chroma_embeddings)} documentos a ChromaDB")
+            logger.info(f"Agregados {len(entries)} documentos a ChromaDB")
             return True
 
         except Exception as e:
@@ -117,10 +147,12 @@ class ChromaDBVectorStore(IVectorStore):
                 return []
             
             # Buscar en ChromaDB
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=min(k, 10)  # Limitar máximo a 10
-            )
+            with trace_span('chromadb.query', n_results=min(k, 10)) as span:
+                results = self.collection.query(
+                    query_embeddings=[query_embedding],
+                    n_results=min(k, 10)  # Limitar máximo a 10
+                )
+                span.set_attribute('chunks', len(results['documents'][0]) if results.get('documents') else 0)
             
             # Formatear resultados
             similar_docs = []
@@ -141,6 +173,44 @@ class ChromaDBVectorStore(IVectorStore):
             logger.error(f"Error buscando en ChromaDB: {e}")
             return []
     
+    def replace_source_documents(self, source: str, documents: List[Dict], embeddings: List[List[float]]) -> bool:
+        """Sustituye los chunks de un archivo fuente (upsert + borrado de sobrantes)"""
+        try:
+            if not self._available or not self.collection:
+                logger.error("ChromaDB no disponible")
+                return False
+            
+            if len(documents) != len(embeddings):
+                logger.error("Cantidad de documentos y embeddings no coincide")
+                return False
+            
+            # Mismos IDs que add_documents: un chunk sin cambios se sobrescribe en su sitio
+            entries = {}
+            for i, (doc, emb) in enumerate(zip(documents, embeddings)):
+                if emb:
+                    entries[self._document_id(doc, i)] = (doc['content'], doc.get('metadata', {}), emb)
+            
+            if entries:
+                self.collection.upsert(
+                    ids=list(entries),
+                    documents=[text for text, _, _ in entries.values()],
+                    embeddings=[emb for _, _, emb in entries.values()],
+                    metadatas=[metadata for _, metadata, _ in entries.values()]
+                )
+            
+            # Borrar chunks antiguos de la fuente que ya no existen (incluye IDs doc_* previos)
+            existing = self.collection.get(where={'full_path': source}, include=[])
+            stale_ids = [doc_id for doc_id in existing.get('ids', []) if doc_id not in entries]
+            if stale_ids:
+                self.collection.delete(ids=stale_ids)
+            
+            logger.info(f"Fuente {source} actualizada en ChromaDB: {len(entries)} chunks, {len(stale_ids)} eliminados")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error actualizando fuente {source} en ChromaDB: {e}")
+            return False
+    
     def get_stats(self) -> Dict[str, Any]:
         """Obtiene estadísticas de ChromaDB"""
         try:
@@ -1,14 +1,35 @@
 import os
+import json
+import hashlib
 import logging
-from typing import List, Dict, Any
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
 from pathlib import Path
-import PyPDF2
-import docx
 from ..interfaces import IDocumentProcessor
 from ..config.settings import Config
+from ..utils import document_parsing
 
 logger = logging.getLogger(__name__)
 
+
+def _pool_context():
+    """
+    Contexto de multiprocessing para el pool de parseo
+
+    El proceso del servidor tiene hilos (sampler, tracing, event loop) y un
+    fork copiaría locks tomados por ellos; forkserver (o spawn donde no
+    existe) arranca los workers desde un proceso limpio. El forkserver
+    precarga solo el módulo de parseo en vez de __main__ (la app completa).
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload([document_parsing.__name__])
+        return context
+    return multiprocessing.get_context('spawn')
+
+
 class FileSystemDocumentProcessor(IDocumentProcessor):
     """Procesador de documentos desde sistema de archivos"""
     
@@ -23,6 +44,8 @@ class FileSystemDocumentProcessor(IDocumentProcessor):
             self.documents_dir
         ]
         
+        self.manifest_path = Config.DOCUMENT_MANIFEST_PATH
+        
         logger.info(f"DocumentProcessor inicializado: {len(self.base_dirs)} directorios")
     
     def load_documents(self) -> List[Dict[str, Any]]:
@@ -30,10 +53,8 @@ class FileSystemDocumentProcessor(IDocumentProcessor):
         all_documents = []
         
         try:
-            for base_dir in self.base_dirs:
-                if os.path.exists(base_dir):
-                    documents = self._load_from_directory(base_dir)
-                    all_documents.extend(documents)
+            for _, documents in self.iter_documents():
+                all_documents.extend(documents)
             
             logger.info(f"Cargados {len(all_documents)} documentos total")
             
@@ -42,6 +63,128 @@ class FileSystemDocumentProcessor(IDocumentProcessor):
         
         return all_documents
     
+    def iter_documents(self, paths: Optional[List[str]] = None,
+                       workers: Optional[int] = None) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+        """
+        Parsea archivos y emite (ruta, chunks) a medida que terminan
+        
+        Con más de un worker el parseo (PyPDF2, docx, troceado) se reparte en un
+        ProcessPoolExecutor. Los resultados salen siempre en el orden de los
+        archivos, y solo hay un número acotado de archivos en vuelo para no
+        acumular resultados si el consumidor es más lento.
+        
+        Args:
+            paths: Archivos a procesar (por defecto, todos los de los directorios base)
+            workers: Número de procesos (por defecto Config.DOCUMENT_PARSE_WORKERS)
+        """
+        if paths is None:
+            paths = [str(file_path) for file_path in self._iter_source_files()]
+        workers = Config.DOCUMENT_PARSE_WORKERS if workers is None else workers
+        
+        if workers <= 1 or len(paths) <= 1:
+            for path in paths:
+                yield path, self._process_file(Path(path))
+            return
+        
+        pending_paths = deque(paths)
+        in_flight = deque()
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context()) as executor:
+                while pending_paths or in_flight:
+                    while pending_paths and len(in_flight) < workers * 2:
+                        path = pending_paths.popleft()
+                        in_flight.append((path, executor.submit(
+                            document_parsing.parse_file, path, Config.CHUNK_SIZE, Config.CHUNK_OVERLAP
+                        )))
+                    path, future = in_flight[0]
+                    documents = future.result()
+                    in_flight.popleft()
+                    yield path, documents
+        except Exception as e:
+            # Sin soporte de multiprocessing (o pool roto): continuar en serie
+            remaining = [path for path, _ in in_flight] + list(pending_paths)
+            logger.warning(f"Parseo paralelo no disponible ({e}), procesando {len(remaining)} archivos en serie")
+            for path in remaining:
+                yield path, self._process_file(Path(path))
+    
+    def scan_changes(self) -> Dict[str, Any]:
+        """
+        Compara los archivos actuales con el manifest guardado
+        
+        Un archivo se considera sin cambios si coinciden mtime y tamaño; si no,
+        se compara el hash del contenido (un touch no provoca re-ingesta).
+        
+        Returns:
+            Dict con 'changed' (rutas nuevas o modificadas), 'removed' (rutas que
+            ya no existen), 'unchanged' (conteo) y 'manifest' (estado nuevo, que
+            se persiste con save_manifest una vez aplicados los cambios)
+        """
+        previous = self.load_manifest()
+        manifest = {}
+        changed = []
+        unchanged = 0
+        
+        for file_path in self._iter_source_files():
+            path = str(file_path)
+            stat = file_path.stat()
+            entry = previous.get(path)
+            
+            if entry and entry['mtime'] == stat.st_mtime and entry['size'] == stat.st_size:
+                manifest[path] = entry
+                unchanged += 1
+                continue
+            
+            content_hash = self._hash_file(file_path)
+            manifest[path] = {'mtime': stat.st_mtime, 'size': stat.st_size, 'sha256': content_hash}
+            if entry and entry['sha256'] == content_hash:
+                unchanged += 1
+            else:
+                changed.append(path)
+        
+        removed = [path for path in previous if path not in manifest]
+        return {
+            'changed': changed,
+            'removed': removed,
+            'unchanged': unchanged,
+            'manifest': manifest
+        }
+    
+    def snapshot_manifest(self) -> Dict[str, Any]:
+        """Manifest del estado actual de todos los archivos (tras una carga completa)"""
+        manifest = {}
+        for file_path in self._iter_source_files():
+            stat = file_path.stat()
+            manifest[str(file_path)] = {
+                'mtime': stat.st_mtime,
+                'size': stat.st_size,
+                'sha256': self._hash_file(file_path)
+            }
+        return manifest
+    
+    def load_manifest(self) -> Dict[str, Any]:
+        """Lee el manifest persistido (vacío si no existe o está corrupto)"""
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"Manifest de documentos ilegible, se reconstruirá: {e}")
+            return {}
+    
+    def save_manifest(self, manifest: Dict[str, Any]) -> bool:
+        """Persiste el manifest de forma atómica"""
+        try:
+            os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+            tmp_path = f"{self.manifest_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump(manifest, file)
+            os.replace(tmp_path, self.manifest_path)
+            return True
+        except Exception as e:
+            logger.error(f"Error guardando manifest de documentos: {e}")
+            return False
+    
     def get_supported_formats(self) -> List[str]:
         """Formatos soportados"""
         return self.supported_formats.copy()
@@ -105,131 +248,50 @@ class FileSystemDocumentProcessor(IDocumentProcessor):
             logger.error(f"Error obteniendo info: {e}")
             return {'error': str(e)}
     
-    def _load_from_directory(self, directory: str) -> List[Dict[str, Any]]:
-        """Carga desde directorio específico"""
-        documents = []
-        
-        try:
-            for file_path in Path(directory).rglob('*'):
+    def _iter_source_files(self):
+        """Archivos soportados de todos los directorios base, sin duplicados"""
+        seen = set()
+        for base_dir in self.base_dirs:
+            if not os.path.exists(base_dir):
+                continue
+            for file_path in sorted(Path(base_dir).rglob('*')):
                 if file_path.is_file() and file_path.suffix.lower() in self.supported_formats:
-                    docs = self._process_file(file_path)
-                    if docs:
-                        documents.extend(docs if isinstance(docs, list) else [docs])
-            
-            logger.info(f"Cargados {len(documents)} desde {directory}")
-            
-        except Exception as e:
-            logger.error(f"Error en directorio {directory}: {e}")
-        
-        return documents
-    
-    def _process_file(self, file_path: Path) -> List[Dict[str, Any]]:
-        """Procesa archivo individual"""
-        try:
-            content = ""
-            file_extension = file_path.suffix.lower()
-            
-            if file_extension == '.pdf':
-                content = self._read_pdf(file_path)
-            elif file_extension == '.docx':
-                content = self._read_docx(file_path)
-            elif file_extension in ['.txt', '.md']:
-                content = self._read_text(file_path)
-            
-            if not content:
-                return []
-            
-            chunks = self._split_content(content)
-            documents = []
-            
-            for i, chunk in enumerate(chunks):
-                doc = {
-                    'content': chunk,
-                    'metadata': {
-                        'filename': file_path.name,
-                        'file_type': file_extension,
-                        'chunk_index': i,
-                        'total_chunks': len(chunks),
-                        'directory': file_path.parent.name,
-                        'full_path': str(file_path)
-                    }
-                }
-                documents.append(doc)
-            
-            return documents
-                
-        except Exception as e:
-            logger.error(f"Error procesando {file_path}: {e}")
-            return []
-    
-    def _read_pdf(self, file_path: Path) -> str:
-        """Lee PDF"""
-        try:
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                content = ""
-                for page in pdf_reader.pages:
-                    content += page.extract_text() + "\n"
-                return content.strip()
-        except Exception as e:
-            logger.error(f"Error leyendo PDF {file_path}: {e}")
-            return ""
+                    path = str(file_path)
+                    if path not in seen:
+                        seen.add(path)
+                        yield file_path
     
-    def _read_docx(self, file_path: Path) -> str:
-        """Lee DOCX"""
-        try:
-            doc = docx.Document(file_path)
-            content = ""
-            for paragraph in doc.paragraphs:
-                content += paragraph.text + "\n"
-            return content.strip()
-        except Exception as e:
-            logger.error(f"Error leyendo DOCX {file_path}: {e}")
-            return ""
+    @staticmethod
+    def _hash_file(file_path: Path) -> str:
+        """SHA-256 del contenido del archivo"""
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as file:
+            for block in iter(lambda: file.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
     
-    def _read_text(self, file_path: Path) -> str:
-        """Lee texto"""
-        try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                return file.read().strip()
-        except UnicodeDecodeError:
-            try:
-                with open(file_path, 'r', encoding='latin-1') as file:
-                    return file.read().strip()
-            except Exception as e:
-                logger.error(f"Error leyendo texto {file_path}: {e}")
-                return ""
-        except Exception as e:
-            logger.error(f"Error leyendo texto {file_path}: {e}")
-            return ""
+    def _process_file(self, file_path: Path, chunk_size: Optional[int] = None,
+                      chunk_overlap: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Procesa archivo individual"""
+        return document_parsing.parse_file(
+            str(file_path),
+            Config.CHUNK_SIZE if chunk_size is None else chunk_size,
+            Config.CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap
+        )
     
-    def _split_content(self, content: str) -> List[str]:
+    def _split_content(self, content: str, chunk_size: Optional[int] = None,
+                       chunk_overlap: Optional[int] = None) -> List[str]:
         """Divide en chunks"""
-        if len(content) <= Config.CHUNK_SIZE:
-            return [content]
-        
-        chunks = []
-        start = 0
-        
-        while start < len(content):
-            end = start + Config.CHUNK_SIZE
-            
-            if end < len(content):
-                last_space = content.rfind(' ', start, end)
-                last_newline = content.rfind('\n', start, end)
-                last_period = content.rfind('.', start, end)
-                
-                cut_point = max(last_space, last_newline, last_period)
-                if cut_point > start:
-                    end = cut_point + (1 if content[cut_point] == '.' else 0)
-            
-            chunk = content[start:end].strip()
-            if chunk:
-                chunks.append(chunk)
-            
-            start = end - Config.CHUNK_OVERLAP if end < len(content) else end
-        
-        return chunks
+        return list(self._iter_chunks([content], chunk_size, chunk_overlap))
+    
+    def _iter_chunks(self, parts: Iterable[str], chunk_size: Optional[int] = None,
+                     chunk_overlap: Optional[int] = None) -> Iterator[str]:
+        """Trocea texto que llega por partes (ver document_parsing.iter_chunks)"""
+        return document_parsing.iter_chunks(
+            parts,
+            Config.CHUNK_SIZE if chunk_size is None else chunk_size,
+            Config.CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap
+        )
     
     def _analyze_directory(self, directory: str) -> Dict[str, Any]:
         """Analiza directorio"""
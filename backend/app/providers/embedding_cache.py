@@ -0,0 +1,164 @@
+"""
+Cache persistente de embeddings direccionado por contenido
+Evita re-embeber chunks sin cambios entre reinicios y entre workers
+"""
+
+import os
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+import numpy as np
+from typing import List, Dict, Any, Optional
+from ..interfaces import IEmbeddingProvider
+from ..config.settings import Config
+
+logger = logging.getLogger(__name__)
+
+# Límite conservador de parámetros por consulta en SQLite
+_SQLITE_MAX_PARAMS = 500
+
+
+class PersistentEmbeddingCache:
+    """
+    Almacén SQLite de embeddings indexado por hash(modelo + texto)
+
+    Los vectores se guardan como blobs float32. La base usa WAL para que varios
+    workers puedan leer mientras otro escribe.
+    """
+
+    def __init__(self, path: Optional[str] = None, model: Optional[str] = None):
+        self.path = path or Config.EMBEDDING_CACHE_PATH
+        self.model = model or Config.EMBEDDING_MODEL
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT NOT NULL,"
+            " dimension INTEGER NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        logger.info(f"PersistentEmbeddingCache inicializado en {self.path}")
+
+    def make_key(self, text: str) -> str:
+        """Clave de contenido: el modelo forma parte del hash"""
+        return hashlib.sha256(f"{self.model}\x00{text}".encode('utf-8')).hexdigest()
+
+    def get_many(self, texts: List[str]) -> Dict[str, List[float]]:
+        """Devuelve {texto: embedding} para los textos presentes en el cache"""
+        keys = {self.make_key(text): text for text in texts}
+        found: Dict[str, List[float]] = {}
+        key_list = list(keys)
+
+        with self._lock:
+            for start in range(0, len(key_list), _SQLITE_MAX_PARAMS):
+                chunk = key_list[start:start + _SQLITE_MAX_PARAMS]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[keys[key]] = np.frombuffer(blob, dtype=np.float32).tolist()
+
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]) -> int:
+        """Guarda {texto: embedding}; ignora embeddings vacíos"""
+        now = time.time()
+        rows = [
+            (self.make_key(text), self.model, len(embedding),
+             np.asarray(embedding, dtype=np.float32).tobytes(), now)
+            for text, embedding in items.items() if embedding
+        ]
+        if not rows:
+            return 0
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, dimension, vector, created_at) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+        return len(rows)
+
+    def clear(self) -> bool:
+        """Elimina todas las entradas"""
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Estadísticas del cache"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings WHERE model = ?", (self.model,)).fetchone()[0]
+            return {
+                'path': self.path,
+                'model': self.model,
+                'entries': entries,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddingProvider(IEmbeddingProvider):
+    """
+    Decorador de IEmbeddingProvider que consulta el cache persistente antes
+    de embeber por lotes. Solo cachea el camino de ingesta (batch); los
+    embeddings de consultas de usuario pasan directo al proveedor.
+    """
+
+    def __init__(self, provider: IEmbeddingProvider, cache: Optional[PersistentEmbeddingCache] = None):
+        self.provider = provider
+        self.cache = cache or PersistentEmbeddingCache()
+
+    def generate_embedding(self, text: str) -> List[float]:
+        return self.provider.generate_embedding(text)
+
+    async def agenerate_embedding(self, text: str) -> List[float]:
+        return await self.provider.agenerate_embedding(text)
+
+    def generate_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embebe solo los textos que no están en el cache"""
+        try:
+            cached = self.cache.get_many(texts)
+        except Exception as e:
+            logger.error(f"Error leyendo cache de embeddings: {e}")
+            cached = {}
+
+        missing = list(dict.fromkeys(text for text in texts if text not in cached))
+        if missing:
+            logger.info(f"Embeddings: {len(texts) - len(missing)} desde cache, {len(missing)} nuevos")
+            fresh = dict(zip(missing, self.provider.generate_embeddings_batch(missing)))
+            try:
+                self.cache.put_many(fresh)
+            except Exception as e:
+                logger.error(f"Error guardando cache de embeddings: {e}")
+            cached.update(fresh)
+
+        return [cached.get(text, []) for text in texts]
+
+    def is_available(self) -> bool:
+        return self.provider.is_available()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return self.cache.get_stats()
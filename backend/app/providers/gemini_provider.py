@@ -1,11 +1,25 @@
 import google.generativeai as genai
+import asyncio
 import logging
-from typing import List, Dict, Any
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, AsyncIterator
 from ..interfaces import ILLMProvider, IEmbeddingProvider
 from ..config.settings import Config
+from ..monitoring.tracing import trace_span
 
 logger = logging.getLogger(__name__)
 
+
+def _is_quota_error(error: Exception) -> bool:
+    """Detecta errores 429 / RESOURCE_EXHAUSTED de la API de Gemini"""
+    if getattr(error, 'code', None) == 429 or error.__class__.__name__ in ('ResourceExhausted', 'TooManyRequests'):
+        return True
+    message = str(error).lower()
+    return '429' in message or 'quota' in message or 'resource_exhausted' in message or 'resource exhausted' in message
+
+
 class GeminiLLMProvider(ILLMProvider):
     """Implementación de Gemini para LLM"""
     
@@ -24,7 +38,8 @@ class GeminiLLMProvider(ILLMProvider):
                     'error': 'Provider not available'
                 }
             
-            response = self.model.generate_content(prompt)
+            with trace_span('gemini.generate_content', model=Config.GEMINI_MODEL, prompt_length=len(prompt)):
+                response = self.model.generate_content(prompt)
             
             return {
                 'success': True,
@@ -41,6 +56,49 @@ class GeminiLLMProvider(ILLMProvider):
                 'error': str(e)
             }
     
+    async def agenerate_response(self, prompt: str, **kwargs) -> Dict[str, Any]:
+        """Genera respuesta usando Gemini sin bloquear el event loop"""
+        try:
+            if not self._available:
+                return {
+                    'success': False,
+                    'response': 'Servicio LLM no disponible',
+                    'error': 'Provider not available'
+                }
+            
+            with trace_span('gemini.generate_content', model=Config.GEMINI_MODEL, prompt_length=len(prompt)):
+                response = await self.model.generate_content_async(prompt)
+            
+            return {
+                'success': True,
+                'response': response.text,
+                'model': Config.GEMINI_MODEL,
+                'provider': 'gemini'
+            }
+            
+        except Exception as e:
+            logger.error(f"Error generando respuesta (async): {e}")
+            return {
+                'success': False,
+                'response': 'Error procesando consulta',
+                'error': str(e)
+            }
+    
+    async def astream_response(self, prompt: str, **kwargs) -> AsyncIterator[str]:
+        """Genera respuesta usando Gemini emitiendo los fragmentos según llegan"""
+        if not self._available:
+            raise RuntimeError('Provider not available')
+        
+        response = await self.model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # Fragmento sin partes de texto (p.ej. bloqueado por filtros de Gemini)
+                continue
+            if text:
+                yield text
+    
     def is_available(self) -> bool:
         """Verifica disponibilidad del servicio"""
         return self._available
@@ -78,11 +136,8 @@ class GeminiEmbeddingProvider(IEmbeddingProvider):
                 logger.warning("Embedding provider no disponible")
                 return []
             
-            result = genai.embed_content(
-                model=Config.EMBEDDING_MODEL,
-                content=text,
-                task_type="retrieval_document"
-            )
+            with trace_span('gemini.embed_content', model=Config.EMBEDDING_MODEL, text_length=len(text)):
+                result = self._call_with_backoff(text)
             return result['embedding']
             
         except Exception as e:
@@ -90,12 +145,101 @@ class GeminiEmbeddingProvider(IEmbeddingProvider):
             return []
     
     def generate_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
-        """Genera embeddings de múltiples textos"""
+        """
+        Genera embeddings de múltiples textos en lotes
+
+        Envía hasta Config.EMBEDDING_BATCH_SIZE textos por request, con como máximo
+        Config.EMBEDDING_MAX_CONCURRENCY requests simultáneas. El resultado está
+        alineado con texts; los textos que no se pudieron procesar quedan como [].
+        """
+        if not texts:
+            return []
+        if not self._available:
+            logger.warning("Embedding provider no disponible")
+            return [[] for _ in texts]
+
+        # Textos vacíos no se envían: la API los rechaza y harían fallar el lote entero
+        pending = [i for i, text in enumerate(texts) if text and text.strip()]
+        batch_size = max(1, Config.EMBEDDING_BATCH_SIZE)
+        batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+
+        embeddings: List[List[float]] = [[] for _ in texts]
+        workers = max(1, min(Config.EMBEDDING_MAX_CONCURRENCY, len(batches)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(self._embed_batch, [texts[i] for i in batch]): batch
+                for batch in batches
+            }
+            for future, batch in futures.items():
+                for index, embedding in zip(batch, future.result()):
+                    embeddings[index] = embedding
+
+        failed = sum(1 for embedding in embeddings if not embedding)
+        if failed:
+            logger.warning(f"{failed}/{len(texts)} textos sin embedding tras el procesamiento por lotes")
+        return embeddings
+
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        """Embebe un lote en una sola request; si el lote falla, reintenta texto a texto"""
+        try:
+            result = self._call_with_backoff(batch)
+            embeddings = result['embedding']
+            if len(embeddings) == len(batch):
+                return embeddings
+            logger.warning(f"Lote de embeddings incompleto ({len(embeddings)}/{len(batch)}), reintentando por texto")
+        except Exception as e:
+            logger.warning(f"Error en lote de embeddings ({len(batch)} textos), reintentando por texto: {e}")
+
         embeddings = []
-        for text in texts:
-            embedding = self.generate_embedding(text)
-            embeddings.append(embedding)
+        for text in batch:
+            try:
+                embeddings.append(self._call_with_backoff(text)['embedding'])
+            except Exception as e:
+                logger.error(f"Error generando embedding: {e}")
+                embeddings.append([])
         return embeddings
+
+    def _call_with_backoff(self, content):
+        """Llama a embed_content reintentando con backoff exponencial ante errores de cuota"""
+        attempt = 0
+        while True:
+            try:
+                return genai.embed_content(
+                    model=Config.EMBEDDING_MODEL,
+                    content=content,
+                    task_type="retrieval_document"
+                )
+            except Exception as e:
+                if not _is_quota_error(e) or attempt >= Config.EMBEDDING_MAX_RETRIES:
+                    raise
+                delay = Config.EMBEDDING_BACKOFF_SECONDS * (2 ** attempt) * (1 + random.random())
+                logger.warning(f"Cuota de embeddings excedida, reintento {attempt + 1} en {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+    
+    async def agenerate_embedding(self, text: str) -> List[float]:
+        """Genera embedding usando Gemini sin bloquear el event loop"""
+        try:
+            if not self._available:
+                logger.warning("Embedding provider no disponible")
+                return []
+            
+            # Versiones antiguas de google-generativeai no exponen embed_content_async
+            embed_content_async = getattr(genai, 'embed_content_async', None)
+            if embed_content_async is None:
+                return await asyncio.to_thread(self.generate_embedding, text)
+            
+            with trace_span('gemini.embed_content', model=Config.EMBEDDING_MODEL, text_length=len(text)):
+                result = await embed_content_async(
+                    model=Config.EMBEDDING_MODEL,
+                    content=text,
+                    task_type="retrieval_document"
+                )
+            return result['embedding']
+            
+        except Exception as e:
+            logger.error(f"Error generando embedding (async): {e}")
+            return []
     
     def is_available(self) -> bool:
         """Verifica disponibilidad"""
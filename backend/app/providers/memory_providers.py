@@ -1,20 +1,43 @@
+import sys
 import json
 import time
+import heapq
 import logging
-from typing import List, Dict, Any, Optional
+import threading
+import numpy as np
+from typing import List, Dict, Any, Optional, Tuple
 from ..interfaces import IVectorStore, ICacheProvider
+from ..config.settings import Config
+from .cache_policies import create_eviction_policy
 
 logger = logging.getLogger(__name__)
 
 class InMemoryVectorStore(IVectorStore):
-    """Implementación de vector store en memoria"""
+    """
+    Implementación de vector store en memoria
     
-    def __init__(self):
+    Los embeddings se guardan normalizados en una matriz float32 contigua que
+    crece por duplicación, de modo que una búsqueda es un único producto
+    matriz-vector seguido de una selección parcial top-k.
+    """
+    
+    def __init__(self, initial_capacity: int = 64):
         self.documents = []
-        self.embeddings = []
         self.metadata = []
+        self.initial_capacity = max(1, initial_capacity)
+        self._matrix: Optional[np.ndarray] = None
+        self._size = 0
+        self._dimension: Optional[int] = None
+        self._lock = threading.RLock()
         logger.info("InMemoryVectorStore inicializado")
     
+    @property
+    def embeddings(self) -> np.ndarray:
+        """Vista de las filas ocupadas de la matriz (embeddings normalizados)"""
+        if self._matrix is None:
+            return np.empty((0, 0), dtype=np.float32)
+        return self._matrix[:self._size]
+    
     def add_documents(self, documents: List[Dict], embeddings: List[List[float]]) -> bool:
         """Agrega documentos con embeddings"""
         try:
@@ -22,12 +45,32 @@ class InMemoryVectorStore(IVectorStore):
                 logger.error("Cantidad de documentos y embeddings no coincide")
                 return False
             
-            for doc, embedding in zip(documents, embeddings):
-                self.documents.append(doc.get('content', ''))
-                self.embeddings.append(embedding)
-                self.metadata.append(doc.get('metadata', {}))
+            # Ignorar documentos sin embedding
+            pairs = [(doc, emb) for doc, emb in zip(documents, embeddings) if emb is not None and len(emb) > 0]
+            if not pairs:
+                logger.warning("No hay embeddings válidos para agregar")
+                return False
+            
+            vectors = np.asarray([emb for _, emb in pairs], dtype=np.float32)
+            if vectors.ndim != 2:
+                logger.error("Los embeddings no tienen una dimensión homogénea")
+                return False
+            
+            if self._dimension is None:
+                self._dimension = vectors.shape[1]
+            elif vectors.shape[1] != self._dimension:
+                logger.error(f"Dimensión de embedding {vectors.shape[1]} distinta de la del store ({self._dimension})")
+                return False
+            
+            with self._lock:
+                self._ensure_capacity(self._size + len(pairs))
+                self._matrix[self._size:self._size + len(pairs)] = self._normalize(vectors)
+                for doc, _ in pairs:
+                    self.documents.append(doc.get('content', ''))
+                    self.metadata.append(doc.get('metadata', {}))
+                self._size += len(pairs)
             
-            logger.info(f"Agregados {len(documents)} documentos al vector store")
+            logger.info(f"Agregados {len(pairs)} documentos al vector store")
             return True
             
         except Exception as e:
@@ -36,89 +79,211 @@ class InMemoryVectorStore(IVectorStore):
     
     def search_similar(self, query_embedding: List[float], k: int) -> List[Dict]:
         """Busca documentos similares"""
+        results = self.search_similar_batch([query_embedding], k)
+        return results[0] if results else []
+    
+    def search_similar_batch(self, query_embeddings: List[List[float]], k: int) -> List[List[Dict]]:
+        """
+        Busca documentos similares para varias consultas a la vez
+        
+        Args:
+            query_embeddings: Lista de embeddings de consulta
+            k: Número de resultados por consulta
+        
+        Returns:
+            Lista (una por consulta) de listas de documentos ordenados por similitud
+        """
         try:
-            if not self.embeddings:
-                return []
+            # Instantánea consistente: replace_source_documents sustituye el estado completo
+            with self._lock:
+                size = self._size
+                matrix = self.embeddings
+                documents = self.documents
+                metadata = self.metadata
+                dimension = self._dimension
+            
+            if size == 0 or k <= 0 or not len(query_embeddings):
+                return [[] for _ in query_embeddings]
             
-            similarities = []
-            for i, doc_embedding in enumerate(self.embeddings):
-                similarity = self._cosine_similarity(query_embedding, doc_embedding)
-                similarities.append((i, similarity))
+            queries = np.asarray(query_embeddings, dtype=np.float32)
+            if queries.ndim != 2 or queries.shape[1] != dimension:
+                logger.error("Dimensión de la consulta no coincide con la del vector store")
+                return [[] for _ in query_embeddings]
             
-            # Ordenar por similitud (mayor a menor)
-            similarities.sort(key=lambda x: x[1], reverse=True)
+            # Similitud coseno = producto escalar de vectores normalizados
+            scores = self._normalize(queries) @ matrix.T
             
-            # Retornar top k
-            results = []
-            for i, similarity in similarities[:k]:
-                results.append({
-                    'content': self.documents[i],
-                    'metadata': self.metadata[i],
-                    'similarity': similarity
-                })
+            k = min(k, size)
+            if k < size:
+                top_indices = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            else:
+                top_indices = np.broadcast_to(np.arange(size), (len(queries), size))
             
-            return results
+            # Ordenar solo los k candidatos (mayor a menor)
+            top_scores = np.take_along_axis(scores, top_indices, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind='stable')
+            top_indices = np.take_along_axis(top_indices, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+            
+            return [
+                [
+                    {
+                        'content': documents[i],
+                        'metadata': metadata[i],
+                        'similarity': float(score)
+                    }
+                    for i, score in zip(row_indices.tolist(), row_scores.tolist())
+                ]
+                for row_indices, row_scores in zip(top_indices, top_scores)
+            ]
             
         except Exception as e:
             logger.error(f"Error buscando similares: {e}")
-            return []
+            return [[] for _ in query_embeddings]
+    
+    async def asearch_similar(self, query_embedding: List[float], k: int) -> List[Dict]:
+        """Búsqueda en memoria: no hay I/O, se ejecuta inline"""
+        return self.search_similar(query_embedding, k)
     
     def get_stats(self) -> Dict[str, Any]:
         """Estadísticas del store"""
         return {
             'total_documents': len(self.documents),
-            'total_embeddings': len(self.embeddings),
+            'total_embeddings': self._size,
+            'dimension': self._dimension,
+            'capacity': 0 if self._matrix is None else self._matrix.shape[0],
+            'memory_bytes': 0 if self._matrix is None else int(self._matrix.nbytes),
             'store_type': 'in_memory'
         }
     
     def clear(self) -> bool:
         """Limpia el store"""
         try:
-            self.documents = []
-            self.embeddings = []
-            self.metadata = []
+            with self._lock:
+                self.documents = []
+                self.metadata = []
+                self._matrix = None
+                self._size = 0
+                self._dimension = None
             logger.info("Vector store limpiado")
             return True
         except Exception as e:
             logger.error(f"Error limpiando store: {e}")
             return False
     
-    def _cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
-        """Calcula similitud coseno"""
+    def replace_source_documents(self, source: str, documents: List[Dict], embeddings: List[List[float]]) -> bool:
+        """Sustituye los chunks de un archivo fuente sin vaciar el resto del store"""
         try:
-            dot_product = sum(a * b for a, b in zip(vec1, vec2))
-            magnitude1 = sum(a * a for a in vec1) ** 0.5
-            magnitude2 = sum(b * b for b in vec2) ** 0.5
+            if len(documents) != len(embeddings):
+                logger.error("Cantidad de documentos y embeddings no coincide")
+                return False
             
-            if magnitude1 == 0 or magnitude2 == 0:
-                return 0
+            pairs = [(doc, emb) for doc, emb in zip(documents, embeddings) if emb is not None and len(emb) > 0]
+            vectors = np.asarray([emb for _, emb in pairs], dtype=np.float32) if pairs else None
+            if vectors is not None and (vectors.ndim != 2 or
+                                        (self._dimension is not None and vectors.shape[1] != self._dimension)):
+                logger.error("Dimensión de embedding distinta de la del store")
+                return False
+            
+            with self._lock:
+                keep = [i for i, meta in enumerate(self.metadata) if meta.get('full_path') != source]
+                dimension = self._dimension if self._dimension is not None else (
+                    vectors.shape[1] if vectors is not None else None)
+                if dimension is None:
+                    return True
+                
+                new_size = len(keep) + len(pairs)
+                capacity = max(self.initial_capacity, 0 if self._matrix is None else self._matrix.shape[0])
+                while capacity < new_size:
+                    capacity *= 2
+                
+                # Se construye el estado nuevo aparte y se publica de una vez,
+                # así las búsquedas concurrentes nunca ven el store a medias
+                new_matrix = np.zeros((capacity, dimension), dtype=np.float32)
+                if keep:
+                    new_matrix[:len(keep)] = self._matrix[keep]
+                if pairs:
+                    new_matrix[len(keep):new_size] = self._normalize(vectors)
+                
+                self.documents = [self.documents[i] for i in keep] + [doc.get('content', '') for doc, _ in pairs]
+                self.metadata = [self.metadata[i] for i in keep] + [doc.get('metadata', {}) for doc, _ in pairs]
+                self._matrix = new_matrix
+                self._size = new_size
+                self._dimension = dimension
             
-            return dot_product / (magnitude1 * magnitude2)
-        except:
-            return 0
+            logger.info(f"Fuente {source} actualizada: {len(pairs)} chunks")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error actualizando fuente {source}: {e}")
+            return False
+    
+    def _ensure_capacity(self, required: int):
+        """Reserva filas suficientes duplicando la capacidad de la matriz"""
+        capacity = 0 if self._matrix is None else self._matrix.shape[0]
+        if required <= capacity:
+            return
+        
+        new_capacity = max(capacity, self.initial_capacity)
+        while new_capacity < required:
+            new_capacity *= 2
+        
+        new_matrix = np.zeros((new_capacity, self._dimension), dtype=np.float32)
+        if self._size:
+            new_matrix[:self._size] = self._matrix[:self._size]
+        self._matrix = new_matrix
+    
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        """Normaliza filas a norma 1 (las filas nulas quedan en cero)"""
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
 
 
 class InMemoryCacheProvider(ICacheProvider):
-    """Implementación de cache en memoria"""
+    """
+    Implementación de cache en memoria acotada
     
-    def __init__(self):
-        self.cache = {}
-        self.timestamps = {}
-        logger.info("InMemoryCacheProvider inicializado")
+    Limita el número de entradas y el tamaño estimado en bytes, desaloja según
+    una política configurable (lru, lfu, tinylfu) y expira entradas por TTL de
+    forma amortizada en cada operación.
+    """
+    
+    def __init__(self, max_entries: Optional[int] = None, max_bytes: Optional[int] = None,
+                 eviction_policy: Optional[str] = None):
+        self.max_entries = max_entries if max_entries is not None else Config.CACHE_MAX_ENTRIES
+        self.max_bytes = max_bytes if max_bytes is not None else Config.CACHE_MAX_BYTES
+        self.policy_name = (eviction_policy or Config.CACHE_EVICTION_POLICY).lower()
+        self.policy = create_eviction_policy(self.policy_name)
+        
+        # key -> (value, expires_at, size_bytes)
+        self.cache: Dict[str, Tuple[Any, float, int]] = {}
+        # Heap (expires_at, key) para expirar sin recorrer todo el cache
+        self._expirations: List[Tuple[float, str]] = []
+        self.current_bytes = 0
+        self._lock = threading.RLock()
+        self._reset_counters()
+        logger.info(f"InMemoryCacheProvider inicializado (max_entries={self.max_entries}, max_bytes={self.max_bytes}, policy={self.policy_name})")
     
     def get(self, key: str) -> Optional[Any]:
         """Obtiene valor del cache"""
         try:
-            if key not in self.cache:
-                return None
-            
-            # Verificar TTL
-            timestamp, ttl = self.timestamps.get(key, (0, 0))
-            if time.time() - timestamp > ttl:
-                self.delete(key)
-                return None
-            
-            return self.cache[key]
+            with self._lock:
+                self._sweep_expired()
+                entry = self.cache.get(key)
+                
+                if entry is None or entry[1] <= time.time():
+                    if entry is not None:
+                        self._remove(key)
+                        self.expirations += 1
+                    self.misses += 1
+                    self.policy.record_miss(key)
+                    return None
+                
+                self.hits += 1
+                self.policy.record_access(key)
+                return entry[0]
             
         except Exception as e:
             logger.error(f"Error obteniendo del cache: {e}")
@@ -127,9 +292,28 @@ class InMemoryCacheProvider(ICacheProvider):
     def set(self, key: str, value: Any, ttl: int = 3600) -> bool:
         """Establece valor en cache"""
         try:
-            self.cache[key] = value
-            self.timestamps[key] = (time.time(), ttl)
-            return True
+            size = self._estimate_size(key, value)
+            if self.max_bytes and size > self.max_bytes:
+                logger.warning(f"Entrada de cache demasiado grande ({size} bytes), no se almacena")
+                self.rejections += 1
+                return False
+            
+            with self._lock:
+                self._sweep_expired()
+                
+                if key in self.cache:
+                    self._remove(key)
+                elif not self._make_room(key, size):
+                    self.rejections += 1
+                    return False
+                
+                expires_at = time.time() + ttl
+                self.cache[key] = (value, expires_at, size)
+                self.current_bytes += size
+                heapq.heappush(self._expirations, (expires_at, key))
+                self.policy.record_insert(key)
+                return True
+            
         except Exception as e:
             logger.error(f"Error estableciendo cache: {e}")
             return False
@@ -137,10 +321,9 @@ class InMemoryCacheProvider(ICacheProvider):
     def delete(self, key: str) -> bool:
         """Elimina del cache"""
         try:
-            if key in self.cache:
-                del self.cache[key]
-            if key in self.timestamps:
-                del self.timestamps[key]
+            with self._lock:
+                if key in self.cache:
+                    self._remove(key)
             return True
         except Exception as e:
             logger.error(f"Error eliminando del cache: {e}")
@@ -149,10 +332,103 @@ class InMemoryCacheProvider(ICacheProvider):
     def clear(self) -> bool:
         """Limpia todo el cache"""
         try:
-            self.cache = {}
-            self.timestamps = {}
+            with self._lock:
+                self.cache = {}
+                self._expirations = []
+                self.current_bytes = 0
+                self.policy.clear()
             logger.info("Cache limpiado")
             return True
         except Exception as e:
             logger.error(f"Error limpiando cache: {e}")
             return False
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Estadísticas del cache (hits, misses, desalojos, tamaño)"""
+        with self._lock:
+            self._sweep_expired()
+            lookups = self.hits + self.misses
+            return {
+                'cache_type': 'in_memory',
+                'eviction_policy': self.policy_name,
+                'entries': len(self.cache),
+                'max_entries': self.max_entries,
+                'size_bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'rejections': self.rejections
+            }
+    
+    def reset_stats(self):
+        """Reinicia los contadores de estadísticas"""
+        with self._lock:
+            self._reset_counters()
+    
+    def _reset_counters(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.rejections = 0
+    
+    def _make_room(self, key: str, size: int) -> bool:
+        """Desaloja entradas hasta que quepa una nueva; False si la política la rechaza"""
+        # Reunir todas las víctimas y decidir la admisión antes de desalojar:
+        # un rechazo a mitad de camino no debe dejar el cache ya vaciado
+        victims = []
+        entries, used = len(self.cache), self.current_bytes
+        for victim in self.policy.victims():
+            if not ((self.max_entries and entries >= self.max_entries) or
+                    (self.max_bytes and used + size > self.max_bytes)):
+                break
+            entry = self.cache.get(victim)
+            if entry is None:
+                continue
+            victims.append(victim)
+            entries -= 1
+            used -= entry[2]
+        
+        if not all(self.policy.admit(key, victim) for victim in victims):
+            return False
+        for victim in victims:
+            self._remove(victim)
+        self.evictions += len(victims)
+        return True
+    
+    def _remove(self, key: str):
+        """Elimina una entrada actualizando contabilidad y política"""
+        entry = self.cache.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry[2]
+            self.policy.record_remove(key)
+    
+    def _sweep_expired(self, max_items: int = 64):
+        """Expira entradas vencidas (coste amortizado, acotado por llamada)"""
+        now = time.time()
+        swept = 0
+        while self._expirations and self._expirations[0][0] <= now and swept < max_items:
+            expires_at, key = heapq.heappop(self._expirations)
+            entry = self.cache.get(key)
+            # Ignorar registros obsoletos de claves reescritas con otro TTL
+            if entry is not None and entry[1] == expires_at:
+                self._remove(key)
+                self.expirations += 1
+            swept += 1
+        
+        # Compactar el heap si acumula demasiados registros obsoletos
+        if len(self._expirations) > 2 * len(self.cache) + 64:
+            self._expirations = [(entry[1], k) for k, entry in self.cache.items()]
+            heapq.heapify(self._expirations)
+    
+    @staticmethod
+    def _estimate_size(key: str, value: Any) -> int:
+        """Estima el tamaño en bytes de una entrada (serialización JSON)"""
+        try:
+            value_size = len(json.dumps(value, default=str, ensure_ascii=False).encode('utf-8'))
+        except Exception:
+            value_size = sys.getsizeof(value)
+        return len(key) + value_size
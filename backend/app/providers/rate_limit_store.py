@@ -0,0 +1,584 @@
+"""
+Almacenes para el rate limiter
+En memoria (por proceso), SQLite-WAL (varios workers en un host) y Redis (varios hosts)
+"""
+
+import os
+import sys
+import uuid
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict, deque
+from typing import List, Dict, Any, Optional, Tuple
+from ..interfaces import IRateLimitStore
+from ..config.settings import Config
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    redis = None
+    REDIS_AVAILABLE = False
+
+# Gauges Prometheus (import seguro)
+try:
+    from ..monitoring.prometheus_exporter import set_rate_limit_gauges
+except Exception:
+    set_rate_limit_gauges = None
+
+logger = logging.getLogger(__name__)
+
+Limits = List[Tuple[int, float]]
+
+
+def _first_violation(counts: List[int], limits: Limits, cost: int) -> Optional[int]:
+    """Índice del primer límite que la request excedería"""
+    for index, (limit, _) in enumerate(limits):
+        if counts[index] + cost > limit:
+            return index
+    return None
+
+
+# Tolerancia para el acumulado de intervalos en punto flotante (p. ej. 3 x 10/3 > 10)
+_GCRA_EPSILON = 1e-9
+
+
+def _gcra_update(tats: List[Optional[float]], now: float, limits: Limits,
+                 cost: int) -> Tuple[Optional[int], List[Optional[float]]]:
+    """
+    GCRA sobre varios límites a la vez
+    
+    Un límite (n, ventana) libera una unidad cada ventana/n segundos y tolera
+    ráfagas de hasta n. El estado es un único float por límite (TAT) y solo se
+    actualiza si todos los límites aceptan la request.
+    """
+    new_tats = []
+    for index, (limit, window) in enumerate(limits):
+        if limit <= 0:
+            return index, tats
+        tat = tats[index] if index < len(tats) and tats[index] is not None else now
+        new_tat = max(tat, now) + window / limit * cost
+        if new_tat - now > window + _GCRA_EPSILON:
+            return index, tats
+        new_tats.append(new_tat)
+    return None, new_tats
+
+
+class InMemoryRateLimitStore(IRateLimitStore):
+    """
+    Ventanas deslizantes en memoria del proceso (comportamiento histórico)
+
+    Cada identificador guarda una deque de timestamps por ventana, así el
+    conteo es len() y la limpieza solo saca los timestamps vencidos.
+
+    La tabla de identificadores está acotada: se mantiene en orden de último
+    uso, al superar max_keys se desplaza el menos reciente, y cada acquire
+    expira unos pocos clientes inactivos desde la cabeza (reaper amortizado).
+    """
+
+    # Solo memoria del proceso: se consulta inline también desde el event loop
+    blocking = False
+
+    # Clientes inactivos revisados como máximo por cada acquire
+    REAP_BATCH = 32
+
+    # Costo aproximado en bytes (CPython 64 bits) para el gauge de memoria:
+    # entrada del dict + tupla + dos deques vacías, y un float por timestamp o TAT
+    KEY_OVERHEAD_BYTES = 200 + 2 * sys.getsizeof(deque())
+    VALUE_BYTES = 8 + sys.getsizeof(0.0)
+
+    def __init__(self, max_keys: Optional[int] = None):
+        self.max_keys = max_keys if max_keys is not None else Config.RATE_LIMIT_MAX_TRACKED_CLIENTS
+        self.windows: "OrderedDict[str, Tuple[Tuple[float, ...], List[deque]]]" = OrderedDict()
+        self.tats: "OrderedDict[str, List[Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Floats retenidos (timestamps + TATs), para estimar memoria en O(1)
+        self._values = 0
+        self.evicted = 0
+        self.reaped = 0
+
+    def _prune(self, key: str, now: float, limits: Limits, create: bool) -> Optional[List[deque]]:
+        window_sizes = tuple(window for _, window in limits)
+        entry = self.windows.get(key)
+        if entry is None or entry[0] != window_sizes:
+            if not create:
+                return None
+            if entry is not None:
+                self._values -= sum(len(timestamps) for timestamps in entry[1])
+            entry = (window_sizes, [deque() for _ in limits])
+            self.windows[key] = entry
+        if create:
+            self.windows.move_to_end(key)
+
+        for timestamps, window in zip(entry[1], window_sizes):
+            window_start = now - window
+            while timestamps and timestamps[0] <= window_start:
+                timestamps.popleft()
+                self._values -= 1
+        return entry[1]
+
+    @staticmethod
+    def _window_idle(entry: Tuple[Tuple[float, ...], List[deque]], now: float) -> bool:
+        """Todas las ventanas vencieron: el timestamp más nuevo quedó fuera"""
+        return all(not timestamps or timestamps[-1] <= now - window
+                   for timestamps, window in zip(entry[1], entry[0]))
+
+    @staticmethod
+    def _tat_idle(tats: List[Optional[float]], now: float) -> bool:
+        """Un TAT en el pasado equivale a no tener estado"""
+        return all(tat is None or tat <= now for tat in tats)
+
+    def _drop_window(self, key: str) -> None:
+        _, windows = self.windows.pop(key)
+        self._values -= sum(len(timestamps) for timestamps in windows)
+
+    def _drop_tats(self, key: str) -> None:
+        self._values -= len(self.tats.pop(key))
+
+    def _reap(self, now: float, budget: int) -> int:
+        """
+        Expira clientes inactivos desde la cabeza de cada tabla (los de uso más
+        antiguo) y desplaza los menos recientes si se superó el tope
+        """
+        removed = 0
+        while self.windows and removed < budget:
+            key, entry = next(iter(self.windows.items()))
+            if not self._window_idle(entry, now):
+                break
+            self._drop_window(key)
+            removed += 1
+        while self.tats and removed < budget:
+            key, tats = next(iter(self.tats.items()))
+            if not self._tat_idle(tats, now):
+                break
+            self._drop_tats(key)
+            removed += 1
+        self.reaped += removed
+
+        while self.max_keys and len(self.windows) + len(self.tats) > self.max_keys:
+            # LRU: primero la tabla más grande, desde el cliente menos reciente
+            if len(self.windows) >= len(self.tats):
+                self._drop_window(next(iter(self.windows)))
+            else:
+                self._drop_tats(next(iter(self.tats)))
+            self.evicted += 1
+
+        self._export_gauges()
+        return removed
+
+    def _memory_bytes(self) -> int:
+        keys = len(self.windows) + len(self.tats)
+        return keys * self.KEY_OVERHEAD_BYTES + self._values * self.VALUE_BYTES
+
+    def _export_gauges(self) -> None:
+        if set_rate_limit_gauges:
+            try:
+                set_rate_limit_gauges(len(self.windows) + len(self.tats), self._memory_bytes())
+            except Exception as e:
+                logger.debug(f"No se pudieron exportar gauges del rate limiter: {e}")
+
+    def acquire(self, key: str, now: float, limits: Limits, cost: int = 1) -> Dict[str, Any]:
+        with self._lock:
+            windows = self._prune(key, now, limits, create=True)
+            counts = [len(timestamps) for timestamps in windows]
+            violated = _first_violation(counts, limits, cost)
+            if violated is None:
+                for timestamps in windows:
+                    timestamps.extend([now] * cost)
+                self._values += cost * len(windows)
+                counts = [count + cost for count in counts]
+            result = {
+                'violated': violated,
+                'counts': counts,
+                'oldest': [timestamps[0] if timestamps else None for timestamps in windows]
+            }
+            self._reap(now, self.REAP_BATCH)
+            return result
+
+    def peek(self, key: str, now: float, limits: Limits) -> Dict[str, Any]:
+        with self._lock:
+            windows = self._prune(key, now, limits, create=False)
+            if windows is None:
+                return {'counts': [0] * len(limits), 'oldest': [None] * len(limits)}
+            return {
+                'counts': [len(timestamps) for timestamps in windows],
+                'oldest': [timestamps[0] if timestamps else None for timestamps in windows]
+            }
+
+    def acquire_gcra(self, key: str, now: float, limits: Limits, cost: int = 1) -> Dict[str, Any]:
+        with self._lock:
+            violated, tats = _gcra_update(self.tats.get(key, []), now, limits, cost)
+            if violated is None:
+                self._values += len(tats) - len(self.tats.get(key, []))
+                self.tats[key] = tats
+                self.tats.move_to_end(key)
+            self._reap(now, self.REAP_BATCH)
+            return {'violated': violated, 'tats': list(tats) + [None] * (len(limits) - len(tats))}
+
+    def peek_gcra(self, key: str, now: float, limits: Limits) -> Dict[str, Any]:
+        with self._lock:
+            tats = list(self.tats.get(key, []))
+        return {'tats': tats + [None] * (len(limits) - len(tats))}
+
+    def reset(self, key: str) -> bool:
+        with self._lock:
+            if key in self.windows:
+                self._drop_window(key)
+            if key in self.tats:
+                self._drop_tats(key)
+            self._export_gauges()
+        return True
+
+    def cleanup(self, now: float) -> int:
+        """Limpia todas las ventanas y elimina identificadores sin requests"""
+        with self._lock:
+            drained = [key for key, tats in self.tats.items() if self._tat_idle(tats, now)]
+            for key in drained:
+                self._drop_tats(key)
+
+            empty = []
+            for key, (window_sizes, windows) in self.windows.items():
+                for timestamps, window in zip(windows, window_sizes):
+                    window_start = now - window
+                    while timestamps and timestamps[0] <= window_start:
+                        timestamps.popleft()
+                        self._values -= 1
+                if not any(windows):
+                    empty.append(key)
+            for key in empty:
+                del self.windows[key]
+            self.reaped += len(empty) + len(drained)
+            self._export_gauges()
+            return len(empty) + len(drained)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'backend': 'memory',
+                'active_keys': len(self.windows) + len(self.tats),
+                'max_keys': self.max_keys,
+                'memory_bytes': self._memory_bytes(),
+                'evicted_keys': self.evicted,
+                'reaped_keys': self.reaped,
+                'total_requests_in_window': sum(
+                    max((len(timestamps) for timestamps in windows), default=0)
+                    for _, windows in self.windows.values()
+                )
+            }
+
+
+class SQLiteRateLimitStore(IRateLimitStore):
+    """
+    Ventanas deslizantes en SQLite (WAL) compartidas por los workers de un host
+
+    acquire corre dentro de BEGIN IMMEDIATE: el lock de escritura serializa el
+    chequeo y el registro entre procesos, así el límite es global y no se
+    multiplica por la cantidad de workers.
+    """
+
+    # Cada cuántas requests se purgan eventos vencidos de identificadores inactivos
+    PURGE_EVERY = 1000
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or Config.RATE_LIMIT_SQLITE_PATH
+        self._lock = threading.Lock()
+        self._max_window = 0.0
+        self._acquires = 0
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Autocommit: las transacciones se abren explícitamente. Con el lock de
+        # escritura tomado por otro worker se espera poco: al vencer, acquire
+        # lanza "database is locked" y el rate limiter deja pasar (fail-open)
+        self._conn = sqlite3.connect(self.path, timeout=Config.RATE_LIMIT_SQLITE_TIMEOUT_MS / 1000,
+                                     check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit_events ("
+            " key TEXT NOT NULL,"
+            " ts REAL NOT NULL,"
+            " cost INTEGER NOT NULL DEFAULT 1)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_rate_limit_key_ts ON rate_limit_events (key, ts)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit_tat ("
+            " key TEXT NOT NULL,"
+            " slot INTEGER NOT NULL,"
+            " tat REAL NOT NULL,"
+            " PRIMARY KEY (key, slot))"
+        )
+        logger.info(f"SQLiteRateLimitStore inicializado en {self.path}")
+
+    def _usage(self, key: str, now: float, limits: Limits) -> Tuple[List[int], List[Optional[float]]]:
+        counts, oldest = [], []
+        for _, window in limits:
+            count, first = self._conn.execute(
+                "SELECT COALESCE(SUM(cost), 0), MIN(ts) FROM rate_limit_events WHERE key = ? AND ts > ?",
+                (key, now - window)
+            ).fetchone()
+            counts.append(int(count))
+            oldest.append(first)
+        return counts, oldest
+
+    def acquire(self, key: str, now: float, limits: Limits, cost: int = 1) -> Dict[str, Any]:
+        max_window = max(window for _, window in limits)
+        with self._lock:
+            self._max_window = max(self._max_window, max_window)
+            self._acquires += 1
+
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM rate_limit_events WHERE key = ? AND ts <= ?", (key, now - max_window))
+                if self._acquires % self.PURGE_EVERY == 0:
+                    self._conn.execute("DELETE FROM rate_limit_events WHERE ts <= ?", (now - self._max_window,))
+
+                counts, oldest = self._usage(key, now, limits)
+                violated = _first_violation(counts, limits, cost)
+                if violated is None:
+                    self._conn.execute(
+                        "INSERT INTO rate_limit_events (key, ts, cost) VALUES (?, ?, ?)", (key, now, cost)
+                    )
+                    counts = [count + cost for count in counts]
+                    oldest = [first if first is not None else now for first in oldest]
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        return {'violated': violated, 'counts': counts, 'oldest': oldest}
+
+    def peek(self, key: str, now: float, limits: Limits) -> Dict[str, Any]:
+        with self._lock:
+            counts, oldest = self._usage(key, now, limits)
+        return {'counts': counts, 'oldest': oldest}
+
+    def _read_tats(self, key: str, size: int) -> List[Optional[float]]:
+        tats: List[Optional[float]] = [None] * size
+        for slot, tat in self._conn.execute("SELECT slot, tat FROM rate_limit_tat WHERE key = ?", (key,)):
+            if slot < size:
+                tats[slot] = tat
+        return tats
+
+    def acquire_gcra(self, key: str, now: float, limits: Limits, cost: int = 1) -> Dict[str, Any]:
+        with self._lock:
+            self._acquires += 1
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self._acquires % self.PURGE_EVERY == 0:
+                    self._conn.execute("DELETE FROM rate_limit_tat WHERE tat <= ?", (now,))
+
+                violated, tats = _gcra_update(self._read_tats(key, len(limits)), now, limits, cost)
+                if violated is None:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO rate_limit_tat (key, slot, tat) VALUES (?, ?, ?)",
+                        [(key, slot, tat) for slot, tat in enumerate(tats)]
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return {'violated': violated, 'tats': tats}
+
+    def peek_gcra(self, key: str, now: float, limits: Limits) -> Dict[str, Any]:
+        with self._lock:
+            return {'tats': self._read_tats(key, len(limits))}
+
+    def reset(self, key: str) -> bool:
+        with self._lock:
+            self._conn.execute("DELETE FROM rate_limit_events WHERE key = ?", (key,))
+            self._conn.execute("DELETE FROM rate_limit_tat WHERE key = ?", (key,))
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            keys, total = self._conn.execute(
+                "SELECT COUNT(DISTINCT key), COALESCE(SUM(cost), 0) FROM rate_limit_events"
+            ).fetchone()
+            keys += self._conn.execute("SELECT COUNT(DISTINCT key) FROM rate_limit_tat").fetchone()[0]
+        return {
+            'backend': 'sqlite',
+            'path': self.path,
+            'active_keys': keys,
+            'total_requests_in_window': int(total)
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# KEYS[1] = zset del identificador; ARGV = now, cost, id, n, (límite, ventana) x n
+# Devuelve {violated (0 = ninguno), counts..., oldest...}; oldest como string para no truncar floats
+_REDIS_ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local cost = tonumber(ARGV[2])
+local request_id = ARGV[3]
+local n = tonumber(ARGV[4])
+local max_window = 0
+for i = 1, n do
+    local window = tonumber(ARGV[4 + 2 * i])
+    if window > max_window then max_window = window end
+end
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - max_window)
+
+local counts, oldest = {}, {}
+local violated = 0
+for i = 1, n do
+    local limit = tonumber(ARGV[3 + 2 * i])
+    local window_start = '(' .. tostring(now - tonumber(ARGV[4 + 2 * i]))
+    counts[i] = redis.call('ZCOUNT', KEYS[1], window_start, '+inf')
+    local first = redis.call('ZRANGEBYSCORE', KEYS[1], window_start, '+inf', 'WITHSCORES', 'LIMIT', 0, 1)
+    oldest[i] = first[2] or ''
+    if violated == 0 and counts[i] + cost > limit then violated = i end
+end
+
+if violated == 0 then
+    for j = 1, cost do
+        redis.call('ZADD', KEYS[1], now, request_id .. ':' .. j)
+    end
+    for i = 1, n do
+        counts[i] = counts[i] + cost
+        if oldest[i] == '' then oldest[i] = ARGV[1] end
+    end
+    redis.call('PEXPIRE', KEYS[1], math.ceil(max_window * 1000))
+end
+
+local result = {violated}
+for i = 1, n do result[#result + 1] = counts[i] end
+for i = 1, n do result[#result + 1] = oldest[i] end
+return result
+"""
+
+
+# KEYS[1] = hash del identificador (campo = índice del límite); ARGV = now, cost, epsilon, n, (límite, ventana) x n
+# Devuelve {violated (0 = ninguno), tats...} con los TAT como string
+_REDIS_GCRA_SCRIPT = """
+local now = tonumber(ARGV[1])
+local cost = tonumber(ARGV[2])
+local epsilon = tonumber(ARGV[3])
+local n = tonumber(ARGV[4])
+local fields = {}
+for i = 1, n do fields[i] = tostring(i) end
+local current = redis.call('HMGET', KEYS[1], unpack(fields))
+
+local violated = 0
+local new_tats = {}
+local max_tat = now
+for i = 1, n do
+    local limit = tonumber(ARGV[3 + 2 * i])
+    local window = tonumber(ARGV[4 + 2 * i])
+    if limit <= 0 then violated = i break end
+    local tat = tonumber(current[i]) or now
+    if tat < now then tat = now end
+    local new_tat = tat + window / limit * cost
+    if new_tat - now > window + epsilon then violated = i break end
+    new_tats[i] = new_tat
+    if new_tat > max_tat then max_tat = new_tat end
+end
+
+local result = {violated}
+if violated == 0 then
+    for i = 1, n do
+        local value = string.format('%.6f', new_tats[i])
+        redis.call('HSET', KEYS[1], tostring(i), value)
+        result[#result + 1] = value
+    end
+    redis.call('PEXPIRE', KEYS[1], math.ceil((max_tat - now) * 1000) + 1)
+else
+    for i = 1, n do result[#result + 1] = current[i] or '' end
+end
+return result
+"""
+
+
+class RedisRateLimitStore(IRateLimitStore):
+    """
+    Ventanas deslizantes en Redis (sorted set por identificador)
+
+    El chequeo y el registro corren en un script Lua, que Redis ejecuta de
+    forma atómica. Acepta cualquier cliente compatible con redis-py, lo que
+    permite probarlo contra un servidor local o un sustituto en memoria.
+    """
+
+    def __init__(self, client=None, url: Optional[str] = None, prefix: str = "ratelimit:"):
+        if client is None:
+            if not REDIS_AVAILABLE:
+                raise ImportError("El paquete redis no está instalado")
+            client = redis.Redis.from_url(url or Config.REDIS_URL)
+        self.client = client
+        self.prefix = prefix
+        self._acquire_script = client.register_script(_REDIS_ACQUIRE_SCRIPT)
+        self._gcra_script = client.register_script(_REDIS_GCRA_SCRIPT)
+        logger.info("RedisRateLimitStore inicializado")
+
+    def acquire(self, key: str, now: float, limits: Limits, cost: int = 1) -> Dict[str, Any]:
+        args = [repr(now), cost, uuid.uuid4().hex, len(limits)]
+        for limit, window in limits:
+            args.extend([limit, window])
+        result = self._acquire_script(keys=[self.prefix + key], args=args)
+
+        n = len(limits)
+        violated = int(result[0])
+        return {
+            'violated': violated - 1 if violated else None,
+            'counts': [int(count) for count in result[1:1 + n]],
+            'oldest': [float(first) if first not in (b'', '') else None for first in result[1 + n:1 + 2 * n]]
+        }
+
+    def peek(self, key: str, now: float, limits: Limits) -> Dict[str, Any]:
+        pipe = self.client.pipeline(transaction=False)
+        for _, window in limits:
+            window_start = f"({now - window!r}"
+            pipe.zcount(self.prefix + key, window_start, '+inf')
+            pipe.zrangebyscore(self.prefix + key, window_start, '+inf', start=0, num=1, withscores=True)
+        results = pipe.execute()
+        return {
+            'counts': [int(count) for count in results[0::2]],
+            'oldest': [float(first[0][1]) if first else None for first in results[1::2]]
+        }
+
+    @staticmethod
+    def _parse_tats(values) -> List[Optional[float]]:
+        return [float(value) if value not in (None, b'', '') else None for value in values]
+
+    def acquire_gcra(self, key: str, now: float, limits: Limits, cost: int = 1) -> Dict[str, Any]:
+        args = [repr(now), cost, _GCRA_EPSILON, len(limits)]
+        for limit, window in limits:
+            args.extend([limit, window])
+        result = self._gcra_script(keys=[self.prefix + 'gcra:' + key], args=args)
+        violated = int(result[0])
+        return {
+            'violated': violated - 1 if violated else None,
+            'tats': self._parse_tats(result[1:1 + len(limits)])
+        }
+
+    def peek_gcra(self, key: str, now: float, limits: Limits) -> Dict[str, Any]:
+        values = self.client.hmget(self.prefix + 'gcra:' + key, [str(i + 1) for i in range(len(limits))])
+        return {'tats': self._parse_tats(values)}
+
+    def reset(self, key: str) -> bool:
+        self.client.delete(self.prefix + key, self.prefix + 'gcra:' + key)
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        # Sin active_keys: contarlas exige recorrer el keyspace (SCAN, O(claves))
+        return {'backend': 'redis', 'active_keys': None}
+
+
+def create_rate_limit_store(backend: Optional[str] = None) -> IRateLimitStore:
+    """Crea el almacén configurado; ante cualquier error vuelve al almacén en memoria"""
+    backend = (backend or Config.RATE_LIMIT_BACKEND or 'memory').lower()
+    try:
+        if backend == 'sqlite':
+            return SQLiteRateLimitStore()
+        if backend == 'redis':
+            return RedisRateLimitStore()
+        if backend != 'memory':
+            logger.error(f"Backend de rate limiting no soportado: {backend}")
+    except Exception as e:
+        logger.warning(f"Backend de rate limiting '{backend}' no disponible, usando memoria: {e}")
+    return InMemoryRateLimitStore()
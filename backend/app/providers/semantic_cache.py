@@ -0,0 +1,165 @@
+"""
+Cache semántico de respuestas para el orquestador
+Reutiliza respuestas de consultas parafraseadas comparando embeddings
+"""
+
+import time
+import logging
+import threading
+import numpy as np
+from typing import List, Dict, Any, Optional, Iterable
+from ..config.settings import Config
+
+logger = logging.getLogger(__name__)
+
+
+class _LanguagePartition:
+    """Buffer circular de embeddings normalizados y respuestas para un idioma"""
+
+    def __init__(self, capacity: int, dimension: int):
+        self.matrix = np.zeros((capacity, dimension), dtype=np.float32)
+        self.expires_at = np.zeros(capacity, dtype=np.float64)
+        self.responses: List[Optional[Dict[str, Any]]] = [None] * capacity
+        self.sources: List[frozenset] = [frozenset()] * capacity
+        self.next_slot = 0
+        self.size = 0
+
+
+class SemanticResponseCache:
+    """
+    Cache semántico de respuestas indexado por embedding de la consulta
+
+    Complementa al cache exacto: dada la embedding de una consulta nueva,
+    devuelve la respuesta de una consulta previa del mismo idioma cuya
+    similitud coseno supere el umbral. Cada idioma tiene un buffer circular
+    de capacidad fija, así que la memoria está acotada y la entrada más
+    antigua se sobrescribe al llenarse.
+    """
+
+    def __init__(self, threshold: Optional[float] = None, max_entries: Optional[int] = None,
+                 ttl: Optional[int] = None):
+        self.threshold = threshold if threshold is not None else Config.SEMANTIC_CACHE_THRESHOLD
+        self.max_entries = max(1, max_entries if max_entries is not None else Config.SEMANTIC_CACHE_MAX_ENTRIES)
+        self.ttl = ttl if ttl is not None else Config.CACHE_TTL
+        self._partitions: Dict[str, _LanguagePartition] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        logger.info(f"SemanticResponseCache inicializado (threshold={self.threshold}, max_entries={self.max_entries})")
+
+    def lookup(self, query_embedding: List[float], language: str) -> Optional[Dict[str, Any]]:
+        """
+        Busca una respuesta cacheada semánticamente similar
+
+        Returns:
+            Dict con 'response', 'similarity' y 'sources', o None si no hay coincidencia
+        """
+        try:
+            query = self._normalize(query_embedding)
+            if query is None:
+                return None
+
+            with self._lock:
+                partition = self._partitions.get(language)
+                if partition is None or partition.size == 0 or partition.matrix.shape[1] != query.shape[0]:
+                    self.misses += 1
+                    return None
+
+                scores = partition.matrix[:partition.size] @ query
+                scores[partition.expires_at[:partition.size] <= time.time()] = -1.0
+                best = int(np.argmax(scores))
+                similarity = float(scores[best])
+
+                if similarity < self.threshold:
+                    self.misses += 1
+                    return None
+
+                self.hits += 1
+                response = dict(partition.responses[best])
+                if isinstance(response.get('metadata'), dict):
+                    response['metadata'] = dict(response['metadata'])
+                return {
+                    'response': response,
+                    'similarity': similarity,
+                    'sources': partition.sources[best]
+                }
+
+        except Exception as e:
+            logger.error(f"Error consultando cache semántico: {e}")
+            return None
+
+    def store(self, query_embedding: List[float], language: str, response: Dict[str, Any],
+              sources: Iterable[str] = ()) -> bool:
+        """Guarda la respuesta asociada a la embedding de la consulta y los archivos que la respaldan"""
+        try:
+            query = self._normalize(query_embedding)
+            if query is None:
+                return False
+
+            with self._lock:
+                partition = self._partitions.get(language)
+                if partition is None or partition.matrix.shape[1] != query.shape[0]:
+                    partition = _LanguagePartition(self.max_entries, query.shape[0])
+                    self._partitions[language] = partition
+
+                slot = partition.next_slot
+                partition.matrix[slot] = query
+                partition.expires_at[slot] = time.time() + self.ttl
+                partition.responses[slot] = response
+                partition.sources[slot] = frozenset(sources)
+                partition.next_slot = (slot + 1) % self.max_entries
+                partition.size = min(partition.size + 1, self.max_entries)
+            return True
+
+        except Exception as e:
+            logger.error(f"Error guardando en cache semántico: {e}")
+            return False
+
+    def clear(self) -> bool:
+        """Invalida todas las entradas"""
+        with self._lock:
+            self._partitions = {}
+        logger.info("Cache semántico limpiado")
+        return True
+
+    def invalidate_sources(self, sources: Iterable[str], include_sourceless: bool = False) -> int:
+        """
+        Invalida las respuestas generadas con alguno de los archivos indicados
+
+        Con include_sourceless también caen las respuestas que no usaron
+        contexto, que podrían mejorar con documentos nuevos.
+        """
+        sources = set(sources)
+        invalidated = 0
+        with self._lock:
+            for partition in self._partitions.values():
+                for slot in range(partition.size):
+                    slot_sources = partition.sources[slot]
+                    if (slot_sources & sources) or (include_sourceless and not slot_sources):
+                        if partition.expires_at[slot] > 0:
+                            partition.expires_at[slot] = 0.0
+                            invalidated += 1
+        return invalidated
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Estadísticas del cache semántico"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'threshold': self.threshold,
+                'max_entries_per_language': self.max_entries,
+                'entries': {lang: p.size for lang, p in self._partitions.items()},
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> Optional[np.ndarray]:
+        if embedding is None or len(embedding) == 0:
+            return None
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return None
+        return vector / norm
@@ -1,12 +1,41 @@
 from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from app.models.schemas import ChatRequest, ChatResponse, ErrorResponse
 from app.services.chromadb_service import chromadb_service
 from app.services.gemini_service import gemini_service
+from app.utils.rate_limiter import get_client_identifier
+import asyncio
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter(tags=["Chat"])
 
+# Orquestador híbrido usado por el endpoint de streaming (se crea bajo demanda)
+orchestrator = None
+_orchestrator_lock = asyncio.Lock()
+
+async def get_orchestrator():
+    """
+    Obtiene el orquestador híbrido, creándolo en la primera llamada
+
+    La construcción (modelos, ChromaDB, índice de FAQs) es bloqueante: corre en
+    un hilo para no frenar el event loop, y el lock evita que requests
+    concurrentes lo construyan dos veces.
+    """
+    global orchestrator
+    if orchestrator is None:
+        async with _orchestrator_lock:
+            if orchestrator is None:
+                from app.core.orchestrator import HybridRAGOrchestrator
+                orchestrator = await asyncio.to_thread(HybridRAGOrchestrator)
+    return orchestrator
+
+def format_sse(event: str, data) -> str:
+    """Serializa un evento en formato Server-Sent Events"""
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    return f"event: {event}\ndata: {payload}\n\n"
+
 @router.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     """
@@ -35,6 +64,40 @@ async def chat(request: ChatRequest):
             detail=f"Error al procesar mensaje: {str(e)}"
         )
 
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest, http_request: Request):
+    """
+    Endpoint de chat en streaming (Server-Sent Events)
+
+    Emite eventos `token` con cada fragmento generado y un evento final `done`
+    (o `error`) con la respuesta estructurada completa.
+    """
+    # Mismo identificador que el rate limiter (IP real detrás de nginx, API key válida)
+    client_identifier = get_client_identifier(http_request)
+    hybrid_orchestrator = await get_orchestrator()
+
+    async def event_stream():
+        try:
+            async for event in hybrid_orchestrator.astream_hybrid_request(
+                message=request.message,
+                client_identifier=client_identifier,
+                user_context=request.context,
+                target_language=request.language or "es"
+            ):
+                yield format_sse(event['event'], event['data'])
+        except Exception as e:
+            logger.error(f"Error en endpoint /chat/stream: {e}")
+            yield format_sse("error", {"success": False, "error": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Evitar buffering en nginx
+        }
+    )
+
 @router.get("/chat/status")
 async def status():
     """Verifica el estado de los servicios"""
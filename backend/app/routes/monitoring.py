@@ -3,12 +3,19 @@ Monitoring Routes (FastAPI-only)
 Expone un dashboard simple y las métricas Prometheus.
 """
 
+import asyncio
 import logging
-from typing import Optional
-from fastapi import APIRouter, Request, Query
-from fastapi.responses import HTMLResponse, Response
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+from fastapi import APIRouter, Request, Query, HTTPException, Header, Depends
+from fastapi.responses import HTMLResponse, Response, JSONResponse, PlainTextResponse
 
+from ..config.settings import Config
 from ..monitoring.prometheus_exporter import get_metrics as prometheus_get_metrics
+from ..monitoring.prometheus_exporter import stage_latency_summary, flow_path_counts
+from ..monitoring.metrics_sampler import get_metrics_sampler, PSUTIL_AVAILABLE
+from ..monitoring.tracing import get_tracer
+from ..monitoring.profiler import get_profiler, ProfilerBusyError
 
 logger = logging.getLogger(__name__)
 
@@ -48,6 +55,70 @@ async def prometheus_raw():
     """Alias para obtener las métricas Prometheus en bruto."""
     data, content_type = prometheus_get_metrics()
     return Response(content=data, media_type=content_type)
+
+
+@router.get("/flows")
+async def flow_statistics_endpoint():
+    """Caminos del flujo y latencias p50/p95/p99 por etapa."""
+    return collect_flow_statistics()
+
+
+@router.get("/performance")
+async def performance_endpoint():
+    """Métricas de rendimiento del proceso y tiempos de respuesta."""
+    return collect_performance_metrics()
+
+
+@router.get("/performance/history")
+async def performance_history_endpoint():
+    """Historial reciente del sampler de métricas."""
+    return collect_performance_history()
+
+
+@router.get("/traces")
+async def traces_endpoint(limit: int = Query(20, ge=1, le=200, description="Trazas recientes a listar"),
+                          slowest: int = Query(5, ge=0, le=50, description="Trazas más lentas con sus spans")):
+    """Trazas recientes y las N más lentas, con el detalle de sus spans."""
+    return collect_traces(limit, slowest)
+
+
+@router.get("/traces/{trace_id}")
+async def trace_detail_endpoint(trace_id: str):
+    """Spans de una traza (trace_id del header x-trace-id)."""
+    trace = get_tracer().get_trace(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return trace
+
+
+def require_admin_key(x_api_key: Optional[str] = Header(None)) -> None:
+    """Dependencia: exige una API key de Config.ADMIN_API_KEYS en X-API-Key."""
+    if Config.is_valid_admin_key(x_api_key):
+        return
+    if not x_api_key:
+        raise HTTPException(status_code=401, detail="Admin API key required")
+    raise HTTPException(status_code=403, detail="Invalid admin API key")
+
+
+@router.get("/profile", dependencies=[Depends(require_admin_key)])
+async def profile_endpoint(seconds: float = Query(10, gt=0, le=Config.PROFILER_MAX_SECONDS,
+                                                  description="Duración del muestreo"),
+                           format: str = Query("collapsed", pattern="^(collapsed|speedscope)$",
+                                               description="collapsed (texto) o speedscope (JSON)")):
+    """Perfil estadístico de todos los hilos durante N segundos (solo admin)."""
+    try:
+        # El muestreo corre en un hilo: el event loop sigue atendiendo (y aparece en el perfil)
+        result = await asyncio.to_thread(get_profiler().profile, seconds)
+    except ProfilerBusyError:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+
+    stats = result.get_stats()
+    headers = {'X-Profile-Samples': str(stats['samples']), 'X-Profile-Interval-Ms': str(stats['interval_ms'])}
+    logger.info(f"Perfilado de {stats['duration_seconds']}s: {stats['samples']} muestras, "
+                f"{stats['distinct_stacks']} pilas distintas")
+    if format == 'speedscope':
+        return JSONResponse(content=result.to_speedscope(), headers=headers)
+    return PlainTextResponse(content=result.to_collapsed(), headers=headers)
 # ==================== FUNCIONES DE RECOLECCIÓN DE MÉTRICAS ====================
 
 def collect_system_metrics(component: Optional[str] = None, time_range: str = "1h") -> Dict[str, Any]:
@@ -102,130 +173,81 @@ def collect_system_metrics(component: Optional[str] = None, time_range: str = "1
 
     return metrics
 
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 3) if seconds is not None else None
+
 def collect_flow_statistics() -> Dict[str, Any]:
     """
     Recolecta estadísticas del flujo de procesamiento
+    Los datos salen de los histogramas Prometheus alimentados por el orquestador
+    (cuantiles interpolados dentro de cada bucket)
     """
-    # TODO: Implementar recolección real desde base de datos o cache
+    stages = stage_latency_summary()
+    total_requests = stages.pop('total', {}).get('count', 0)
+    paths = flow_path_counts()
+
     return {
         'timestamp': datetime.now().isoformat(),
         'flow_paths': {
-            'cache_hit': {'count': 150, 'percentage': 15.0},
-            'faq_response': {'count': 300, 'percentage': 30.0},
-            'rag_generation': {'count': 450, 'percentage': 45.0},
-            'emergency_mode': {'count': 50, 'percentage': 5.0},
-            'rate_limit_exceeded': {'count': 30, 'percentage': 3.0},
-            'input_validation_failed': {'count': 20, 'percentage': 2.0}
+            path: {
+                'count': count,
+                'percentage': round(100.0 * count / total_requests, 2) if total_requests else 0.0
+            }
+            for path, count in sorted(paths.items(), key=lambda item: item[1], reverse=True)
         },
         'steps_performance': {
-            'rate_limiting': {'avg_time_ms': 2, 'p95_time_ms': 5, 'p99_time_ms': 10},
-            'input_validation': {'avg_time_ms': 5, 'p95_time_ms': 10, 'p99_time_ms': 20},
-            'cache_lookup': {'avg_time_ms': 10, 'p95_time_ms': 20, 'p99_time_ms': 50},
-            'faq_classification': {'avg_time_ms': 15, 'p95_time_ms': 30, 'p99_time_ms': 60},
-            'rag_generation': {'avg_time_ms': 500, 'p95_time_ms': 1000, 'p99_time_ms': 2000},
-            'safety_check': {'avg_time_ms': 20, 'p95_time_ms': 40, 'p99_time_ms': 80},
-            'i18n': {'avg_time_ms': 10, 'p95_time_ms': 20, 'p99_time_ms': 40}
+            stage: {
+                'count': values['count'],
+                'avg_time_ms': _ms(values['avg']),
+                'p50_time_ms': _ms(values['p50']),
+                'p95_time_ms': _ms(values['p95']),
+                'p99_time_ms': _ms(values['p99'])
+            }
+            for stage, values in sorted(stages.items(), key=lambda item: item[1]['avg'], reverse=True)
         },
-        'total_requests_processed': 1000,
-        'requests_last_hour': 100,
-        'requests_last_24h': 800,
-        'peak_hour': '14:00-15:00',
-        'peak_requests': 150
+        'total_requests_processed': total_requests
     }
 
 def collect_performance_metrics() -> Dict[str, Any]:
     """
     Recolecta métricas de rendimiento
+    Devuelve la última foto del sampler en segundo plano: no consulta psutil
+    ni recorre datos en la request
     """
-    try:
-        import psutil
-    except Exception:
-        psutil = None
-
-    if psutil is None:
-        # psutil no disponible: devolver métricas por defecto y nota en el resultado
-        return {
-            'timestamp': datetime.now().isoformat(),
-            'system': {
-                'cpu_percent': None,
-                'memory_mb': None,
-                'memory_percent': None,
-                'threads': None,
-                'open_files': None
-            },
-            'response_times': {
-                'average_ms': None,
-                'median_ms': None,
-                'p95_ms': None,
-                'p99_ms': None,
-                'max_ms': None
-            },
-            'throughput': {
-                'requests_per_second': None,
-                'requests_per_minute': None,
-                'bytes_per_second': None
-            },
-            'cache': {
-                'hit_rate': None,
-                'miss_rate': None,
-                'evictions_per_minute': None,
-                'size_mb': None
-            },
-            'database': {
-                'active_connections': None,
-                'query_avg_ms': None,
-                'slow_queries': None
-            },
-            'note': 'psutil not installed; install psutil to get detailed system metrics'
-        }
-
-    import os
-
-    process = psutil.Process(os.getpid())
-
-    # Llamada a cpu_percent con un intervalo 0.1 para obtener valor más estable
-    try:
-        cpu = process.cpu_percent(interval=0.1)
-    except Exception:
-        cpu = process.cpu_percent()
+    snapshot = get_metrics_sampler().snapshot()
+    metrics = {
+        'timestamp': datetime.fromtimestamp(snapshot['timestamp']).isoformat(),
+        'system': snapshot['system'] or {
+            'cpu_percent': None,
+            'memory_mb': None,
+            'memory_percent': None,
+            'threads': None,
+            'open_files': None
+        },
+        'response_times': snapshot['response_times'],
+        'throughput': snapshot['throughput'],
+        'cache': snapshot['cache']
+    }
+    if not PSUTIL_AVAILABLE:
+        metrics['note'] = 'psutil not installed; install psutil to get detailed system metrics'
+    return metrics
 
-    try:
-        open_files = len(process.open_files()) if hasattr(process, 'open_files') else 0
-    except Exception:
-        open_files = None
+def collect_performance_history() -> Dict[str, Any]:
+    """Muestras del ring buffer del sampler (CPU, memoria, requests por intervalo)"""
+    sampler = get_metrics_sampler()
+    return {
+        'interval_seconds': sampler.interval,
+        'samples': sampler.get_history()
+    }
 
+def collect_traces(limit: int = 20, slowest: int = 5) -> Dict[str, Any]:
+    """Resumen de las trazas del ring buffer y detalle de las más lentas"""
+    tracer = get_tracer()
     return {
         'timestamp': datetime.now().isoformat(),
-        'system': {
-            'cpu_percent': cpu,
-            'memory_mb': process.memory_info().rss / 1024 / 1024 if hasattr(process, 'memory_info') else None,
-            'memory_percent': process.memory_percent() if hasattr(process, 'memory_percent') else None,
-            'threads': process.num_threads() if hasattr(process, 'num_threads') else None,
-            'open_files': open_files
-        },
-        'response_times': {
-            'average_ms': 150,
-            'median_ms': 100,
-            'p95_ms': 500,
-            'p99_ms': 1000,
-            'max_ms': 5000
-        },
-        'throughput': {
-            'requests_per_second': 10,
-            'requests_per_minute': 600,
-            'bytes_per_second': 50000
-        },
-        'cache': {
-            'hit_rate': 0.35,
-            'miss_rate': 0.65,
-            'evictions_per_minute': 5,
-            'size_mb': 50
-        },
-        'database': {
-            'active_connections': 5,
-            'query_avg_ms': 20,
-            'slow_queries': 2
-        }
+        'stats': tracer.get_stats(),
+        'recent': tracer.recent(limit),
+        'slowest': tracer.slowest(slowest)
     }
 
 def collect_system_alerts(severity: Optional[str] = None) -> Dict[str, Any]:
@@ -711,4 +733,5 @@ def generate_dashboard_html() -> str:
 """
 
 # ==================== EXPORTACIÓN ====================
-__all__ = ['router', 'collect_system_metrics', 'collect_flow_statistics']
+__all__ = ['router', 'collect_system_metrics', 'collect_flow_statistics', 'collect_performance_metrics',
+           'collect_traces']
@@ -1,3 +1,4 @@
+import re
 import logging
 from typing import Dict, Optional, List, Any
 from dataclasses import dataclass
@@ -18,6 +19,65 @@ class Translation:
     en: str
     category: str = "general"
 
+# Con pocas traducciones, comprobar cada texto con `in` es más barato que la regex
+_SUBSTRING_SCAN_LIMIT = 32
+
+def _trie_pattern(texts: List[str]) -> Optional[re.Pattern]:
+    """
+    Compila un conjunto de textos en una regex con forma de trie
+    Cada posición se resuelve siguiendo un único camino de prefijos, así el
+    costo por carácter depende de la longitud del match y no de cuántos textos
+    hay. Los opcionales son codiciosos: gana la coincidencia más larga.
+    """
+    trie: Dict[str, Any] = {}
+    for text in texts:
+        if not text:
+            continue
+        node = trie
+        for char in text:
+            node = node.setdefault(char, {})
+        node[''] = True
+    
+    def render(node: Dict[str, Any]) -> str:
+        branches = []
+        for char, child in node.items():
+            if not char:
+                continue
+            # Las cadenas sin bifurcaciones se recorren sin recursión
+            run = [char]
+            while len(child) == 1 and '' not in child:
+                char, child = next(iter(child.items()))
+                run.append(char)
+            branches.append(re.escape(''.join(run)) + render(child))
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:
+            grouped = len(branches) > 1 or len(body) == 1
+            return body + '?' if grouped else '(?:' + body + ')?'
+        return body
+    
+    return re.compile(render(trie)) if trie else None
+
+class _LookupTables:
+    """Índices inversos texto -> clave por idioma y sus regex de reemplazo (inmutables una vez publicados)"""
+    
+    def __init__(self, translations: Dict[str, 'Translation']):
+        self.text_to_key: Dict[Language, Dict[str, str]] = {lang: {} for lang in Language}
+        for key, translation in translations.items():
+            for lang in Language:
+                text = getattr(translation, lang.value)
+                if text:
+                    # Ante textos repetidos gana la primera traducción
+                    self.text_to_key[lang].setdefault(text, key)
+        self._patterns: Dict[Language, Optional[re.Pattern]] = {}
+    
+    def pattern(self, source_lang: Language) -> Optional[re.Pattern]:
+        """Regex de un solo paso con todos los textos del idioma de origen (compilada bajo demanda)"""
+        if source_lang not in self._patterns:
+            self._patterns[source_lang] = _trie_pattern(list(self.text_to_key[source_lang]))
+        return self._patterns[source_lang]
+
 class I18nService:
     """
     Servicio de internacionalización según diagrama híbrido
@@ -28,8 +88,9 @@ class I18nService:
         self.translations: Dict[str, Translation] = {}
         self.default_language = Language.SPANISH
         
-        # Cargar traducciones predefinidas
+        # Cargar traducciones predefinidas y construir los índices inversos
         self._load_translations()
+        self._tables = _LookupTables(self.translations)
         
         logger.info(f"I18nService inicializado con {len(self.translations)} traducciones")
     
@@ -243,22 +304,25 @@ class I18nService:
     
     def _translate_text(self, text: str, target_lang: Language) -> str:
         """Traduce texto usando las traducciones predefinidas o pasándolo como está"""
-        # Buscar traducción exacta
-        for key, translation in self.translations.items():
-            if target_lang == Language.SPANISH and text == translation.en:
-                return translation.es
-            elif target_lang == Language.ENGLISH and text == translation.es:
-                return translation.en
+        if not text:
+            return text
+        
+        source_lang = Language.ENGLISH if target_lang == Language.SPANISH else Language.SPANISH
+        tables = self._tables
+        lookup = tables.text_to_key[source_lang]
         
-        # Si no hay traducción exacta, buscar por coincidencias parciales
-        translated_text = text
-        for key, translation in self.translations.items():
-            if target_lang == Language.SPANISH:
-                translated_text = translated_text.replace(translation.en, translation.es)
-            elif target_lang == Language.ENGLISH:
-                translated_text = translated_text.replace(translation.es, translation.en)
+        # Buscar traducción exacta
+        key = lookup.get(text)
+        if key is not None:
+            return getattr(self.translations[key], target_lang.value)
         
-        return translated_text
+        # Si no hay traducción exacta, reemplazar coincidencias parciales en una sola pasada
+        if len(lookup) <= _SUBSTRING_SCAN_LIMIT and not any(source in text for source in lookup):
+            return text
+        pattern = tables.pattern(source_lang)
+        if pattern is None:
+            return text
+        return pattern.sub(lambda match: getattr(self.translations[lookup[match.group()]], target_lang.value), text)
     
     def _translate_metadata(self, metadata: Dict[str, Any], target_lang: Language) -> Dict[str, Any]:
         """Traduce campos de metadata"""
@@ -333,6 +397,8 @@ class I18nService:
         """Agrega nueva traducción"""
         try:
             self.translations[translation.key] = translation
+            # Se publican índices nuevos; las traducciones en curso siguen con los anteriores
+            self._tables = _LookupTables(self.translations)
             logger.info(f"Traducción agregada: {translation.key}")
             return True
         except Exception as e:
@@ -3,6 +3,7 @@ import logging
 from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
 from enum import Enum
+from ..utils.regex_literals import fold_text, required_literals
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +24,52 @@ class SafetyRule:
     description: str
     action: str  # block, warn, filter, template
 
+class _CompiledRuleSet:
+    """
+    Conjunto de reglas precompilado con prefiltro de palabras clave
+    
+    De cada patrón se extraen los literales que toda coincidencia debe contener
+    ('contraseña', '<script'...). Una verificación normaliza el texto una vez y
+    descarta con búsquedas de subcadena las reglas cuyos literales no aparecen;
+    solo las candidatas (y las reglas sin literales, como la de repetición)
+    ejecutan su regex ya compilada. Devuelve todas las reglas disparadas.
+    """
+    
+    def __init__(self, rules: List[SafetyRule]):
+        self.rules: List[SafetyRule] = []
+        self.compiled: Dict[str, re.Pattern] = {}
+        self._entries: List[Tuple[SafetyRule, re.Pattern, Optional[Tuple[str, ...]]]] = []
+        
+        for rule in rules:
+            try:
+                compiled = re.compile(rule.pattern, re.IGNORECASE)
+            except re.error as e:
+                logger.warning(f"Patrón regex inválido en regla {rule.id}: {e}")
+                continue
+            
+            self.rules.append(rule)
+            self.compiled[rule.id] = compiled
+            self._entries.append((rule, compiled, required_literals(rule.pattern)))
+    
+    @property
+    def prefiltered_rules(self) -> int:
+        return sum(1 for _, _, literals in self._entries if literals is not None)
+    
+    def find(self, text: str) -> List[SafetyRule]:
+        """Reglas que coinciden en el texto, en el orden en que fueron definidas"""
+        folded = None
+        triggered = []
+        for rule, compiled, literals in self._entries:
+            if literals is not None:
+                if folded is None:
+                    folded = fold_text(text)
+                if not any(literal in folded for literal in literals):
+                    continue
+            if compiled.search(text):
+                triggered.append(rule)
+        return triggered
+
+
 class SafetyChecker:
     """
     Verificador de seguridad según diagrama híbrido
@@ -33,6 +80,8 @@ class SafetyChecker:
         self.safety_rules: Dict[str, SafetyRule] = {}
         self.blocked_patterns: List[re.Pattern] = []
         self.warning_patterns: List[re.Pattern] = []
+        self._rule_set = _CompiledRuleSet([])
+        self._blocked_rule_set = _CompiledRuleSet([])
         
         # Cargar reglas de seguridad
         self._load_safety_rules()
@@ -54,28 +103,25 @@ class SafetyChecker:
             issues = []
             filtered_message = message
             max_level = SafetyLevel.SAFE
+            blocked = False
+            rule_set = self._rule_set
+            
+            # Una sola pasada devuelve todas las reglas disparadas
+            for rule in rule_set.find(message):
+                issues.append(self._rule_issue(rule))
+                
+                # Actualizar nivel máximo de riesgo
+                if self._is_more_severe(rule.level, max_level):
+                    max_level = rule.level
+                
+                # Aplicar acción correspondiente
+                if rule.action == "block":
+                    blocked = True
+                elif rule.action == "filter" and not blocked:
+                    filtered_message = rule_set.compiled[rule.id].sub("[FILTRADO]", filtered_message)
             
-            # Verificar cada regla de seguridad
-            for rule_id, rule in self.safety_rules.items():
-                if self._matches_pattern(message, rule.pattern):
-                    issues.append({
-                        'rule_id': rule_id,
-                        'category': rule.category,
-                        'level': rule.level.value,
-                        'description': rule.description,
-                        'action': rule.action
-                    })
-                    
-                    # Actualizar nivel máximo de riesgo
-                    if self._is_more_severe(rule.level, max_level):
-                        max_level = rule.level
-                    
-                    # Aplicar acción correspondiente
-                    if rule.action == "filter":
-                        filtered_message = self._apply_filter(filtered_message, rule.pattern)
-                    elif rule.action == "block":
-                        filtered_message = ""
-                        break
+            if blocked:
+                filtered_message = ""
             
             return {
                 'is_safe': max_level in [SafetyLevel.SAFE, SafetyLevel.WARNING],
@@ -158,6 +204,36 @@ class SafetyChecker:
                 'error': str(e)
             }
     
+    def check_stream_safety(self, text_window: str) -> Dict[str, any]:
+        """
+        Verificación incremental para respuestas en streaming
+        
+        Evalúa solo las reglas de nivel BLOCKED sobre la ventana deslizante del
+        buffer generado; las comprobaciones que requieren la respuesta completa
+        (longitud, repetición, coherencia) se hacen al final con check_output_safety.
+        
+        Args:
+            text_window: Final del texto ya emitido más el fragmento nuevo
+        
+        Returns:
+            Dict con is_safe e issues
+        """
+        try:
+            issues = [self._rule_issue(rule) for rule in self._blocked_rule_set.find(text_window)]
+            
+            return {
+                'is_safe': not issues,
+                'issues': issues
+            }
+            
+        except Exception as e:
+            logger.error(f"Error verificando seguridad del stream: {e}")
+            return {
+                'is_safe': False,
+                'issues': [{'category': 'error', 'description': str(e)}],
+                'error': str(e)
+            }
+    
     def _load_safety_rules(self):
         """Carga reglas de seguridad predefinidas"""
         rules = [
@@ -237,28 +313,32 @@ class SafetyChecker:
             self.safety_rules[rule.id] = rule
     
     def _compile_patterns(self):
-        """Compila patrones regex para optimización"""
-        self.blocked_patterns = []
-        self.warning_patterns = []
+        """
+        Compila las reglas en los matchers combinados
         
-        for rule in self.safety_rules.values():
-            try:
-                compiled_pattern = re.compile(rule.pattern, re.IGNORECASE)
-                
-                if rule.level == SafetyLevel.BLOCKED:
-                    self.blocked_patterns.append(compiled_pattern)
-                elif rule.level in [SafetyLevel.WARNING, SafetyLevel.UNSAFE]:
-                    self.warning_patterns.append(compiled_pattern)
-                    
-            except re.error as e:
-                logger.warning(f"Patrón regex inválido en regla {rule.id}: {e}")
+        Los objetos nuevos se construyen completos y se publican con una
+        asignación, de modo que una verificación concurrente usa siempre el
+        conjunto anterior o el nuevo, nunca uno a medias.
+        """
+        rules = list(self.safety_rules.values())
+        rule_set = _CompiledRuleSet(rules)
+        blocked_rule_set = _CompiledRuleSet([rule for rule in rules if rule.level == SafetyLevel.BLOCKED])
+        
+        self._rule_set = rule_set
+        self._blocked_rule_set = blocked_rule_set
+        self.blocked_patterns = [rule_set.compiled[rule.id] for rule in rule_set.rules if rule.level == SafetyLevel.BLOCKED]
+        self.warning_patterns = [rule_set.compiled[rule.id] for rule in rule_set.rules
+                                 if rule.level in [SafetyLevel.WARNING, SafetyLevel.UNSAFE]]
     
-    def _matches_pattern(self, text: str, pattern: str) -> bool:
-        """Verifica si el texto coincide con el patrón"""
-        try:
-            return bool(re.search(pattern, text, re.IGNORECASE))
-        except re.error:
-            return False
+    def _rule_issue(self, rule: SafetyRule) -> Dict[str, str]:
+        """Issue reportado cuando una regla se dispara"""
+        return {
+            'rule_id': rule.id,
+            'category': rule.category,
+            'level': rule.level.value,
+            'description': rule.description,
+            'action': rule.action
+        }
     
     def _is_more_severe(self, level1: SafetyLevel, level2: SafetyLevel) -> bool:
         """Compara severidad de niveles de seguridad"""
@@ -270,13 +350,6 @@ class SafetyChecker:
         }
         return severity_order[level1] > severity_order[level2]
     
-    def _apply_filter(self, text: str, pattern: str) -> str:
-        """Aplica filtro para remover contenido problemático"""
-        try:
-            return re.sub(pattern, "[FILTRADO]", text, flags=re.IGNORECASE)
-        except re.error:
-            return text
-    
     def _check_output_content(self, response: str) -> List[Dict]:
         """Verifica contenido de la respuesta"""
         issues = []
@@ -365,7 +438,10 @@ class SafetyChecker:
             # Verificar que el patrón sea válido
             re.compile(rule.pattern)
             
-            self.safety_rules[rule.id] = rule
+            # Copia del diccionario: las verificaciones en curso no lo ven mutar
+            safety_rules = dict(self.safety_rules)
+            safety_rules[rule.id] = rule
+            self.safety_rules = safety_rules
             self._compile_patterns()
             
             logger.info(f"Regla de seguridad agregada: {rule.id}")
@@ -391,7 +467,8 @@ class SafetyChecker:
             'by_level': level_counts,
             'by_category': category_counts,
             'blocked_patterns': len(self.blocked_patterns),
-            'warning_patterns': len(self.warning_patterns)
+            'warning_patterns': len(self.warning_patterns),
+            'prefiltered_rules': self._rule_set.prefiltered_rules
         }
 
 # Instancia global del verificador de seguridad
@@ -405,6 +482,10 @@ def check_output_safety(response: str, context: Dict = None) -> Dict[str, any]:
     """Función helper para verificar seguridad del output"""
     return safety_checker.check_output_safety(response, context)
 
+def check_stream_safety(text_window: str) -> Dict[str, any]:
+    """Función helper para verificar seguridad incremental del streaming"""
+    return safety_checker.check_stream_safety(text_window)
+
 def is_safe_content(text: str) -> bool:
     """Verificación rápida de seguridad"""
     try:
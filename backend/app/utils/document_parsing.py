@@ -0,0 +1,124 @@
+"""
+Parseo y troceado de archivos para el pool de ingesta
+
+Es el punto de entrada de los workers de FileSystemDocumentProcessor. Cada
+worker (forkserver/spawn) importa este módulo y nada más, así que solo carga
+PyPDF2 y docx: importar app.providers arrastraría chromadb y el SDK de Gemini
+a cada proceso (~150 MB de RSS por worker).
+"""
+
+import logging
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List
+
+import PyPDF2
+import docx
+
+logger = logging.getLogger(__name__)
+
+
+def parse_file(path: str, chunk_size: int, chunk_overlap: int) -> List[Dict[str, Any]]:
+    """Parsea y trocea un archivo en documentos con su metadata"""
+    file_path = Path(path)
+    try:
+        try:
+            chunks = list(iter_chunks(iter_file_parts(file_path), chunk_size, chunk_overlap))
+        except UnicodeDecodeError:
+            chunks = list(iter_chunks(iter_text_blocks(file_path, 'latin-1'), chunk_size, chunk_overlap))
+
+        return [
+            {
+                'content': chunk,
+                'metadata': {
+                    'filename': file_path.name,
+                    'file_type': file_path.suffix.lower(),
+                    'chunk_index': i,
+                    'total_chunks': len(chunks),
+                    'directory': file_path.parent.name,
+                    'full_path': str(file_path)
+                }
+            }
+            for i, chunk in enumerate(chunks)
+        ]
+
+    except Exception as e:
+        logger.error(f"Error procesando {file_path}: {e}")
+        return []
+
+
+def iter_file_parts(file_path: Path) -> Iterator[str]:
+    """Emite el texto del archivo por partes (páginas, párrafos o bloques)"""
+    file_extension = file_path.suffix.lower()
+    if file_extension == '.pdf':
+        return iter_pdf_pages(file_path)
+    if file_extension == '.docx':
+        return iter_docx_paragraphs(file_path)
+    if file_extension in ['.txt', '.md']:
+        return iter_text_blocks(file_path, 'utf-8')
+    return iter(())
+
+
+def iter_pdf_pages(file_path: Path) -> Iterator[str]:
+    """Lee PDF página a página"""
+    with open(file_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        for page in pdf_reader.pages:
+            yield (page.extract_text() or "") + "\n"
+
+
+def iter_docx_paragraphs(file_path: Path) -> Iterator[str]:
+    """Lee DOCX párrafo a párrafo"""
+    doc = docx.Document(file_path)
+    for paragraph in doc.paragraphs:
+        yield paragraph.text + "\n"
+
+
+def iter_text_blocks(file_path: Path, encoding: str, block_size: int = 64 * 1024) -> Iterator[str]:
+    """Lee texto en bloques"""
+    with open(file_path, 'r', encoding=encoding) as file:
+        for block in iter(lambda: file.read(block_size), ''):
+            yield block
+
+
+def iter_chunks(parts: Iterable[str], chunk_size: int, chunk_overlap: int) -> Iterator[str]:
+    """
+    Trocea texto que llega por partes sin concatenar el documento completo
+
+    Solo se corta cuando el límite del chunk queda antes del final del texto
+    ya recibido (ignorando espacios finales), así el resultado es el mismo
+    que trocear el texto completo con strip().
+    """
+    buffer = ""
+    started = False
+    for part in parts:
+        if not started:
+            part = part.lstrip()
+            if not part:
+                continue
+            started = True
+        buffer += part
+
+        start = 0
+        limit = len(buffer.rstrip())
+        while start + chunk_size < limit:
+            end = start + chunk_size
+            last_space = buffer.rfind(' ', start, end)
+            last_newline = buffer.rfind('\n', start, end)
+            last_period = buffer.rfind('.', start, end)
+
+            cut_point = max(last_space, last_newline, last_period)
+            if cut_point > start:
+                end = cut_point + (1 if buffer[cut_point] == '.' else 0)
+
+            chunk = buffer[start:end].strip()
+            if chunk:
+                yield chunk
+
+            # El overlap nunca hace retroceder el inicio
+            start = max(end - chunk_overlap, start + 1)
+
+        buffer = buffer[start:]
+
+    tail = buffer.strip()
+    if tail:
+        yield tail
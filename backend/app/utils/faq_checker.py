@@ -1,8 +1,13 @@
 import re
+import heapq
 import logging
-from typing import Dict, List, Optional, Tuple
+import threading
+from typing import Dict, List, Optional, Tuple, Set
 from dataclasses import dataclass
 from difflib import SequenceMatcher
+import numpy as np
+from .regex_literals import fold_text, required_literals, example_text
+from ..config.settings import Config
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +22,108 @@ class FAQItem:
     priority: int = 1  # 1 = alta, 2 = media, 3 = baja
     language: str = "es"
 
+NGRAM_SIZE = 3
+
+
+def _char_ngrams(text: str, size: int = NGRAM_SIZE) -> Set[str]:
+    """N-gramas de caracteres de un texto"""
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+class FAQIndex:
+    """
+    Índice precompilado de patrones FAQ
+    
+    - Tier de patrones: cada regex se compila una vez y se indexa por un
+      trigrama de un literal que toda coincidencia debe contener; solo se
+      ejecutan las regex cuyos trigramas aparecen en el mensaje.
+    - Tier de similitud: los patrones limpios se indexan por trigramas de
+      caracteres; el coeficiente de Dice sobre trigramas compartidos elige los
+      top_k candidatos y solo esos pasan por SequenceMatcher.
+    
+    Los identificadores de patrón siguen el orden de inserción, así que los
+    empates se resuelven igual que el recorrido lineal original.
+    """
+    
+    def __init__(self, top_k: int = 8):
+        self.top_k = top_k
+        self.pattern_faq_ids: List[str] = []
+        self.compiled: List[Optional[re.Pattern]] = []
+        self.clean_patterns: List[str] = []
+        self._clean_gram_counts: List[int] = []
+        self._literal_index: Dict[str, List[int]] = {}
+        self._unindexed: List[int] = []
+        self._gram_index: Dict[str, List[int]] = {}
+    
+    def add(self, faq: 'FAQItem'):
+        """Indexa los patrones de una FAQ"""
+        for pattern in faq.question_patterns:
+            pattern_id = len(self.pattern_faq_ids)
+            self.pattern_faq_ids.append(faq.id)
+            
+            try:
+                compiled = re.compile(pattern, re.IGNORECASE)
+            except re.error:
+                logger.warning(f"Patrón regex inválido en FAQ {faq.id}: {pattern}")
+                compiled = None
+            self.compiled.append(compiled)
+            if compiled is not None:
+                self._index_literals(pattern_id, pattern)
+            
+            # Remover regex especiales para comparación de similitud
+            clean_pattern = re.sub(r'[^\w\s]', '', pattern).lower()
+            self.clean_patterns.append(clean_pattern)
+            grams = _char_ngrams(f" {clean_pattern} ")
+            self._clean_gram_counts.append(len(grams))
+            for gram in grams:
+                self._gram_index.setdefault(gram, []).append(pattern_id)
+    
+    def _index_literals(self, pattern_id: int, pattern: str):
+        """Asocia el patrón al trigrama menos frecuente de cada literal obligatorio"""
+        literals = required_literals(pattern)
+        if not literals or min(map(len, literals)) < NGRAM_SIZE:
+            self._unindexed.append(pattern_id)
+            return
+        
+        keys = set()
+        for literal in literals:
+            keys.add(min(_char_ngrams(literal), key=lambda gram: len(self._literal_index.get(gram, ()))))
+        for key in keys:
+            self._literal_index.setdefault(key, []).append(pattern_id)
+    
+    def pattern_candidates(self, message: str) -> List[int]:
+        """Patrones cuya regex puede coincidir con el mensaje, en orden de inserción"""
+        candidates = set(self._unindexed)
+        for gram in _char_ngrams(fold_text(message)):
+            posting = self._literal_index.get(gram)
+            if posting:
+                candidates.update(posting)
+        return sorted(candidates)
+    
+    def similarity_candidates(self, message: str) -> List[int]:
+        """Top-k patrones por coeficiente de Dice de trigramas, en orden de inserción"""
+        grams = _char_ngrams(f" {message} ")
+        shared: Dict[int, int] = {}
+        for gram in grams:
+            for pattern_id in self._gram_index.get(gram, ()):
+                shared[pattern_id] = shared.get(pattern_id, 0) + 1
+        if not shared:
+            return []
+        
+        top = heapq.nlargest(
+            self.top_k, shared,
+            key=lambda pattern_id: 2 * shared[pattern_id] / (len(grams) + self._clean_gram_counts[pattern_id])
+        )
+        return sorted(top)
+    
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            'patterns_indexed': len(self.pattern_faq_ids),
+            'unindexed_patterns': len(self._unindexed),
+            'literal_keys': len(self._literal_index),
+            'ngram_keys': len(self._gram_index)
+        }
+
 class FAQClassifier:
     """
     Clasificador de FAQ según diagrama híbrido
@@ -26,10 +133,15 @@ class FAQClassifier:
     def __init__(self):
         self.faqs: Dict[str, FAQItem] = {}
         self.keyword_index: Dict[str, List[str]] = {}
+        self.index = FAQIndex()
+        # Versión del conjunto de FAQs: los índices derivados (semántico) se
+        # reconstruyen cuando cambia
+        self.version = 0
         
         # Inicializar FAQs predefinidas
         self._load_default_faqs()
         self._build_keyword_index()
+        self._build_faq_index()
         
         logger.info(f"FAQClassifier inicializado con {len(self.faqs)} FAQs")
     
@@ -243,6 +355,13 @@ class FAQClassifier:
                     self.keyword_index[keyword] = []
                 self.keyword_index[keyword].append(faq_id)
     
+    def _build_faq_index(self):
+        """Precompila patrones y construye el índice de n-gramas"""
+        index = FAQIndex(top_k=self.index.top_k)
+        for faq in self.faqs.values():
+            index.add(faq)
+        self.index = index
+    
     def _normalize_message(self, message: str) -> str:
         """Normaliza mensaje para búsqueda"""
         # Convertir a minúsculas
@@ -260,26 +379,26 @@ class FAQClassifier:
         """Búsqueda por patrones regex (alta precisión)"""
         best_match = None
         best_confidence = 0.0
+        index = self.index
         
-        for faq_id, faq in self.faqs.items():
-            for pattern in faq.question_patterns:
-                try:
-                    if re.search(pattern, message, re.IGNORECASE):
-                        # Calcular confianza basada en la longitud del match
-                        match = re.search(pattern, message, re.IGNORECASE)
-                        confidence = len(match.group()) / len(message)
-                        confidence = min(confidence * 1.2, 1.0)  # Boost para matches exactos
-                        
-                        if confidence > best_confidence:
-                            best_confidence = confidence
-                            best_match = {
-                                'faq_id': faq_id,
-                                'response': faq.response,
-                                'confidence': confidence,
-                                'category': faq.category
-                            }
-                except re.error:
-                    logger.warning(f"Patrón regex inválido en FAQ {faq_id}: {pattern}")
+        for pattern_id in index.pattern_candidates(message):
+            match = index.compiled[pattern_id].search(message)
+            if not match:
+                continue
+            
+            # Calcular confianza basada en la longitud del match
+            confidence = len(match.group()) / len(message)
+            confidence = min(confidence * 1.2, 1.0)  # Boost para matches exactos
+            
+            if confidence > best_confidence:
+                best_confidence = confidence
+                faq = self.faqs[index.pattern_faq_ids[pattern_id]]
+                best_match = {
+                    'faq_id': faq.id,
+                    'response': faq.response,
+                    'confidence': confidence,
+                    'category': faq.category
+                }
         
         return best_match if best_confidence > 0.6 else None
     
@@ -319,36 +438,46 @@ class FAQClassifier:
         """Búsqueda por similitud de texto (baja precisión, alta cobertura)"""
         best_match = None
         best_similarity = 0.0
+        index = self.index
         
-        for faq_id, faq in self.faqs.items():
-            for pattern in faq.question_patterns:
-                # Remover regex especiales para comparación de similitud
-                clean_pattern = re.sub(r'[^\w\s]', '', pattern).lower()
-                
-                similarity = SequenceMatcher(None, message, clean_pattern).ratio()
-                
-                if similarity > best_similarity:
-                    best_similarity = similarity
-                    best_match = {
-                        'faq_id': faq_id,
-                        'response': faq.response,
-                        'confidence': similarity * 0.9,  # Reducir confianza para matches de similitud
-                        'category': faq.category
-                    }
+        # Solo los top-k candidatos por trigramas pasan por SequenceMatcher
+        for pattern_id in index.similarity_candidates(message):
+            matcher = SequenceMatcher(None, message, index.clean_patterns[pattern_id])
+            if matcher.real_quick_ratio() <= best_similarity or matcher.quick_ratio() <= best_similarity:
+                continue
+            
+            similarity = matcher.ratio()
+            if similarity > best_similarity:
+                best_similarity = similarity
+                faq = self.faqs[index.pattern_faq_ids[pattern_id]]
+                best_match = {
+                    'faq_id': faq.id,
+                    'response': faq.response,
+                    'confidence': similarity * 0.9,  # Reducir confianza para matches de similitud
+                    'category': faq.category
+                }
         
         return best_match if best_similarity > 0.7 else None
     
     def add_faq(self, faq: FAQItem) -> bool:
         """Agrega nueva FAQ dinámicamente"""
         try:
-            self.faqs[faq.id] = faq
-            
-            # Actualizar índice de keywords
-            for keyword in faq.keywords:
-                if keyword not in self.keyword_index:
-                    self.keyword_index[keyword] = []
-                self.keyword_index[keyword].append(faq.id)
+            if faq.id in self.faqs:
+                # Reemplazo: reconstruir índices para no dejar patrones obsoletos
+                self.faqs[faq.id] = faq
+                self._build_keyword_index()
+                self._build_faq_index()
+            else:
+                self.faqs[faq.id] = faq
+                
+                # Actualizar índices de keywords y patrones
+                for keyword in faq.keywords:
+                    if keyword not in self.keyword_index:
+                        self.keyword_index[keyword] = []
+                    self.keyword_index[keyword].append(faq.id)
+                self.index.add(faq)
             
+            self.version += 1
             logger.info(f"FAQ agregada: {faq.id}")
             return True
         except Exception as e:
@@ -372,7 +501,185 @@ class FAQClassifier:
             'total_faqs': len(self.faqs),
             'categories': categories,
             'priorities': priorities,
-            'keywords_indexed': len(self.keyword_index)
+            'keywords_indexed': len(self.keyword_index),
+            **self.index.get_stats()
+        }
+
+class SemanticFAQIndex:
+    """
+    Tier semántico del clasificador FAQ
+    
+    Embebe una vez el texto representativo de cada question_pattern y lo guarda
+    en una matriz normalizada. Una consulta se resuelve con un producto matriz
+    por vector contra la embedding de la consulta que ya calculó el orquestador,
+    así las paráfrasis de una FAQ no llegan al LLM.
+    
+    El índice recuerda la versión del clasificador con la que se construyó;
+    refresh() lo reconstruye tras add_faq embebiendo solo los textos nuevos.
+    La matriz, los ids y los textos se publican juntos en una sola
+    asignación, así una consulta nunca mezcla dos versiones del índice.
+    """
+    
+    def __init__(self, classifier: FAQClassifier, threshold: Optional[float] = None):
+        self.classifier = classifier
+        self.threshold = threshold if threshold is not None else Config.FAQ_SEMANTIC_THRESHOLD
+        self.version: Optional[int] = None
+        # (matriz, faq_ids, textos) publicados
+        self._index: Tuple[Optional[np.ndarray], List[str], List[str]] = (None, [], [])
+        # Vector normalizado por texto, reutilizado entre reconstrucciones
+        self._vectors: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+        self._refresh_thread: Optional[threading.Thread] = None
+        self.hits = 0
+        self.misses = 0
+    
+    @property
+    def matrix(self) -> Optional[np.ndarray]:
+        return self._index[0]
+    
+    @property
+    def faq_ids(self) -> List[str]:
+        return self._index[1]
+    
+    @property
+    def texts(self) -> List[str]:
+        return self._index[2]
+    
+    @property
+    def size(self) -> int:
+        return len(self.faq_ids)
+    
+    @property
+    def stale(self) -> bool:
+        """El conjunto de FAQs cambió desde la última construcción"""
+        return self.version != self.classifier.version
+    
+    def build(self, embedding_provider) -> int:
+        """Embebe los patrones de todas las FAQs; devuelve cuántos quedaron indexados"""
+        with self._lock:
+            return self._build(embedding_provider)
+    
+    def _build(self, embedding_provider) -> int:
+        # Un fallo no se reintenta en cada consulta: espera al próximo cambio de FAQs
+        self.version = self.classifier.version
+        try:
+            entries = {}
+            for faq in self.classifier.faqs.values():
+                for pattern in faq.question_patterns:
+                    text = example_text(pattern)
+                    if text and text not in entries:
+                        entries[text] = faq.id
+            
+            texts = list(entries)
+            missing = [text for text in texts if text not in self._vectors]
+            embeddings = embedding_provider.generate_embeddings_batch(missing) if missing else []
+            for text, embedding in zip(missing, embeddings):
+                if embedding is None or len(embedding) == 0:
+                    continue
+                vector = np.asarray(embedding, dtype=np.float32)
+                norm = np.linalg.norm(vector)
+                if norm != 0:
+                    self._vectors[text] = vector / norm
+            
+            rows, faq_ids, indexed_texts = [], [], []
+            for text in texts:
+                vector = self._vectors.get(text)
+                if vector is None or (rows and vector.shape != rows[0].shape):
+                    continue
+                rows.append(vector)
+                faq_ids.append(entries[text])
+                indexed_texts.append(text)
+            
+            # Olvidar patrones de FAQs reemplazadas
+            self._vectors = {text: self._vectors[text] for text in texts if text in self._vectors}
+            self._index = (np.vstack(rows) if rows else None, faq_ids, indexed_texts)
+            logger.info(f"Índice semántico de FAQs: {len(faq_ids)}/{len(texts)} patrones embebidos "
+                        f"({len(missing)} nuevos)")
+            return len(faq_ids)
+            
+        except Exception as e:
+            # Se sigue sirviendo el índice anterior
+            logger.error(f"Error construyendo índice semántico de FAQs: {e}")
+            return self.size
+    
+    def refresh(self, embedding_provider) -> bool:
+        """Reconstruye el índice si cambiaron las FAQs; devuelve si hubo reconstrucción"""
+        if not self.stale:
+            return False
+        with self._lock:
+            if not self.stale:
+                return False
+            self._build(embedding_provider)
+            return True
+    
+    def refresh_in_background(self, embedding_provider) -> bool:
+        """
+        Lanza refresh() en un hilo si las FAQs cambiaron, sin bloquear al llamador
+        
+        Embeber los patrones nuevos es una llamada de red; desde el flujo de una
+        request (y del event loop) solo se dispara. Hasta que el hilo publique
+        el índice nuevo las consultas usan el anterior.
+        """
+        if not self.stale:
+            return False
+        thread = self._refresh_thread
+        if thread is not None and thread.is_alive():
+            return False
+        thread = threading.Thread(target=self.refresh, args=(embedding_provider,),
+                                  name='faq-index-refresh', daemon=True)
+        self._refresh_thread = thread
+        thread.start()
+        return True
+    
+    def match(self, query_embedding: List[float]) -> Optional[Dict[str, any]]:
+        """
+        Busca la FAQ más similar a la embedding de la consulta
+        
+        Returns:
+            Dict con el mismo formato que classify_message, o None bajo el umbral
+        """
+        try:
+            matrix, faq_ids, texts = self._index
+            if matrix is None or query_embedding is None or len(query_embedding) == 0:
+                return None
+            
+            query = np.asarray(query_embedding, dtype=np.float32)
+            norm = np.linalg.norm(query)
+            if norm == 0 or query.shape[0] != matrix.shape[1]:
+                return None
+            
+            scores = matrix @ (query / norm)
+            best = int(np.argmax(scores))
+            similarity = float(scores[best])
+            faq = self.classifier.faqs.get(faq_ids[best])
+            
+            if faq is None or similarity < self.threshold:
+                self.misses += 1
+                return None
+            
+            self.hits += 1
+            return {
+                'is_faq': True,
+                'confidence': similarity,
+                'faq_id': faq.id,
+                'response': faq.response,
+                'method': 'semantic_match',
+                'category': faq.category,
+                'matched_text': texts[best]
+            }
+            
+        except Exception as e:
+            logger.error(f"Error en búsqueda semántica de FAQs: {e}")
+            return None
+    
+    def get_stats(self) -> Dict[str, any]:
+        lookups = self.hits + self.misses
+        return {
+            'threshold': self.threshold,
+            'patterns_embedded': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0
         }
 
 # Instancia global del clasificador FAQ
@@ -1,9 +1,18 @@
+import math
 import time
+import asyncio
 import logging
-from collections import defaultdict, deque
-from typing import Dict, Optional
-from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+from dataclasses import dataclass, field
 from ..config.settings import Config
+from ..interfaces import IRateLimitStore
+from ..providers.rate_limit_store import create_rate_limit_store
+
+# Contador Prometheus de decisiones fail-open (import seguro)
+try:
+    from ..monitoring.prometheus_exporter import inc_rate_limit_fail_open
+except Exception:
+    inc_rate_limit_fail_open = None
 
 logger = logging.getLogger(__name__)
 
@@ -14,194 +23,395 @@ class RateLimitConfig:
     window_seconds: int = 60  # Ventana de tiempo en segundos
     burst_limit: int = 5  # Límite de ráfaga
     burst_window: int = 10  # Ventana de ráfaga en segundos
+    # sliding_window: un timestamp por request; gcra: un float por límite y cliente
+    algorithm: str = field(default_factory=lambda: Config.RATE_LIMIT_ALGORITHM)
+
+# Límites por tipo de cliente y categoría, cada par con su ventana y ráfaga propias
+RATE_LIMIT_CONFIGS = {
+    'anonymous': {
+        'chat': {'limit': 30, 'window': 3600, 'burst_limit': 5, 'burst_window': 10},       # 30 chats/hora
+        'suggest': {'limit': 50, 'window': 3600, 'burst_limit': 10, 'burst_window': 10},   # 50 sugerencias/hora
+        'search': {'limit': 100, 'window': 3600, 'burst_limit': 10, 'burst_window': 10}    # 100 búsquedas/hora
+    },
+    'authenticated': {
+        'chat': {'limit': 100, 'window': 3600, 'burst_limit': 10, 'burst_window': 10},     # 100 chats/hora
+        'suggest': {'limit': 200, 'window': 3600, 'burst_limit': 20, 'burst_window': 10},  # 200 sugerencias/hora
+        'search': {'limit': 500, 'window': 3600, 'burst_limit': 20, 'burst_window': 10}    # 500 búsquedas/hora
+    },
+    'premium': {
+        'chat': {'limit': 500, 'window': 3600, 'burst_limit': 20, 'burst_window': 10},     # 500 chats/hora
+        'suggest': {'limit': 1000, 'window': 3600, 'burst_limit': 50, 'burst_window': 10}, # 1000 sugerencias/hora
+        'search': {'limit': 2000, 'window': 3600, 'burst_limit': 50, 'burst_window': 10}   # 2000 búsquedas/hora
+    },
+    'api_key': {
+        'chat': {'limit': 1000, 'window': 3600, 'burst_limit': 50, 'burst_window': 10},    # 1000 chats/hora
+        'suggest': {'limit': 5000, 'window': 3600, 'burst_limit': 100, 'burst_window': 10},# 5000 sugerencias/hora
+        'search': {'limit': 10000, 'window': 3600, 'burst_limit': 200, 'burst_window': 10} # 10000 búsquedas/hora
+    }
+}
+
+# Categorías que consumen el presupuesto de otra (un stream gasta del cupo de chat)
+RATE_LIMIT_BUDGETS = {
+    'chat_stream': 'chat'
+}
+
+# Unidades de presupuesto por request: un stream mantiene la generación de
+# Gemini abierta más tiempo que una respuesta de chat/FAQ. Con la ráfaga más
+# chica (anónimo, 5/10s) siguen entrando dos streams seguidos; un costo mayor
+# que la ráfaga del tier se recorta a ella (si no, la request nunca pasaría)
+RATE_LIMIT_COSTS = {
+    'chat_stream': 2
+}
+
+# Prefijo del identificador -> tipo de cliente (ver get_client_identifier)
+CLIENT_TYPE_PREFIXES = {
+    'api_key': 'api_key',
+    'premium': 'premium',
+    'user': 'authenticated'
+}
+
+
+def client_type_from_identifier(identifier: str) -> str:
+    """Tipo de cliente según el prefijo del identificador (anónimo por defecto)"""
+    prefix = identifier.split(':', 1)[0] if ':' in identifier else ''
+    return CLIENT_TYPE_PREFIXES.get(prefix, 'anonymous')
+
+
+def category_key(identifier: str, category: str) -> str:
+    """Función de clave por defecto: un contador por identificador y categoría"""
+    return f"{category}|{identifier}"
+
 
 class RateLimiter:
     """
     Rate Limiter según arquitectura híbrida
     Implementa ventanas deslizantes y límites de ráfaga
+    
+    El estado vive en un IRateLimitStore: en memoria por defecto, o SQLite /
+    Redis para que varios workers compartan un mismo límite.
+    
+    Con algorithm='gcra' cada ventana se aplica como GCRA: el estado es un
+    único TAT por límite en lugar de un timestamp por request, con la misma
+    semántica de ráfaga + ventana y las mismas claves de respuesta.
+    
+    check_rate_limit aplica límites por (tipo de cliente, categoría) desde
+    RATE_LIMIT_CONFIGS, con requests ponderadas por costo; is_allowed sin
+    configuración usa el límite global.
     """
     
-    def __init__(self, config: Optional[RateLimitConfig] = None):
+    def __init__(self, config: Optional[RateLimitConfig] = None, store: Optional[IRateLimitStore] = None,
+                 key_func: Optional[Callable[[str, str], str]] = None,
+                 client_type_func: Optional[Callable[[str], str]] = None,
+                 tiers: Optional[Dict[str, Dict[str, Dict[str, int]]]] = None):
         self.config = config or RateLimitConfig()
         
-        # Almacén de timestamps por identificador
-        self.requests: Dict[str, deque] = defaultdict(lambda: deque())
-        self.burst_requests: Dict[str, deque] = defaultdict(lambda: deque())
+        # Almacén de ventanas por identificador
+        self.store: IRateLimitStore = store or create_rate_limit_store()
+        
+        # Funciones enchufables: clave del contador y tipo de cliente
+        self.key_func = key_func or category_key
+        self.client_type_func = client_type_func or client_type_from_identifier
         
-        # Cache de decisiones para optimizar
-        self.decision_cache: Dict[str, tuple] = {}
+        # Configuraciones precompiladas por (tipo de cliente, categoría)
+        self.tiers = {
+            (client_type, category): self._tier_config(values)
+            for client_type, categories in (tiers if tiers is not None else RATE_LIMIT_CONFIGS).items()
+            for category, values in categories.items()
+        }
+        self._explicit_configs: Dict[Tuple[int, int], RateLimitConfig] = {}
         
-        logger.info(f"RateLimiter inicializado: {self.config.max_requests} req/{self.config.window_seconds}s")
+        self.total_requests = 0
+        self.blocked_requests = 0
+        self.fail_open_requests = 0
+        
+        logger.info(f"RateLimiter inicializado: {self.config.max_requests} req/{self.config.window_seconds}s "
+                    f"({self.store.__class__.__name__}, {self.config.algorithm})")
+    
+    def _tier_config(self, values: Dict[str, int]) -> RateLimitConfig:
+        limit = int(values['limit'])
+        window = int(values['window'])
+        return RateLimitConfig(
+            max_requests=limit,
+            window_seconds=window,
+            burst_limit=int(values.get('burst_limit', limit)),
+            burst_window=int(values.get('burst_window', window)),
+            algorithm=self.config.algorithm
+        )
     
-    def is_allowed(self, identifier: str, request_type: str = "default") -> Dict[str, any]:
+    def resolve_config(self, category: str, client_type: str,
+                       limit: Optional[int] = None, window: Optional[int] = None) -> RateLimitConfig:
+        """
+        Configuración aplicable: límites explícitos > tier (tipo de cliente,
+        categoría) > límite global
+        """
+        if limit is not None or window is not None:
+            limit = int(limit if limit is not None else self.config.max_requests)
+            window = int(window if window is not None else self.config.window_seconds)
+            config = self._explicit_configs.get((limit, window))
+            if config is None:
+                # Sin ráfaga propia: la ventana explícita es el único límite efectivo
+                config = self._tier_config({'limit': limit, 'window': window})
+                self._explicit_configs[(limit, window)] = config
+            return config
+        
+        return self.tiers.get((client_type, category), self.config)
+    
+    def has_tier(self, client_type: str, category: str) -> bool:
+        """Indica si el par (tipo de cliente, categoría) tiene límites propios"""
+        return (client_type, RATE_LIMIT_BUDGETS.get(category, category)) in self.tiers
+    
+    def check_rate_limit(self, identifier: str, request_type: str = "default",
+                         limit: Optional[int] = None, window: Optional[int] = None,
+                         cost: Optional[int] = None, client_type: Optional[str] = None) -> Dict[str, any]:
+        """
+        Verifica una request contra el límite de su tier y categoría
+        
+        Args:
+            identifier: Identificador del cliente (ip:..., api_key:..., user:...)
+            request_type: Categoría (chat, chat_stream, search, ...)
+            limit: Límite explícito por ventana (tiene prioridad sobre el tier)
+            window: Ventana explícita en segundos
+            cost: Unidades que consume la request (por defecto RATE_LIMIT_COSTS)
+            client_type: Tipo de cliente; si falta se deduce del identificador
+        
+        Returns:
+            Dict con allowed, remaining, reset_time, limit, window
+        """
+        if request_type == "default" and limit is None and window is None and cost is None:
+            return self.is_allowed(identifier, request_type)
+        
+        budget = RATE_LIMIT_BUDGETS.get(request_type, request_type)
+        config = self.resolve_config(budget, client_type or self.client_type_func(identifier), limit, window)
+        if cost is None:
+            cost = RATE_LIMIT_COSTS.get(request_type, 1)
+        if config.burst_limit > 0:
+            cost = min(cost, config.burst_limit)
+        
+        return self.is_allowed(self.key_func(identifier, budget), request_type, cost=cost, config=config)
+    
+    def _limits(self, config: Optional[RateLimitConfig] = None) -> List[Tuple[int, float]]:
+        """Ventanas evaluadas en orden: ráfaga primero, luego el límite principal"""
+        config = config or self.config
+        return [
+            (config.burst_limit, config.burst_window),
+            (config.max_requests, config.window_seconds)
+        ]
+    
+    def is_allowed(self, identifier: str, request_type: str = "default", cost: int = 1,
+                   config: Optional[RateLimitConfig] = None) -> Dict[str, any]:
         """
         Verifica si una request está permitida según el diagrama de flujo
         
         Args:
             identifier: IP o user ID
             request_type: Tipo de request (chat, health, etc.)
+            cost: Unidades de presupuesto que consume la request
+            config: Límites a aplicar (por defecto el límite global)
         
         Returns:
             Dict con allowed, remaining, reset_time
         """
+        config = config or self.config
+        current_time = time.time()
+        self.total_requests += 1
         try:
-            current_time = time.time()
-            
-            # Limpiar requests antiguos
-            self._cleanup_old_requests(identifier, current_time)
-            
-            # Verificar límite de ráfaga primero
-            if not self._check_burst_limit(identifier, current_time):
-                return {
-                    'allowed': False,
-                    'reason': 'burst_limit_exceeded',
-                    'remaining': 0,
-                    'reset_time': self._get_burst_reset_time(identifier, current_time),
-                    'retry_after': self.config.burst_window
-                }
-            
-            # Verificar límite principal
-            requests_count = len(self.requests[identifier])
-            
-            if requests_count >= self.config.max_requests:
-                return {
-                    'allowed': False,
-                    'reason': 'rate_limit_exceeded',
-                    'remaining': 0,
-                    'reset_time': self._get_reset_time(identifier, current_time),
-                    'retry_after': self._calculate_retry_after(identifier, current_time)
-                }
-            
-            # Request permitida - registrar timestamp
-            self.requests[identifier].append(current_time)
-            self.burst_requests[identifier].append(current_time)
-            
-            remaining = max(0, self.config.max_requests - len(self.requests[identifier]))
-            
-            return {
-                'allowed': True,
-                'remaining': remaining,
-                'reset_time': current_time + self.config.window_seconds,
-                'limit': self.config.max_requests
-            }
+            if config.algorithm == 'gcra':
+                result = self._is_allowed_gcra(identifier, current_time, config, cost)
+            else:
+                result = self._is_allowed_window(identifier, current_time, config, cost)
+            if not result['allowed']:
+                self.blocked_requests += 1
+            return result
             
         except Exception as e:
-            logger.error(f"Error en rate limiting para {identifier}: {e}")
-            # En caso de error, permitir la request (fail-open)
+            # En caso de error del almacén, permitir la request (fail-open) y contarlo
+            self.fail_open_requests += 1
+            backend = self.store.__class__.__name__
+            logger.warning(f"Rate limiting fail-open para {identifier} ({backend}): {e}")
+            if inc_rate_limit_fail_open:
+                try:
+                    inc_rate_limit_fail_open(backend)
+                except Exception:
+                    pass
             return {
                 'allowed': True,
-                'remaining': self.config.max_requests,
-                'reset_time': current_time + self.config.window_seconds,
+                'fail_open': True,
+                'remaining': config.max_requests,
+                'reset_time': current_time + config.window_seconds,
                 'error': str(e)
             }
     
-    def _cleanup_old_requests(self, identifier: str, current_time: float):
-        """Limpia requests fuera de la ventana de tiempo"""
-        # Limpiar ventana principal
-        window_start = current_time - self.config.window_seconds
-        requests = self.requests[identifier]
+    def _is_allowed_window(self, identifier: str, current_time: float, config: RateLimitConfig,
+                           cost: int) -> Dict[str, any]:
+        """Ventanas deslizantes: un timestamp por unidad consumida"""
+        # Chequeo y registro atómicos sobre ambas ventanas
+        result = self.store.acquire(identifier, current_time, self._limits(config), cost)
+        violated = result['violated']
+        oldest = result['oldest']
         
-        while requests and requests[0] <= window_start:
-            requests.popleft()
+        # Verificar límite de ráfaga primero
+        if violated == 0:
+            return {
+                'allowed': False,
+                'reason': 'burst_limit_exceeded',
+                'remaining': 0,
+                'reset_time': self._reset_time(oldest[0], config.burst_window, current_time),
+                'retry_after': config.burst_window,
+                'limit': config.max_requests,
+                'window': config.window_seconds
+            }
         
-        # Limpiar ventana de ráfaga
-        burst_window_start = current_time - self.config.burst_window
-        burst_requests = self.burst_requests[identifier]
+        # Verificar límite principal
+        if violated == 1:
+            reset_time = self._reset_time(oldest[1], config.window_seconds, current_time)
+            return {
+                'allowed': False,
+                'reason': 'rate_limit_exceeded',
+                'remaining': 0,
+                'reset_time': reset_time,
+                'retry_after': max(1, int(reset_time - current_time)),
+                'limit': config.max_requests,
+                'window': config.window_seconds
+            }
         
-        while burst_requests and burst_requests[0] <= burst_window_start:
-            burst_requests.popleft()
-    
-    def _check_burst_limit(self, identifier: str, current_time: float) -> bool:
-        """Verifica límite de ráfaga"""
-        burst_count = len(self.burst_requests[identifier])
-        return burst_count < self.config.burst_limit
-    
-    def _get_reset_time(self, identifier: str, current_time: float) -> float:
-        """Calcula cuándo se resetea el límite principal"""
-        requests = self.requests[identifier]
-        if not requests:
-            return current_time
+        remaining = max(0, config.max_requests - result['counts'][1])
         
-        oldest_request = requests[0]
-        return oldest_request + self.config.window_seconds
+        return {
+            'allowed': True,
+            'remaining': remaining,
+            'reset_time': current_time + config.window_seconds,
+            'limit': config.max_requests,
+            'window': config.window_seconds
+        }
     
-    def _get_burst_reset_time(self, identifier: str, current_time: float) -> float:
-        """Calcula cuándo se resetea el límite de ráfaga"""
-        burst_requests = self.burst_requests[identifier]
-        if not burst_requests:
-            return current_time
+    def _is_allowed_gcra(self, identifier: str, current_time: float, config: RateLimitConfig,
+                         cost: int) -> Dict[str, any]:
+        """Variante GCRA de is_allowed: O(1) de estado por cliente"""
+        limits = self._limits(config)
+        result = self.store.acquire_gcra(identifier, current_time, limits, cost)
+        violated = result['violated']
+        tats = result['tats']
         
-        oldest_burst = burst_requests[0]
-        return oldest_burst + self.config.burst_window
+        if violated is not None:
+            limit, window = limits[violated]
+            if limit <= 0:
+                allow_at = current_time + window
+            else:
+                # Momento en que la próxima request entra en la ventana
+                tat = max(tats[violated] or current_time, current_time)
+                allow_at = tat + window / limit * cost - window
+            return {
+                'allowed': False,
+                'reason': 'burst_limit_exceeded' if violated == 0 else 'rate_limit_exceeded',
+                'remaining': 0,
+                'reset_time': allow_at,
+                'retry_after': max(1, math.ceil(allow_at - current_time)),
+                'limit': config.max_requests,
+                'window': config.window_seconds
+            }
+        
+        used = self._gcra_used(tats[1], config.max_requests, config.window_seconds, current_time)
+        return {
+            'allowed': True,
+            'remaining': max(0, config.max_requests - used),
+            'reset_time': tats[1],
+            'limit': config.max_requests,
+            'window': config.window_seconds
+        }
     
-    def _calculate_retry_after(self, identifier: str, current_time: float) -> int:
-        """Calcula segundos hasta que se permita la siguiente request"""
-        reset_time = self._get_reset_time(identifier, current_time)
-        return max(1, int(reset_time - current_time))
+    @staticmethod
+    def _gcra_used(tat: Optional[float], limit: int, window: float, current_time: float) -> int:
+        """Requests equivalentes consumidas en una ventana según su TAT"""
+        if tat is None or tat <= current_time or limit <= 0:
+            return 0
+        return min(limit, math.ceil((tat - current_time) * limit / window - 1e-9))
     
-    def get_stats(self, identifier: str) -> Dict[str, any]:
-        """Obtiene estadísticas de rate limiting para un identificador"""
+    @staticmethod
+    def _reset_time(oldest: Optional[float], window: float, current_time: float) -> float:
+        """Momento en que vence el timestamp más antiguo de la ventana"""
+        if oldest is None:
+            return current_time
+        return oldest + window
+    
+    def get_stats(self, identifier: str, config: Optional[RateLimitConfig] = None) -> Dict[str, any]:
+        """Obtiene estadísticas de rate limiting para un identificador (o clave de check_rate_limit)"""
+        config = config or self.config
         try:
             current_time = time.time()
-            self._cleanup_old_requests(identifier, current_time)
+            if config.algorithm == 'gcra':
+                return self._get_stats_gcra(identifier, current_time, config)
+            
+            usage = self.store.peek(identifier, current_time, self._limits(config))
             
             return {
-                'current_requests': len(self.requests[identifier]),
-                'max_requests': self.config.max_requests,
-                'window_seconds': self.config.window_seconds,
-                'burst_requests': len(self.burst_requests[identifier]),
-                'burst_limit': self.config.burst_limit,
-                'reset_time': self._get_reset_time(identifier, current_time)
+                'current_requests': usage['counts'][1],
+                'max_requests': config.max_requests,
+                'window_seconds': config.window_seconds,
+                'burst_requests': usage['counts'][0],
+                'burst_limit': config.burst_limit,
+                'reset_time': self._reset_time(usage['oldest'][1], config.window_seconds, current_time)
             }
         except Exception as e:
             logger.error(f"Error obteniendo stats para {identifier}: {e}")
             return {'error': str(e)}
     
+    def _get_stats_gcra(self, identifier: str, current_time: float, config: RateLimitConfig) -> Dict[str, any]:
+        tats = self.store.peek_gcra(identifier, current_time, self._limits(config))['tats']
+        return {
+            'current_requests': self._gcra_used(tats[1], config.max_requests,
+                                                config.window_seconds, current_time),
+            'max_requests': config.max_requests,
+            'window_seconds': config.window_seconds,
+            'burst_requests': self._gcra_used(tats[0], config.burst_limit,
+                                              config.burst_window, current_time),
+            'burst_limit': config.burst_limit,
+            'reset_time': max(tats[1] or current_time, current_time)
+        }
+    
     def reset_user_limits(self, identifier: str):
         """Resetea límites para un usuario específico (admin function)"""
         try:
-            if identifier in self.requests:
-                del self.requests[identifier]
-            if identifier in self.burst_requests:
-                del self.burst_requests[identifier]
-            
+            self.store.reset(identifier)
             logger.info(f"Rate limits reseteados para {identifier}")
             return True
         except Exception as e:
             logger.error(f"Error reseteando límites para {identifier}: {e}")
             return False
     
+    def reset_stats(self) -> None:
+        """Reinicia los contadores globales (no los límites de cada cliente)"""
+        self.total_requests = 0
+        self.blocked_requests = 0
+        self.fail_open_requests = 0
+    
     def get_global_stats(self) -> Dict[str, any]:
         """Estadísticas globales del rate limiter"""
         try:
-            current_time = time.time()
-            
-            # Limpiar todos los usuarios
-            for identifier in list(self.requests.keys()):
-                self._cleanup_old_requests(identifier, current_time)
-            
-            # Eliminar usuarios sin requests
-            empty_users = [
-                identifier for identifier, requests in self.requests.items()
-                if not requests
-            ]
-            for identifier in empty_users:
-                del self.requests[identifier]
-                if identifier in self.burst_requests:
-                    del self.burst_requests[identifier]
+            # Limpiar usuarios sin requests (solo aplica al almacén en memoria)
+            if hasattr(self.store, 'cleanup'):
+                self.store.cleanup(time.time())
             
-            total_active_users = len(self.requests)
-            total_requests = sum(len(requests) for requests in self.requests.values())
+            store_stats = self.store.get_stats()
             
             return {
-                'active_users': total_active_users,
-                'total_requests_in_window': total_requests,
+                'total_requests': self.total_requests,
+                'blocked_requests': self.blocked_requests,
+                'fail_open_requests': self.fail_open_requests,
+                # None si el almacén no puede contarlos barato (Redis)
+                'clients': store_stats.get('active_keys'),
+                'active_users': store_stats.get('active_keys'),
+                'total_requests_in_window': store_stats.get('total_requests_in_window'),
+                'memory_bytes': store_stats.get('memory_bytes'),
+                'evicted_users': store_stats.get('evicted_keys'),
+                'backend': store_stats.get('backend'),
+                'algorithm': self.config.algorithm,
                 'config': {
                     'max_requests': self.config.max_requests,
                     'window_seconds': self.config.window_seconds,
                     'burst_limit': self.config.burst_limit,
                     'burst_window': self.config.burst_window
-                }
+                },
+                'tiers': len(self.tiers)
             }
         except Exception as e:
             logger.error(f"Error obteniendo stats globales: {e}")
@@ -210,19 +420,58 @@ class RateLimiter:
 # Instancia global del rate limiter
 rate_limiter = RateLimiter()
 
-def check_rate_limit(identifier: str, request_type: str = "default") -> Dict[str, any]:
+def check_rate_limit(identifier: str, request_type: str = "default",
+                     limit: Optional[int] = None, window: Optional[int] = None,
+                     cost: Optional[int] = None, client_type: Optional[str] = None) -> Dict[str, any]:
     """Función helper para verificar rate limiting"""
-    return rate_limiter.is_allowed(identifier, request_type)
+    return rate_limiter.check_rate_limit(identifier, request_type, limit=limit, window=window,
+                                         cost=cost, client_type=client_type)
 
-def get_client_identifier(request) -> str:
-    """Extrae identificador del cliente desde la request"""
-    # Intentar obtener IP real detrás de proxies
-    forwarded_for = request.headers.get('X-Forwarded-For')
-    if forwarded_for:
-        return forwarded_for.split(',')[0].strip()
+async def run_rate_limit_check(check: Callable[..., Dict[str, any]], *args, **kwargs) -> Dict[str, any]:
+    """
+    Ejecuta un chequeo de rate limiting desde código async
     
+    Con un almacén que hace I/O (SQLite, Redis) el chequeo corre en un hilo
+    para no bloquear el event loop; el almacén en memoria se consulta inline.
+    """
+    if getattr(rate_limiter.store, 'blocking', True):
+        return await asyncio.to_thread(check, *args, **kwargs)
+    return check(*args, **kwargs)
+
+def get_api_key(request) -> Optional[str]:
+    """
+    Devuelve la API key de la request solo si está configurada
+    (Config.is_valid_rate_limit_key); una clave desconocida no da tier propio
+    """
+    api_key = request.headers.get('X-API-Key')
+    if api_key and Config.is_valid_rate_limit_key(api_key):
+        return api_key
+    return None
+
+def get_client_ip(request) -> str:
+    """
+    IP real del cliente detrás de proxies
+    Prioridad: X-Real-IP (la fija nginx) > X-Forwarded-For > conexión directa
+    """
     real_ip = request.headers.get('X-Real-IP')
     if real_ip:
-        return real_ip
-    
-    return request.remote_addr or 'unknown'
+        return real_ip.strip()
+
+    forwarded_for = request.headers.get('X-Forwarded-For')
+    if forwarded_for:
+        return forwarded_for.split(',')[0].strip()
+
+    client = getattr(request, 'client', None)
+    return getattr(client, 'host', None) or 'unknown'
+
+def get_client_identifier(request) -> str:
+    """
+    Extrae identificador del cliente desde la request
+    El prefijo (api_key:, ip:) determina el tipo de cliente para los tiers;
+    api_key: solo se usa con claves válidas, el resto cae a la IP
+    """
+    api_key = get_api_key(request)
+    if api_key:
+        return f"api_key:{api_key}"
+
+    return f"ip:{get_client_ip(request)}"
@@ -0,0 +1,127 @@
+"""
+Extracción de literales obligatorios de patrones regex
+Permite descartar patrones con búsquedas de subcadena antes de ejecutar la regex
+"""
+
+from typing import Dict, Optional, Tuple
+
+try:
+    from re import _parser as _sre_parse  # Python >= 3.11
+except ImportError:  # pragma: no cover
+    import sre_parse as _sre_parse
+
+
+def _ignorecase_folds() -> Dict[int, str]:
+    """
+    Equivalencias de re.IGNORECASE que casefold no unifica ('ı' ~ 'i'...)
+    Se toman de la tabla del propio motor de regex, así el prefiltro nunca
+    descarta un texto que la regex sí reconocería
+    """
+    try:
+        from re._casefix import _EXTRA_CASES  # Python >= 3.11
+    except ImportError:  # pragma: no cover
+        _EXTRA_CASES = {0x69: (0x131,), 0x73: (0x17f,)}
+    table = {}
+    for codepoint, others in _EXTRA_CASES.items():
+        group = {chr(c).casefold() for c in (codepoint, *others)}
+        canonical = min(group)
+        for folded in group:
+            if folded != canonical and len(folded) == 1:
+                table[ord(folded)] = canonical
+    return table
+
+
+_IGNORECASE_FOLDS = _ignorecase_folds()
+
+
+def fold_text(text: str) -> str:
+    """
+    Normalización para prefiltros de literales
+    casefold cubre la mayoría de las equivalencias de re.IGNORECASE (ſ/s,
+    K/k...); las restantes ('ı'/i) se mapean aparte y se descarta el punto
+    combinante que casefold añade a 'İ'
+    """
+    return text.casefold().translate(_IGNORECASE_FOLDS).replace('\u0307', '')
+
+
+def required_literals(pattern: str) -> Optional[Tuple[str, ...]]:
+    """
+    Literales de los que al menos uno aparece en cualquier coincidencia del patrón
+    Devuelve None si no se puede garantizar ninguno (el patrón debe evaluarse siempre)
+    """
+    def best(current, candidate):
+        if not candidate or '' in candidate:
+            return current
+        if current is None or min(map(len, candidate)) > min(map(len, current)):
+            return candidate
+        return current
+
+    def sequence(items) -> Optional[set]:
+        required = None
+        run = []
+        for op, av in items:
+            if op is _sre_parse.LITERAL:
+                run.append(chr(av))
+                continue
+            if run:
+                required = best(required, {''.join(run)})
+                run = []
+            if op is _sre_parse.SUBPATTERN:
+                required = best(required, sequence(av[-1]))
+            elif op is _sre_parse.BRANCH:
+                branches = [sequence(branch) for branch in av[1]]
+                if all(branches):
+                    required = best(required, set().union(*branches))
+            elif op in (_sre_parse.MAX_REPEAT, _sre_parse.MIN_REPEAT) and av[0] >= 1:
+                required = best(required, sequence(av[2]))
+        if run:
+            required = best(required, {''.join(run)})
+        return required
+
+    try:
+        literals = sequence(_sre_parse.parse(pattern))
+    except Exception:
+        return None
+    return tuple(sorted({fold_text(literal) for literal in literals})) if literals else None
+
+
+def example_text(pattern: str) -> str:
+    """
+    Texto representativo que coincide con el patrón (primera alternativa,
+    opcionales incluidos, variantes acentuadas preferidas en las clases)
+    Útil para embeber patrones como si fueran preguntas
+    """
+    def pick(items) -> str:
+        literals = [chr(av) for op, av in items if op is _sre_parse.LITERAL]
+        if literals:
+            return next((char for char in literals if ord(char) > 127), literals[0])
+        for op, av in items:
+            if op is _sre_parse.NEGATE:
+                return ''
+            if op is _sre_parse.RANGE:
+                return chr(av[0])
+            if op is _sre_parse.CATEGORY and av is _sre_parse.CATEGORY_SPACE:
+                return ' '
+        return ''
+
+    def render(items) -> str:
+        out = []
+        for op, av in items:
+            if op is _sre_parse.LITERAL:
+                out.append(chr(av))
+            elif op is _sre_parse.SUBPATTERN:
+                out.append(render(av[-1]))
+            elif op is _sre_parse.BRANCH:
+                out.append(render(av[1][0]))
+            elif op is _sre_parse.IN:
+                out.append(pick(av))
+            elif op in (_sre_parse.MAX_REPEAT, _sre_parse.MIN_REPEAT):
+                low, high, sub = av
+                out.append(render(sub) * (low or (1 if high == 1 else 0)))
+        return ''.join(out)
+
+    try:
+        text = render(_sre_parse.parse(pattern))
+    except Exception:
+        return ''
+    return ' '.join(text.split())
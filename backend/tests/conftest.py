@@ -49,3 +49,71 @@ def mock_orchestrator():
         "metadata": {"flow_path": ["test"]}
     }
     return orchestrator
+
+@pytest.fixture
+def orchestrator_factory():
+    """Construye un HybridRAGOrchestrator con el LLM dado, sin el resto de providers y con servicios sanos"""
+    from unittest.mock import MagicMock, patch
+    from app.core.orchestrator import HybridRAGOrchestrator
+
+    def build(llm):
+        with patch('app.core.factory.ProviderFactory.create_all_providers') as mock_factory:
+            mock_factory.return_value = {
+                'llm': llm,
+                'embedding': None,
+                'vector_store': None,
+                'document_processor': None,
+                'cache': None
+            }
+            orchestrator = HybridRAGOrchestrator()
+        orchestrator._check_services_health = MagicMock(return_value={
+            'llm_available': True,
+            'vector_store_available': True,
+            'embedding_available': True
+        })
+        return orchestrator
+
+    return build
+
+@pytest.fixture
+def ask_orchestrator():
+    """Consulta síncrona con rate limit, clasificador FAQ léxico y safety de salida neutralizados"""
+    from unittest.mock import patch
+
+    def ask(orchestrator, message, user_context=None):
+        with patch('app.core.orchestrator.check_rate_limit', return_value={'allowed': True}), \
+             patch('app.core.orchestrator.classify_user_message', return_value={'is_faq': False}), \
+             patch('app.core.orchestrator.check_output_safety', side_effect=lambda r, c: {'is_safe': True, 'safe_response': r}):
+            return orchestrator.process_hybrid_request(
+                message=message,
+                client_identifier="test_client",
+                user_context=user_context
+            )
+
+    return ask
+
+@pytest.fixture
+def embedding_provider():
+    """Provider de embeddings de semantic_orchestrator (los módulos de test lo sobreescriben)"""
+    return None
+
+@pytest.fixture
+def semantic_orchestrator(orchestrator_factory, embedding_provider):
+    """Orquestador inicializado con LLM falso, vector store vacío y el embedding_provider del test"""
+    from unittest.mock import MagicMock
+
+    llm = MagicMock()
+    llm.get_model_info.return_value = {'provider': 'fake', 'model': 'fake'}
+    llm.generate_response.return_value = {'success': True, 'response': 'Uso Python a diario.'}
+    orchestrator = orchestrator_factory(llm)
+    orchestrator.embedding_provider = embedding_provider
+    orchestrator.vector_store = MagicMock()
+    orchestrator.vector_store.search_similar.return_value = []
+    orchestrator.is_initialized = True
+    return orchestrator
+
+@pytest.fixture
+def faq_orchestrator(semantic_orchestrator):
+    """semantic_orchestrator con el índice semántico de FAQs construido"""
+    semantic_orchestrator._build_semantic_faq_index()
+    return semantic_orchestrator
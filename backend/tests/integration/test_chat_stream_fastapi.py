@@ -0,0 +1,83 @@
+import importlib
+import json
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+chat_module = importlib.import_module("app.routes.chat")
+
+
+class DummyStreamingOrchestrator:
+    """Orquestador simulado que emite eventos de streaming"""
+
+    def __init__(self):
+        self.client_identifiers = []
+
+    async def astream_hybrid_request(self, message, client_identifier, user_context=None, target_language="es"):
+        self.client_identifiers.append(client_identifier)
+        for token in ["Hola, ", "soy ", "Heily."]:
+            yield {"event": "token", "data": token}
+        yield {"event": "done", "data": {"success": True, "response": "Hola, soy Heily."}}
+
+
+def _parse_sse(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_chat_stream_emits_sse_events():
+    chat_module.orchestrator = DummyStreamingOrchestrator()
+    app = FastAPI()
+    app.include_router(chat_module.router, prefix="/api")
+    client = TestClient(app)
+
+    response = client.post("/api/chat/stream", json={"message": "Hola", "language": "es"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _parse_sse(response.text)
+    assert [name for name, _ in events] == ["token", "token", "token", "done"]
+    assert events[-1][1]["response"] == "Hola, soy Heily."
+
+
+def test_chat_stream_uses_proxy_aware_client_identifier():
+    orchestrator = DummyStreamingOrchestrator()
+    chat_module.orchestrator = orchestrator
+    app = FastAPI()
+    app.include_router(chat_module.router, prefix="/api")
+    client = TestClient(app)
+
+    response = client.post("/api/chat/stream", json={"message": "Hola", "language": "es"},
+                           headers={"X-Real-IP": "198.51.100.23", "X-API-Key": "not-configured"})
+
+    assert response.status_code == 200
+    assert orchestrator.client_identifiers == ["ip:198.51.100.23"]
+
+
+def test_get_orchestrator_builds_once_off_the_event_loop(monkeypatch):
+    import asyncio
+    import threading
+    import time
+
+    orchestrator_module = importlib.import_module("app.core.orchestrator")
+    built_in = []
+
+    class SlowOrchestrator:
+        def __init__(self):
+            built_in.append(threading.get_ident())
+            time.sleep(0.05)
+
+    monkeypatch.setattr(orchestrator_module, "HybridRAGOrchestrator", SlowOrchestrator)
+    monkeypatch.setattr(chat_module, "orchestrator", None)
+
+    async def build_concurrently():
+        return threading.get_ident(), await asyncio.gather(*(chat_module.get_orchestrator() for _ in range(3)))
+
+    loop_thread, instances = asyncio.run(build_concurrently())
+
+    assert len(built_in) == 1
+    assert built_in[0] != loop_thread
+    assert all(instance is instances[0] for instance in instances)
@@ -0,0 +1,69 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.config.settings import Config
+from app.main import app
+
+
+@pytest.fixture(scope="module")
+def client() -> TestClient:
+    # Sin context manager: no se ejecuta el startup (carga de ChromaDB)
+    return TestClient(app)
+
+
+def test_traces_endpoint_lists_app_requests(client: TestClient):
+    trace_id = client.get("/api/health").headers["x-trace-id"]
+
+    response = client.get("/api/monitoring/traces?limit=50&slowest=1")
+
+    assert response.status_code == 200
+    data = response.json()
+    assert trace_id in [trace["trace_id"] for trace in data["recent"]]
+    assert data["stats"]["finished_traces"] >= 1
+    assert len(data["slowest"]) <= 1
+
+
+def test_trace_detail_endpoint(client: TestClient):
+    trace_id = client.get("/api/health").headers["x-trace-id"]
+
+    response = client.get(f"/api/monitoring/traces/{trace_id}")
+
+    assert response.status_code == 200
+    assert response.json()["trace_id"] == trace_id
+    assert client.get("/api/monitoring/traces/does-not-exist").status_code == 404
+
+
+def test_flows_endpoint(client: TestClient):
+    response = client.get("/api/monitoring/flows")
+
+    assert response.status_code == 200
+    assert {"flow_paths", "steps_performance"} <= set(response.json())
+
+
+def test_performance_endpoint(client: TestClient):
+    response = client.get("/api/monitoring/performance")
+
+    assert response.status_code == 200
+    assert {"system", "response_times", "throughput", "cache"} <= set(response.json())
+
+
+def test_performance_history_endpoint(client: TestClient):
+    response = client.get("/api/monitoring/performance/history")
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["interval_seconds"] > 0
+    assert isinstance(data["samples"], list)
+
+
+def test_profile_endpoint_requires_admin_key(client: TestClient, monkeypatch):
+    monkeypatch.setattr(Config, "ADMIN_API_KEY_REQUIRED", True)
+    monkeypatch.setattr(Config, "ADMIN_API_KEYS", ["admin-key"])
+
+    assert client.get("/api/monitoring/profile?seconds=0.05").status_code == 401
+    assert client.get("/api/monitoring/profile?seconds=0.05", headers={"X-API-Key": "nope"}).status_code == 403
+
+    response = client.get("/api/monitoring/profile?seconds=0.05", headers={"X-API-Key": "admin-key"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert int(response.headers["x-profile-samples"]) > 0
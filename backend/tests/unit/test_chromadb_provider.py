@@ -6,3 +6,95 @@ import pytest
 def test_add_and_search_documents():
     # TODO: crear instancia ChromaDBVectorStore con temp dir y datos de prueba
     assert True
+
+
+@pytest.mark.unit
+class TestChromaDBReplaceSourceDocuments:
+    """Tests para replace_source_documents sobre una colección persistente temporal"""
+
+    def _store(self, tmp_path, monkeypatch):
+        from app.config.settings import Config
+        from app.providers.chromadb_provider import ChromaDBVectorStore
+
+        monkeypatch.setattr(Config, 'VECTORSTORE_DIR', str(tmp_path / "vectorstore"))
+        store = ChromaDBVectorStore()
+        assert store.is_available()
+        return store
+
+    def _chunks(self, source, texts):
+        return [{'content': text, 'metadata': {'full_path': source, 'chunk_index': i}}
+                for i, text in enumerate(texts)]
+
+    def _contents(self, store, source):
+        result = store.collection.get(where={'full_path': source}, include=['documents'])
+        return sorted(result['documents'])
+
+    def test_replace_overwrites_and_drops_stale_chunks(self, tmp_path, monkeypatch):
+        """Reemplazar una fuente borra sus chunks sobrantes sin tocar las demás"""
+        store = self._store(tmp_path, monkeypatch)
+
+        assert store.replace_source_documents("/docs/a.md", self._chunks("/docs/a.md", ["a0", "a1", "a2"]),
+                                              [[1.0, 0.0], [0.9, 0.1], [0.8, 0.2]])
+        assert store.replace_source_documents("/docs/b.md", self._chunks("/docs/b.md", ["b0"]), [[0.0, 1.0]])
+        assert store.collection.count() == 4
+
+        assert store.replace_source_documents("/docs/a.md", self._chunks("/docs/a.md", ["a0 nuevo"]), [[1.0, 0.0]])
+        assert self._contents(store, "/docs/a.md") == ["a0 nuevo"]
+        assert self._contents(store, "/docs/b.md") == ["b0"]
+
+        assert store.replace_source_documents("/docs/a.md", [], [])
+        assert self._contents(store, "/docs/a.md") == []
+        assert store.collection.count() == 1
+
+    def test_replace_rejects_mismatched_embeddings(self, tmp_path, monkeypatch):
+        """Con distinta cantidad de embeddings no se modifica la fuente"""
+        store = self._store(tmp_path, monkeypatch)
+
+        assert store.replace_source_documents("/docs/a.md", self._chunks("/docs/a.md", ["a0"]), [[1.0, 0.0]])
+        assert not store.replace_source_documents("/docs/a.md", self._chunks("/docs/a.md", ["x", "y"]), [[1.0, 0.0]])
+        assert self._contents(store, "/docs/a.md") == ["a0"]
+
+    def test_add_documents_ids_do_not_collide_across_batches_or_directories(self, tmp_path, monkeypatch):
+        """Mismo nombre de archivo en otro directorio u otro lote no pisa chunks ajenos"""
+        store = self._store(tmp_path, monkeypatch)
+
+        assert store.add_documents(self._chunks("/docs/es/cv.md", ["es0", "es1"]), [[1.0, 0.0], [0.9, 0.1]])
+        assert store.add_documents(self._chunks("/docs/en/cv.md", ["en0"]), [[0.0, 1.0]])
+        assert store.collection.count() == 3
+
+        # Re-ingestar el mismo archivo sobrescribe en vez de fallar o duplicar
+        assert store.add_documents(self._chunks("/docs/es/cv.md", ["es0 v2", "es1"]), [[1.0, 0.0], [0.9, 0.1]])
+        assert store.collection.count() == 3
+        assert self._contents(store, "/docs/es/cv.md") == ["es0 v2", "es1"]
+
+        # replace_source_documents usa los mismos IDs
+        assert store.replace_source_documents("/docs/en/cv.md", self._chunks("/docs/en/cv.md", ["en0 v2"]), [[0.0, 1.0]])
+        assert store.collection.count() == 3
+        assert self._contents(store, "/docs/en/cv.md") == ["en0 v2"]
+
+
+    def test_replace_and_add_share_ids_when_an_embedding_fails(self, tmp_path, monkeypatch):
+        """Un embedding fallido no corre los IDs: add_documents no duplica chunks"""
+        store = self._store(tmp_path, monkeypatch)
+        chunks = self._chunks("/docs/a.md", ["a0", "a1", "a2"])
+
+        assert store.replace_source_documents("/docs/a.md", chunks, [[1.0, 0.0], None, [0.8, 0.2]])
+        assert self._contents(store, "/docs/a.md") == ["a0", "a2"]
+
+        assert store.add_documents(chunks, [[1.0, 0.0], None, [0.8, 0.2]])
+        assert self._contents(store, "/docs/a.md") == ["a0", "a2"]
+
+    def test_legacy_ids_are_removed_for_ingested_sources(self, tmp_path, monkeypatch):
+        """Los chunks con IDs doc_{i}_{archivo} de versiones previas no quedan duplicados"""
+        store = self._store(tmp_path, monkeypatch)
+        store.collection.add(ids=["doc_0_a.md", "doc_0_b.md"], documents=["a0 viejo", "b0"],
+                             embeddings=[[1.0, 0.0], [0.0, 1.0]],
+                             metadatas=[{'full_path': "/docs/a.md", 'chunk_index': 0},
+                                        {'full_path': "/docs/b.md", 'chunk_index': 0}])
+
+        assert store.add_documents(self._chunks("/docs/a.md", ["a0"]), [[1.0, 0.0]])
+        assert self._contents(store, "/docs/a.md") == ["a0"]
+        assert self._contents(store, "/docs/b.md") == ["b0"]
+
+        assert store.replace_source_documents("/docs/b.md", self._chunks("/docs/b.md", ["b0 nuevo"]), [[0.0, 1.0]])
+        assert self._contents(store, "/docs/b.md") == ["b0 nuevo"]
@@ -0,0 +1,99 @@
+"""
+Tests unitarios para FileSystemDocumentProcessor
+"""
+
+import os
+import pytest
+
+from app.config.settings import Config
+from app.providers.document_processor import FileSystemDocumentProcessor
+
+
+@pytest.fixture
+def processor(tmp_path, monkeypatch):
+    docs_dir = tmp_path / "documents"
+    docs_dir.mkdir()
+    monkeypatch.setattr(Config, 'DOCUMENTS_DIR', str(docs_dir))
+    monkeypatch.setattr(Config, 'DOCUMENT_MANIFEST_PATH', str(tmp_path / "manifest.json"))
+    return FileSystemDocumentProcessor()
+
+
+@pytest.mark.unit
+class TestIncrementalScan:
+    """Tests para la detección de cambios con manifest"""
+
+    def test_detects_added_modified_and_removed_files(self, processor):
+        """Solo los archivos con contenido distinto cuentan como cambiados"""
+        docs_dir = processor.documents_dir
+        for name in ("a.md", "b.md", "c.md"):
+            with open(os.path.join(docs_dir, name), 'w', encoding='utf-8') as f:
+                f.write(f"contenido {name}")
+
+        first = processor.scan_changes()
+        assert len(first['changed']) == 3 and first['removed'] == []
+        processor.save_manifest(first['manifest'])
+
+        with open(os.path.join(docs_dir, "a.md"), 'w', encoding='utf-8') as f:
+            f.write("contenido nuevo y más largo")
+        stat = os.stat(os.path.join(docs_dir, "b.md"))
+        os.utime(os.path.join(docs_dir, "b.md"), (stat.st_atime, stat.st_mtime + 10))
+        os.remove(os.path.join(docs_dir, "c.md"))
+
+        second = processor.scan_changes()
+        assert second['changed'] == [os.path.join(docs_dir, "a.md")]
+        assert second['removed'] == [os.path.join(docs_dir, "c.md")]
+        assert second['unchanged'] == 1
+
+    def test_files_are_not_listed_twice(self, processor):
+        """Los subdirectorios base no se recorren dos veces"""
+        sub_dir = os.path.join(processor.documents_dir, 'datos_base_es')
+        os.makedirs(sub_dir)
+        with open(os.path.join(sub_dir, "perfil.txt"), 'w', encoding='utf-8') as f:
+            f.write("perfil")
+
+        assert list(processor.snapshot_manifest()) == [os.path.join(sub_dir, "perfil.txt")]
+
+
+@pytest.mark.unit
+class TestParallelParsing:
+    """Tests para iter_documents con ProcessPoolExecutor"""
+
+    def test_parallel_matches_serial_order(self, processor, monkeypatch):
+        """El modo paralelo produce los mismos chunks y en el mismo orden que el serie"""
+        monkeypatch.setattr(Config, 'CHUNK_SIZE', 40)
+        monkeypatch.setattr(Config, 'CHUNK_OVERLAP', 5)
+        for i in range(6):
+            with open(os.path.join(processor.documents_dir, f"doc_{i}.txt"), 'w', encoding='utf-8') as f:
+                f.write(" ".join(f"palabra{i}_{j}" for j in range(30)))
+
+        serial = list(processor.iter_documents(workers=1))
+        parallel = list(processor.iter_documents(workers=2))
+
+        assert [path for path, _ in parallel] == [path for path, _ in serial]
+        assert parallel == serial
+        assert all(len(docs) > 1 for _, docs in parallel)
+
+    def test_pool_does_not_fork_the_server_process(self, processor, caplog):
+        """Los workers arrancan con forkserver/spawn y el pool no cae al modo serie"""
+        from app.providers.document_processor import _pool_context
+
+        assert _pool_context().get_start_method() in ('forkserver', 'spawn')
+
+        for i in range(2):
+            with open(os.path.join(processor.documents_dir, f"doc_{i}.txt"), 'w', encoding='utf-8') as f:
+                f.write(f"contenido {i}")
+        with caplog.at_level('WARNING', logger='app.providers.document_processor'):
+            assert len(list(processor.iter_documents(workers=2))) == 2
+        assert not caplog.records
+
+    def test_worker_module_does_not_import_providers(self):
+        """El módulo que cargan los workers no arrastra chromadb ni el SDK de Gemini"""
+        import subprocess
+        import sys
+
+        code = ("import sys, app.utils.document_parsing; "
+                "print(sorted(m for m in ('app.providers', 'chromadb', 'google.generativeai') if m in sys.modules))")
+        backend_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        output = subprocess.run([sys.executable, "-c", code], cwd=backend_dir,
+                                capture_output=True, text=True, check=True).stdout
+        assert output.strip() == "[]"
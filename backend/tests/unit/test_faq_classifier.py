@@ -89,3 +89,173 @@ class TestFAQClassifier:
         
         # Both should map to same category
         assert result_en.get('category') == result_es.get('category')
+
+
+@pytest.mark.unit
+class TestFAQIndex:
+    """Tests para el índice precompilado de FAQs"""
+
+    def test_pattern_candidates_pruned_by_literals(self):
+        """Solo se evalúan las regex cuyos literales aparecen en el mensaje"""
+        from app.utils.faq_checker import FAQClassifier
+
+        classifier = FAQClassifier()
+        index = classifier.index
+        message = classifier._normalize_message("¿Cómo puedo contactarte?")
+
+        candidates = index.pattern_candidates(message)
+        assert len(candidates) < len(index.pattern_faq_ids)
+        assert 'contact_info' in {index.pattern_faq_ids[i] for i in candidates}
+        assert classifier.classify_message("¿Cómo puedo contactarte?")['faq_id'] == 'contact_info'
+
+    def test_dotless_i_reaches_pattern_tier(self):
+        """Los trigramas se pliegan como IGNORECASE: 'ı' no descarta patrones con 'i'"""
+        from app.utils.faq_checker import FAQClassifier
+
+        classifier = FAQClassifier()
+        index = classifier.index
+        message = classifier._normalize_message("¿Qué estudıaste?")
+        assert 'education' in {index.pattern_faq_ids[i] for i in index.pattern_candidates(message)}
+        result = classifier.classify_message("¿Qué estudıaste?")
+        assert result['faq_id'] == 'education'
+        assert result['method'] == 'pattern_match'
+
+    def test_similarity_tier_uses_top_k_candidates(self):
+        """El tier de similitud solo puntúa los top-k candidatos por trigramas"""
+        from app.utils.faq_checker import FAQClassifier, FAQItem
+
+        classifier = FAQClassifier()
+        for i in range(300):
+            classifier.add_faq(FAQItem(
+                id=f"generated_{i}", question_patterns=[f"pregunta generada numero {i}"],
+                response=f"respuesta {i}", keywords=[], category="generadas"
+            ))
+
+        candidates = classifier.index.similarity_candidates("pregunta generada numro 123")
+        assert len(candidates) <= classifier.index.top_k
+
+        result = classifier.classify_message("pregunta generada numro 123")
+        assert result['is_faq'] is True
+        assert result['method'] == 'similarity_match'
+        assert result['faq_id'] == 'generated_123'
+
+    def test_replacing_faq_rebuilds_index(self):
+        """Reemplazar una FAQ no deja patrones ni keywords obsoletos"""
+        from app.utils.faq_checker import FAQClassifier, FAQItem
+
+        classifier = FAQClassifier()
+        total_patterns = len(classifier.index.pattern_faq_ids)
+        assert classifier.add_faq(FAQItem(
+            id="help", question_patterns=[r"necesito soporte"],
+            response="Soporte", keywords=["soporte"], category="ayuda"
+        ))
+
+        assert len(classifier.index.pattern_faq_ids) == total_patterns - 4
+        assert 'help' not in classifier.keyword_index.get('ayuda', [])
+        assert classifier.classify_message("necesito soporte")['response'] == "Soporte"
+
+
+class _KeywordEmbedding:
+    """Embeddings falsos: textos sobre contacto comparten vector"""
+
+    def __init__(self):
+        self.batches = []
+
+    def _embed(self, text):
+        return [1.0, 0.0] if 'contact' in text or 'escribirte' in text else [0.0, 1.0]
+
+    def generate_embeddings_batch(self, texts):
+        self.batches.append(list(texts))
+        return [self._embed(text) for text in texts]
+
+
+@pytest.mark.unit
+class TestSemanticFAQIndex:
+    """Tests para el tier semántico de FAQs"""
+
+    def test_build_embeds_pattern_examples_once(self):
+        """Los patrones se embeben como texto representativo en un único lote"""
+        from app.utils.faq_checker import FAQClassifier, SemanticFAQIndex
+        from app.utils.regex_literals import example_text
+
+        assert example_text(r"qu[eé] experiencia tienes?") == "qué experiencia tienes"
+        assert example_text(r"^(hola|hello|hi|hey)$") == "hola"
+
+        provider = _KeywordEmbedding()
+        index = SemanticFAQIndex(FAQClassifier(), threshold=0.9)
+
+        assert index.build(provider) == index.size > 0
+        assert len(provider.batches) == 1
+        assert "cómo puedo contactarte" in provider.batches[0]
+        assert index.matrix.shape == (index.size, 2)
+
+    def test_match_respects_threshold(self):
+        """Solo devuelve la FAQ si la similitud supera el umbral"""
+        from app.utils.faq_checker import FAQClassifier, SemanticFAQIndex
+
+        index = SemanticFAQIndex(FAQClassifier(), threshold=0.9)
+        index.build(_KeywordEmbedding())
+
+        result = index.match([2.0, 0.1])
+        assert result['is_faq'] is True
+        assert result['faq_id'] == 'contact_info'
+        assert result['method'] == 'semantic_match'
+        assert index.match([1.0, 1.0]) is None
+        assert index.match([]) is None
+        assert index.get_stats()['hits'] == 1
+
+    def test_add_faq_refreshes_index_with_only_new_patterns(self):
+        """Tras add_faq el índice queda desactualizado y se extiende embebiendo solo lo nuevo"""
+        from app.utils.faq_checker import FAQClassifier, FAQItem, SemanticFAQIndex
+
+        provider = _KeywordEmbedding()
+        classifier = FAQClassifier()
+        index = SemanticFAQIndex(classifier, threshold=0.9)
+        size = index.build(provider)
+        assert not index.stale and index.refresh(provider) is False
+
+        assert classifier.add_faq(FAQItem(id='newsletter', question_patterns=[r"tienes un bolet[ií]n"],
+                                          response="No, pero puedes seguirme en LinkedIn.",
+                                          keywords=['boletín'], category='contact'))
+        assert index.stale
+
+        assert index.refresh(provider) is True
+        assert provider.batches[-1] == ["tienes un boletín"]
+        assert index.size == size + 1 and 'newsletter' in index.faq_ids
+        assert index.refresh(provider) is False
+
+    def test_background_refresh_keeps_serving_previous_index(self):
+        """Mientras se re-embebe en segundo plano, y si falla, se usa la matriz anterior"""
+        import threading
+        from app.utils.faq_checker import FAQClassifier, FAQItem, SemanticFAQIndex
+
+        classifier = FAQClassifier()
+        index = SemanticFAQIndex(classifier, threshold=0.9)
+        index.build(_KeywordEmbedding())
+        size = index.size
+        release = threading.Event()
+
+        class _SlowEmbedding(_KeywordEmbedding):
+            def generate_embeddings_batch(self, texts):
+                release.wait(timeout=5)
+                return super().generate_embeddings_batch(texts)
+
+        classifier.add_faq(FAQItem(id='newsletter', question_patterns=[r"tienes un bolet[ií]n"],
+                                   response="No, pero puedes seguirme en LinkedIn.",
+                                   keywords=['boletín'], category='contact'))
+        assert index.refresh_in_background(_SlowEmbedding()) is True
+        assert index.refresh_in_background(_SlowEmbedding()) is False
+        assert index.size == size and index.match([2.0, 0.1])['faq_id'] == 'contact_info'
+
+        release.set()
+        index._refresh_thread.join(timeout=5)
+        assert index.size == size + 1 and not index.stale
+
+        class _FailingEmbedding:
+            def generate_embeddings_batch(self, texts):
+                raise ConnectionError("sin red")
+
+        classifier.add_faq(FAQItem(id='podcast', question_patterns=[r"tienes un podcast"],
+                                   response="Todavía no.", keywords=['podcast'], category='contact'))
+        assert index.refresh(_FailingEmbedding()) is True
+        assert index.size == size + 1 and index.matrix is not None
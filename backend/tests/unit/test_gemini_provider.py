@@ -0,0 +1,116 @@
+"""
+Tests unitarios para GeminiEmbeddingProvider (sin llamadas reales a la API)
+"""
+
+import threading
+import pytest
+from unittest.mock import patch
+
+from app.config.settings import Config
+from app.providers.gemini_provider import GeminiEmbeddingProvider
+
+
+class _QuotaError(Exception):
+    code = 429
+
+
+def _provider():
+    with patch.object(GeminiEmbeddingProvider, '_check_availability', return_value=True), \
+         patch('app.providers.gemini_provider.genai.configure'):
+        return GeminiEmbeddingProvider()
+
+
+@pytest.mark.unit
+class TestGeminiEmbeddingBatch:
+    """Tests para generate_embeddings_batch"""
+
+    def test_batches_requests_and_keeps_order(self, monkeypatch):
+        """Los textos se agrupan por request y el resultado queda alineado con la entrada"""
+        monkeypatch.setattr(Config, 'EMBEDDING_BATCH_SIZE', 3)
+        monkeypatch.setattr(Config, 'EMBEDDING_MAX_CONCURRENCY', 2)
+        calls = []
+        lock = threading.Lock()
+
+        def fake_embed(model, content, task_type):
+            with lock:
+                calls.append(content)
+            return {'embedding': [[float(len(text))] for text in content]}
+
+        texts = ["a" * (i + 1) for i in range(7)] + ["  "]
+        with patch('app.providers.gemini_provider.genai.embed_content', side_effect=fake_embed):
+            embeddings = _provider().generate_embeddings_batch(texts)
+
+        assert len(calls) == 3
+        assert all(isinstance(batch, list) and len(batch) <= 3 for batch in calls)
+        assert embeddings[:7] == [[float(i + 1)] for i in range(7)]
+        assert embeddings[7] == []
+
+    def test_partial_failures_and_quota_backoff(self, monkeypatch):
+        """Un lote que falla se reintenta por texto y los errores de cuota esperan y reintentan"""
+        monkeypatch.setattr(Config, 'EMBEDDING_BACKOFF_SECONDS', 0)
+        quota_hits = {'count': 0}
+
+        def fake_embed(model, content, task_type):
+            if isinstance(content, list):
+                raise ValueError("lote inválido")
+            if content == "roto":
+                raise ValueError("texto inválido")
+            if content == "cuota" and quota_hits['count'] < 2:
+                quota_hits['count'] += 1
+                raise _QuotaError("429 Resource has been exhausted")
+            return {'embedding': [1.0]}
+
+        with patch('app.providers.gemini_provider.genai.embed_content', side_effect=fake_embed), \
+             patch('app.providers.gemini_provider.time.sleep') as mock_sleep:
+            embeddings = _provider().generate_embeddings_batch(["ok", "roto", "cuota"])
+
+        assert embeddings == [[1.0], [], [1.0]]
+        assert mock_sleep.call_count == 2
+
+
+class _CountingEmbedding:
+    """Proveedor falso que registra qué textos se embebieron"""
+
+    def __init__(self):
+        self.embedded = []
+
+    def generate_embedding(self, text):
+        return [1.0]
+
+    def generate_embeddings_batch(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(text)), 0.5] for text in texts]
+
+    def is_available(self):
+        return True
+
+
+@pytest.mark.unit
+class TestCachedEmbeddingProvider:
+    """Tests para el cache persistente de embeddings"""
+
+    def test_only_new_chunks_are_embedded_across_restarts(self, tmp_path):
+        """Un segundo arranque reutiliza los embeddings guardados en disco"""
+        from app.providers.embedding_cache import CachedEmbeddingProvider, PersistentEmbeddingCache
+        path = str(tmp_path / "embeddings.sqlite3")
+
+        first = _CountingEmbedding()
+        provider = CachedEmbeddingProvider(first, PersistentEmbeddingCache(path, model="m1"))
+        assert provider.generate_embeddings_batch(["abc", "de"]) == [[3.0, 0.5], [2.0, 0.5]]
+
+        second = _CountingEmbedding()
+        restarted = CachedEmbeddingProvider(second, PersistentEmbeddingCache(path, model="m1"))
+        assert restarted.generate_embeddings_batch(["abc", "nuevo", "de"]) == [[3.0, 0.5], [5.0, 0.5], [2.0, 0.5]]
+        assert second.embedded == ["nuevo"]
+        assert restarted.get_stats()['entries'] == 3
+
+    def test_model_is_part_of_the_key(self, tmp_path):
+        """Cambiar EMBEDDING_MODEL invalida los embeddings guardados"""
+        from app.providers.embedding_cache import CachedEmbeddingProvider, PersistentEmbeddingCache
+        path = str(tmp_path / "embeddings.sqlite3")
+
+        CachedEmbeddingProvider(_CountingEmbedding(), PersistentEmbeddingCache(path, model="m1")).generate_embeddings_batch(["abc"])
+        other = _CountingEmbedding()
+        CachedEmbeddingProvider(other, PersistentEmbeddingCache(path, model="m2")).generate_embeddings_batch(["abc"])
+
+        assert other.embedded == ["abc"]
@@ -0,0 +1,51 @@
+"""
+Unit tests for I18n Service component
+"""
+
+import pytest
+
+
+@pytest.mark.unit
+class TestI18nLookupTables:
+    """Tests para los índices inversos y el reemplazo en una sola pasada"""
+
+    def test_exact_translation_uses_reverse_map(self):
+        """Un texto completo se traduce por búsqueda directa en ambos sentidos"""
+        from app.services.i18n_service import I18nService, Language
+
+        service = I18nService()
+        system_error = service.translations['system_error']
+
+        assert service._translate_text(system_error.es, Language.ENGLISH) == system_error.en
+        assert service._translate_text(system_error.en, Language.SPANISH) == system_error.es
+        assert service._translate_text("Texto sin traducción", Language.ENGLISH) == "Texto sin traducción"
+
+    def test_partial_replacement_prefers_longest_match(self):
+        """Los fragmentos se reemplazan en una pasada y gana la coincidencia más larga"""
+        from app.services.i18n_service import I18nService, Language, Translation
+
+        service = I18nService()
+        service.add_translation(Translation(key="python", es="experiencia con Python", en="experience with Python"))
+        service.add_translation(Translation(key="python_fastapi", es="experiencia con Python y FastAPI",
+                                            en="experience with Python and FastAPI"))
+        service.add_translation(Translation(key="fastapi", es="FastAPI", en="FastAPI framework"))
+
+        text = "Tengo experiencia con Python y FastAPI. También experiencia con Python."
+        assert service._translate_text(text, Language.ENGLISH) == (
+            "Tengo experience with Python and FastAPI. También experience with Python."
+        )
+
+    def test_add_translation_replaces_existing_key(self):
+        """Reemplazar una clave no deja textos obsoletos en los índices"""
+        from app.services.i18n_service import I18nService, Language, Translation
+
+        service = I18nService()
+        for i in range(100):
+            service.add_translation(Translation(key=f"frase_{i}", es=f"frase número {i}", en=f"sentence number {i}"))
+        service.add_translation(Translation(key="frase_7", es="frase siete", en="sentence seven"))
+
+        assert service._translate_text("una frase siete aquí", Language.ENGLISH) == "una sentence seven aquí"
+        assert service._translate_text("frase número 7", Language.ENGLISH) == "frase número 7"
+        assert service._translate_text("frase número 42 y frase número 4", Language.ENGLISH) == (
+            "sentence number 42 y sentence number 4"
+        )
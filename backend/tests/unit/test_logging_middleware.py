@@ -0,0 +1,130 @@
+"""
+Unit tests for the structured logging middleware
+"""
+
+import asyncio
+import json
+import logging
+import pytest
+
+
+class _ListHandler(logging.Handler):
+    """Handler del listener que guarda las líneas ya formateadas"""
+
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(record.getMessage())
+
+
+def _run_request(middleware, path, chunks):
+    """Ejecuta una request ASGI enviando el body en `chunks`"""
+    messages = [{'type': 'http.request', 'body': chunk, 'more_body': i < len(chunks) - 1}
+                for i, chunk in enumerate(chunks)]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': 'POST', 'path': path, 'client': ('10.0.0.1', 1234),
+             'headers': [(b'x-api-key', b'secret'), (b'content-type', b'application/json')]}
+    asyncio.run(middleware(scope, receive, send))
+    return sent
+
+
+async def _echo_length_app(scope, receive, send):
+    """App ASGI que consume el body completo y responde 200"""
+    total = 0
+    more_body = True
+    while more_body:
+        message = await receive()
+        total += len(message.get('body', b''))
+        more_body = message.get('more_body', False)
+    await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+    await send({'type': 'http.response.body', 'body': str(total).encode()})
+
+
+@pytest.mark.unit
+class TestStructuredLoggingMiddleware:
+    """Tests para el pipeline de logging asíncrono"""
+
+    def test_preview_is_captured_from_receive_stream(self):
+        """La app recibe el body intacto y el log solo guarda el preview enmascarado"""
+        from app.middleware.logging_middleware import LogPipeline, StructuredLoggingMiddleware
+
+        handler = _ListHandler()
+        pipeline = LogPipeline(queue_size=10, handlers=[handler])
+        middleware = StructuredLoggingMiddleware(_echo_length_app, pipeline=pipeline,
+                                                 body_preview_bytes=40, sample_rates={})
+        logger = logging.getLogger("structured_logger")
+        logger.addHandler(pipeline.handler)
+        pipeline.start()
+        try:
+            sent = _run_request(middleware, "/api/chat", [b'{"email": "juan.perez@example.com", ', b'x' * 5000, b'}'])
+        finally:
+            pipeline.stop()
+            logger.removeHandler(pipeline.handler)
+
+        assert sent[1]['body'] == b'5037'
+        request_log, response_log = [json.loads(line) for line in handler.lines]
+        assert request_log['payload_preview'] == '{"email": "j***z@example.com", xxxx'
+        assert request_log['headers']['x-api-key'] == 'REDACTED'
+        assert response_log == {'event': 'response_sent', 'method': 'POST', 'path': '/api/chat', 'status_code': 200}
+
+    def test_full_queue_drops_and_sampling_skips(self):
+        """Con la cola llena se descarta contando, y las rutas muestreadas no se loguean"""
+        from app.middleware.logging_middleware import LogPipeline, StructuredLoggingMiddleware
+
+        pipeline = LogPipeline(queue_size=1, handlers=[_ListHandler()])
+        middleware = StructuredLoggingMiddleware(_echo_length_app, pipeline=pipeline,
+                                                 sample_rates={'/api/health': 0.0})
+        logger = logging.getLogger("structured_logger")
+        logger.addHandler(pipeline.handler)
+        try:
+            _run_request(middleware, "/api/chat", [b'hola'])
+            _run_request(middleware, "/api/health", [b''])
+        finally:
+            logger.removeHandler(pipeline.handler)
+
+        stats = middleware.get_stats()
+        assert stats['queued'] == 1
+        assert stats['dropped'] == 1
+        assert stats['sampled_out'] == 1
+
+
+@pytest.mark.unit
+class TestMaskPII:
+    """Tests para el escáner de PII de una sola pasada"""
+
+    def test_matches_sequential_masking(self):
+        """Sin solapamientos el resultado es el mismo que con cuatro pasadas"""
+        from app.middleware.logging_middleware import mask_pii
+        from app.scripts.benchmark_pii_masking import mask_pii_sequential
+
+        texts = [
+            "Escríbeme a juan.perez@example.com o a ab@cd.ef",
+            "Mi SSN es 123-45-6789 y mi tarjeta 4111 1111 1111 1111.",
+            "Llámame al 612345678, gracias",
+            "Texto normal sin datos personales",
+            "",
+        ]
+        for text in texts:
+            assert mask_pii(text) == mask_pii_sequential(text)
+
+        # Única diferencia: los dígitos del dominio de un email quedan en claro
+        assert mask_pii("x@mail-612345678.es") == "***@mail-612345678.es"
+        assert mask_pii_sequential("x@mail-612345678.es") == "***@mail-61*****78.es"
+
+    def test_overlaps_resolve_to_leftmost_match(self):
+        """El prefijo internacional queda dentro del mismo span del teléfono"""
+        from app.middleware.logging_middleware import mask_pii
+
+        assert mask_pii("tel +34 612345678") == "tel +3*********78"
+        assert mask_pii("id x12345678901 ok") == "id x12345678901 ok"
+        long_digits = "9" * 65536
+        assert mask_pii(long_digits) == long_digits
@@ -0,0 +1,216 @@
+"""
+Tests unitarios para los proveedores en memoria
+"""
+
+import numpy as np
+import pytest
+
+from app.providers.memory_providers import InMemoryVectorStore
+
+
+def _docs(n):
+    return [{'content': f"doc {i}", 'metadata': {'filename': f"f{i}.md"}} for i in range(n)]
+
+
+@pytest.mark.unit
+class TestInMemoryVectorStore:
+    """Tests para InMemoryVectorStore"""
+
+    def test_search_matches_brute_force_cosine(self):
+        """El top-k coincide con un cálculo coseno directo"""
+        rng = np.random.default_rng(0)
+        vectors = rng.normal(size=(50, 16))
+        store = InMemoryVectorStore(initial_capacity=4)
+        assert store.add_documents(_docs(50), vectors.tolist())
+
+        query = rng.normal(size=16)
+        results = store.search_similar(query.tolist(), 5)
+
+        expected = vectors @ query / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query))
+        expected_order = np.argsort(-expected)[:5]
+        assert [r['content'] for r in results] == [f"doc {i}" for i in expected_order]
+        assert results[0]['similarity'] == pytest.approx(expected[expected_order[0]], abs=1e-5)
+
+    def test_capacity_grows_by_doubling(self):
+        """La matriz crece por duplicación y conserva los documentos previos"""
+        store = InMemoryVectorStore(initial_capacity=2)
+        for i in range(5):
+            store.add_documents(_docs(1), [[float(i + 1), 1.0]])
+
+        stats = store.get_stats()
+        assert stats['total_embeddings'] == 5
+        assert stats['capacity'] == 8
+        assert store.search_similar([5.0, 1.0], 1)[0]['content'] == "doc 0"
+
+    def test_batch_search_and_k_larger_than_store(self):
+        """La búsqueda batch devuelve una lista por consulta y limita k al tamaño"""
+        store = InMemoryVectorStore()
+        store.add_documents(_docs(3), [[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]])
+
+        results = store.search_similar_batch([[1.0, 0.0], [0.0, 1.0]], 10)
+
+        assert len(results) == 2
+        assert len(results[0]) == 3
+        assert results[0][0]['metadata']['filename'] == "f0.md"
+        assert results[1][0]['metadata']['filename'] == "f1.md"
+
+    def test_rejects_dimension_mismatch_and_skips_empty(self):
+        """Embeddings vacíos se ignoran y dimensiones distintas se rechazan"""
+        store = InMemoryVectorStore()
+        assert store.add_documents(_docs(2), [[1.0, 0.0], []])
+        assert store.get_stats()['total_documents'] == 1
+        assert not store.add_documents(_docs(1), [[1.0, 0.0, 0.0]])
+        assert store.search_similar([1.0, 0.0, 0.0], 1) == []
+
+
+@pytest.mark.unit
+class TestInMemoryCacheProvider:
+    """Tests para InMemoryCacheProvider acotado"""
+
+    def test_lru_evicts_least_recently_used(self):
+        from app.providers.memory_providers import InMemoryCacheProvider
+
+        cache = InMemoryCacheProvider(max_entries=2, max_bytes=0, eviction_policy='lru')
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        assert cache.get('b') is None
+        assert cache.get('a') == 1
+        assert cache.get_stats()['evictions'] == 1
+
+    def test_lfu_evicts_least_frequently_used(self):
+        from app.providers.memory_providers import InMemoryCacheProvider
+
+        cache = InMemoryCacheProvider(max_entries=2, max_bytes=0, eviction_policy='lfu')
+        cache.set('a', 1)
+        cache.set('b', 2)
+        for _ in range(3):
+            cache.get('b')
+        cache.get('a')
+        cache.set('c', 3)
+
+        assert cache.get('a') is None
+        assert cache.get('b') == 2
+
+    def test_tinylfu_rejects_one_hit_wonders(self):
+        from app.providers.memory_providers import InMemoryCacheProvider
+
+        cache = InMemoryCacheProvider(max_entries=1, max_bytes=0, eviction_policy='tinylfu')
+        cache.set('popular', 'x')
+        for _ in range(5):
+            cache.get('popular')
+
+        cache.get('rare')
+        assert cache.set('rare', 'y') is False
+        assert cache.get('popular') == 'x'
+
+    def test_rejected_admission_keeps_every_victim(self):
+        """Si la admisión falla con alguna víctima no se desaloja ninguna"""
+        from app.providers.memory_providers import InMemoryCacheProvider
+
+        cache = InMemoryCacheProvider(max_entries=0, max_bytes=100, eviction_policy='tinylfu')
+        cache.set('cold', 'x' * 30)
+        cache.set('hot', 'y' * 30)
+        for _ in range(5):
+            cache.get('hot')
+        for _ in range(3):
+            cache.get('big')
+
+        # 'big' solo cabe desalojando ambas; le gana a 'cold' pero no a 'hot'
+        assert cache.set('big', 'z' * 70) is False
+        assert cache.get('cold') == 'x' * 30
+        assert cache.get('hot') == 'y' * 30
+        assert cache.get_stats()['evictions'] == 0
+
+    def test_frequency_sketch_rows_hash_independently(self):
+        """Dos claves que chocan en una fila no comparten contador en todas"""
+        from app.providers.cache_policies import FrequencySketch
+
+        sketch = FrequencySketch(width=64, depth=4)
+        first_row = {}
+        for i in range(sketch.width + 1):
+            key = f"clave_{i}"
+            index = dict(sketch._indexes(key))[0]
+            if index in first_row:
+                colliding = (first_row[index], key)
+                break
+            first_row[index] = key
+
+        rows_a, rows_b = (dict(sketch._indexes(key)) for key in colliding)
+        assert rows_a[0] == rows_b[0]
+        assert any(rows_a[row] != rows_b[row] for row in range(1, sketch.depth))
+
+        for _ in range(5):
+            sketch.increment(colliding[0])
+        assert sketch.estimate(colliding[1]) < 5
+
+    def test_byte_budget_and_ttl_sweep(self):
+        import time
+        from app.providers.memory_providers import InMemoryCacheProvider
+
+        cache = InMemoryCacheProvider(max_entries=0, max_bytes=100, eviction_policy='lru')
+        cache.set('k1', 'x' * 50)
+        cache.set('k2', 'y' * 50)
+        assert cache.get_stats()['entries'] == 1
+        assert cache.get_stats()['size_bytes'] <= 100
+
+        cache.set('short', 'z', ttl=0)
+        time.sleep(0.01)
+        stats = cache.get_stats()
+        assert stats['expirations'] >= 1
+        assert 'short' not in cache.cache
+
+
+@pytest.mark.unit
+class TestSemanticResponseCache:
+    """Tests para SemanticResponseCache"""
+
+    def test_hit_above_threshold_same_language_only(self):
+        """Una consulta cercana reutiliza la respuesta solo dentro del mismo idioma"""
+        from app.providers.semantic_cache import SemanticResponseCache
+        cache = SemanticResponseCache(threshold=0.9, max_entries=4, ttl=60)
+        cache.store([1.0, 0.0, 0.0], 'es', {'response': 'hola', 'metadata': {'flow_path': ['rag']}})
+
+        hit = cache.lookup([0.99, 0.05, 0.0], 'es')
+        assert hit['response']['response'] == 'hola'
+        assert hit['similarity'] > 0.9
+        assert cache.lookup([0.99, 0.05, 0.0], 'en') is None
+        assert cache.lookup([0.0, 1.0, 0.0], 'es') is None
+
+    def test_capacity_overwrites_oldest_and_ttl_expires(self):
+        """El buffer por idioma es circular y las entradas caducadas no se devuelven"""
+        from app.providers.semantic_cache import SemanticResponseCache
+        cache = SemanticResponseCache(threshold=0.99, max_entries=2, ttl=60)
+        cache.store([1.0, 0.0], 'es', {'response': 'a'})
+        cache.store([0.0, 1.0], 'es', {'response': 'b'})
+        cache.store([-1.0, 0.0], 'es', {'response': 'c'})
+
+        assert cache.get_stats()['entries'] == {'es': 2}
+        assert cache.lookup([1.0, 0.0], 'es') is None
+        assert cache.lookup([-1.0, 0.0], 'es')['response']['response'] == 'c'
+
+        expired = SemanticResponseCache(threshold=0.9, max_entries=2, ttl=0)
+        expired.store([1.0, 0.0], 'es', {'response': 'a'})
+        assert expired.lookup([1.0, 0.0], 'es') is None
+
+
+@pytest.mark.unit
+class TestInMemoryVectorStoreReplaceSource:
+    """Tests para replace_source_documents"""
+
+    def test_replaces_and_deletes_only_the_given_source(self):
+        """Los chunks de otras fuentes siguen disponibles"""
+        store = InMemoryVectorStore(initial_capacity=2)
+        docs = [{'content': f"{src}-{i}", 'metadata': {'full_path': src}} for src in ("a", "b") for i in range(2)]
+        store.add_documents(docs, [[1.0, 0.0], [1.0, 0.1], [0.0, 1.0], [0.1, 1.0]])
+
+        new_docs = [{'content': "a-nuevo", 'metadata': {'full_path': "a"}}]
+        assert store.replace_source_documents("a", new_docs, [[1.0, 0.0]])
+        assert sorted(store.documents) == ["a-nuevo", "b-0", "b-1"]
+        assert store.search_similar([1.0, 0.0], 1)[0]['content'] == "a-nuevo"
+
+        assert store.replace_source_documents("b", [], [])
+        assert store.documents == ["a-nuevo"]
+        assert store.get_stats()['total_embeddings'] == 1
@@ -0,0 +1,63 @@
+"""
+Unit tests for the background metrics sampler
+"""
+
+import random
+import pytest
+
+
+@pytest.mark.unit
+class TestQuantileSketch:
+    """Tests para el sketch de cuantiles con error relativo acotado"""
+
+    def test_quantiles_within_relative_accuracy(self):
+        """Los cuantiles estimados quedan dentro del error relativo configurado"""
+        from app.monitoring.metrics_sampler import QuantileSketch
+
+        rng = random.Random(3)
+        values = [rng.lognormvariate(-3, 1.2) for _ in range(20000)]
+        sketch = QuantileSketch(relative_accuracy=0.01)
+        for value in values:
+            sketch.add(value)
+
+        values.sort()
+        estimates = sketch.quantiles((0.5, 0.95, 0.99))
+        for q, estimate in zip((0.5, 0.95, 0.99), estimates):
+            exact = values[int(q * (len(values) - 1))]
+            assert abs(estimate - exact) / exact <= 0.011
+        assert len(sketch.buckets) < 1500
+        assert sketch.max == values[-1]
+
+
+@pytest.mark.unit
+class TestMetricsSampler:
+    """Tests para el muestreador en segundo plano"""
+
+    def test_sample_publishes_snapshot_and_history(self):
+        """Cada muestra vuelca las requests pendientes y publica una foto nueva"""
+        from app.monitoring.metrics_sampler import MetricsSampler
+
+        sampler = MetricsSampler(interval=5, history_size=3)
+        for i in range(10):
+            sampler.record_request(0.1 if i < 9 else 2.0, cache_hit=i < 4)
+
+        before = sampler.snapshot()
+        snapshot = sampler.sample_once(now=1000.0)
+        assert sampler.snapshot() is snapshot is not before
+        assert snapshot['response_times']['count'] == 10
+        assert snapshot['response_times']['median_ms'] == pytest.approx(100, rel=0.01)
+        assert snapshot['response_times']['max_ms'] == 2000
+        assert snapshot['cache']['hit_rate'] == 0.4
+        assert snapshot['throughput']['requests_per_second'] is None
+
+        for i in range(5):
+            sampler.record_request(0.05)
+        snapshot = sampler.sample_once(now=1005.0)
+        assert snapshot['throughput']['requests_per_second'] == 1.0
+        assert snapshot['throughput']['requests_per_minute'] == 15
+        assert snapshot['throughput']['total_requests'] == 15
+
+        for second in range(3):
+            sampler.sample_once(now=1010.0 + second * 5)
+        assert len(sampler.get_history()) == 3
+        assert sampler.snapshot()['throughput']['requests_per_minute'] == 0
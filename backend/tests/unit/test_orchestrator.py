@@ -5,6 +5,7 @@ Tests unitarios para el orquestador híbrido
 import pytest
 from unittest.mock import MagicMock, patch
 from app.core.orchestrator import HybridRAGOrchestrator
+from app.config.settings import Config
 
 @pytest.mark.unit
 class TestHybridOrchestrator:
@@ -270,3 +271,507 @@ class TestHybridOrchestrator:
                 
                 mock_init.assert_called()
                 assert 'success' in result
+
+
+class _SlowAsyncLLM:
+    """LLM falso con latencia asíncrona para probar concurrencia"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def is_available(self):
+        return True
+
+    def get_model_info(self):
+        return {'provider': 'fake', 'model': 'fake'}
+
+    def generate_response(self, prompt, **kwargs):
+        raise AssertionError("El flujo async no debe llamar a la versión bloqueante")
+
+    async def agenerate_response(self, prompt, **kwargs):
+        import asyncio
+        await asyncio.sleep(self.delay)
+        return {'success': True, 'response': 'Tengo experiencia con Python y FastAPI en proyectos reales.'}
+
+
+@pytest.mark.unit
+class TestHybridOrchestratorAsync:
+    """Tests para aprocess_hybrid_request"""
+
+    def test_aprocess_uses_async_llm(self, orchestrator_factory):
+        """El pipeline async espera al LLM y completa el flujo RAG"""
+        import asyncio
+        orchestrator = orchestrator_factory(_SlowAsyncLLM(0.01))
+
+        with patch('app.core.orchestrator.check_rate_limit', return_value={'allowed': True}), \
+             patch('app.core.orchestrator.classify_user_message', return_value={'is_faq': False}), \
+             patch('app.core.orchestrator.check_output_safety', side_effect=lambda r, c: {'is_safe': True, 'safe_response': r}):
+            result = asyncio.run(orchestrator.aprocess_hybrid_request(
+                message="Háblame de tu experiencia con Python",
+                client_identifier="async_client"
+            ))
+
+        assert result['success'] is True
+        assert 'rag_generation' in result['metadata']['flow_path']
+        assert 'Python' in result['response']
+
+    def test_aprocess_requests_run_concurrently(self, orchestrator_factory):
+        """Varias requests lentas comparten el event loop en lugar de serializarse"""
+        import asyncio
+        import time
+        orchestrator = orchestrator_factory(_SlowAsyncLLM(0.2))
+
+        async def run_many():
+            return await asyncio.gather(*[
+                orchestrator.aprocess_hybrid_request(
+                    message=f"Pregunta distinta número {i} sobre proyectos",
+                    client_identifier=f"client_{i}"
+                )
+                for i in range(10)
+            ])
+
+        with patch('app.core.orchestrator.check_rate_limit', return_value={'allowed': True}), \
+             patch('app.core.orchestrator.classify_user_message', return_value={'is_faq': False}), \
+             patch('app.core.orchestrator.check_output_safety', side_effect=lambda r, c: {'is_safe': True, 'safe_response': r}):
+            start = time.time()
+            results = asyncio.run(run_many())
+            elapsed = time.time() - start
+
+        assert all(r['success'] for r in results)
+        assert elapsed < 1.0
+
+
+class _StreamingLLM(_SlowAsyncLLM):
+    """LLM falso que emite la respuesta en fragmentos"""
+
+    def __init__(self, chunks):
+        super().__init__(0)
+        self.chunks = chunks
+
+    async def astream_response(self, prompt, **kwargs):
+        for chunk in self.chunks:
+            yield chunk
+
+
+@pytest.mark.unit
+class TestHybridOrchestratorStreaming:
+    """Tests para astream_hybrid_request"""
+
+    def _collect(self, orchestrator, message):
+        import asyncio
+
+        async def collect():
+            return [event async for event in orchestrator.astream_hybrid_request(
+                message=message,
+                client_identifier="stream_client"
+            )]
+
+        with patch('app.core.orchestrator.check_rate_limit', return_value={'allowed': True}), \
+             patch('app.core.orchestrator.classify_user_message', return_value={'is_faq': False}), \
+             patch('app.core.orchestrator.check_output_safety', side_effect=lambda r, c: {'is_safe': True, 'safe_response': r}):
+            return asyncio.run(collect())
+
+    def test_stream_emits_tokens_then_done_and_caches(self, orchestrator_factory):
+        """Los tokens se emiten en orden y la respuesta final se cachea al terminar"""
+        llm = _StreamingLLM(["Trabajo con ", "Python y ", "FastAPI."])
+        orchestrator = orchestrator_factory(llm)
+        orchestrator.cache_provider = MagicMock()
+        orchestrator.cache_provider.get.return_value = None
+
+        events = self._collect(orchestrator, "¿Con qué trabajas en backend?")
+
+        assert [e['event'] for e in events] == ['token', 'token', 'token', 'done']
+        assert events[-1]['data']['response'] == "Trabajo con Python y FastAPI."
+        orchestrator.cache_provider.set.assert_called_once()
+
+    def test_stream_stops_on_unsafe_chunk(self, orchestrator_factory):
+        """Un patrón bloqueado partido entre fragmentos corta el stream sin cachear"""
+        llm = _StreamingLLM(["Puedes usar ev", "al(codigo) para", " ejecutar"])
+        orchestrator = orchestrator_factory(llm)
+        orchestrator.cache_provider = MagicMock()
+        orchestrator.cache_provider.get.return_value = None
+
+        events = self._collect(orchestrator, "¿Cómo ejecuto código dinámico?")
+
+        assert [e['event'] for e in events] == ['token', 'error']
+        assert 'output_unsafe_stream' in events[-1]['data']['metadata']['flow_path']
+        orchestrator.cache_provider.set.assert_not_called()
+
+
+class _FakeEmbedding:
+    """Embeddings falsos: consultas con la misma palabra clave comparten vector"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def is_available(self):
+        return True
+
+    def generate_embedding(self, text):
+        self.calls += 1
+        return [1.0, 0.0] if 'python' in text.lower() else [0.0, 1.0]
+
+    async def agenerate_embedding(self, text):
+        return self.generate_embedding(text)
+
+
+@pytest.fixture
+def embedding_provider():
+    """Embeddings falsos para semantic_orchestrator (ver tests/conftest.py)"""
+    return _FakeEmbedding()
+
+
+@pytest.mark.unit
+class TestHybridOrchestratorSemanticCache:
+    """Tests para el cache semántico de respuestas"""
+
+    def test_paraphrase_hits_semantic_cache_and_reuses_embedding(self, semantic_orchestrator, ask_orchestrator):
+        """Una paráfrasis no llama al LLM y la consulta se embebe una sola vez"""
+        orchestrator = semantic_orchestrator
+
+        first = ask_orchestrator(orchestrator, "¿Sabes Python?")
+        assert orchestrator.embedding_provider.calls == 1
+        second = ask_orchestrator(orchestrator, "¿Tienes experiencia con Python?")
+
+        assert orchestrator.llm_provider.generate_response.call_count == 1
+        assert second['response'] == first['response']
+        assert second['from_cache'] is True
+        assert 'semantic_cache_hit' in second['metadata']['flow_path']
+        orchestrator.vector_store.search_similar.assert_called_once_with([1.0, 0.0], Config.SIMILARITY_TOP_K)
+
+    def test_user_context_and_reload_bypass_semantic_cache(self, semantic_orchestrator, ask_orchestrator):
+        """Las consultas con contexto no lo usan y reload_documents lo invalida"""
+        orchestrator = semantic_orchestrator
+        orchestrator._initialize_documents = MagicMock()
+
+        ask_orchestrator(orchestrator, "¿Sabes Python?")
+        ask_orchestrator(orchestrator, "Python en proyectos", user_context="reclutador")
+        assert orchestrator.llm_provider.generate_response.call_count == 2
+
+        orchestrator.reload_documents()
+        orchestrator.is_initialized = True
+        result = ask_orchestrator(orchestrator, "¿Programas en Python?")
+
+        assert orchestrator.llm_provider.generate_response.call_count == 3
+        assert 'semantic_cache_miss' in result['metadata']['flow_path']
+
+
+class _FAQEmbedding(_FakeEmbedding):
+    """Embeddings falsos con lote: las paráfrasis de contacto caen sobre la FAQ"""
+
+    def _vector(self, text):
+        text = text.lower()
+        if 'contact' in text or 'escribirte' in text:
+            return [1.0, 0.0, 0.0]
+        if 'python' in text:
+            return [0.0, 1.0, 0.0]
+        return [0.0, 0.0, 1.0]
+
+    def generate_embedding(self, text):
+        self.calls += 1
+        return self._vector(text)
+
+    def generate_embeddings_batch(self, texts):
+        return [self._vector(text) for text in texts]
+
+
+@pytest.mark.unit
+class TestHybridOrchestratorSemanticFAQ:
+    """Tests para el tier semántico de FAQs"""
+
+    @pytest.fixture
+    def embedding_provider(self):
+        return _FAQEmbedding()
+
+    def test_paraphrased_faq_skips_llm(self, faq_orchestrator, ask_orchestrator):
+        """Una paráfrasis de una FAQ se responde sin generación"""
+        from app.utils.faq_checker import faq_classifier
+
+        orchestrator = faq_orchestrator
+        result = ask_orchestrator(orchestrator, "¿Por dónde puedo escribirte?")
+
+        orchestrator.llm_provider.generate_response.assert_not_called()
+        assert result['response'] == faq_classifier.faqs['contact_info'].response
+        assert result['source'] == 'faq'
+        assert 'semantic_faq_hit' in result['metadata']['flow_path']
+        assert orchestrator.embedding_provider.calls == 1
+
+    def test_faq_added_after_startup_is_matched(self, faq_orchestrator, ask_orchestrator):
+        """Una FAQ agregada con add_faq se indexa en segundo plano, fuera del hilo de la request"""
+        import threading
+        from app.utils.faq_checker import FAQClassifier, FAQItem, SemanticFAQIndex
+
+        orchestrator = faq_orchestrator
+        classifier = FAQClassifier()
+        orchestrator.semantic_faq = SemanticFAQIndex(classifier)
+        orchestrator._build_semantic_faq_index()
+
+        batch_threads = []
+        embed_batch = orchestrator.embedding_provider.generate_embeddings_batch
+        orchestrator.embedding_provider.generate_embeddings_batch = (
+            lambda texts: batch_threads.append(threading.current_thread()) or embed_batch(texts))
+
+        classifier.add_faq(FAQItem(id='python_skills', question_patterns=[r"sabes python"],
+                                   response="Sí, Python es mi lenguaje principal.",
+                                   keywords=['python'], category='skills'))
+        ask_orchestrator(orchestrator, "¿Cuál es tu color favorito?")
+        orchestrator.semantic_faq._refresh_thread.join(timeout=5)
+
+        assert batch_threads and threading.current_thread() not in batch_threads
+        assert not orchestrator.semantic_faq.stale
+        orchestrator.llm_provider.generate_response.reset_mock()
+        result = ask_orchestrator(orchestrator, "¿Sabes Python?")
+
+        orchestrator.llm_provider.generate_response.assert_not_called()
+        assert result['response'] == "Sí, Python es mi lenguaje principal."
+        assert 'semantic_faq_hit' in result['metadata']['flow_path']
+
+    def test_faq_miss_shares_query_embedding_with_search(self, faq_orchestrator, ask_orchestrator):
+        """Sin coincidencia, la misma embedding sirve para la búsqueda RAG"""
+        orchestrator = faq_orchestrator
+        result = ask_orchestrator(orchestrator, "¿Sabes Python?")
+
+        assert orchestrator.llm_provider.generate_response.call_count == 1
+        assert 'semantic_faq_hit' not in result['metadata']['flow_path']
+        assert 'semantic_faq_lookup' in result['metadata']['steps_completed']
+        assert orchestrator.embedding_provider.calls == 1
+        orchestrator.vector_store.search_similar.assert_called_once_with([0.0, 1.0, 0.0], Config.SIMILARITY_TOP_K)
+
+
+@pytest.mark.unit
+class TestHybridOrchestratorIncrementalSync:
+    """Tests para reload_documents incremental"""
+
+    def test_sync_updates_changed_file_and_invalidates_only_its_responses(self, tmp_path, monkeypatch):
+        """Un archivo modificado se re-ingesta y solo caen las respuestas que lo usaron"""
+        import os
+        from app.providers.document_processor import FileSystemDocumentProcessor
+        from app.providers.memory_providers import InMemoryVectorStore, InMemoryCacheProvider
+
+        docs_dir = tmp_path / "documents"
+        docs_dir.mkdir()
+        (docs_dir / "python.md").write_text("Experiencia con Python", encoding='utf-8')
+        (docs_dir / "cv.md").write_text("Formación académica", encoding='utf-8')
+        monkeypatch.setattr(Config, 'DOCUMENTS_DIR', str(docs_dir))
+        monkeypatch.setattr(Config, 'DOCUMENT_MANIFEST_PATH', str(tmp_path / "manifest.json"))
+
+        class _BatchEmbedding(_FakeEmbedding):
+            def generate_embeddings_batch(self, texts):
+                self.batched = getattr(self, 'batched', []) + list(texts)
+                return [self.generate_embedding(text) for text in texts]
+
+        embedding = _BatchEmbedding()
+        with patch('app.core.factory.ProviderFactory.create_all_providers') as mock_factory:
+            mock_factory.return_value = {
+                'llm': None,
+                'embedding': embedding,
+                'vector_store': InMemoryVectorStore(),
+                'document_processor': FileSystemDocumentProcessor(),
+                'cache': InMemoryCacheProvider()
+            }
+            orchestrator = HybridRAGOrchestrator()
+        assert orchestrator.is_initialized
+
+        python_path = str(docs_dir / "python.md")
+        cv_path = str(docs_dir / "cv.md")
+        orchestrator.cache_provider.set("k_python", {'response': 'py'})
+        orchestrator._track_response_sources("k_python", frozenset({python_path}))
+        orchestrator.cache_provider.set("k_cv", {'response': 'cv'})
+        orchestrator._track_response_sources("k_cv", frozenset({cv_path}))
+
+        (docs_dir / "python.md").write_text("Experiencia con Python y FastAPI", encoding='utf-8')
+        embedding.batched = []
+        result = orchestrator.reload_documents()
+
+        assert result['mode'] == 'incremental'
+        assert result['changed_files'] == 1 and result['removed_files'] == 0
+        assert embedding.batched == ["Experiencia con Python y FastAPI"]
+        assert sorted(orchestrator.vector_store.documents) == ["Experiencia con Python y FastAPI", "Formación académica"]
+        assert orchestrator.cache_provider.get("k_python") is None
+        assert orchestrator.cache_provider.get("k_cv") == {'response': 'cv'}
+
+        os.remove(cv_path)
+        result = orchestrator.reload_documents()
+        assert result['removed_files'] == 1
+        assert orchestrator.vector_store.documents == ["Experiencia con Python y FastAPI"]
+        assert orchestrator.cache_provider.get("k_cv") is None
+
+    def test_sync_keeps_indexed_version_when_embedding_fails(self, tmp_path, monkeypatch):
+        """Si el embedder falla, el archivo conserva sus chunks y su entrada del manifest"""
+        import json
+        from app.providers.document_processor import FileSystemDocumentProcessor
+        from app.providers.memory_providers import InMemoryVectorStore, InMemoryCacheProvider
+
+        docs_dir = tmp_path / "documents"
+        docs_dir.mkdir()
+        (docs_dir / "python.md").write_text("Experiencia con Python", encoding='utf-8')
+        manifest_path = tmp_path / "manifest.json"
+        monkeypatch.setattr(Config, 'DOCUMENTS_DIR', str(docs_dir))
+        monkeypatch.setattr(Config, 'DOCUMENT_MANIFEST_PATH', str(manifest_path))
+
+        class _FlakyEmbedding(_FakeEmbedding):
+            failing = False
+
+            def generate_embeddings_batch(self, texts):
+                if self.failing:
+                    return [[] for _ in texts]
+                return [self.generate_embedding(text) for text in texts]
+
+        embedding = _FlakyEmbedding()
+        with patch('app.core.factory.ProviderFactory.create_all_providers') as mock_factory:
+            mock_factory.return_value = {
+                'llm': None,
+                'embedding': embedding,
+                'vector_store': InMemoryVectorStore(),
+                'document_processor': FileSystemDocumentProcessor(),
+                'cache': InMemoryCacheProvider()
+            }
+            orchestrator = HybridRAGOrchestrator()
+        assert orchestrator.is_initialized
+
+        python_path = str(docs_dir / "python.md")
+        orchestrator.cache_provider.set("k_python", {'response': 'py'})
+        orchestrator._track_response_sources("k_python", frozenset({python_path}))
+        indexed_entry = json.loads(manifest_path.read_text())[python_path]
+
+        (docs_dir / "python.md").write_text("Experiencia con Python y FastAPI", encoding='utf-8')
+        embedding.failing = True
+        result = orchestrator.reload_documents()
+
+        assert result['success'] is False
+        assert result['changed_files'] == 0 and result['skipped_files'] == 1
+        assert orchestrator.vector_store.documents == ["Experiencia con Python"]
+        assert orchestrator.cache_provider.get("k_python") == {'response': 'py'}
+        assert json.loads(manifest_path.read_text())[python_path] == indexed_entry
+
+        # Con el embedder recuperado el archivo se vuelve a detectar como cambiado
+        embedding.failing = False
+        result = orchestrator.reload_documents()
+        assert result['success'] is True and result['changed_files'] == 1
+        assert orchestrator.vector_store.documents == ["Experiencia con Python y FastAPI"]
+        assert orchestrator.cache_provider.get("k_python") is None
+
+    def test_startup_reconciles_persisted_store_with_saved_manifest(self, tmp_path, monkeypatch):
+        """Al arrancar sobre un store persistente se aplican los cambios ocurridos con el servicio caído"""
+        import os
+        from app.providers.document_processor import FileSystemDocumentProcessor
+        from app.providers.memory_providers import InMemoryVectorStore
+
+        docs_dir = tmp_path / "documents"
+        docs_dir.mkdir()
+        (docs_dir / "python.md").write_text("Experiencia con Python", encoding='utf-8')
+        (docs_dir / "cv.md").write_text("Formación académica", encoding='utf-8')
+        (docs_dir / "old.md").write_text("Proyecto discontinuado", encoding='utf-8')
+        monkeypatch.setattr(Config, 'DOCUMENTS_DIR', str(docs_dir))
+        monkeypatch.setattr(Config, 'DOCUMENT_MANIFEST_PATH', str(tmp_path / "manifest.json"))
+        monkeypatch.setattr(Config, 'FAQ_SEMANTIC_ENABLED', False)
+
+        class _BatchEmbedding(_FakeEmbedding):
+            def generate_embeddings_batch(self, texts):
+                self.batched = getattr(self, 'batched', []) + list(texts)
+                return [self.generate_embedding(text) for text in texts]
+
+        # El mismo store en ambos arranques hace de colección persistente
+        vector_store = InMemoryVectorStore()
+
+        def start(embedding):
+            with patch('app.core.factory.ProviderFactory.create_all_providers') as mock_factory:
+                mock_factory.return_value = {
+                    'llm': None,
+                    'embedding': embedding,
+                    'vector_store': vector_store,
+                    'document_processor': FileSystemDocumentProcessor(),
+                    'cache': None
+                }
+                return HybridRAGOrchestrator()
+
+        assert start(_BatchEmbedding()).is_initialized
+
+        # Con el servicio caído: un archivo se borra y otro se modifica
+        os.remove(docs_dir / "old.md")
+        (docs_dir / "python.md").write_text("Experiencia con Python y FastAPI", encoding='utf-8')
+
+        embedding = _BatchEmbedding()
+        orchestrator = start(embedding)
+        assert orchestrator.is_initialized
+        assert embedding.batched == ["Experiencia con Python y FastAPI"]
+        assert sorted(vector_store.documents) == ["Experiencia con Python y FastAPI", "Formación académica"]
+
+        result = orchestrator.reload_documents()
+        assert result['mode'] == 'incremental'
+        assert result['changed_files'] == 0 and result['removed_files'] == 0
+
+
+@pytest.mark.unit
+class TestHybridOrchestratorStreamingIngestion:
+    """Tests para la ingesta por lotes en streaming"""
+
+    def test_documents_are_embedded_and_stored_in_bounded_batches(self, tmp_path, monkeypatch):
+        """Cada lote de embedding/upsert contiene como mucho INGEST_BATCH_SIZE chunks más un archivo"""
+        from app.providers.document_processor import FileSystemDocumentProcessor
+        from app.providers.memory_providers import InMemoryVectorStore
+
+        docs_dir = tmp_path / "documents"
+        docs_dir.mkdir()
+        for i in range(10):
+            (docs_dir / f"doc_{i}.md").write_text(f"Documento {i} sobre Python", encoding='utf-8')
+        monkeypatch.setattr(Config, 'DOCUMENTS_DIR', str(docs_dir))
+        monkeypatch.setattr(Config, 'DOCUMENT_MANIFEST_PATH', str(tmp_path / "manifest.json"))
+        monkeypatch.setattr(Config, 'DOCUMENT_PARSE_WORKERS', 1)
+        monkeypatch.setattr(Config, 'INGEST_BATCH_SIZE', 3)
+        monkeypatch.setattr(Config, 'FAQ_SEMANTIC_ENABLED', False)
+
+        embedding = _FakeEmbedding()
+        embedding.generate_embeddings_batch = MagicMock(side_effect=lambda texts: [[1.0, 0.0] for _ in texts])
+        vector_store = InMemoryVectorStore()
+        add_sizes = []
+        original_add = vector_store.add_documents
+        vector_store.add_documents = lambda docs, embs: add_sizes.append(len(docs)) or original_add(docs, embs)
+
+        with patch('app.core.factory.ProviderFactory.create_all_providers') as mock_factory:
+            mock_factory.return_value = {
+                'llm': None,
+                'embedding': embedding,
+                'vector_store': vector_store,
+                'document_processor': FileSystemDocumentProcessor(),
+                'cache': None
+            }
+            orchestrator = HybridRAGOrchestrator()
+
+        assert orchestrator.is_initialized
+        assert add_sizes == [3, 3, 3, 1]
+        assert [len(call.args[0]) for call in embedding.generate_embeddings_batch.call_args_list] == [3, 3, 3, 1]
+        assert vector_store.get_stats()['total_embeddings'] == 10
+
+
+@pytest.mark.unit
+class TestHybridOrchestratorTracing:
+    """Tests para los spans del flujo híbrido"""
+
+    def test_rag_flow_records_stage_spans(self, semantic_orchestrator, ask_orchestrator):
+        """Una request RAG deja una traza con las etapas, chunks y largo del prompt"""
+        from app.monitoring.tracing import get_tracer
+
+        tracer = get_tracer()
+        tracer.clear()
+        orchestrator = semantic_orchestrator
+        orchestrator.vector_store.search_similar.return_value = [
+            {'content': 'Proyecto RAG con FastAPI', 'metadata': {'filename': 'proyectos.md'}},
+            {'content': 'Experiencia en Python', 'metadata': {'filename': 'cv.md'}}
+        ]
+
+        ask_orchestrator(orchestrator, "¿Sabes Python?")
+
+        trace = tracer.slowest(1)[0]
+        spans = {span['name']: span for span in trace['spans']}
+        root = trace['spans'][0]
+        assert trace['name'] == 'hybrid_request'
+        assert trace['attributes']['cache_hit'] is False
+        assert 'rag_generation' in trace['attributes']['flow_path']
+        for stage in ('rate_limiting', 'input_safety', 'cache_lookup', 'faq_classification',
+                      'query_embedding', 'output_safety', 'i18n'):
+            assert spans[stage]['parent_id'] == root['span_id']
+        assert spans['vector_search']['attributes']['chunks'] == 2
+        assert spans['build_prompt']['attributes']['chunks'] == 2
+        assert spans['build_prompt']['attributes']['prompt_length'] == spans['llm_generation']['attributes']['prompt_length'] > 0
+        assert spans['cache_lookup']['attributes']['cache_hit'] is False
@@ -0,0 +1,109 @@
+"""
+Unit tests for the in-process sampling profiler
+"""
+
+import threading
+import pytest
+
+
+def _busy_regex_stage(stop):
+    """Carga de CPU reconocible en las pilas muestreadas"""
+    import re
+    pattern = re.compile(r"(\d{3}[- ]?\d{2}[- ]?\d{4})")
+    while not stop.is_set():
+        pattern.findall("ssn 123-45-6789 " * 50)
+
+
+def _profile_busy_thread(profiler, seconds=0.3):
+    stop = threading.Event()
+    worker = threading.Thread(target=_busy_regex_stage, args=(stop,), name="busy-worker")
+    worker.start()
+    try:
+        return profiler.profile(seconds)
+    finally:
+        stop.set()
+        worker.join()
+
+
+@pytest.mark.unit
+class TestSamplingProfiler:
+    """Tests para el muestreador de pilas"""
+
+    def test_collapsed_stacks_attribute_samples_to_hot_function(self):
+        """La función que consume CPU aparece en la mayoría de las muestras de su hilo"""
+        from app.monitoring.profiler import SamplingProfiler
+
+        result = _profile_busy_thread(SamplingProfiler(interval_ms=5))
+
+        assert result.samples > 10
+        lines = result.to_collapsed().splitlines()
+        worker_counts = [int(line.rsplit(' ', 1)[1]) for line in lines if line.startswith('busy-worker;')]
+        hot_counts = [int(line.rsplit(' ', 1)[1]) for line in lines
+                      if line.startswith('busy-worker;') and '_busy_regex_stage (' in line]
+        assert sum(worker_counts) == result.samples
+        assert sum(hot_counts) >= 0.9 * result.samples
+        assert not any(line.startswith('MainThread;') and 'SamplingProfiler' in line for line in lines)
+
+    def test_speedscope_profile_is_consistent(self):
+        """Un perfil 'sampled' por hilo, con índices válidos y pesos en milisegundos"""
+        from app.monitoring.profiler import SamplingProfiler, SPEEDSCOPE_SCHEMA
+
+        result = _profile_busy_thread(SamplingProfiler(interval_ms=10), seconds=0.2)
+        document = result.to_speedscope()
+
+        assert document['$schema'] == SPEEDSCOPE_SCHEMA
+        frames = document['shared']['frames']
+        profiles = {profile['name']: profile for profile in document['profiles']}
+        worker = profiles['busy-worker']
+        assert worker['type'] == 'sampled' and worker['unit'] == 'milliseconds'
+        assert len(worker['samples']) == len(worker['weights'])
+        assert worker['endValue'] == pytest.approx(result.samples * 10)
+        assert all(0 <= index < len(frames) for stack in worker['samples'] for index in stack)
+        assert any('_busy_regex_stage' in (frames[i]['name'] for i in stack) for stack in worker['samples'])
+
+    def test_only_one_profile_at_a_time(self):
+        """Un segundo perfilado concurrente se rechaza en lugar de duplicar el costo"""
+        from app.monitoring.profiler import SamplingProfiler, ProfilerBusyError
+
+        profiler = SamplingProfiler(interval_ms=5)
+        started = threading.Thread(target=profiler.profile, args=(0.3,))
+        started.start()
+        try:
+            while not profiler.running:
+                pass
+            with pytest.raises(ProfilerBusyError):
+                profiler.profile(0.05)
+        finally:
+            started.join()
+        assert not profiler.running
+
+
+@pytest.mark.unit
+class TestProfileEndpoint:
+    """Tests para /api/monitoring/profile"""
+
+    def _client(self):
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from app.routes.monitoring import router
+
+        app = FastAPI()
+        app.include_router(router)
+        return TestClient(app)
+
+    def test_requires_admin_key(self, monkeypatch):
+        """Sin clave o con una clave desconocida el perfil no se ejecuta"""
+        from app.config.settings import Config
+
+        monkeypatch.setattr(Config, 'ADMIN_API_KEY_REQUIRED', True)
+        monkeypatch.setattr(Config, 'ADMIN_API_KEYS', ['admin-key'])
+        client = self._client()
+
+        assert client.get("/api/monitoring/profile?seconds=0.05").status_code == 401
+        assert client.get("/api/monitoring/profile?seconds=0.05", headers={'X-API-Key': 'nope'}).status_code == 403
+
+        response = client.get("/api/monitoring/profile?seconds=0.05&format=speedscope",
+                              headers={'X-API-Key': 'admin-key'})
+        assert response.status_code == 200
+        assert response.json()['profiles']
+        assert int(response.headers['x-profile-samples']) > 0
@@ -18,3 +18,40 @@ def test_metrics_registry_importable():
     observe_response_time(endpoint='/test', seconds=0.123)
     inc_cache_hit(endpoint='cache_test')
     inc_error(endpoint='/test', err_type='unit_test')
+
+
+@pytest.mark.unit
+class TestFlowStageMetrics:
+    """Tests para los histogramas por etapa y los percentiles del flujo"""
+
+    def test_histogram_quantile_interpolates_within_bucket(self):
+        """El cuantil se interpola linealmente dentro del bucket que lo contiene"""
+        pytest.importorskip("prometheus_client")
+        from app.monitoring.prometheus_exporter import histogram_quantile
+
+        buckets = [(0.01, 50.0), (0.1, 90.0), (1.0, 100.0), (float('inf'), 100.0)]
+        assert histogram_quantile(0.5, buckets, 100) == pytest.approx(0.01)
+        assert histogram_quantile(0.7, buckets, 100) == pytest.approx(0.055)
+        assert histogram_quantile(0.99, buckets, 100) == pytest.approx(0.91)
+        assert histogram_quantile(0.5, buckets, 0) is None
+
+    def test_flow_statistics_come_from_observed_flows(self):
+        """collect_flow_statistics reporta caminos y percentiles de los flujos registrados"""
+        pytest.importorskip("prometheus_client")
+        from app.monitoring.prometheus_exporter import observe_flow, stage_latency_summary, flow_path_counts
+        from app.routes.monitoring import collect_flow_statistics
+
+        before_total = stage_latency_summary().get('total', {}).get('count', 0)
+        before_paths = flow_path_counts()
+        for i in range(20):
+            observe_flow({'rate_limiting': 0.0002, 'unit_test_stage': 0.002 if i < 18 else 0.2},
+                         ['cache_miss', 'unit_test_path'], total_seconds=0.3)
+
+        stats = collect_flow_statistics()
+        stage = stats['steps_performance']['unit_test_stage']
+        assert stage['count'] >= 20
+        assert stage['p50_time_ms'] <= 2.5
+        assert stage['p99_time_ms'] > 100
+        assert stats['total_requests_processed'] == before_total + 20
+        assert stats['flow_paths']['unit_test_path']['count'] == before_paths.get('unit_test_path', 0) + 20
+        assert 'total' not in stats['steps_performance']
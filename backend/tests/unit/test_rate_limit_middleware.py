@@ -12,3 +12,87 @@ def test_require_rate_limit_allows_when_under_limit():
 def test_require_rate_limit_blocks_when_exceeded():
     # TODO: simular response 429
     assert True
+
+
+@pytest.mark.unit
+class TestRateLimitRouteTable:
+    """Tests para la tabla de rutas precompilada del middleware"""
+
+    def test_longest_prefix_and_exclusions(self):
+        """Gana el prefijo más largo y las rutas excluidas se resuelven en la misma búsqueda"""
+        from app.middleware.rate_limit_middleware import RateLimitMiddleware
+
+        middleware = RateLimitMiddleware(app=None)
+
+        assert middleware._get_endpoint_config("/api/chat")['category'] == "chat"
+        assert middleware._get_endpoint_config("/api/chat/status")['category'] == "chat"
+        assert middleware._get_endpoint_config("/api/chats")['category'] == "chat"
+        # El stream se cobra una sola vez, en el orquestador
+        assert middleware._resolve("/api/chat/stream")[0] is True
+        assert middleware._resolve("/api/chat/stream/abc")[0] is True
+        assert middleware._get_endpoint_config("/api/other")['category'] == "general"
+        assert middleware._get_endpoint_config("/")['category'] == "general"
+        assert middleware._resolve("/health/ready")[0] is True
+        assert middleware._resolve("/docs")[0] is True
+        assert middleware._resolve("/api/admin/users")[0] is False
+
+    def test_hot_reload_when_config_is_replaced(self, monkeypatch):
+        """Reemplazar RATE_LIMIT_DEFAULTS recompila la tabla en la siguiente request"""
+        from app.config.settings import Config
+        from app.middleware.rate_limit_middleware import RateLimitMiddleware
+
+        monkeypatch.setattr(Config, 'RATE_LIMIT_DEFAULTS', {'chat': {'limit': 5, 'window': 60}})
+        middleware = RateLimitMiddleware(app=None, default_limit=7, default_window=30)
+        table = middleware._routes
+
+        assert middleware._get_endpoint_config("/api/chat") == {"category": "chat", "limit": 5, "window": 60}
+        assert middleware._get_endpoint_config("/api/search")['limit'] == 7
+        assert middleware._routes is table
+
+        monkeypatch.setattr(Config, 'RATE_LIMIT_DEFAULTS', {'chat': {'limit': 9, 'window': 60},
+                                                            'general': {'limit': 3, 'window': 10}})
+        assert middleware._get_endpoint_config("/api/chat")['limit'] == 9
+        assert middleware._get_endpoint_config("/api/search") == {"category": "search", "limit": 3, "window": 10}
+        assert middleware._routes is not table
+
+
+@pytest.mark.unit
+class TestRateLimitClientType:
+    """Tests para la derivación del tipo de cliente y su identificador"""
+
+    def _request(self, headers):
+        from starlette.requests import Request as StarletteRequest
+
+        return StarletteRequest({
+            'type': 'http', 'method': 'GET', 'path': '/api/chat', 'query_string': b'',
+            'headers': [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+            'client': ('203.0.113.9', 5000)
+        })
+
+    def test_only_configured_api_keys_get_the_api_key_tier(self, monkeypatch):
+        """Una X-API-Key arbitraria cae al tier anónimo con la IP como identificador"""
+        from app.config.settings import Config
+        from app.middleware.rate_limit_middleware import RateLimitMiddleware, get_client_type
+
+        monkeypatch.setattr(Config, 'RATE_LIMIT_API_KEYS', ['client-key'])
+        monkeypatch.setattr(Config, 'ADMIN_API_KEYS', ['admin-key'])
+        middleware = RateLimitMiddleware(app=None)
+
+        forged = self._request({'X-API-Key': 'anything'})
+        assert get_client_type(forged) == 'anonymous'
+        assert middleware._get_client_identifier(forged) == 'ip:203.0.113.9'
+
+        for key in ('client-key', 'admin-key'):
+            valid = self._request({'X-API-Key': key})
+            assert get_client_type(valid) == 'api_key'
+            assert middleware._get_client_identifier(valid) == f'api_key:{key}'
+
+    def test_identifier_ignores_session_cookie_and_uses_proxy_ip(self):
+        """La cookie de sesión no cambia el identificador; detrás de nginx manda X-Real-IP"""
+        from app.middleware.rate_limit_middleware import RateLimitMiddleware
+
+        middleware = RateLimitMiddleware(app=None)
+        request = self._request({'Cookie': 'session_id=fresh', 'X-Real-IP': '198.51.100.4',
+                                 'X-Forwarded-For': '192.0.2.1, 10.0.0.1'})
+
+        assert middleware._get_client_identifier(request) == 'ip:198.51.100.4'
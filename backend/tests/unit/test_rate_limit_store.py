@@ -0,0 +1,223 @@
+"""
+Unit tests for rate limiter storage backends
+"""
+
+import time
+import pytest
+from concurrent.futures import ProcessPoolExecutor
+
+
+def _hammer_sqlite_store(path, attempts):
+    """Worker de otro proceso: intenta `attempts` requests contra el almacén compartido"""
+    from app.providers.rate_limit_store import SQLiteRateLimitStore
+
+    store = SQLiteRateLimitStore(path)
+    allowed = sum(
+        1 for _ in range(attempts)
+        if store.acquire("shared_client", time.time(), [(15, 60)])['violated'] is None
+    )
+    store.close()
+    return allowed
+
+
+@pytest.mark.unit
+class TestInMemoryRateLimitStore:
+    """Tests para el almacén en memoria"""
+
+    def test_acquire_checks_windows_in_order(self):
+        """La primera ventana excedida se reporta y la request no se registra"""
+        from app.providers.rate_limit_store import InMemoryRateLimitStore
+
+        store = InMemoryRateLimitStore()
+        limits = [(2, 10), (3, 60)]
+
+        assert store.acquire("client", 100.0, limits)['violated'] is None
+        assert store.acquire("client", 101.0, limits)['counts'] == [2, 2]
+        assert store.acquire("client", 102.0, limits)['violated'] == 0
+        assert store.acquire("client", 111.5, limits)['violated'] is None
+        blocked = store.acquire("client", 115.0, limits)
+        assert blocked['violated'] == 1
+        assert blocked['oldest'] == [111.5, 100.0]
+
+    def test_gcra_keeps_one_float_per_limit(self):
+        """GCRA admite la ráfaga, luego el ritmo sostenido, con estado constante"""
+        from app.providers.rate_limit_store import InMemoryRateLimitStore
+
+        store = InMemoryRateLimitStore()
+        limits = [(3, 10), (1000, 3600)]
+
+        assert [store.acquire_gcra("client", 100.0, limits)['violated'] for _ in range(4)] == [None, None, None, 0]
+        # Una unidad de ráfaga se libera cada 10/3 s
+        assert store.acquire_gcra("client", 102.0, limits)['violated'] == 0
+        assert store.acquire_gcra("client", 103.4, limits)['violated'] is None
+        for i in range(300):
+            store.acquire_gcra("client", 104.0 + i * 3.4, limits)
+
+        assert len(store.tats["client"]) == 2
+        assert store.windows == {}
+        assert store.cleanup(10000.0) == 1
+        assert store.peek_gcra("client", 10000.0, limits) == {'tats': [None, None]}
+
+    def test_peek_does_not_allocate_unknown_identifiers(self):
+        """Consultar un identificador desconocido no crea estado"""
+        from app.providers.rate_limit_store import InMemoryRateLimitStore
+
+        store = InMemoryRateLimitStore()
+        assert store.peek("unknown", time.time(), [(5, 10)]) == {'counts': [0], 'oldest': [None]}
+        assert store.get_stats()['active_keys'] == 0
+
+
+    def test_identifier_table_is_bounded(self):
+        """Un barrido desde muchas IPs no supera el tope y desplaza al menos reciente"""
+        from app.providers.rate_limit_store import InMemoryRateLimitStore
+
+        store = InMemoryRateLimitStore(max_keys=100)
+        limits = [(5, 10), (30, 60)]
+        store.acquire("regular", 1000.0, limits)
+        for i in range(1000):
+            store.acquire(f"ip:{i}", 1000.0 + i * 0.001, limits)
+            if i % 50 == 0:
+                store.acquire("regular", 1000.0 + i * 0.001, limits)
+
+        stats = store.get_stats()
+        assert stats['active_keys'] == 100
+        assert stats['evicted_keys'] == 901
+        assert "regular" in store.windows
+        assert "ip:0" not in store.windows
+        assert stats['memory_bytes'] == 100 * store.KEY_OVERHEAD_BYTES + store._values * store.VALUE_BYTES
+
+    def test_idle_clients_are_reaped_on_acquire(self):
+        """Cada acquire expira clientes inactivos sin esperar a get_global_stats"""
+        from app.providers.rate_limit_store import InMemoryRateLimitStore
+
+        store = InMemoryRateLimitStore(max_keys=0)
+        limits = [(5, 10), (30, 60)]
+        for i in range(10):
+            store.acquire(f"ip:{i}", 1000.0, limits)
+        store.acquire_gcra("gcra", 1000.0, limits)
+
+        store.acquire("active", 1061.0, limits)
+        assert list(store.windows) == ["active"]
+        assert store.tats == {}
+        assert store.get_stats()['reaped_keys'] == 11
+        assert store._values == 2
+
+@pytest.mark.unit
+class TestSQLiteRateLimitStore:
+    """Tests para el almacén SQLite compartido entre workers"""
+
+    def test_limit_is_shared_across_processes(self, tmp_path):
+        """Cuatro procesos contra el mismo archivo no superan el límite global"""
+        path = str(tmp_path / "rate_limits.sqlite3")
+
+        with ProcessPoolExecutor(max_workers=4) as pool:
+            allowed = sum(pool.map(_hammer_sqlite_store, [path] * 4, [10] * 4))
+
+        assert allowed == 15
+
+    def test_busy_database_fails_open_quickly(self, tmp_path, monkeypatch):
+        """Con el lock de escritura tomado por otro worker se espera poco y la request pasa"""
+        import sqlite3
+        from app.config.settings import Config
+        from app.providers.rate_limit_store import SQLiteRateLimitStore
+        from app.utils.rate_limiter import RateLimiter, RateLimitConfig
+
+        monkeypatch.setattr(Config, 'RATE_LIMIT_SQLITE_TIMEOUT_MS', 50)
+        path = str(tmp_path / "rate_limits.sqlite3")
+        limiter = RateLimiter(RateLimitConfig(max_requests=3, window_seconds=60), store=SQLiteRateLimitStore(path))
+
+        other_worker = sqlite3.connect(path, isolation_level=None)
+        other_worker.execute("BEGIN IMMEDIATE")
+        try:
+            start = time.perf_counter()
+            result = limiter.is_allowed("ip:1.2.3.4")
+            elapsed = time.perf_counter() - start
+        finally:
+            other_worker.execute("ROLLBACK")
+            other_worker.close()
+
+        assert result['allowed'] is True and result['fail_open'] is True
+        assert elapsed < 1.0
+        assert limiter.is_allowed("ip:1.2.3.4").get('fail_open') is None
+
+    def test_rate_limiters_share_counters(self, tmp_path):
+        """Dos RateLimiter (como dos workers) aplican un único límite"""
+        from app.providers.rate_limit_store import SQLiteRateLimitStore
+        from app.utils.rate_limiter import RateLimiter, RateLimitConfig
+
+        path = str(tmp_path / "rate_limits.sqlite3")
+        config = RateLimitConfig(max_requests=3, window_seconds=60, burst_limit=10, burst_window=10)
+        worker_a = RateLimiter(config, store=SQLiteRateLimitStore(path))
+        worker_b = RateLimiter(config, store=SQLiteRateLimitStore(path))
+
+        assert worker_a.is_allowed("ip:1.2.3.4")['allowed'] is True
+        assert worker_b.is_allowed("ip:1.2.3.4")['allowed'] is True
+        assert worker_a.is_allowed("ip:1.2.3.4")['remaining'] == 0
+        blocked = worker_b.is_allowed("ip:1.2.3.4")
+        assert blocked['allowed'] is False
+        assert blocked['reason'] == 'rate_limit_exceeded'
+        assert worker_a.get_stats("ip:1.2.3.4")['current_requests'] == 3
+
+        assert worker_b.reset_user_limits("ip:1.2.3.4") is True
+        assert worker_a.is_allowed("ip:1.2.3.4")['allowed'] is True
+
+    def test_gcra_rate_limiters_share_state(self, tmp_path, monkeypatch):
+        """En modo GCRA los workers comparten el TAT y reportan remaining/retry_after"""
+        from app.providers.rate_limit_store import SQLiteRateLimitStore
+        from app.utils import rate_limiter as rate_limiter_module
+        from app.utils.rate_limiter import RateLimiter, RateLimitConfig
+
+        monkeypatch.setattr(rate_limiter_module.time, 'time', lambda: 1000.0)
+        path = str(tmp_path / "rate_limits.sqlite3")
+        config = RateLimitConfig(max_requests=3, window_seconds=60, burst_limit=10, burst_window=10,
+                                 algorithm='gcra')
+        worker_a = RateLimiter(config, store=SQLiteRateLimitStore(path))
+        worker_b = RateLimiter(config, store=SQLiteRateLimitStore(path))
+
+        first = worker_a.is_allowed("ip:1.2.3.4")
+        assert first['allowed'] is True
+        assert first['remaining'] == 2
+        assert first['reset_time'] == 1020.0
+        assert worker_b.is_allowed("ip:1.2.3.4")['remaining'] == 1
+        assert worker_a.is_allowed("ip:1.2.3.4")['remaining'] == 0
+
+        blocked = worker_b.is_allowed("ip:1.2.3.4")
+        assert blocked['allowed'] is False
+        assert blocked['reason'] == 'rate_limit_exceeded'
+        assert blocked['retry_after'] == 20
+        assert worker_a.get_stats("ip:1.2.3.4")['current_requests'] == 3
+
+        monkeypatch.setattr(rate_limiter_module.time, 'time', lambda: 1020.0)
+        assert worker_b.is_allowed("ip:1.2.3.4")['allowed'] is True
+
+
+@pytest.mark.unit
+class TestRedisRateLimitStore:
+    """Tests para el almacén Redis contra un sustituto local con soporte Lua"""
+
+    def test_acquire_is_atomic_script(self):
+        """El script Lua registra la request solo si ninguna ventana se excede"""
+        fakeredis = pytest.importorskip("fakeredis")
+        pytest.importorskip("lupa")
+        from app.providers.rate_limit_store import RedisRateLimitStore
+
+        store = RedisRateLimitStore(client=fakeredis.FakeRedis())
+        limits = [(2, 10), (3, 60)]
+
+        assert store.acquire("client", 100.0, limits)['violated'] is None
+        assert store.acquire("client", 101.0, limits)['counts'] == [2, 2]
+        assert store.acquire("client", 102.0, limits)['violated'] == 0
+        assert store.peek("client", 102.0, limits)['oldest'] == [100.0, 100.0]
+        assert store.reset("client") is True
+        assert store.peek("client", 102.0, limits)['counts'] == [0, 0]
+
+    def test_get_stats_does_not_scan_keyspace(self):
+        """get_stats no recorre las claves de Redis con SCAN"""
+        from unittest.mock import MagicMock
+        from app.providers.rate_limit_store import RedisRateLimitStore
+
+        client = MagicMock()
+        stats = RedisRateLimitStore(client=client).get_stats()
+
+        assert stats == {'backend': 'redis', 'active_keys': None}
+        client.scan_iter.assert_not_called()
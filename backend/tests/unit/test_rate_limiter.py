@@ -69,9 +69,11 @@ class TestRateLimiter:
         """Test client identifier extraction"""
         from app.utils.rate_limiter import get_client_identifier
         
+        from app.config.settings import Config
+        
         # Mock request object
         mock_request = Mock()
-        mock_request.remote_addr = "192.168.1.1"
+        mock_request.client.host = "192.168.1.1"
         mock_request.headers = {}
         
         identifier = get_client_identifier(mock_request)
@@ -79,8 +81,15 @@ class TestRateLimiter:
         
         # Test with API key
         mock_request.headers = {"X-API-Key": "test-key"}
-        identifier = get_client_identifier(mock_request)
+        with patch.object(Config, 'RATE_LIMIT_API_KEYS', ["test-key"]):
+            identifier = get_client_identifier(mock_request)
         assert identifier == "api_key:test-key"
+        
+        # Una API key no configurada no obtiene identificador propio
+        mock_request.headers = {"X-API-Key": "made-up-key", "X-Real-IP": "10.0.0.7"}
+        with patch.object(Config, 'RATE_LIMIT_API_KEYS', ["test-key"]):
+            identifier = get_client_identifier(mock_request)
+        assert identifier == "ip:10.0.0.7"
     
     def test_rate_limiter_stats(self):
         """Test rate limiter statistics"""
@@ -96,3 +105,134 @@ class TestRateLimiter:
         stats = rate_limiter.get_global_stats()
         assert stats['total_requests'] >= 2
         assert 'clients' in stats
+
+
+@pytest.mark.unit
+class TestRateLimiterTiers:
+    """Tests para límites por tipo de cliente y categoría con costo"""
+
+    def test_tiers_are_independent_per_client_type(self):
+        """Cada (tipo de cliente, categoría) aplica su propia ventana y ráfaga"""
+        from app.providers.rate_limit_store import InMemoryRateLimitStore
+        from app.utils.rate_limiter import RateLimiter
+
+        limiter = RateLimiter(store=InMemoryRateLimitStore(), tiers={
+            'anonymous': {'chat': {'limit': 2, 'window': 3600, 'burst_limit': 5, 'burst_window': 10}},
+            'api_key': {'chat': {'limit': 100, 'window': 3600, 'burst_limit': 3, 'burst_window': 10}}
+        })
+
+        assert limiter.check_rate_limit("ip:1.1.1.1", "chat")['limit'] == 2
+        assert limiter.check_rate_limit("ip:1.1.1.1", "chat")['allowed'] is True
+        blocked = limiter.check_rate_limit("ip:1.1.1.1", "chat")
+        assert blocked['allowed'] is False
+        assert blocked['reason'] == 'rate_limit_exceeded'
+
+        results = [limiter.check_rate_limit("api_key:abc", "chat") for _ in range(4)]
+        assert [result['allowed'] for result in results] == [True, True, True, False]
+        assert results[-1]['reason'] == 'burst_limit_exceeded'
+        assert results[0]['limit'] == 100
+
+        # Los límites explícitos tienen prioridad sobre el tier
+        assert limiter.check_rate_limit("ip:1.1.1.1", "chat", limit=10, window=60)['allowed'] is True
+
+    def test_stream_costs_more_of_the_chat_budget(self):
+        """chat_stream consume del mismo presupuesto que chat, con mayor costo"""
+        from app.providers.rate_limit_store import InMemoryRateLimitStore
+        from app.utils.rate_limiter import RateLimiter, RATE_LIMIT_COSTS
+
+        limiter = RateLimiter(store=InMemoryRateLimitStore(), tiers={
+            'anonymous': {'chat': {'limit': 10, 'window': 3600, 'burst_limit': 10, 'burst_window': 10}}
+        })
+
+        assert limiter.check_rate_limit("ip:2.2.2.2", "chat")['remaining'] == 9
+        stream = limiter.check_rate_limit("ip:2.2.2.2", "chat_stream")
+        assert stream['remaining'] == 9 - RATE_LIMIT_COSTS['chat_stream']
+        assert limiter.check_rate_limit("ip:2.2.2.2", "chat", cost=stream['remaining'] + 1)['allowed'] is False
+        assert limiter.get_global_stats()['blocked_requests'] == 1
+
+    def test_two_streams_fit_every_tier_burst(self):
+        """Dos streams seguidos entran en la ráfaga de chat de todos los tiers"""
+        from app.providers.rate_limit_store import InMemoryRateLimitStore
+        from app.utils.rate_limiter import RateLimiter, RATE_LIMIT_CONFIGS
+
+        limiter = RateLimiter(store=InMemoryRateLimitStore())
+        identifiers = {'anonymous': "ip:3.3.3.3", 'authenticated': "user:7",
+                       'premium': "premium:7", 'api_key': "api_key:k"}
+
+        for client_type, identifier in identifiers.items():
+            assert client_type in RATE_LIMIT_CONFIGS
+            results = [limiter.check_rate_limit(identifier, "chat_stream") for _ in range(2)]
+            assert all(result['allowed'] for result in results), client_type
+
+    def test_cost_is_capped_at_the_burst_limit(self):
+        """Un costo mayor que la ráfaga del tier se recorta en vez de rechazar siempre"""
+        from app.providers.rate_limit_store import InMemoryRateLimitStore
+        from app.utils.rate_limiter import RateLimiter
+
+        limiter = RateLimiter(store=InMemoryRateLimitStore(), tiers={
+            'anonymous': {'chat': {'limit': 10, 'window': 3600, 'burst_limit': 1, 'burst_window': 10}}
+        })
+
+        first = limiter.check_rate_limit("ip:4.4.4.4", "chat_stream")
+        assert first['allowed'] is True
+        assert first['remaining'] == 9
+        assert limiter.check_rate_limit("ip:4.4.4.4", "chat_stream")['reason'] == 'burst_limit_exceeded'
+
+    def test_store_failure_fails_open_with_warning_and_counter(self, caplog):
+        """Un fallo del almacén permite la request, avisa en WARNING y suma al contador"""
+        import logging
+        from unittest.mock import MagicMock
+        from app.utils.rate_limiter import RateLimiter
+
+        store = MagicMock()
+        store.acquire.side_effect = ConnectionError("redis caído")
+        store.get_stats.return_value = {'backend': 'redis', 'active_keys': None}
+        limiter = RateLimiter(store=store)
+
+        with caplog.at_level(logging.WARNING, logger="app.utils.rate_limiter"):
+            result = limiter.check_rate_limit("ip:5.5.5.5", "chat")
+
+        assert result['allowed'] is True
+        assert result['fail_open'] is True
+        assert any(r.levelno == logging.WARNING and "fail-open" in r.getMessage() for r in caplog.records)
+        stats = limiter.get_global_stats()
+        assert stats['fail_open_requests'] == 1
+        assert stats['clients'] is None
+
+
+@pytest.mark.unit
+class TestRateLimitAsyncCheck:
+    """Tests para run_rate_limit_check desde el event loop"""
+
+    def _check_thread(self, monkeypatch, store):
+        import asyncio
+        import threading
+        from app.utils import rate_limiter as rate_limiter_module
+
+        monkeypatch.setattr(rate_limiter_module.rate_limiter, 'store', store)
+        threads = []
+
+        def check(identifier, request_type):
+            threads.append(threading.current_thread())
+            return {'allowed': True}
+
+        async def run():
+            result = await rate_limiter_module.run_rate_limit_check(check, "ip:1.2.3.4", "chat")
+            return result, threading.current_thread()
+
+        result, loop_thread = asyncio.run(run())
+        assert result == {'allowed': True}
+        return threads[0] is loop_thread
+
+    def test_blocking_store_is_checked_off_the_event_loop(self, monkeypatch, tmp_path):
+        """SQLite y Redis se consultan en un hilo"""
+        from app.providers.rate_limit_store import SQLiteRateLimitStore
+
+        store = SQLiteRateLimitStore(str(tmp_path / "rate_limits.sqlite3"))
+        assert self._check_thread(monkeypatch, store) is False
+
+    def test_memory_store_is_checked_inline(self, monkeypatch):
+        """El almacén en memoria no paga el salto a un hilo"""
+        from app.providers.rate_limit_store import InMemoryRateLimitStore
+
+        assert self._check_thread(monkeypatch, InMemoryRateLimitStore()) is True
@@ -106,3 +106,64 @@ class TestSafetyChecker:
             assert result['has_pii'] == expected_has_pii
             if expected_has_pii:
                 assert len(result['pii_types']) > 0
+
+
+@pytest.mark.unit
+class TestSafetyCheckerRuleSet:
+    """Tests para el conjunto de reglas precompilado con prefiltro"""
+
+    def test_overlapping_rules_reported_in_one_scan(self):
+        """Una misma palabra puede disparar varias reglas y todas se reportan"""
+        from app.services.safety_checker import SafetyChecker
+
+        checker = SafetyChecker()
+        result = checker.check_input_safety("olvidé mi contraseña, y eval(x)")
+
+        rule_ids = [issue['rule_id'] for issue in result['issues']]
+        assert rule_ids == ['personal_info', 'unauthorized_requests', 'malicious_code']
+        assert result['is_safe'] is False
+        assert result['filtered_message'] == ""
+
+    def test_added_rule_rebuilds_rule_set(self):
+        """add_safety_rule reconstruye el conjunto de reglas sin perder las existentes"""
+        from app.services.safety_checker import SafetyChecker, SafetyRule, SafetyLevel
+
+        checker = SafetyChecker()
+        assert checker.add_safety_rule(SafetyRule(
+            id="repeated_pair", pattern=r"(ab)\1{2}", level=SafetyLevel.WARNING,
+            category="spam", description="Par repetido", action="filter"
+        ))
+
+        assert 'repeated_pair' in checker._rule_set.compiled
+        result = checker.check_input_safety("xx ababab yy")
+        assert [issue['rule_id'] for issue in result['issues']] == ['repeated_pair']
+        assert result['filtered_message'] == "xx [FILTRADO] yy"
+        assert checker.check_input_safety("xx abab yy")['issues'] == []
+        assert checker.check_stream_safety("texto <script>")['issues'][0]['rule_id'] == 'malicious_code'
+
+    def test_required_literals_prefilter(self):
+        """Los literales obligatorios se extraen del patrón y respetan IGNORECASE"""
+        from app.services.safety_checker import SafetyChecker
+        from app.utils.regex_literals import required_literals
+
+        assert required_literals(r"\b(hackear|robar)\b") == ('hackear', 'robar')
+        assert required_literals(r"(.)\1{10,}") is None
+
+        checker = SafetyChecker()
+        assert [rule.id for rule in checker._rule_set.find("HACKEAR el sistema")] == ['unauthorized_requests']
+        assert [rule.id for rule in checker._rule_set.find("JavaScript:alert(1)")] == ['malicious_code']
+        assert checker._rule_set.find("Háblame de tus proyectos") == []
+
+    def test_prefilter_keeps_ignorecase_only_equivalences(self):
+        """'ı' (U+0131) coincide con 'i' bajo IGNORECASE: el prefiltro no puede descartarla"""
+        from app.services.safety_checker import SafetyChecker
+        from app.utils.regex_literals import fold_text
+
+        assert fold_text("scrıpt ſ \u212a") == "script s k"
+
+        checker = SafetyChecker()
+        blocked = checker.check_input_safety("<scrıpt>alert(1)</scrıpt>")
+        assert blocked['is_safe'] is False
+        assert [issue['rule_id'] for issue in blocked['issues']] == ['malicious_code']
+        for message in ("eres un ıdıota", "vıolencia", "discrımınación"):
+            assert checker.check_input_safety(message)['issues'], message
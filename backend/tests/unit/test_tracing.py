@@ -0,0 +1,174 @@
+"""
+Unit tests for request-scoped tracing
+"""
+
+import asyncio
+import json
+import time
+import pytest
+
+
+@pytest.mark.unit
+class TestTracer:
+    """Tests para los spans y el ring buffer de trazas"""
+
+    def test_nested_spans_share_trace_and_finish_on_root(self):
+        """Los hijos heredan trace_id y la traza se guarda al cerrar la raíz"""
+        from app.monitoring.tracing import Tracer, current_span
+
+        tracer = Tracer(enabled=True, buffer_size=10, slowest_size=5)
+        with tracer.span('request', path='/api/chat') as root:
+            with tracer.span('embedding') as child:
+                assert current_span() is child
+                with tracer.span('gemini.embed_content'):
+                    pass
+            assert current_span() is root
+            assert tracer.recent() == []
+        assert current_span() is None
+
+        trace = tracer.describe(tracer.traces[0])
+        names = [span['name'] for span in trace['spans']]
+        assert names == ['request', 'embedding', 'gemini.embed_content']
+        assert trace['spans'][2]['parent_id'] == child.span_id
+        assert child.trace_id == root.trace_id
+        assert trace['attributes'] == {'path': '/api/chat'}
+        assert trace['span_count'] == 3
+
+    def test_exceptions_mark_span_as_error(self):
+        """Un error dentro del span se registra y se propaga"""
+        from app.monitoring.tracing import Tracer
+
+        tracer = Tracer(enabled=True)
+        with pytest.raises(ValueError):
+            with tracer.span('request'):
+                with tracer.span('chromadb.query'):
+                    raise ValueError("sin colección")
+
+        summary = tracer.recent(1)[0]
+        assert summary['status'] == 'error'
+        spans = tracer.describe(tracer.traces[0])['spans']
+        assert spans[1]['attributes']['error.type'] == 'ValueError'
+
+    def test_ring_buffer_and_slowest_top(self):
+        """El ring buffer guarda las últimas trazas y el top conserva las más lentas"""
+        from app.monitoring.tracing import Tracer
+
+        tracer = Tracer(enabled=True, buffer_size=3, slowest_size=2)
+        for i, delay in enumerate([0.03, 0.0, 0.02, 0.0, 0.0]):
+            with tracer.span(f'request-{i}'):
+                time.sleep(delay)
+
+        assert [trace['name'] for trace in tracer.recent(10)] == ['request-4', 'request-3', 'request-2']
+        slowest = tracer.slowest(5)
+        assert [trace['name'] for trace in slowest] == ['request-0', 'request-2']
+        assert slowest[0]['spans'][0]['name'] == 'request-0'
+        assert tracer.get_trace(slowest[0]['trace_id'])['name'] == 'request-0'
+        assert tracer.get_stats()['finished_traces'] == 5
+
+    def test_context_propagates_through_await_and_threads(self):
+        """El span activo llega a corrutinas y a asyncio.to_thread"""
+        from app.monitoring.tracing import Tracer
+
+        tracer = Tracer(enabled=True)
+
+        def blocking_query():
+            with tracer.span('chromadb.query', chunks=3):
+                pass
+
+        async def flow():
+            with tracer.span('request'):
+                await asyncio.gather(asyncio.to_thread(blocking_query), asyncio.sleep(0))
+
+        asyncio.run(flow())
+        spans = tracer.describe(tracer.traces[0])['spans']
+        assert [span['name'] for span in spans] == ['request', 'chromadb.query']
+        assert spans[1]['parent_id'] == spans[0]['span_id']
+
+    def test_disabled_tracer_records_nothing(self):
+        """Con el tracing deshabilitado los spans no registran nada"""
+        from app.monitoring.tracing import Tracer, NOOP_SPAN
+
+        tracer = Tracer(enabled=False)
+        with tracer.span('request') as span:
+            span.set_attribute('cache_hit', True)
+        assert span is NOOP_SPAN
+        assert len(tracer.traces) == 0
+
+
+@pytest.mark.unit
+class TestOTLPFileExporter:
+    """Tests para el exportador OTLP/JSON a archivo"""
+
+    def test_flush_writes_one_otlp_line_per_trace(self, tmp_path):
+        """Cada traza exportada es una línea ExportTraceServiceRequest válida"""
+        from app.monitoring.tracing import Tracer, OTLPFileExporter
+
+        path = tmp_path / "traces.jsonl"
+        exporter = OTLPFileExporter(str(path), service_name='portfolio-test')
+        tracer = Tracer(enabled=True, exporters=[exporter])
+        for _ in range(2):
+            with tracer.span('request', cache_hit=False):
+                with tracer.span('build_prompt', chunks=4, similarity=0.5):
+                    pass
+
+        assert not path.exists()
+        assert exporter.flush() == 2
+        lines = path.read_text(encoding='utf-8').splitlines()
+        assert len(lines) == 2
+
+        payload = json.loads(lines[0])
+        resource_spans = payload['resourceSpans'][0]
+        assert resource_spans['resource']['attributes'] == [
+            {'key': 'service.name', 'value': {'stringValue': 'portfolio-test'}}
+        ]
+        root, child = resource_spans['scopeSpans'][0]['spans']
+        assert len(root['traceId']) == 32 and len(root['spanId']) == 16
+        assert root['parentSpanId'] == ''
+        assert child['parentSpanId'] == root['spanId']
+        assert int(child['endTimeUnixNano']) >= int(child['startTimeUnixNano'])
+        assert child['attributes'] == [
+            {'key': 'chunks', 'value': {'intValue': '4'}},
+            {'key': 'similarity', 'value': {'doubleValue': 0.5}}
+        ]
+        assert root['attributes'] == [{'key': 'cache_hit', 'value': {'boolValue': False}}]
+        assert tracer.get_stats()['exported'] == 2
+
+
+@pytest.mark.unit
+class TestTracingMiddleware:
+    """Tests para el span raíz de cada request HTTP"""
+
+    def _run(self, middleware, path):
+        sent = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.run(middleware({'type': 'http', 'method': 'POST', 'path': path}, receive, send))
+        return sent
+
+    def test_root_span_wraps_app_spans_and_returns_trace_id(self):
+        """Los spans de la app cuelgan del span HTTP y el trace_id vuelve en un header"""
+        from app.monitoring.tracing import Tracer
+        from app.middleware.tracing_middleware import TracingMiddleware
+
+        tracer = Tracer(enabled=True)
+
+        async def app(scope, receive, send):
+            with tracer.span('hybrid_request'):
+                await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+                await send({'type': 'http.response.body', 'body': b'ok'})
+
+        middleware = TracingMiddleware(app, tracer=tracer, excluded_paths=['/api/monitoring'])
+        sent = self._run(middleware, '/api/chat')
+        self._run(middleware, '/api/monitoring/traces')
+
+        # En la ruta excluida el span de la app queda como raíz de su propia traza
+        assert [root.name for root in tracer.traces] == ['http.request', 'hybrid_request']
+        trace = tracer.describe(tracer.traces[0])
+        assert dict(sent[0]['headers'])[b'x-trace-id'] == trace['trace_id'].encode()
+        assert trace['attributes'] == {'http.method': 'POST', 'http.target': '/api/chat', 'http.status_code': 200}
+        assert trace['spans'][1]['parent_id'] == trace['spans'][0]['span_id']